@@ -0,0 +1,215 @@
+"""
+章节音频后处理：去除首尾静音、响度统一、按角色切换插入停顿
+
+不同音色合成的片段响度和首尾静音差别很大。这里在拼接章节时对解码后的PCM做处理，
+整章只启动一个 ffmpeg 解码进程和一个编码进程：片段包中的MP3帧按顺序送入解码器，
+解码输出按每个片段的采样数切分，逐个片段处理后直接写入编码器，不需要在内存中保存整章音频。
+
+每个片段只计算一次分窗能量（NumPy 向量化），同一组能量同时用于定位首尾静音和计算响度。
+响度按去除静音后的 RMS（dBFS）统一，同时限制峰值避免削波。
+"""
+
+import threading
+import subprocess
+
+import numpy as np
+from pydub import AudioSegment
+
+from chapter_assembler import audio_frames, parse_frame_header
+from encoding_profiles import encoder_args
+
+# 后处理默认参数
+POSTPROCESS_DEFAULTS = {
+    # 目标响度（去除静音后的RMS，dBFS）
+    "target_dbfs": -20.0,
+    # 低于该电平（dBFS）的分窗视为静音
+    "silence_dbfs": -45.0,
+    # 计算能量的分窗长度（毫秒）
+    "window_ms": 10,
+    # 去除静音后在首尾保留的静音（毫秒）
+    "keep_silence_ms": 30,
+    # 同一角色连续两句之间的停顿（毫秒）
+    "pause_ms": 200,
+    # 角色切换时的停顿（毫秒）
+    "speaker_pause_ms": 500,
+    # 允许的最大峰值（相对满刻度）
+    "peak_limit": 0.98,
+    # 输出码率
+    "bitrate": "128k",
+}
+
+# 16位PCM的满刻度
+FULL_SCALE = 32768.0
+
+
+def postprocess_settings(settings=None):
+    """合并默认参数，settings 为 True 或 None 时使用默认参数"""
+    merged = dict(POSTPROCESS_DEFAULTS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+
+def window_energy(samples, window):
+    """
+    分窗能量（每个分窗的均方值），samples 为 (采样数, 声道数) 的浮点数组
+
+    末尾不足一个分窗的部分单独成窗
+    """
+    count = len(samples)
+    if count == 0:
+        return np.zeros(0)
+    mono = (samples * samples).mean(axis=1)
+    full = count // window * window
+    energy = mono[:full].reshape(-1, window).mean(axis=1)
+    if full < count:
+        energy = np.append(energy, mono[full:].mean())
+    return energy
+
+
+def process_segment(samples, sample_rate, settings):
+    """
+    处理一个片段：去除首尾静音并统一响度
+
+    samples 为 int16 的 (采样数, 声道数) 数组，返回处理后的 int16 数组（全部为静音时返回空数组）
+    """
+    data = samples.astype(np.float32) / FULL_SCALE
+    window = max(1, int(sample_rate * settings["window_ms"] / 1000))
+    energy = window_energy(data, window)
+
+    threshold = 10 ** (settings["silence_dbfs"] / 10)
+    voiced = np.flatnonzero(energy > threshold)
+    if voiced.size == 0:
+        return samples[:0]
+
+    keep = int(sample_rate * settings["keep_silence_ms"] / 1000)
+    start = max(0, voiced[0] * window - keep)
+    end = min(len(data), (voiced[-1] + 1) * window + keep)
+    data = data[start:end]
+
+    # 只用有声分窗计算响度，片段内部的停顿不会拉低响度
+    rms = np.sqrt(energy[voiced].mean())
+    gain = 10 ** (settings["target_dbfs"] / 20) / rms
+    peak = np.abs(data).max()
+    if peak * gain > settings["peak_limit"]:
+        gain = settings["peak_limit"] / peak
+
+    return np.clip(data * gain * FULL_SCALE, -FULL_SCALE, FULL_SCALE - 1).astype(
+        np.int16
+    )
+
+
+def silence(milliseconds, sample_rate, channels):
+    """指定时长的静音"""
+    return np.zeros((int(sample_rate * milliseconds / 1000), channels), np.int16)
+
+
+def segment_samples(frames):
+    """片段MP3帧解码后的采样数"""
+    offset = 0
+    samples = 0
+    while True:
+        header = parse_frame_header(frames, offset)
+        if header is None or header["length"] <= 0:
+            return samples
+        samples += header["samples"]
+        offset += header["length"]
+
+
+def _feed(process, chunks):
+    """向解码进程写入MP3帧（单独线程，避免与读取输出互相阻塞）"""
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+    except BrokenPipeError:
+        pass
+    finally:
+        process.stdin.close()
+
+
+def render_chapter(segments, output_path, settings=None, export=None):
+    """
+    流式解码、处理并编码整章音频
+
+    segments 为按顺序的 (MP3数据, 角色名)，角色与上一句不同时插入较长的停顿。
+    export 为编码配置（见 encoding_profiles），为None时按 settings 中的码率编码为MP3。
+    返回写入的音频时长（秒），没有有效音频时返回0且不创建文件
+    """
+    settings = postprocess_settings(settings)
+    parts = []
+    for data, speaker in segments:
+        frames = audio_frames(data)
+        if frames:
+            parts.append((bytes(frames), speaker))
+    if not parts:
+        return 0
+
+    header = parse_frame_header(parts[0][0])
+    sample_rate = header["sample_rate"]
+    channels = header["channels"]
+    frame_bytes = 2 * channels
+
+    pcm_format = ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels)]
+    if export:
+        output_format = encoder_args(export)
+    else:
+        output_format = ["-f", "mp3", "-b:a", settings["bitrate"]]
+    decoder = subprocess.Popen(
+        [AudioSegment.converter, "-v", "error", "-f", "mp3", "-i", "pipe:0"]
+        + pcm_format
+        + ["pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    encoder = subprocess.Popen(
+        [AudioSegment.converter, "-v", "error", "-y"]
+        + pcm_format
+        + ["-i", "pipe:0"]
+        + output_format
+        + [output_path],
+        stdin=subprocess.PIPE,
+    )
+    feeder = threading.Thread(
+        target=_feed, args=(decoder, [frames for frames, _ in parts]), daemon=True
+    )
+    feeder.start()
+
+    written = 0
+    previous = None
+    try:
+        for i, (frames, speaker) in enumerate(parts):
+            if i == len(parts) - 1:
+                # 最后一个片段读取解码器剩余的全部输出
+                raw = decoder.stdout.read()
+            else:
+                raw = decoder.stdout.read(segment_samples(frames) * frame_bytes)
+            usable = len(raw) // frame_bytes * frame_bytes
+            samples = np.frombuffer(raw[:usable], np.int16).reshape(-1, channels)
+
+            processed = process_segment(samples, sample_rate, settings)
+            if not len(processed):
+                continue
+            if previous is not None:
+                pause = (
+                    settings["pause_ms"]
+                    if speaker == previous
+                    else settings["speaker_pause_ms"]
+                )
+                gap = silence(pause, sample_rate, channels)
+                encoder.stdin.write(gap.tobytes())
+                written += len(gap)
+            encoder.stdin.write(processed.tobytes())
+            written += len(processed)
+            previous = speaker
+    finally:
+        feeder.join()
+        decoder.stdout.close()
+        decoder.wait()
+        encoder.stdin.close()
+        encoder.wait()
+
+    if decoder.returncode or encoder.returncode:
+        raise RuntimeError(
+            f"ffmpeg 处理失败（解码 {decoder.returncode}，编码 {encoder.returncode}）"
+        )
+    return written / sample_rate
@@ -0,0 +1,124 @@
+"""
+合成音频的快速校验
+
+不解码音频，只逐帧解析MP3帧头：
+    - 帧序列中途断开或最后一帧不完整时判定为截断
+    - 按帧数计算时长，与按文本长度估算的时长比较，过短或过长都判定为异常
+    - 读取每帧第一个颗粒的边信息（part2_3_length、big_values），用 NumPy 一次性取出各字段。
+      静音颗粒几乎不占用编码比特，绝大多数颗粒都没有频谱数据时判定为近似静音
+"""
+
+import numpy as np
+
+from chapter_assembler import audio_frames, parse_frame_header
+
+# 朗读语速（每秒字数），用于估算合成音频的时长
+CHARS_PER_SECOND = 4.5
+
+# 时长低于估算值的该比例时判定为过短
+MIN_DURATION_RATIO = 0.35
+
+# 时长超过 估算值 × 该倍数 + LONG_DURATION_SLACK 秒时判定为过长（模型重复朗读等）
+MAX_DURATION_RATIO = 3.0
+LONG_DURATION_SLACK = 3.0
+
+# 任何有内容的片段的最短时长（秒）
+MIN_DURATION = 0.3
+
+# 有频谱数据的颗粒占比低于该值时判定为近似静音
+MIN_VOICED_RATIO = 0.1
+
+# 颗粒编码比特数低于该值视为静音颗粒
+SILENT_GRANULE_BITS = 32
+
+
+def expected_duration(text, speed=1):
+    """按文本长度估算朗读时长（秒），只统计文字和数字，不统计标点和空白"""
+    chars = sum(1 for c in text if c.isalnum())
+    return chars / CHARS_PER_SECOND / (speed or 1)
+
+
+def _side_info_offset(header_bytes):
+    """第一个颗粒（第一个声道）的 part2_3_length 在边信息中的比特偏移"""
+    mpeg1 = ((header_bytes[1] >> 3) & 0x03) == 3
+    mono = (header_bytes[3] >> 6) == 3
+    if mpeg1:
+        # main_data_begin(9) private_bits(5/3) scfsi(4/8)
+        return 18 if mono else 20
+    # main_data_begin(8) private_bits(1/2)
+    return 9 if mono else 10
+
+
+def scan_frames(data):
+    """
+    逐帧扫描MP3数据（不解码）
+
+    返回 {"frames": 帧数, "duration": 时长(秒), "truncated": 是否截断,
+    "voiced_ratio": 有频谱数据的颗粒占比}
+    """
+    frames = audio_frames(data)
+    end = len(frames)
+    offset = 0
+    duration = 0.0
+    truncated = False
+    side_info = []
+    while offset < end:
+        header = parse_frame_header(frames, offset)
+        if header is None:
+            # 帧序列中途断开
+            truncated = True
+            break
+        if offset + header["length"] > end:
+            # 最后一帧不完整
+            truncated = True
+            break
+
+        # 帧头(4) + CRC(2，保护位为0时存在)之后是边信息，取8个字节
+        start = offset + 4 + (0 if frames[offset + 1] & 0x01 else 2)
+        side_info.append(bytes(frames[start : start + 8]).ljust(8, b"\0"))
+        duration += header["samples"] / header["sample_rate"]
+        offset += header["length"]
+
+    voiced_ratio = 0.0
+    if side_info:
+        shift = _side_info_offset(bytes(frames[0:4]))
+        words = np.frombuffer(b"".join(side_info), dtype=">u8")
+        part2_3_length = (words >> np.uint64(64 - shift - 12)) & np.uint64(0xFFF)
+        big_values = (words >> np.uint64(64 - shift - 21)) & np.uint64(0x1FF)
+        voiced = (big_values > 0) & (part2_3_length > SILENT_GRANULE_BITS)
+        voiced_ratio = float(voiced.mean())
+
+    return {
+        "frames": len(side_info),
+        "duration": duration,
+        "truncated": truncated,
+        "voiced_ratio": voiced_ratio,
+    }
+
+
+def validate_segment(data, text="", speed=1):
+    """
+    校验一个合成片段
+
+    返回 (是否通过, 原因)，text 为空时不检查时长
+    """
+    if not data:
+        return False, "音频为空"
+
+    result = scan_frames(data)
+    if not result["frames"]:
+        return False, "没有有效的MP3帧"
+    if result["truncated"]:
+        return False, f"音频被截断（{result['frames']} 帧后中断）"
+
+    duration = result["duration"]
+    if text:
+        expected = expected_duration(text, speed)
+        if duration < max(MIN_DURATION, expected * MIN_DURATION_RATIO):
+            return False, f"时长过短（{duration:.1f} 秒，预计 {expected:.1f} 秒）"
+        if duration > expected * MAX_DURATION_RATIO + LONG_DURATION_SLACK:
+            return False, f"时长过长（{duration:.1f} 秒，预计 {expected:.1f} 秒）"
+
+    if result["voiced_ratio"] < MIN_VOICED_RATIO:
+        return False, f"近似静音（有声帧占比 {result['voiced_ratio']:.0%}）"
+    return True, ""
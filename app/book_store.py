@@ -0,0 +1,814 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import serialization
+from serialization import INDEX_TYPECODE
+from file_utils import atomic_write_text, file_versions, content_hash
+
+# 每本书的单文件存储路径: data/{book_id}/book.db
+STORE_FILENAME = "book.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    chapter_id TEXT PRIMARY KEY,
+    position INTEGER,
+    url TEXT,
+    title TEXT,
+    grp TEXT,
+    text TEXT,
+    char_count INTEGER NOT NULL DEFAULT 0,
+    text_size INTEGER NOT NULL DEFAULT 0,
+    text_updated_at REAL,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_chapters_position ON chapters (position);
+CREATE TABLE IF NOT EXISTS dialogues (
+    chapter_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS speaker_contributions (
+    chapter_id TEXT NOT NULL,
+    speaker TEXT NOT NULL,
+    chapter_order INTEGER NOT NULL,
+    lines_count INTEGER NOT NULL,
+    first_sex TEXT,
+    first_row INTEGER,
+    last_sex TEXT,
+    last_row INTEGER,
+    segment_rows BLOB,
+    PRIMARY KEY (chapter_id, speaker)
+);
+CREATE INDEX IF NOT EXISTS idx_contributions_speaker_order
+    ON speaker_contributions (speaker, chapter_order);
+CREATE TABLE IF NOT EXISTS characters (
+    name TEXT PRIMARY KEY,
+    lines_count INTEGER NOT NULL,
+    first_sex TEXT,
+    last_sex TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    artifact TEXT PRIMARY KEY,
+    inputs_hash TEXT NOT NULL,
+    built_at REAL
+);
+"""
+
+# 角色统计表的结构版本（PRAGMA user_version），低于该版本时重建统计表并从对话结果回填
+CHARACTER_STATS_VERSION = 3
+
+# 章节在角色统计中的排序值：有序号时为序号，没有序号的排在最后
+CHAPTER_ORDER_SQL = "COALESCE(position, (1 << 40) + rowid)"
+
+
+def chapter_id(chapter):
+    """
+    章节的稳定ID
+
+    优先使用章节URL计算，没有URL时使用分组和标题，
+    这样章节标题清洗规则或章节序号变化都不会影响ID
+    """
+    if isinstance(chapter, str):
+        return chapter
+
+    url = chapter.get("chapter_url")
+    if url:
+        key = url
+    else:
+        key = f"{chapter.get('group', '')}/{chapter.get('chapter_title', '')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def inputs_hash(*inputs):
+    """
+    构建产物的输入哈希
+
+    inputs 为生成产物用到的全部输入（上游内容哈希、提示词、模型、语音、合成参数等），
+    任意一项变化哈希都会变化，产物即视为过期
+    """
+    return content_hash(
+        json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    )
+
+
+def text_artifact(chapter):
+    """章节正文在构建记录中的名称"""
+    return f"text:{chapter_id(chapter)}"
+
+
+def dialogues_artifact(chapter):
+    """章节对话分析结果在构建记录中的名称"""
+    return f"dialogues:{chapter_id(chapter)}"
+
+
+def file_artifact(path):
+    """音频等文件产物在构建记录中的名称（按文件路径记录，文件被覆盖时记录随之更新）"""
+    return f"file:{path}"
+
+
+def count_chars(text):
+    """统计字数（移除空格、换行符等）"""
+    return len(
+        text.replace(" ", "").replace("\n", "").replace("\r", "").replace("\t", "")
+    )
+
+
+class BookStore:
+    """
+    单本书的单文件存储（SQLite），保存章节正文、对话分析结果和章节元数据
+
+    所有章节以稳定的章节ID为键，续传和状态检查都是索引查询，
+    不再需要扫描大量小文件。各方法的 chapter 参数可以是章节字典或章节ID。
+    """
+
+    def __init__(self, book_id, data_dir="data"):
+        self.book_id = book_id
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, book_id, STORE_FILENAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < CHARACTER_STATS_VERSION:
+                # 旧结构的统计表直接删除，建表后从已保存的对话结果回填
+                self.conn.executescript("""
+                    DROP TABLE IF EXISTS speaker_contributions;
+                    DROP TABLE IF EXISTS characters;
+                    """)
+            self.conn.executescript(SCHEMA)
+            if version < CHARACTER_STATS_VERSION:
+                self._backfill_character_stats()
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _upsert_chapter(self, chapter):
+        """确保章节行存在，章节为字典时同时更新URL、标题和分组"""
+        cid = chapter_id(chapter)
+        if isinstance(chapter, str):
+            self.conn.execute(
+                "INSERT OR IGNORE INTO chapters (chapter_id) VALUES (?)", (cid,)
+            )
+        else:
+            self.conn.execute(
+                """
+                INSERT INTO chapters (chapter_id, url, title, grp) VALUES (?, ?, ?, ?)
+                ON CONFLICT (chapter_id) DO UPDATE SET
+                    url = excluded.url, title = excluded.title, grp = excluded.grp
+                """,
+                (
+                    cid,
+                    chapter.get("chapter_url"),
+                    chapter.get("chapter_title"),
+                    chapter.get("group", ""),
+                ),
+            )
+        return cid
+
+    # ---------- 章节列表 ----------
+
+    def sync_chapters(self, chapters):
+        """按章节列表的顺序写入章节信息和序号"""
+        with self.lock:
+            moved = 0
+            for position, chapter in enumerate(chapters):
+                cid = self._upsert_chapter(chapter)
+                moved += self.conn.execute(
+                    "UPDATE chapters SET position = ? WHERE chapter_id = ? AND position IS NOT ?",
+                    (position, cid, position),
+                ).rowcount
+            # 章节顺序变化会影响角色“第一次/最后一次出现”时的性别
+            if moved:
+                self.conn.execute(f"""
+                    UPDATE speaker_contributions SET chapter_order = (
+                        SELECT {CHAPTER_ORDER_SQL} FROM chapters c
+                        WHERE c.chapter_id = speaker_contributions.chapter_id
+                    )
+                    """)
+                self._refresh_characters()
+            self.conn.commit()
+
+    def list_chapters(self):
+        """按序号返回所有章节的概要信息（不含正文）"""
+        rows = self._query("""
+            SELECT c.chapter_id, c.position, c.url, c.title, c.grp, c.char_count,
+                   c.text IS NOT NULL AS has_text, d.chapter_id IS NOT NULL AS has_dialogues
+            FROM chapters c LEFT JOIN dialogues d ON d.chapter_id = c.chapter_id
+            ORDER BY c.position IS NULL, c.position, c.rowid
+            """)
+        return [
+            {
+                "chapter_id": row["chapter_id"],
+                "position": row["position"],
+                "chapter_url": row["url"],
+                "chapter_title": row["title"],
+                "group": row["grp"] or "",
+                "char_count": row["char_count"],
+                "has_text": bool(row["has_text"]),
+                "has_dialogues": bool(row["has_dialogues"]),
+            }
+            for row in rows
+        ]
+
+    # ---------- 章节正文 ----------
+
+    def put_text(self, chapter, text):
+        """保存章节正文，同时记录正文哈希作为下游对话分析的输入"""
+        with self.lock:
+            cid = self._upsert_chapter(chapter)
+            self.conn.execute(
+                """
+                UPDATE chapters
+                SET text = ?, char_count = ?, text_size = ?, text_updated_at = ?
+                WHERE chapter_id = ?
+                """,
+                (text, count_chars(text), len(text.encode("utf-8")), time.time(), cid),
+            )
+            self._record_artifacts([(text_artifact(cid), content_hash(text))])
+            self.conn.commit()
+
+    def get_text(self, chapter):
+        """读取章节正文，不存在时返回None"""
+        rows = self._query(
+            "SELECT text FROM chapters WHERE chapter_id = ?", (chapter_id(chapter),)
+        )
+        return rows[0]["text"] if rows else None
+
+    def has_text(self, chapter):
+        rows = self._query(
+            "SELECT 1 FROM chapters WHERE chapter_id = ? AND text IS NOT NULL",
+            (chapter_id(chapter),),
+        )
+        return bool(rows)
+
+    def get_char_count(self, chapter):
+        """章节字数，未下载时返回0"""
+        rows = self._query(
+            "SELECT char_count FROM chapters WHERE chapter_id = ? AND text IS NOT NULL",
+            (chapter_id(chapter),),
+        )
+        return rows[0]["char_count"] if rows else 0
+
+    def chapter_stats(self):
+        """
+        已下载章节的状态表
+
+        返回 {章节ID: {"downloaded": True, "char_count": 字数, "size": 字节数, "mtime": 写入时间}}，
+        这些字段在写入正文时一并更新，读取时不需要加载正文
+        """
+        rows = self._query("""
+            SELECT chapter_id, char_count, text_size, text_updated_at
+            FROM chapters WHERE text IS NOT NULL
+            """)
+        return {
+            row["chapter_id"]: {
+                "downloaded": True,
+                "char_count": row["char_count"],
+                "size": row["text_size"],
+                "mtime": row["text_updated_at"],
+            }
+            for row in rows
+        }
+
+    def version(self):
+        """存储文件的版本（数据库和WAL文件的修改时间和大小），用于判断缓存是否过期"""
+        return store_version(self.book_id, self.data_dir)
+
+    def text_status(self):
+        """已下载章节的字数表 {章节ID: 字数}"""
+        rows = self._query(
+            "SELECT chapter_id, char_count FROM chapters WHERE text IS NOT NULL"
+        )
+        return {row["chapter_id"]: row["char_count"] for row in rows}
+
+    # ---------- 对话分析结果 ----------
+
+    def put_dialogues(self, chapter, dialogues, inputs=None):
+        """
+        保存章节的对话分析结果（使用 serialization 的紧凑二进制编码）
+
+        inputs 为生成该结果的输入哈希，与结果在同一事务中记录
+        """
+        with self.lock:
+            cid = self._upsert_chapter(chapter)
+            self.conn.execute(
+                """
+                INSERT INTO dialogues (chapter_id, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (chapter_id) DO UPDATE SET
+                    data = excluded.data, updated_at = excluded.updated_at
+                """,
+                (cid, serialization.dumps(dialogues), time.time()),
+            )
+            self._replace_contributions(cid, dialogues)
+            if inputs is not None:
+                self._record_artifacts([(dialogues_artifact(cid), inputs)])
+            self.conn.commit()
+
+    def get_dialogues(self, chapter):
+        """读取章节的对话分析结果，不存在时返回None"""
+        rows = self._query(
+            "SELECT data FROM dialogues WHERE chapter_id = ?", (chapter_id(chapter),)
+        )
+        return serialization.loads(rows[0]["data"]) if rows else None
+
+    def has_dialogues(self, chapter):
+        rows = self._query(
+            "SELECT 1 FROM dialogues WHERE chapter_id = ?", (chapter_id(chapter),)
+        )
+        return bool(rows)
+
+    def dialogue_ids(self):
+        """已有对话分析结果的章节ID集合"""
+        return {
+            row["chapter_id"] for row in self._query("SELECT chapter_id FROM dialogues")
+        }
+
+    def _iter_dialogue_rows(self, batch_size=100):
+        """按章节顺序分批读取对话数据行，不一次性载入整本书"""
+        with self.lock:
+            cursor = self.conn.execute("""
+                SELECT d.chapter_id, d.data, c.position FROM dialogues d
+                LEFT JOIN chapters c ON c.chapter_id = d.chapter_id
+                ORDER BY c.position IS NULL, c.position, c.rowid
+                """)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_dialogues(self):
+        """按章节顺序遍历所有对话分析结果，返回 (章节ID, 对话列表)"""
+        for row in self._iter_dialogue_rows():
+            yield row["chapter_id"], serialization.loads(row["data"])
+
+    def iter_speakers(self):
+        """
+        按章节顺序遍历每条对话的角色，返回 (章节ID, [(角色名, 性别)])
+
+        只统计角色时使用，二进制编码的数据不需要解码对话正文
+        """
+        for row in self._iter_dialogue_rows():
+            yield row["chapter_id"], serialization.speakers(row["data"])
+
+    def export_dialogues_json(self, output_dir):
+        """
+        把所有对话分析结果导出为便于阅读的JSON文件
+
+        文件按章节序号命名为 {序号}.json（与旧版本 audio/{book_id}/chapter 目录的布局相同），
+        返回导出的文件数
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        count = 0
+        for row in self._iter_dialogue_rows():
+            name = (
+                f"{row['position'] + 1}.json"
+                if row["position"] is not None
+                else f"{row['chapter_id']}.json"
+            )
+            atomic_write_text(
+                os.path.join(output_dir, name),
+                serialization.to_json(serialization.loads(row["data"])),
+            )
+            count += 1
+        return count
+
+    # ---------- 角色统计 ----------
+
+    def _replace_contributions(self, cid, dialogues):
+        """
+        替换章节对角色统计的贡献：扣除旧的台词数，加上新的台词数
+
+        只重新计算受影响角色的性别，调用方负责加锁和提交
+        """
+        contributions = count_speakers(
+            (
+                (item.get("type", ""), item.get("sex", ""))
+                if isinstance(item, dict)
+                else ("", "")
+            )
+            for item in dialogues or []
+        )
+
+        old = self.conn.execute(
+            "SELECT speaker, lines_count FROM speaker_contributions WHERE chapter_id = ?",
+            (cid,),
+        ).fetchall()
+        deltas = {row["speaker"]: -row["lines_count"] for row in old}
+        for speaker, entry in contributions.items():
+            deltas[speaker] = deltas.get(speaker, 0) + entry[0]
+
+        order = self.conn.execute(
+            f"SELECT {CHAPTER_ORDER_SQL} FROM chapters WHERE chapter_id = ?", (cid,)
+        ).fetchone()[0]
+        self.conn.execute(
+            "DELETE FROM speaker_contributions WHERE chapter_id = ?", (cid,)
+        )
+        self.conn.executemany(
+            """
+            INSERT INTO speaker_contributions
+                (chapter_id, speaker, chapter_order, lines_count,
+                 first_sex, first_row, last_sex, last_row, segment_rows)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(cid, speaker, order, *entry) for speaker, entry in contributions.items()],
+        )
+
+        for speaker, delta in deltas.items():
+            if delta:
+                self.conn.execute(
+                    """
+                    INSERT INTO characters (name, lines_count) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET lines_count = lines_count + excluded.lines_count
+                    """,
+                    (speaker, delta),
+                )
+        self.conn.execute("DELETE FROM characters WHERE lines_count <= 0")
+        self._refresh_characters(list(deltas))
+
+    def _refresh_characters(self, speakers=None):
+        """
+        按章节顺序重新计算角色第一次和最后一次出现时的性别（不指定时计算全部角色）
+
+        每个角色在一个章节中只有一行贡献，按 (speaker, chapter_order) 索引各取一行
+        """
+        sql = """
+            UPDATE characters SET
+                first_sex = (
+                    SELECT first_sex FROM speaker_contributions
+                    WHERE speaker = characters.name
+                    ORDER BY chapter_order LIMIT 1
+                ),
+                last_sex = (
+                    SELECT last_sex FROM speaker_contributions
+                    WHERE speaker = characters.name
+                    ORDER BY chapter_order DESC LIMIT 1
+                )
+            """
+        if speakers is None:
+            self.conn.execute(sql)
+            return
+
+        # 分批指定角色，避免超过SQLite的参数个数限制
+        speakers = list(speakers)
+        for start in range(0, len(speakers), 500):
+            batch = speakers[start : start + 500]
+            self.conn.execute(
+                sql + f"WHERE name IN ({','.join('?' * len(batch))})", batch
+            )
+
+    def _backfill_character_stats(self):
+        """旧的存储文件没有角色统计时，从已保存的对话结果回填（调用方负责加锁和提交）"""
+        rows = self.conn.execute("SELECT chapter_id, data FROM dialogues").fetchall()
+        for row in rows:
+            speakers = serialization.speakers(row["data"])
+            self._replace_contributions(
+                row["chapter_id"],
+                [{"type": speaker, "sex": sex} for speaker, sex in speakers],
+            )
+        self.conn.execute(f"PRAGMA user_version = {CHARACTER_STATS_VERSION}")
+
+    def rebuild_character_stats(self, workers=None, shards_per_worker=4, progress=None):
+        """
+        全量重建角色统计
+
+        按行号把对话数据分片，由进程池并行解码角色列并统计每个章节的贡献，
+        主进程合并各分片的计数后一次写入。progress(已完成分片数, 分片总数, 已扫描章节数)
+        用于输出进度。返回 {"chapters", "characters", "workers", "shards", "scan_seconds", "merge_seconds"}
+        """
+        workers = workers or os.cpu_count() or 1
+        low, high = self._query("SELECT MIN(rowid), MAX(rowid) FROM dialogues")[0]
+        shards = []
+        if low is not None:
+            count = max(1, workers * shards_per_worker)
+            step = max(1, (high - low + count) // count)
+            shards = [
+                (self.path, start, start + step) for start in range(low, high + 1, step)
+            ]
+
+        start_time = time.perf_counter()
+        contributions = []
+        totals = Counter()
+        scanned = 0
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(scan_speaker_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                rows, shard_contributions, shard_totals = future.result()
+                contributions.extend(shard_contributions)
+                totals.update(shard_totals)
+                scanned += rows
+                done += 1
+                if progress:
+                    progress(done, len(shards), scanned)
+        scan_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        with self.lock:
+            orders = dict(
+                self.conn.execute(
+                    f"SELECT chapter_id, {CHAPTER_ORDER_SQL} FROM chapters"
+                ).fetchall()
+            )
+            self.conn.execute("DELETE FROM speaker_contributions")
+            self.conn.execute("DELETE FROM characters")
+            self.conn.executemany(
+                """
+                INSERT INTO speaker_contributions
+                    (chapter_id, speaker, chapter_order, lines_count,
+                     first_sex, first_row, last_sex, last_row, segment_rows)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (cid, speaker, orders.get(cid, 1 << 41), *entry)
+                    for cid, speaker, *entry in contributions
+                ],
+            )
+            self.conn.executemany(
+                "INSERT INTO characters (name, lines_count) VALUES (?, ?)",
+                [(name, count) for name, count in totals.items() if count > 0],
+            )
+            self._refresh_characters()
+            self.conn.execute(f"PRAGMA user_version = {CHARACTER_STATS_VERSION}")
+            self.conn.commit()
+        merge_seconds = time.perf_counter() - start_time
+
+        return {
+            "chapters": scanned,
+            "characters": len(totals),
+            "workers": workers,
+            "shards": len(shards),
+            "scan_seconds": scan_seconds,
+            "merge_seconds": merge_seconds,
+        }
+
+    def character_stats(self, gender="first"):
+        """
+        整本书的角色统计，按台词数降序返回 [{"name", "gender", "lines_count"}]
+
+        统计随每个章节的对话结果写入或替换增量更新，读取时只查询角色表。
+        gender 为 "first" 时取角色第一次出现时的性别，为 "last" 时取最后一次出现时的性别
+        """
+        column = "first_sex" if gender == "first" else "last_sex"
+        rows = self._query(f"""
+            SELECT name, {column} AS gender, lines_count FROM characters
+            WHERE name != '' ORDER BY lines_count DESC, rowid
+            """)
+        return [
+            {
+                "name": row["name"],
+                "gender": row["gender"] or "",
+                "lines_count": row["lines_count"],
+            }
+            for row in rows
+        ]
+
+    def speaker_names(self):
+        """整本书出现过的全部角色名（包括空角色名）"""
+        return [row["name"] for row in self._query("SELECT name FROM characters")]
+
+    def speaker_segments(self, speakers):
+        """
+        倒排索引查询：指定角色在每个章节中的片段序号
+
+        返回 {章节ID: [片段序号]}（按序号升序），只包含有这些角色台词的章节，
+        用于更换角色音色后只重新合成受影响的片段
+        """
+        speakers = list(dict.fromkeys(speakers))
+        segments = {}
+        for i in range(0, len(speakers), 500):
+            batch = speakers[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._query(
+                f"""
+                SELECT chapter_id, segment_rows FROM speaker_contributions
+                WHERE speaker IN ({placeholders}) ORDER BY chapter_order
+                """,
+                batch,
+            )
+            for row in rows:
+                segments.setdefault(row["chapter_id"], []).extend(
+                    unpack_rows(row["segment_rows"])
+                )
+        return {cid: sorted(rows) for cid, rows in segments.items()}
+
+    # ---------- 构建记录 ----------
+
+    def _record_artifacts(self, items):
+        self.conn.executemany(
+            """
+            INSERT INTO artifacts (artifact, inputs_hash, built_at) VALUES (?, ?, ?)
+            ON CONFLICT (artifact) DO UPDATE SET
+                inputs_hash = excluded.inputs_hash, built_at = excluded.built_at
+            """,
+            [(artifact, digest, time.time()) for artifact, digest in items],
+        )
+
+    def record_artifacts(self, items):
+        """记录产物 [(产物名称, 输入哈希)] 已按这些输入构建完成"""
+        with self.lock:
+            self._record_artifacts(items)
+            self.conn.commit()
+
+    def forget_artifacts(self, artifacts):
+        """删除产物的构建记录（产物被删除时调用）"""
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM artifacts WHERE artifact = ?",
+                [(artifact,) for artifact in artifacts],
+            )
+            self.conn.commit()
+
+    def artifact_hashes(self, prefix):
+        """名称以 prefix 开头的产物的构建记录 {产物名称: 输入哈希}"""
+        rows = self._query(
+            """
+            SELECT artifact, inputs_hash FROM artifacts
+            WHERE artifact >= ? AND artifact < ?
+            """,
+            (prefix, prefix + "\uffff"),
+        )
+        return {row["artifact"]: row["inputs_hash"] for row in rows}
+
+    def text_hashes(self):
+        """
+        已下载章节的正文哈希 {章节ID: 哈希}
+
+        旧版本写入的正文没有记录，第一次读取时计算并补录
+        """
+        recorded = self.artifact_hashes("text:")
+        hashes = {}
+        missing = []
+        for row in self._query(
+            "SELECT chapter_id FROM chapters WHERE text IS NOT NULL"
+        ):
+            digest = recorded.get(text_artifact(row["chapter_id"]))
+            if digest is None:
+                missing.append(row["chapter_id"])
+            else:
+                hashes[row["chapter_id"]] = digest
+
+        for cid in missing:
+            text = self.get_text(cid)
+            if text is not None:
+                hashes[cid] = content_hash(text)
+        if missing:
+            self.record_artifacts(
+                (text_artifact(cid), hashes[cid]) for cid in missing if cid in hashes
+            )
+        return hashes
+
+    # ---------- 章节元数据 ----------
+
+    def get_meta(self, chapter):
+        """读取章节元数据字典"""
+        rows = self._query(
+            "SELECT meta FROM chapters WHERE chapter_id = ?", (chapter_id(chapter),)
+        )
+        return json.loads(rows[0]["meta"]) if rows else {}
+
+    def update_meta(self, chapter, **values):
+        """更新章节元数据中的指定字段"""
+        with self.lock:
+            cid = self._upsert_chapter(chapter)
+            row = self.conn.execute(
+                "SELECT meta FROM chapters WHERE chapter_id = ?", (cid,)
+            ).fetchone()
+            meta = json.loads(row["meta"]) if row else {}
+            meta.update(values)
+            self.conn.execute(
+                "UPDATE chapters SET meta = ? WHERE chapter_id = ?",
+                (json.dumps(meta, ensure_ascii=False), cid),
+            )
+            self.conn.commit()
+
+
+def count_speakers(speakers):
+    """
+    统计一个章节中每个角色的贡献
+
+    speakers 为按对话顺序的 (角色名, 性别)，返回 {角色名: [台词数, 第一次出现的性别,
+    第一次出现的行号, 最后一次出现的性别, 最后一次出现的行号, 全部行号]}，
+    全部行号为 u32 数组的字节数据（行号即该对话在章节中的片段序号）
+    """
+    contributions = {}
+    for row, (speaker, sex) in enumerate(speakers):
+        entry = contributions.get(speaker)
+        if entry is None:
+            contributions[speaker] = [
+                1,
+                sex,
+                row,
+                sex,
+                row,
+                array(INDEX_TYPECODE, [row]),
+            ]
+        else:
+            entry[0] += 1
+            entry[3] = sex
+            entry[4] = row
+            entry[5].append(row)
+    for entry in contributions.values():
+        entry[5] = entry[5].tobytes()
+    return contributions
+
+
+def unpack_rows(data):
+    """还原 count_speakers 保存的行号数组"""
+    rows = array(INDEX_TYPECODE)
+    if data:
+        rows.frombytes(data)
+    return list(rows)
+
+
+def scan_speaker_shard(shard):
+    """
+    进程池任务：统计 rowid 在 [start, end) 范围内的章节对话的角色贡献
+
+    返回 (章节数, 贡献行列表, {角色名: 台词数})
+    """
+    path, start, end = shard
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        rows = conn.execute(
+            "SELECT chapter_id, data FROM dialogues WHERE rowid >= ? AND rowid < ?",
+            (start, end),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    contributions = []
+    totals = Counter()
+    for cid, data in rows:
+        for speaker, entry in count_speakers(serialization.speakers(data)).items():
+            contributions.append((cid, speaker, *entry))
+            totals[speaker] += entry[0]
+    return len(rows), contributions, totals
+
+
+def store_version(book_id, data_dir="data"):
+    """不打开数据库获取书籍存储文件的版本"""
+    path = os.path.join(data_dir, book_id, STORE_FILENAME)
+    return file_versions(path, path + "-wal")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_book_store(book_id, data_dir="data"):
+    """获取书籍存储（每本书在进程内只打开一次）"""
+    key = (data_dir, book_id)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = BookStore(book_id, data_dir)
+        return _stores[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="书籍存储维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild-characters", help="全量重建角色统计")
+    rebuild.add_argument("book_id", help="书籍ID")
+    rebuild.add_argument("--data-dir", default="data", help="数据目录")
+    rebuild.add_argument(
+        "--workers", type=int, default=None, help="进程数，默认CPU核数"
+    )
+    args = parser.parse_args()
+
+    if args.command == "rebuild-characters":
+        store = get_book_store(args.book_id, args.data_dir)
+
+        def progress(done, total, scanned):
+            print(f"\r分片 {done}/{total}，已扫描 {scanned} 个章节", end="", flush=True)
+
+        result = store.rebuild_character_stats(args.workers, progress=progress)
+        print()
+        print(
+            f"重建完成: {result['chapters']} 个章节，{result['characters']} 个角色，"
+            f"{result['workers']} 个进程 / {result['shards']} 个分片，"
+            f"扫描 {result['scan_seconds']:.2f} 秒，合并 {result['merge_seconds']:.2f} 秒"
+        )
+
+
+if __name__ == "__main__":
+    main()
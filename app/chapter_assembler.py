@@ -0,0 +1,182 @@
+"""
+章节音频流式拼接
+
+片段由线程池并发合成，完成顺序是乱序的。拼接器用一个重排缓冲区暂存提前完成的片段，
+只要从头开始的片段连续可用，就立即把它们追加到章节输出文件，
+章节在最慢的片段完成后几乎立刻就能生成，不需要等全部片段完成再统一合并。
+
+同一本书的片段使用相同的合成参数（采样率、声道、码率模式），MP3帧可以直接按字节拼接，
+拼接时去掉每个片段的 ID3 标签和 Xing/Info 信息帧，避免播放器按第一个片段的信息计算总时长。
+"""
+
+import os
+
+# MPEG-1 / MPEG-2 / MPEG-2.5 Layer III 的码率表（kbps），下标为帧头中的码率索引
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# 采样率表，键为帧头中的版本位
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),  # MPEG-2.5
+}
+
+
+def parse_frame_header(data, offset=0):
+    """
+    解析 offset 处的 MP3（Layer III）帧头
+
+    返回 {"length": 帧字节数, "sample_rate": 采样率, "samples": 每帧采样数, "channels": 声道数}，
+    不是有效帧头时返回None
+    """
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset : offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or rate_index == 3:
+        return None
+    if bitrate_index in (0, 15):
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    samples = 1152 if mpeg1 else 576
+    return {
+        "length": samples // 8 * bitrate // sample_rate + padding,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "channels": 1 if (b3 >> 6) == 3 else 2,
+    }
+
+
+def id3v2_size(data):
+    """开头的 ID3v2 标签长度，没有标签时为0"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def audio_frames(data):
+    """
+    提取MP3数据中的音频帧部分
+
+    去掉 ID3v2 标签、末尾的 ID3v1 标签以及第一帧的 Xing/Info 信息帧，
+    返回 memoryview，找不到有效帧时返回空视图
+    """
+    view = memoryview(data)
+    start = id3v2_size(view)
+    end = len(view)
+    if end - start >= 128 and bytes(view[end - 128 : end - 125]) == b"TAG":
+        end -= 128
+
+    # 跳过标签后可能存在的填充字节，定位到第一个帧头
+    while start < end and parse_frame_header(view, start) is None:
+        start += 1
+    header = parse_frame_header(view, start)
+    if header is None:
+        return view[0:0]
+
+    first_frame = bytes(view[start : start + min(header["length"], 64)])
+    if b"Xing" in first_frame or b"Info" in first_frame:
+        start += header["length"]
+    return view[start:end]
+
+
+def frames_duration(frames):
+    """按帧头累计音频帧的时长（秒），遇到无效帧头时停止"""
+    offset = 0
+    seconds = 0.0
+    while True:
+        header = parse_frame_header(frames, offset)
+        if header is None or header["length"] <= 0:
+            return seconds
+        seconds += header["samples"] / header["sample_rate"]
+        offset += header["length"]
+
+
+class ChapterAssembler:
+    """
+    按片段序号顺序流式拼接章节音频
+
+    add(序号, 读取函数) 可以按任意顺序调用，读取函数在写出时才调用并返回片段的MP3数据，
+    为None表示该片段没有音频（空文本或合成失败），拼接时跳过。
+    从头开始连续可用的片段立即追加到 {output_path}.part，finish() 后重命名为最终文件。
+    """
+
+    def __init__(self, output_path, total):
+        self.output_path = output_path
+        self.part_path = f"{output_path}.part"
+        self.total = total
+        self.pending = {}
+        self.next_index = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.file = None
+
+    def add(self, index, reader):
+        """登记一个已完成的片段，并写出所有已连续可用的片段"""
+        self.pending[index] = reader
+        while self.next_index in self.pending:
+            self._flush(self.next_index, self.pending.pop(self.next_index))
+            self.next_index += 1
+
+    def _flush(self, index, reader):
+        data = reader() if reader is not None else None
+        if data is None:
+            return
+        frames = audio_frames(data)
+        if not frames:
+            print(f"片段 {index} 不是有效的MP3音频，跳过")
+            return
+
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+            self.file = open(self.part_path, "wb")
+        self.file.write(frames)
+        self.written += 1
+        self.bytes_written += len(frames)
+
+    @property
+    def buffered(self):
+        """重排缓冲区中等待前面片段的片段数"""
+        return len(self.pending)
+
+    def finish(self):
+        """
+        完成拼接
+
+        所有片段都已登记时返回输出路径；没有任何音频或还有片段未登记时删除临时文件并返回None
+        """
+        complete = self.next_index >= self.total
+        if self.file is None:
+            return None
+
+        self.file.close()
+        self.file = None
+        if not complete or not self.written:
+            os.remove(self.part_path)
+            return None
+        os.replace(self.part_path, self.output_path)
+        return self.output_path
+
+    def abort(self):
+        """放弃拼接，删除临时文件"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.part_path)
@@ -0,0 +1,214 @@
+"""
+章节音频收尾（拼接、校验）的进程池
+
+片段合成是网络等待，章节收尾是CPU和磁盘工作，两者放在同一个线程里会互相阻塞。
+合成完成的章节提交给按CPU核数开启的进程池收尾，主线程继续合成后面的章节。
+提交的任务数超过上限时等待最早的任务完成，避免合成远远领先于收尾、积压大量片段包。
+书籍的编码配置需要重新编码时（见 encoding_profiles），编码也在收尾进程中进行，多个章节并行编码。
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from chapter_assembler import ChapterAssembler, audio_frames, frames_duration
+from encoding_profiles import is_mp3, transcode
+from segment_pack import SegmentPack
+
+# 章节音频时长与片段时长之和允许的误差（秒）
+DURATION_TOLERANCE = 0.5
+
+
+def verify_chapter_audio(output_path, expected_duration, export=None):
+    """
+    校验章节音频：逐帧解析帧头计算时长（跳过编码器写入的标签和信息帧），与预期时长比较
+
+    export 为非MP3的编码配置时无法逐帧解析，只检查文件不为空。
+    返回 (是否通过, 实际时长)
+    """
+    if not is_mp3(export):
+        return os.path.getsize(output_path) > 0, expected_duration
+    with open(output_path, "rb") as f:
+        duration = frames_duration(audio_frames(f.read()))
+    return abs(duration - expected_duration) <= DURATION_TOLERANCE, duration
+
+
+def finalize_chapter(job):
+    """
+    进程池任务：按序号从片段包拼接章节音频并校验
+
+    job 为 {"pack": 片段包路径, "output_path": 输出路径, "total": 片段数,
+    "keep_segments": 是否保留片段包, ...}，其余字段原样返回给回调。
+    job 中有 "postprocess"（后处理参数）时解码后去除静音、统一响度并按角色切换插入停顿，
+    此时 "speakers" 为每个片段的角色名；有 "export"（编码配置）时按配置重新编码。
+    返回 {"output_path": 输出路径或None, "duration": 时长, "message": 说明,
+    "size": 文件字节数, "encode_seconds": 编码耗时}
+    """
+    export = job.get("export")
+    pack = SegmentPack(job["pack"])
+    try:
+        if job.get("postprocess"):
+            return _render_chapter(job, pack)
+        # 需要重新编码时先在片段包旁（audio_temp 目录）拼接MP3源文件，
+        # 不写入发布目录，避免被发布程序和统计当作章节音频
+        source_path = source_audio_path(job) if export else job["output_path"]
+        assembler = ChapterAssembler(source_path, job["total"])
+        expected = 0.0
+        try:
+            for index in range(job["total"]):
+                entry = pack.get(index)
+                if entry is None:
+                    assembler.add(index, None)
+                    continue
+                expected += entry.get("duration", 0)
+                assembler.add(index, lambda i=index: pack.read(i))
+        except BaseException:
+            assembler.abort()
+            raise
+        output_path = assembler.finish()
+    finally:
+        if job.get("keep_segments", True):
+            pack.close()
+        else:
+            pack.remove()
+
+    if not output_path:
+        return {"output_path": None, "duration": 0, "message": "没有可用的音频片段"}
+
+    try:
+        ok, duration = verify_chapter_audio(output_path, expected)
+        if not ok:
+            os.remove(output_path)
+            return {
+                "output_path": None,
+                "duration": duration,
+                "message": f"章节时长 {duration:.1f} 秒与片段时长之和 {expected:.1f} 秒不一致",
+            }
+        if export:
+            return _encode_chapter(output_path, job["output_path"], duration, export)
+        return _finished(output_path, duration)
+    finally:
+        # 源文件只是编码的中间结果，编码成功、失败或出错都删除
+        if export and os.path.exists(source_path):
+            os.remove(source_path)
+
+
+def source_audio_path(job):
+    """重新编码前拼接的MP3源文件路径，与片段包放在同一目录"""
+    return f"{job['pack']}.src.mp3"
+
+
+def _finished(output_path, duration, encode_seconds=0.0):
+    return {
+        "output_path": output_path,
+        "duration": duration,
+        "message": "",
+        "size": os.path.getsize(output_path),
+        "encode_seconds": encode_seconds,
+    }
+
+
+def _encode_chapter(source_path, output_path, expected, export):
+    """把拼接好的MP3按编码配置重新编码（源文件由调用方删除）"""
+    part_path = f"{output_path}.part"
+    start = time.perf_counter()
+    try:
+        transcode(source_path, part_path, export)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    encode_seconds = time.perf_counter() - start
+
+    ok, duration = verify_chapter_audio(part_path, expected, export)
+    if not ok:
+        os.remove(part_path)
+        return {
+            "output_path": None,
+            "duration": duration,
+            "message": f"编码后时长 {duration:.1f} 秒与拼接的时长 {expected:.1f} 秒不一致",
+        }
+    os.replace(part_path, output_path)
+    return _finished(output_path, duration, encode_seconds)
+
+
+def _render_chapter(job, pack):
+    """后处理并重新编码章节音频，校验编码结果与写入的PCM时长一致"""
+    from audio_postprocess import render_chapter
+
+    output_path = job["output_path"]
+    export = job.get("export")
+    part_path = f"{output_path}.part"
+    segments = (
+        (pack.read(index), job["speakers"][index])
+        for index in range(job["total"])
+        if pack.get(index)
+    )
+    start = time.perf_counter()
+    try:
+        expected = render_chapter(segments, part_path, job["postprocess"], export)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    if not expected:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return {"output_path": None, "duration": 0, "message": "没有可用的音频片段"}
+    encode_seconds = time.perf_counter() - start
+
+    ok, duration = verify_chapter_audio(part_path, expected, export)
+    if not ok:
+        os.remove(part_path)
+        return {
+            "output_path": None,
+            "duration": duration,
+            "message": f"编码后时长 {duration:.1f} 秒与处理后的时长 {expected:.1f} 秒不一致",
+        }
+    os.replace(part_path, output_path)
+    return _finished(output_path, duration, encode_seconds)
+
+
+class ChapterFinalizer:
+    """
+    章节收尾进程池
+
+    submit(job, callback) 提交一个章节，完成后在主进程中调用 callback(job, result)，
+    收尾出错时 result 为异常对象
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.pending = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, job, callback=None):
+        # 积压的任务过多时等待，合成线程不会无限领先
+        while len(self.pending) >= self.max_pending:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+
+        future = self.executor.submit(finalize_chapter, job)
+        if callback:
+
+            def done(future):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                callback(job, result)
+
+            future.add_done_callback(done)
+        self.pending.add(future)
+        return future
+
+    def close(self):
+        """等待全部章节收尾完成并关闭进程池"""
+        self.executor.shutdown(wait=True)
+        self.pending.clear()
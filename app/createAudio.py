@@ -2,18 +2,45 @@ import os
 import requests
 import json
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 import time
-from pydub import AudioSegment
-import shutil
 import random
+import shutil
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
+from file_utils import atomic_write_text
+from book_store import get_book_store, chapter_id, inputs_hash, file_artifact
+from chapter_assembler import ChapterAssembler, audio_frames
+from segment_pack import SegmentPack
+from chapter_finalizer import ChapterFinalizer, finalize_chapter, verify_chapter_audio
+from audio_postprocess import postprocess_settings
+from audio_validation import validate_segment
+from encoding_profiles import load_profile, output_extension, output_extensions
 
 load_dotenv(override=True)
 
+# 对话没有角色或角色没有配置语音时使用的角色
+NARRATOR = "旁白"
+
+# 片段合成结果校验失败时最多合成的次数
+MAX_SEGMENT_ATTEMPTS = 3
+
+# 有片段缺失时章节音频的构建记录，与任何输入哈希都不相同，下次运行时重新拼接
+INCOMPLETE_BUILD = "incomplete"
+
+# 旁白也没有配置语音时使用的默认语音
+DEFAULT_VOICE = "FunAudioLLM/CosyVoice2-0.5B:david"
+
+# 语音合成参数，修改后所有片段都会按新参数重新合成。书籍的编码配置可以覆盖其中的参数
+SYNTH_SETTINGS = {
+    "model": "FunAudioLLM/CosyVoice2-0.5B",
+    "response_format": "mp3",
+    "sample_rate": 44100,
+    "speed": 1,
+    "gain": 0,
+}
 
 
 def setup_logging(book_id):
@@ -64,42 +91,27 @@ def setup_logging(book_id):
     return logger
 
 
-
-
-
-def validate_audio_content(audio_content):
+def validate_audio_content(audio_content, text="", speed=SYNTH_SETTINGS["speed"]):
     """
     验证音频内容是否合规
 
+    逐帧解析MP3帧头（不解码）检查截断，按文本长度估算时长检查过短或过长，
+    并检查是否近似静音，见 audio_validation
+
     参数:
     audio_content: 从API获取的音频内容
+    text: 合成的文本，为空时不检查时长
+    speed: 合成语速
 
     返回:
-    布尔值，表示音频是否有效
+    (是否有效, 原因)
     """
-    # 检查参数有效性
-    if audio_content is None:
-        return False
-
-    # 检查音频内容长度 (最小文件大小阈值，单位：字节)
-    min_audio_size = 1024  # 1KB
-    if len(audio_content) < min_audio_size:
-        return False
-
-    # 尝试检查音频文件头部标识
-    try:
-        # MP3文件头部标识检查
-        if not (
-            audio_content.startswith(b"ID3") or audio_content.startswith(b"\xff\xf3")
-        ):
-            return False
-    except Exception:
-        return False
-
-    return True
+    return validate_segment(audio_content, text, speed)
 
 
-def create_audio_from_api(text: str, module: str, max_retries: int = 3):
+def create_audio_from_api(
+    text: str, module: str, max_retries: int = 3, settings: dict = None
+):
     """
     通过API生成音频，支持多次重试
 
@@ -107,6 +119,7 @@ def create_audio_from_api(text: str, module: str, max_retries: int = 3):
     text: 待转换的文本内容
     module: 使用的语音模型
     max_retries: 最大重试次数，默认为3
+    settings: 合成参数，默认为 SYNTH_SETTINGS
 
     返回:
     成功时返回音频内容，失败时返回None
@@ -114,14 +127,10 @@ def create_audio_from_api(text: str, module: str, max_retries: int = 3):
     url = "https://api.siliconflow.cn/v1/audio/speech"
 
     payload = {
-        "model": "FunAudioLLM/CosyVoice2-0.5B",
+        **(settings or SYNTH_SETTINGS),
         "input": text,
         "voice": module,
-        "response_format": "mp3",
-        "sample_rate": 44100,
         "stream": True,
-        "speed": 1,
-        "gain": 0,
     }
 
     headers = {
@@ -153,227 +162,524 @@ def create_audio_from_api(text: str, module: str, max_retries: int = 3):
     return None
 
 
-# 处理单个文本片段并生成音频
-def process_text_segment(args):
-    index, content, user_voices, chapter_index, book_id = args
-
-    # 创建保存临时音频的文件夹
-    temp_dir = f"audio/{book_id}/audio_temp/{chapter_index}"
-    os.makedirs(temp_dir, exist_ok=True)
+def resolve_voice(user_voices, role_type):
+    """角色实际使用的语音模型：没有配置时使用旁白的语音，旁白也没有配置时使用默认语音"""
+    return user_voices.get(
+        role_type or NARRATOR, user_voices.get(NARRATOR, DEFAULT_VOICE)
+    )
 
-    # 生成音频文件路径
-    audio_path = f"{temp_dir}/{index}.mp3"
-    # 合成后的音频文件路径
-    output_path = f"audio/{book_id}/audio/{index}.mp3"
-    # 如果文件已存在，直接返回路径（避免重复生成）
-    if os.path.exists(audio_path):
-        return index, audio_path
 
-    # 获取文本内容
-    text = content.get("text", "").strip()
+def segment_dir(book_id, chapter_index):
+    """旧版本的章节片段缓存目录，片段按对话序号保存为 {序号}.mp3"""
+    return f"audio/{book_id}/audio_temp/{chapter_index}"
 
-    # 如果文本为空，返回None
-    if not text:
-        return index, None
 
-    # 获取角色类型
-    role_type = content.get("type", "旁白")
+def segment_pack_path(book_id, chapter_index):
+    """章节片段包的路径（不含扩展名），见 SegmentPack"""
+    return f"audio/{book_id}/audio_temp/{chapter_index}"
 
-    # 查找对应的语音模型，如果没有则使用旁白
-    voice_model = user_voices.get(
-        role_type, user_voices.get("旁白", "FunAudioLLM/CosyVoice2-0.5B:david")
-    )
 
-    # 调用API生成音频
-    audio_content = create_audio_from_api(text, voice_model)
-    if not audio_content:
-        return index, None
-    # 保存音频文件
-    with open(audio_path, "wb") as f:
-        f.write(audio_content)
+def chapter_output_path(book_id, chapter_meta, chapter_index, extension="mp3"):
+    """章节合成音频的输出路径，使用章节标题作为文件名（去除不合法的字符）"""
+    chapter_title = chapter_meta.get("chapter_title", f"第{chapter_index+1}章")
+    safe_title = "".join(c for c in chapter_title if c.isalnum() or c in " _-").strip()
+    if not safe_title:
+        safe_title = f"chapter_{chapter_index}"
+    return f"audio/{book_id}/audio/{safe_title}.{extension}"
 
-    # 返回索引和音频文件路径（用于后续合并）
-    return index, audio_path
 
+def incomplete_output_path(output_path):
+    """
+    有片段缺失的章节音频的保存路径 audio/{book_id}/audio_incomplete/{文件名}
 
-def get_audio_duration(file_path):
+    不完整的章节不写入 audio 目录，避免被发布程序当作完成的章节发布
     """
-    获取音频文件的总时长（毫秒）
+    directory, name = os.path.split(output_path)
+    return f"{os.path.dirname(directory)}/audio_incomplete/{name}"
 
-    参数:
-    file_path: 音频文件路径
 
-    返回:
-    音频总时长（毫秒），如果无法读取则返回0
+def load_encoding_profile(book_id, profile=None):
     """
-    try:
-        audio = AudioSegment.from_mp3(file_path)
-        return len(audio)  # 返回音频长度（毫秒）
-    except Exception as e:
-        print(f"获取音频时长失败: {file_path}, 错误: {e}")
-        return 0
+    书籍的编码配置（见 encoding_profiles）
+
+    profile 为None时读取 audio/{book_id}/encoding.json，文件不存在时使用默认配置
+    """
+    profile_path = f"audio/{book_id}/encoding.json"
+    if profile is None and os.path.exists(profile_path):
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    return load_profile(profile)
 
 
-def merge_chapter_audio(audio_files, output_path):
+def invalidate_speakers(book_id, chapters_meta, speakers):
     """
-    合并章节音频片段，并进行长度校验
+    删除指定角色的已生成片段和所在章节的合成音频
 
-    参数:
-    audio_files: 音频文件列表，每个元素为 (索引, 文件路径)
-    output_path: 合并后音频的输出路径
+    通过书籍存储的角色倒排索引找到这些角色在每个章节中的片段序号，
+    只删除这些片段，下次生成时其余片段直接使用缓存，只重新合成被删除的片段。
 
     返回:
-    合并后的音频文件路径，如果不需要合并则返回现有文件路径
+    (受影响章节数, 删除的片段数)
+    """
+    store = get_book_store(book_id)
+    segments = store.speaker_segments(speakers)
+    if not segments:
+        return 0, 0
+
+    chapters = 0
+    removed = 0
+    for index, chapter_meta in enumerate(chapters_meta):
+        rows = segments.get(chapter_id(chapter_meta))
+        if not rows:
+            continue
+        chapters += 1
+
+        pack_base = segment_pack_path(book_id, index)
+        if os.path.exists(f"{pack_base}.idx"):
+            with SegmentPack(pack_base) as pack:
+                removed += pack.discard(rows)
+        else:
+            print(f"章节 {index+1} 没有片段缓存，将整章重新合成")
+
+        # 旧版本按文件保存的片段
+        temp_dir = segment_dir(book_id, index)
+        for row in rows:
+            audio_path = f"{temp_dir}/{row}.mp3"
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+                removed += 1
+
+        for extension in output_extensions():
+            output_path = chapter_output_path(book_id, chapter_meta, index, extension)
+            for path in (output_path, incomplete_output_path(output_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    return chapters, removed
+
+
+def apply_voice_changes(book_id, chapters_meta, user_voices):
     """
-    # 过滤掉None值的音频文件
-    audio_files = [file for file in audio_files if file[1] is not None]
-    audio_files.sort(key=lambda x: x[0])
+    对比角色语音对照表与上次生成时的快照，使更换了语音的角色的片段失效
 
-    # 如果没有有效音频文件，返回None
-    if not audio_files:
-        return None
+    快照保存在 audio/{book_id}/voice_snapshot.json，第一次运行时只保存快照。
+    比较的是角色实际使用的语音（包括回退到旁白的角色），
+    因此修改旁白语音时，没有单独配置语音的角色也会重新合成。
 
-    # 检查本地是否已存在合成音频
-    if os.path.exists(output_path):
-        # 计算分段音频总时长
-        total_segment_duration = sum(
-            get_audio_duration(file_path) for _, file_path in audio_files
+    返回:
+    更换了语音的角色列表
+    """
+    snapshot_path = f"audio/{book_id}/voice_snapshot.json"
+    changed = []
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+        store = get_book_store(book_id)
+        speakers = set(store.speaker_names()) | set(user_voices) | set(previous)
+        changed = sorted(
+            speaker
+            for speaker in speakers
+            if resolve_voice(user_voices, speaker) != resolve_voice(previous, speaker)
         )
+        if changed:
+            chapters, removed = invalidate_speakers(book_id, chapters_meta, changed)
+            print(
+                f"以下角色更换了语音：{'、'.join(s or NARRATOR for s in changed)}，"
+                f"涉及 {chapters} 个章节，删除 {removed} 个片段待重新合成"
+            )
 
-        # 获取已存在音频的时长
-        existing_audio_duration = get_audio_duration(output_path)
+    atomic_write_text(
+        snapshot_path, json.dumps(user_voices, ensure_ascii=False, indent=4)
+    )
+    return changed
 
-        # 允许的时长误差范围（毫秒）
-        DURATION_TOLERANCE = 5000  # 5秒
 
-        # 判断是否需要重新合成
-        if abs(total_segment_duration - existing_audio_duration) <= DURATION_TOLERANCE:
-            print(f"现有音频长度符合，跳过重新合成: {output_path}")
-            return output_path
+# 处理单个文本片段并生成音频
+def process_text_segment(args):
+    """
+    合成一个片段并追加到片段包
 
-    # 开始合并音频
-    try:
-        # 第一个音频作为基础
-        combined = AudioSegment.from_mp3(audio_files[0][1])
+    返回 (索引, 片段记录, 错误原因)，文本为空时片段记录和错误原因都为None，
+    合成失败或校验不通过时片段记录为None
+    """
+    index, content, user_voices, pack, digest, settings, _ = args
 
-        # 添加其余音频
-        for _, file_path in audio_files[1:]:
-            audio = AudioSegment.from_mp3(file_path)
-            combined += audio
+    # 如果片段包中已有按当前输入生成的片段，直接返回（避免重复生成）
+    if pack.is_current(index, digest):
+        return index, pack.get(index), None
 
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # 获取文本内容
+    text = content.get("text", "").strip()
 
-        # 导出合并后的音频
-        combined.export(output_path, format="mp3")
+    # 如果文本为空，返回None
+    if not text:
+        return index, None, None
 
-        print(f"音频合并完成: {output_path}")
-        return output_path
+    # 查找角色对应的语音模型，如果没有则使用旁白
+    voice_model = resolve_voice(user_voices, content.get("type", NARRATOR))
 
-    except Exception as e:
-        print(f"音频合并失败: {e}")
+    # 调用API生成音频
+    audio_content = create_audio_from_api(text, voice_model, settings=settings)
+    if not audio_content:
+        return index, None, "接口没有返回音频"
+
+    # 截断、时长异常或近似静音的音频不写入片段包
+    valid, reason = validate_audio_content(audio_content, text, settings["speed"])
+    if not valid:
+        return index, None, reason
+
+    # 只保存音频帧追加到片段包，返回索引和片段记录（用于后续拼接）
+    frames = audio_frames(audio_content)
+    return index, pack.append(index, bytes(frames), digest), None
+
+
+def segment_inputs(content, user_voices, settings=SYNTH_SETTINGS):
+    """片段音频的输入哈希（文本、实际使用的语音和合成参数），文本为空时返回None"""
+    text = content.get("text", "").strip()
+    if not text:
         return None
+    voice = resolve_voice(user_voices, content.get("type", NARRATOR))
+    return inputs_hash(text, voice, settings)
+
+
+def import_legacy_segments(store, pack, temp_dir, segment_hashes):
+    """
+    把旧版本按文件保存的片段导入片段包，导入后删除旧的片段目录
+
+    片段的输入哈希使用构建记录，没有记录的片段视为按当前输入生成。
+    返回导入的片段数
+    """
+    if not os.path.isdir(temp_dir):
+        return 0
+
+    recorded = store.artifact_hashes(file_artifact(f"{temp_dir}/"))
+    imported = 0
+    for index, expected in enumerate(segment_hashes):
+        audio_path = f"{temp_dir}/{index}.mp3"
+        if expected is None or pack.get(index) or not os.path.exists(audio_path):
+            continue
+        with open(audio_path, "rb") as f:
+            frames = audio_frames(f.read())
+        if frames:
+            digest = recorded.get(file_artifact(audio_path), expected)
+            pack.append(index, bytes(frames), digest)
+            imported += 1
+
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    store.forget_artifacts(list(recorded))
+    return imported
+
+
+def has_build_records(store, book_id):
+    """书籍是否已由记录构建输入的版本合成过（有章节音频的构建记录或片段包）"""
+    for directory in ("audio", "audio_incomplete"):
+        if store.artifact_hashes(file_artifact(f"audio/{book_id}/{directory}/")):
+            return True
+    temp_dir = f"audio/{book_id}/audio_temp"
+    return os.path.isdir(temp_dir) and any(
+        name.endswith(".idx") for name in os.listdir(temp_dir)
+    )
+
+
+def load_chapter_dialogues(book_id, chapter_meta, chapter_index):
+    """
+    读取章节对话分析结果
+
+    书籍存储中没有时，导入旧版本按序号保存的 audio/{book_id}/chapter/{序号}.json
+    """
+    store = get_book_store(book_id)
+    dialogues = store.get_dialogues(chapter_meta)
+    if dialogues is not None:
+        return dialogues
+
+    chapter_file = os.path.join("audio", book_id, "chapter", f"{chapter_index+1}.json")
+    if not os.path.exists(chapter_file):
+        return None
+
+    with open(chapter_file, "r", encoding="utf-8") as f:
+        try:
+            dialogues = json.load(f)
+        except json.JSONDecodeError:
+            print(f"章节文件格式错误: {chapter_file}")
+            return None
+
+    store.put_dialogues(chapter_meta, dialogues)
+    return dialogues
 
 
 # 处理单个章节
-def process_chapter(chapter_meta, user_voices, book_id, chapter_index, max_workers=100):
+def process_chapter(
+    chapter_meta,
+    user_voices,
+    book_id,
+    chapter_index,
+    max_workers=100,
+    keep_segments=True,
+    finalizer=None,
+    postprocess=None,
+    profile=None,
+):
     """
     处理单个章节
 
+    不做后处理也不重新编码时，片段合成完成后由 ChapterAssembler 按序号流式追加到章节音频，
+    不需要等待全部片段完成再统一合并。指定 postprocess 时章节在收尾阶段解码后
+    去除首尾静音、统一响度并按角色切换插入停顿（见 audio_postprocess），
+    编码配置需要重新编码时章节同样在收尾阶段编码：指定 finalizer（ChapterFinalizer）时
+    把收尾提交到收尾进程池，立即返回 Future，调用方可以继续合成下一个章节，
+    否则在当前线程中收尾。
+    有片段合成失败时，章节音频保存到 audio_incomplete 目录（见 incomplete_output_path），
+    下次运行时补齐缺失的片段后重新生成。
+
     chapter_meta: 章节元数据
     user_voices: 角色语音对照表
     book_id: 书籍ID
     chapter_index: 章节索引
     max_workers: 最大线程数
+    keep_segments: 是否保留章节的片段包。保留时更换角色语音或修改文本后
+        只需重新合成变化的片段；不保留时章节音频生成后删除片段包
+    finalizer: 章节收尾进程池，只用于需要后处理或重新编码的章节
+    postprocess: 后处理参数，True 使用默认参数，None 不做后处理
+    profile: 编码配置（load_profile 的返回值），None 使用默认配置
     """
     chapter_title = chapter_meta.get("chapter_title", f"第{chapter_index+1}章")
-    chapter_file = os.path.join(os.getcwd(), "audio", book_id, "chapter", f"{chapter_index+1}.json")
+    profile = profile or load_profile()
+    synth = {**SYNTH_SETTINGS, **profile["synth"]}
+    export = profile["export"]
+    output_path = chapter_output_path(
+        book_id, chapter_meta, chapter_index, output_extension(export)
+    )
 
-    # 如果章节文件路径不存在，返回
-    if not chapter_file or not os.path.exists(chapter_file):
-        print(f"章节文件不存在: {chapter_file}")
+    # 从书籍存储读取章节对话分析结果
+    chapter_content = load_chapter_dialogues(book_id, chapter_meta, chapter_index)
+    if chapter_content is None:
+        print(f"章节对话数据不存在: {chapter_title}")
         return None
 
-    # 读取章节详细内容
-    with open(chapter_file, "r", encoding="utf-8") as f:
-        try:
-            chapter_content = json.load(f)
-        except json.JSONDecodeError:
-            print(f"章节文件格式错误: {chapter_file}")
-            return None
-
     # 确保章节内容是列表
     if not isinstance(chapter_content, list) or not chapter_content:
-        print(f"章节内容为空或格式错误: {chapter_file}")
+        print(f"章节内容为空或格式错误: {chapter_title}")
         return None
 
+    # 章节音频的输入为全部片段的输入，任一片段的文本、语音或合成参数变化都需要重新合并
+    store = get_book_store(book_id)
+    segment_hashes = [
+        segment_inputs(content, user_voices, synth) for content in chapter_content
+    ]
+    # 开启后处理或重新编码时处理参数和编码参数也是章节音频的输入
+    settings = postprocess_settings(postprocess) if postprocess else None
+    if settings or export:
+        chapter_hash = inputs_hash(segment_hashes, settings, export)
+    else:
+        chapter_hash = inputs_hash(segment_hashes)
+    if os.path.exists(output_path):
+        built = store.artifact_hashes(file_artifact(output_path)).get(
+            file_artifact(output_path)
+        )
+        if built is None and not has_build_records(store, book_id):
+            # 旧版本生成的章节音频没有构建记录，视为最新并补录；
+            # 书籍已有构建记录时，没有记录的章节音频来源不明，重新生成
+            store.record_artifacts([(file_artifact(output_path), chapter_hash)])
+            return output_path
+        if built == chapter_hash:
+            return output_path
+
     print(f"\n开始处理章节：{chapter_title}")
 
-    # 准备处理任务
-    tasks = []
-    for i, content in enumerate(chapter_content):
-        # 添加任务，直接传递用户语音对照表
-        tasks.append((i, content, user_voices, chapter_index, book_id))
-
-    # 创建临时目录
-    temp_dir = f"audio/{book_id}/audio_temp/{chapter_index}"
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # 多线程处理音频生成
-    audio_files = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 创建进度条
-        futures = {executor.submit(process_text_segment, task): task for task in tasks}
-
-        # 使用tqdm显示进度
-        with tqdm(total=len(tasks), desc=f"章节 {chapter_title} 音频生成进度") as pbar:
-            for future in as_completed(futures):
-                try:
-                    index, audio_path = future.result()
-                    if audio_path:  # 只添加成功生成的音频
-                        audio_files.append((index, audio_path))
-                    pbar.update(1)
-                except Exception as e:
-                    print(f"处理音频时出错: {e}")
-                    pbar.update(1)
-
-    # 合并章节音频
-    if audio_files:
-        output_dir = f"audio/{book_id}/audio"
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 使用章节标题作为文件名，但去除不合法的字符
-        safe_title = "".join(
-            c for c in chapter_title if c.isalnum() or c in " _-"
-        ).strip()
-        if not safe_title:
-            safe_title = f"chapter_{chapter_index}"
-
-        output_path = f"{output_dir}/{safe_title}.mp3"
-        if os.path.exists(output_path):
-            return output_path
-        print(f"正在合并章节 {chapter_title} 的音频...")
-        merge_chapter_audio(audio_files, output_path)
-        print(f"章节 {chapter_title} 音频已生成: {output_path}")
+    # 更换编码配置后删除其他格式的旧章节音频，上次不完整的章节音频重新生成后不再需要
+    for extension in output_extensions():
+        old_path = chapter_output_path(book_id, chapter_meta, chapter_index, extension)
+        if old_path != output_path and os.path.exists(old_path):
+            os.remove(old_path)
+        if os.path.exists(incomplete_output_path(old_path)):
+            os.remove(incomplete_output_path(old_path))
+    staging_path = incomplete_output_path(output_path)
 
-        # 清理临时文件
-        print(f"清理临时文件...")
-        shutil.rmtree(temp_dir, ignore_errors=True)
+    pack = SegmentPack(segment_pack_path(book_id, chapter_index))
+    try:
+        # 旧版本按文件保存的片段导入片段包
+        import_legacy_segments(
+            store, pack, segment_dir(book_id, chapter_index), segment_hashes
+        )
+        stale = sum(
+            1
+            for i, digest in enumerate(segment_hashes)
+            if pack.get(i) and not pack.is_current(i, digest)
+        )
+        if stale:
+            print(f"章节 {chapter_title} 有 {stale} 个片段的输入已变化，重新合成")
+
+        # 准备处理任务
+        tasks = []
+        for i, content in enumerate(chapter_content):
+            # 添加任务，直接传递用户语音对照表和片段包
+            tasks.append((i, content, user_voices, pack, segment_hashes[i], synth, 1))
+
+        # 多线程处理音频生成，不做后处理也不重新编码时，完成的片段按序号流式写入
+        # audio_incomplete 目录，全部片段完整时再移入 audio 目录
+        streaming = not settings and not export
+        assembler = ChapterAssembler(staging_path, len(tasks)) if streaming else None
+        generated = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 创建进度条
+                pending = {
+                    executor.submit(process_text_segment, task): task
+                    for task in tasks
+                }
+
+                # 使用tqdm显示进度
+                with tqdm(
+                    total=len(tasks), desc=f"章节 {chapter_title} 音频生成进度"
+                ) as pbar:
+                    while pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            task = pending.pop(future)
+                            try:
+                                index, entry, error = future.result()
+                            except Exception as e:
+                                index, entry, error = task[0], None, str(e)
+
+                            # 校验不通过或出错的片段重新排队合成
+                            attempt = task[-1]
+                            if error and attempt < MAX_SEGMENT_ATTEMPTS:
+                                print(
+                                    f"片段 {index} 第{attempt}次合成失败：{error}，重新合成"
+                                )
+                                retry = task[:-1] + (attempt + 1,)
+                                future = executor.submit(process_text_segment, retry)
+                                pending[future] = retry
+                                continue
+                            if error:
+                                print(f"片段 {index} 合成失败：{error}")
+
+                            if entry:  # 只拼接成功生成的音频
+                                generated += 1
+                            if assembler:
+                                assembler.add(
+                                    index,
+                                    (lambda i=index: pack.read(i)) if entry else None,
+                                )
+                            pbar.update(1)
+        except BaseException:
+            if assembler:
+                assembler.abort()
+            raise
+
+        # 所有非空片段都生成成功时才记录构建输入，否则记录为不完整，下次运行时补齐缺失片段后重新拼接
+        complete = generated == sum(1 for digest in segment_hashes if digest is not None)
+        built_hash = chapter_hash if complete else INCOMPLETE_BUILD
+        if streaming:
+            merged = assembler.finish()
+            expected_duration = sum(
+                pack.get(i)["duration"] for i in range(len(tasks)) if pack.get(i)
+            )
+    finally:
+        # 由收尾任务拼接时片段包在收尾任务读取后再删除
+        if keep_segments or not streaming:
+            pack.compact()
+            pack.close()
+        else:
+            pack.remove()
+
+    if not streaming:
+        if not complete:
+            os.makedirs(os.path.dirname(staging_path), exist_ok=True)
+        job = {
+            "pack": segment_pack_path(book_id, chapter_index),
+            "output_path": output_path if complete else staging_path,
+            "total": len(tasks),
+            "keep_segments": keep_segments,
+            "chapter_title": chapter_title,
+            "postprocess": settings,
+            "export": export,
+            "speakers": [
+                content.get("type", NARRATOR) or NARRATOR
+                for content in chapter_content
+            ],
+        }
+
+        def callback(job, result):
+            record_finalized(store, job, result, built_hash)
+
+        if finalizer:
+            return finalizer.submit(job, callback)
 
-        return output_path
+        try:
+            result = finalize_chapter(job)
+        except Exception as e:
+            result = e
+        callback(job, result)
+        return None if isinstance(result, Exception) else result["output_path"]
+
+    if not merged:
+        return None
+    ok, duration = verify_chapter_audio(staging_path, expected_duration)
+    if not ok:
+        print(
+            f"章节 {chapter_title} 音频时长 {duration:.1f} 秒与片段时长之和 "
+            f"{expected_duration:.1f} 秒不一致，已删除"
+        )
+        os.remove(staging_path)
+        return None
+    if complete:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        os.replace(staging_path, output_path)
+    else:
+        output_path = staging_path
+    print(f"章节 {chapter_title} 音频已生成: {output_path}")
+
+    store.record_artifacts([(file_artifact(output_path), built_hash)])
+    return output_path
 
-    return None
+
+def record_finalized(store, job, result, chapter_hash):
+    """
+    收尾进程池完成一个章节后的回调
+
+    result 为 finalize_chapter 的返回值或异常；chapter_hash 为 INCOMPLETE_BUILD 表示有片段缺失
+    """
+    chapter_title = job["chapter_title"]
+    if isinstance(result, Exception):
+        print(f"章节 {chapter_title} 收尾出错: {result}")
+        return
+    if not result["output_path"]:
+        print(f"章节 {chapter_title} 音频生成失败: {result['message']}")
+        return
+
+    print(
+        f"章节 {chapter_title} 音频已生成: {result['output_path']}"
+        f"（{result['size'] / 1024 / 1024:.1f} MB，编码 {result['encode_seconds']:.1f} 秒）"
+    )
+    store.record_artifacts([(file_artifact(result["output_path"]), chapter_hash)])
 
 
 # 读取章节信息与角色语音对照表生成章节音频
-def create_audio(book_id: str, max_workers=100):
+def create_audio(
+    book_id: str,
+    max_workers=100,
+    keep_segments=True,
+    finalize_workers=None,
+    postprocess=None,
+    profile=None,
+):
     """
     book_id: 书籍id
     max_workers: 最大线程数
+    keep_segments: 是否保留片段缓存，见 process_chapter
+    finalize_workers: 章节收尾（后处理、重新编码）的进程数，默认CPU核数；
+        为0时在合成线程中收尾。不做后处理也不重新编码时章节在合成线程中流式拼接，
+        不启动收尾进程池
+    postprocess: 后处理参数（去除静音、统一响度、角色切换停顿），见 process_chapter
+    profile: 编码配置名称或配置，None 时读取 audio/{book_id}/encoding.json，
+        见 encoding_profiles
     """
     # 确保必要的目录存在
     os.makedirs(f"audio/{book_id}", exist_ok=True)
     os.makedirs(f"audio/{book_id}/audio", exist_ok=True)
+    os.makedirs(f"audio/{book_id}/audio_incomplete", exist_ok=True)
     os.makedirs(f"audio/{book_id}/audio_temp", exist_ok=True)
 
     # 读取章节元数据
@@ -388,20 +694,44 @@ def create_audio(book_id: str, max_workers=100):
     with open(f"audio/{book_id}/user.json", "r", encoding="utf-8") as f:
         user_voices = json.load(f)
 
+    profile = load_encoding_profile(book_id, profile)
+    print(f"编码配置：{profile['name']}")
+
+    # 角色更换语音后，只删除该角色的片段和所在章节的音频，其余片段继续使用
+    apply_voice_changes(book_id, chapters_meta, user_voices)
+
     # 逐章节处理
     total_chapters = len(chapters_meta)
     print(f"总共 {total_chapters} 个章节需要处理")
 
-    # 总进度条
-    with tqdm(total=total_chapters, desc="总体进度") as pbar:
-        for i, chapter_meta in enumerate(chapters_meta):
-            # 处理单个章节（等待完成后再处理下一个）
-            chapter_output = process_chapter(
-                chapter_meta, user_voices, book_id, i, max_workers
-            )
+    # 需要后处理或重新编码的章节合成完成后交给收尾进程池，合成线程继续处理下一个章节
+    finalizer = None
+    if finalize_workers != 0 and (postprocess or profile["export"]):
+        finalizer = ChapterFinalizer(finalize_workers)
 
-            # 更新总进度条
-            pbar.update(1)
+    # 总进度条
+    try:
+        with tqdm(total=total_chapters, desc="总体进度") as pbar:
+            for i, chapter_meta in enumerate(chapters_meta):
+                # 处理单个章节（合成完成后再处理下一个，收尾在进程池中进行）
+                chapter_output = process_chapter(
+                    chapter_meta,
+                    user_voices,
+                    book_id,
+                    i,
+                    max_workers,
+                    keep_segments,
+                    finalizer,
+                    postprocess,
+                    profile,
+                )
+
+                # 更新总进度条
+                pbar.update(1)
+    finally:
+        if finalizer:
+            print("等待章节收尾完成...")
+            finalizer.close()
 
     print(f"\n所有章节音频生成完毕！音频文件保存在 audio/{book_id}/audio 目录下")
 
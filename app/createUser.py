@@ -1,5 +1,6 @@
 import json
 import random
+from file_utils import atomic_write_json
 
 
 def fpjs(book_id: str):
@@ -43,8 +44,7 @@ def fpjs(book_id: str):
             user[name] = narrator_model
 
     # 保存更新后的user.json
-    with open(f"audio/{book_id}/user.json", "w", encoding="utf-8") as f:
-        json.dump(user, f, ensure_ascii=False, indent=4)
+    atomic_write_json(f"audio/{book_id}/user.json", user)
 
     return user
 
@@ -0,0 +1,123 @@
+"""
+章节音频的编码配置
+
+每本书可以选择一个编码配置，同时决定语音合成的请求参数和章节音频的最终编码：
+    synth   覆盖 SYNTH_SETTINGS 中的合成参数（片段始终为MP3，便于校验和按帧拼接）
+    export  章节音频的最终编码，为None时直接输出拼接的MP3帧，不重新编码
+
+语音内容用单声道、24kHz、较低码率编码就足够清晰，体积只有默认输出的几分之一。
+书籍的配置保存在 audio/{book_id}/encoding.json，例如：
+    {"profile": "speech_opus"}
+    {"profile": "speech_mp3", "export": {"bitrate": "40k"}}
+"""
+
+import subprocess
+
+from pydub import AudioSegment
+
+# 没有配置时使用的编码配置
+DEFAULT_PROFILE = "default"
+
+# 接口支持的MP3采样率为 32000 和 44100，降低采样率的配置按 32000 合成后再重新编码
+ENCODING_PROFILES = {
+    # 接口返回的 44.1kHz MP3 直接拼接
+    "default": {"synth": {}, "export": None},
+    "speech_mp3": {
+        "synth": {"sample_rate": 32000},
+        "export": {
+            "format": "mp3",
+            "extension": "mp3",
+            "codec": "libmp3lame",
+            "sample_rate": 24000,
+            "channels": 1,
+            "bitrate": "48k",
+        },
+    },
+    "speech_aac": {
+        "synth": {"sample_rate": 32000},
+        "export": {
+            "format": "ipod",
+            "extension": "m4a",
+            "codec": "aac",
+            "sample_rate": 24000,
+            "channels": 1,
+            "bitrate": "40k",
+        },
+    },
+    "speech_opus": {
+        "synth": {"sample_rate": 32000},
+        "export": {
+            "format": "opus",
+            "extension": "opus",
+            "codec": "libopus",
+            "sample_rate": 24000,
+            "channels": 1,
+            "bitrate": "24k",
+            "options": ["-application", "voip"],
+        },
+    },
+}
+
+
+def load_profile(profile=None):
+    """
+    解析编码配置
+
+    profile 为配置名称，或 {"profile": 基础配置名称, "synth": {...}, "export": {...}}，
+    synth 和 export 中的字段覆盖基础配置。返回 {"name", "synth", "export"}，
+    配置名称不存在时抛出 ValueError
+    """
+    overrides = profile if isinstance(profile, dict) else {"profile": profile}
+    name = overrides.get("profile") or DEFAULT_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(
+            f"未知的编码配置: {name}，可选: {'、'.join(ENCODING_PROFILES)}"
+        )
+
+    base = ENCODING_PROFILES[name]
+    synth = dict(base["synth"], **overrides.get("synth", {}))
+    export = base["export"]
+    if overrides.get("export"):
+        export = dict(export or {}, **overrides["export"])
+    return {"name": name, "synth": synth, "export": export}
+
+
+def output_extension(export):
+    """章节音频的扩展名"""
+    return (export or {}).get("extension", "mp3")
+
+
+def output_extensions():
+    """所有编码配置可能产生的扩展名"""
+    return sorted({output_extension(p["export"]) for p in ENCODING_PROFILES.values()})
+
+
+def is_mp3(export):
+    """最终输出是否为MP3（可以逐帧校验时长）"""
+    return not export or export.get("format", "mp3") == "mp3"
+
+
+def encoder_args(export):
+    """ffmpeg 的输出编码参数"""
+    args = ["-vn", "-c:a", export["codec"]]
+    if export.get("sample_rate"):
+        args += ["-ar", str(export["sample_rate"])]
+    if export.get("channels"):
+        args += ["-ac", str(export["channels"])]
+    if export.get("bitrate"):
+        args += ["-b:a", export["bitrate"]]
+    return args + list(export.get("options", [])) + ["-f", export["format"]]
+
+
+def transcode(input_path, output_path, export):
+    """按编码配置重新编码音频文件，ffmpeg 出错时抛出 RuntimeError"""
+    result = subprocess.run(
+        [AudioSegment.converter, "-v", "error", "-y", "-i", input_path]
+        + encoder_args(export)
+        + [output_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode:
+        message = result.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"ffmpeg 编码失败（{result.returncode}）: {message}")
@@ -1,13 +1,14 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 from urllib.parse import urljoin
+from file_utils import atomic_write_json
+from site_profiles import profile_for
 
 
 def fetch_options_from_url(url):
-    # 获取页面内容
-    response = requests.get(url)
-    response.encoding = "utf-8"  # 确保中文编码正确
+    # 获取页面内容（请求头、编码和限速由站点配置决定）
+    profile = profile_for(url)
+    response = profile.get(url)
 
     if response.status_code != 200:
         return f"错误: 无法获取页面，状态码: {response.status_code}"
@@ -15,14 +16,14 @@ def fetch_options_from_url(url):
     # 解析HTML
     soup = BeautifulSoup(response.text, "html.parser")
 
-    # 查找指定的select元素
-    select_element = soup.find("select", attrs={"onchange": "location.href=this.value"})
+    # 查找站点配置中的分页select元素
+    select_element = profile.select_one("toc_select", soup)
 
     if not select_element:
         return "错误: 未找到指定的select元素"
 
     # 提取所有option元素
-    options = select_element.find_all("option")
+    options = profile.select("toc_option", select_element)
 
     # 创建结果列表
     result = []
@@ -43,8 +44,7 @@ def fetch_options_from_url(url):
 
 def save_to_json(data, filename="options.json"):
     # 保存为JSON文件
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    atomic_write_json(filename, data)
 
     return f"数据已保存到 {filename}"
 
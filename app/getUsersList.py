@@ -2,50 +2,56 @@ import json
 import os
 from collections import defaultdict
 from typing import Dict, List
+from file_utils import atomic_write_json
+from book_store import get_book_store
 
-def get_users_list(book_id: str) -> None:
-    """
-    读取指定书籍ID的所有章节JSON文件，统计角色信息并保存结果
-    
-    Args:
-        book_id: 书籍ID
-    """
-    # 角色统计信息
-    characters_info = defaultdict(lambda: {"gender": "", "lines_count": 0})
-    
-    # 构建章节文件目录路径
+def iter_legacy_dialogues(book_id: str):
+    """遍历旧版本保存在 audio/{book_id}/chapter 下的章节对话文件，返回 (文件名, [(角色名, 性别)])"""
     chapters_dir = f"audio/{book_id}/chapter"
-    
-    # 确保目录存在
     if not os.path.exists(chapters_dir):
         print(f"目录不存在: {chapters_dir}")
         return
-    
-    # 遍历所有JSON文件
+
     for filename in os.listdir(chapters_dir):
         if not filename.endswith('.json'):
             continue
-            
-        file_path = os.path.join(chapters_dir, filename)
+
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            with open(os.path.join(chapters_dir, filename), 'r', encoding='utf-8') as f:
                 dialogues = json.load(f)
-                
-            # 处理每个对话
-            for dialogue in dialogues:
-                if not isinstance(dialogue, dict):
-                    continue
-                    
-                character = dialogue.get("type", "")
-                gender = dialogue.get("sex", "")
-                
-                if character:
-                    characters_info[character]["gender"] = gender
-                    characters_info[character]["lines_count"] += 1
-                    
+            yield filename, [
+                (dialogue.get("type", ""), dialogue.get("sex", ""))
+                for dialogue in dialogues
+                if isinstance(dialogue, dict)
+            ]
         except Exception as e:
             print(f"处理文件 {filename} 时出错: {str(e)}")
+
+
+def get_users_list(book_id: str) -> None:
+    """
+    读取指定书籍ID所有章节的对话分析结果，统计角色信息并保存结果
     
+    Args:
+        book_id: 书籍ID
+    """
+    # 书籍存储中的角色统计随对话结果写入增量更新，直接读取（性别取最后一次出现时的性别）
+    store = get_book_store(book_id)
+    if store.dialogue_ids():
+        save_users_list(book_id, store.character_stats(gender="last"))
+        return
+
+    # 角色统计信息
+    characters_info = defaultdict(lambda: {"gender": "", "lines_count": 0})
+
+    # 尚未导入存储的旧书遍历章节文件
+    for cid, speakers in iter_legacy_dialogues(book_id):
+        # 处理每个对话
+        for character, gender in speakers:
+            if character:
+                characters_info[character]["gender"] = gender
+                characters_info[character]["lines_count"] += 1
+
     # 转换为列表并排序
     characters_list = [
         {
@@ -58,14 +64,16 @@ def get_users_list(book_id: str) -> None:
     
     # 按台词数量降序排序
     characters_list.sort(key=lambda x: x["lines_count"], reverse=True)
-    
-    # 保存结果
+    save_users_list(book_id, characters_list)
+
+
+def save_users_list(book_id: str, characters_list: List[Dict]) -> None:
+    """保存角色统计信息到 audio/{book_id}/characters.json"""
     output_dir = f"audio/{book_id}"
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "characters.json")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(characters_list, f, ensure_ascii=False, indent=2)
+    atomic_write_json(output_file, characters_list, indent=2)
     
     print(f"角色统计信息已保存到: {output_file}")
 
@@ -1,9 +1,10 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 import os
 import argparse
 from urllib.parse import urljoin
+from file_utils import atomic_write_json
+from site_profiles import get_registry, profile_for
 
 
 def read_json_file(file_path):
@@ -21,8 +22,7 @@ def read_json_file(file_path):
 def fetch_html_content(url):
     """获取URL的HTML内容"""
     try:
-        response = requests.get(url)
-        response.encoding = "utf-8"  # 确保中文编码正确
+        response = profile_for(url).get(url)
 
         if response.status_code != 200:
             print(f"错误: 无法获取页面，状态码: {response.status_code}, URL: {url}")
@@ -40,30 +40,26 @@ def extract_chapters(html_content, base_url):
         return []
 
     soup = BeautifulSoup(html_content, "html.parser")
+    profile = profile_for(base_url)
 
-    # 查找指定的ul元素
-    ul_element = soup.find("ul", class_="read")
+    # 查找站点配置中的章节列表元素
+    ul_element = profile.select_one("chapter_list", soup)
 
     if not ul_element:
         print("错误: 未找到指定的ul元素")
         return []
 
-    # 提取所有li元素
-    li_elements = ul_element.find_all("li")
-
     chapters = []
 
-    for li in li_elements:
-        a_tag = li.find("a")
-        if a_tag:
-            href = a_tag.get("href")
-            title = a_tag.text.strip()
+    for a_tag in profile.select("chapter_link", ul_element):
+        href = a_tag.get("href")
+        title = a_tag.text.strip()
 
-            # 处理相对URL
-            if href and not href.startswith(("http://", "https://")):
-                href = urljoin(base_url, href)
+        # 处理相对URL
+        if href and not href.startswith(("http://", "https://")):
+            href = urljoin(base_url, href)
 
-            chapters.append({"chapter_url": href, "chapter_title": title})
+        chapters.append({"chapter_url": href, "chapter_title": title})
 
     return chapters
 
@@ -85,8 +81,7 @@ def save_to_json(data, filename):
         # 确保目录存在
         os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        atomic_write_json(filename, data)
 
         print(f"数据已保存到 {filename}")
         return True
@@ -134,6 +129,9 @@ def main(input_file, output_file):
             else:
                 print(f"跳过已存在章节: {chapter['chapter_title']}")
 
+    # 保存本次抓取中调优后的站点参数
+    get_registry().save()
+
     # 保存所有章节信息
     if new_chapters_count > 0:
         save_to_json(existing_chapters, output_file)
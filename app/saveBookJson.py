@@ -8,9 +8,16 @@ import threading
 from openai import OpenAI
 import re
 from tqdm import tqdm
+from book_store import get_book_store, inputs_hash, dialogues_artifact
 
 load_dotenv(override=True)
 
+# 对话分析使用的模型
+MODEL = "gemini-2.0-flash"
+
+# 超过该行数的章节分块分析
+CHUNK_LINES = 50
+
 
 prompt = """
     我发给你的是一章小说，请帮我仔细分析出来每句话都是谁说的，然后以json的形式给我
@@ -27,20 +34,38 @@ prompt = """
 """
 
 
-def get_book_json(book_id: str):
-    """
-    读取指定book_id的所有小说章节文件路径，并按照文件夹和文件名顺序排列，
-    然后保存为JSON文件。
+def safe_name(name):
+    """旧版本保存章节文件时使用的文件名清洗规则"""
+    return "".join(c if c.isalnum() or c in "- " else "_" for c in name)
 
-    Args:
-        book_id (str): 小说ID，对应data目录下的子目录名
+
+def load_chapter_list(book_id: str):
+    """读取书籍的章节列表（带章节URL），用于给旧版本章节文件对应稳定的章节ID"""
+    for list_file in [
+        os.path.join("data", book_id, "chapters.json"),
+        os.path.join("audio", book_id, "xszj.json"),
+    ]:
+        if os.path.exists(list_file):
+            with open(list_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return []
+
+
+def list_legacy_chapter_files(book_id: str):
+    """
+    按文件夹和文件名顺序列出旧版本保存的章节文件路径（相对data目录）
     """
+    # 旧版本缓存的章节顺序
+    cache_file = f"{book_id}_chapters.json"
+    if os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
     book_dir = os.path.join("data", book_id, "content")
 
     # 检查目录是否存在
     if not os.path.exists(book_dir):
-        print(f"错误：目录 '{book_dir}' 不存在")
-        return
+        return []
 
     # 获取所有子目录
     subdirs = [
@@ -85,22 +110,121 @@ def get_book_json(book_id: str):
             chapter_path = os.path.join(book_id, "content", subdir, chapter_file)
             all_chapters.append(chapter_path)
 
-    # 保存章节路径列表到JSON文件
-    output_file = f"{book_id}_chapters.json"
-    # 判断是否没有这个文件
-    if not os.path.exists(output_file):
-        # 创建这个文件
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(all_chapters, f, ensure_ascii=False, indent=4)
-    else:
-        # 读取这个文件
-        with open(output_file, "r", encoding="utf-8") as f:
-            all_chapters = json.load(f)
-
-    print(f"已成功读取 {len(all_chapters)} 个章节路径，并保存到 {output_file}")
     return all_chapters
 
 
+def import_legacy_chapters(book_id: str):
+    """
+    把旧版本的章节文件和对话文件导入书籍存储
+
+    章节文件按清洗后的分组和标题与章节列表对应，找到时使用章节URL作为稳定ID；
+    书籍存储中已有正文的章节不再读取文件，只更新章节顺序。
+    对话文件 audio/{book_id}/chapter/{序号}.json 按章节顺序导入。
+    返回新导入正文的章节数
+    """
+    store = get_book_store(book_id)
+    known = {
+        (safe_name(c.get("group", "")), safe_name(c["chapter_title"])): c
+        for c in load_chapter_list(book_id)
+        if c.get("chapter_title")
+    }
+
+    chapters = []
+    imported = 0
+    for chapter_path in list_legacy_chapter_files(book_id):
+        full_path = os.path.join("data", chapter_path)
+        group = os.path.basename(os.path.dirname(chapter_path))
+        title = re.sub(
+            r"^\d+_", "", os.path.splitext(os.path.basename(chapter_path))[0]
+        )
+        chapter = known.get((group, title), {"chapter_title": title, "group": group})
+        if store.has_text(chapter):
+            chapters.append(chapter)
+            continue
+
+        try:
+            with open(full_path, "r", encoding="utf-8") as f:
+                chapter_content = f.read()
+        except UnicodeDecodeError:
+            with open(full_path, "r", encoding="gbk") as f:
+                chapter_content = f.read()
+        except OSError:
+            continue
+
+        store.put_text(chapter, chapter_content)
+        chapters.append(chapter)
+        imported += 1
+
+    store.sync_chapters(chapters)
+
+    for i, chapter in enumerate(chapters, 1):
+        dialogue_file = os.path.join("audio", book_id, "chapter", f"{i}.json")
+        if os.path.exists(dialogue_file) and not store.has_dialogues(chapter):
+            with open(dialogue_file, "r", encoding="utf-8") as f:
+                store.put_dialogues(chapter, json.load(f))
+
+    return imported
+
+
+def get_book_json(book_id: str):
+    """
+    按章节顺序获取指定book_id已下载正文的所有章节（来自书籍存储）
+
+    先导入旧版本按目录保存、书籍存储中还没有正文的章节文件
+    （没有指定书籍ID的下载只写入文件，之后下载的章节也在这里补录）
+
+    Args:
+        book_id (str): 小说ID，对应data目录下的子目录名
+    """
+    store = get_book_store(book_id)
+    imported = import_legacy_chapters(book_id)
+    if imported:
+        print(f"已导入 {imported} 个章节文件到书籍存储")
+
+    all_chapters = [c for c in store.list_chapters() if c["has_text"]]
+    if not all_chapters:
+        print(f"错误：书籍 '{book_id}' 没有已下载的章节")
+        return []
+
+    print(f"已成功读取 {len(all_chapters)} 个章节")
+    return all_chapters
+
+
+def dialogue_inputs(text_hash):
+    """章节对话分析结果的输入哈希：正文、提示词、模型和分块方式任一变化都需要重新分析"""
+    return inputs_hash(text_hash, prompt, MODEL, CHUNK_LINES)
+
+
+def find_stale_dialogues(book_id: str, chapters):
+    """
+    找出需要（重新）分析对话的章节
+
+    返回 [(章节, 输入哈希)]：没有对话分析结果的章节，以及生成结果时的输入与当前不一致的章节。
+    旧版本生成的结果没有构建记录，视为按当前输入生成并补录，避免整本书重新分析
+    """
+    store = get_book_store(book_id)
+    text_hashes = store.text_hashes()
+    recorded = store.artifact_hashes("dialogues:")
+
+    stale = []
+    adopted = []
+    for chapter in chapters:
+        expected = dialogue_inputs(text_hashes.get(chapter["chapter_id"]))
+        if not chapter["has_dialogues"]:
+            stale.append((chapter, expected))
+            continue
+
+        built = recorded.get(dialogues_artifact(chapter["chapter_id"]))
+        if built is None:
+            adopted.append((dialogues_artifact(chapter["chapter_id"]), expected))
+        elif built != expected:
+            stale.append((chapter, expected))
+
+    if adopted:
+        store.record_artifacts(adopted)
+    return stale
+
+
 def get_book_json_content(book_id: str):
     """
     读取指定book_id的所有小说章节内容，使用AI分析对话内容，
@@ -110,12 +234,14 @@ def get_book_json_content(book_id: str):
         book_id (str): 小说ID，对应data目录下的子目录名
     """
 
-    # 获取章节路径列表
+    # 获取章节列表
     chapters = get_book_json(book_id)
     if not chapters:
         print(f"错误: 未找到书籍 {book_id} 的章节")
         return
 
+    store = get_book_store(book_id)
+
     # 读取API密钥列表
     api_keys = []
     try:
@@ -129,21 +255,11 @@ def get_book_json_content(book_id: str):
         print("错误: 未找到有效的API密钥")
         return
 
-    # 确保输出目录存在
-    output_dir = os.path.join("audio", book_id, "chapter")
-    os.makedirs(output_dir, exist_ok=True)
-
     # 获取API基础URL
     api_base_url = os.getenv("GEMINI_API_URL")
 
-    # 准备任务
-    tasks = []
-    for i, chapter_path in enumerate(chapters, 1):  # 从1开始计数
-        output_path = os.path.join(output_dir, f"{i}.json")  # 使用简单的数字序号命名
-
-        # 如果文件不存在，添加到任务列表
-        if not os.path.exists(output_path):
-            tasks.append((chapter_path, output_path))
+    # 准备任务，已有对话分析结果且输入没有变化的章节直接跳过
+    tasks = find_stale_dialogues(book_id, chapters)
 
     # 如果所有任务都已完成，直接返回
     if not tasks:
@@ -174,33 +290,25 @@ def get_book_json_content(book_id: str):
             base_url=api_base_url,
         )
 
-        for chapter_path, output_path in assigned_tasks:
+        for chapter, expected in assigned_tasks:
+            chapter_title = chapter["chapter_title"]
+            artifact = dialogues_artifact(chapter["chapter_id"])
             try:
-                # 构建完整章节路径
-                full_path = os.path.join("data", chapter_path)
-
-                # 读取章节内容
-                try:
-                    with open(full_path, "r", encoding="utf-8") as f:
-                        chapter_content = f.read()
-                except UnicodeDecodeError:
-                    with open(full_path, "r", encoding="gbk") as f:
-                        chapter_content = f.read()
-                # 如果 output_path 文件 已经存在 则跳过
-                if os.path.exists(output_path):
-                    print(f"章节 {chapter_path} 已经存在，跳过")
-                    pass
+                # 如果对话分析结果已经按当前输入生成（例如另一个进程），则跳过
+                if store.artifact_hashes(artifact).get(artifact) == expected:
+                    print(f"章节 {chapter_title} 已经存在，跳过")
                 else:
+                    # 从书籍存储读取章节内容
+                    chapter_content = store.get_text(chapter["chapter_id"])
+
                     # 使用AI分析章节内容
                     result = generate_board_json_with_client(client, chapter_content)
 
                     # 保存结果
                     if result:
-                        # 确保目录存在
-                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-                        with open(output_path, "w", encoding="utf-8") as f:
-                            json.dump(result, f, ensure_ascii=False, indent=4)
+                        store.put_dialogues(
+                            chapter["chapter_id"], result, inputs=expected
+                        )
 
                 # 更新进度
                 with lock:
@@ -208,7 +316,7 @@ def get_book_json_content(book_id: str):
                     pbar.update(1)
 
             except Exception as e:
-                print(f"处理章节 {chapter_path} 时出错: {str(e)}")
+                print(f"处理章节 {chapter_title} 时出错: {str(e)}")
 
             # 添加短暂延迟，避免API速率限制
             time.sleep(1)
@@ -220,10 +328,12 @@ def get_book_json_content(book_id: str):
         # 将文本按行分割
         lines = chapter_content.split("\n")
 
-        # 检查是否超过100行
-        if len(lines) > 50:
-            # 分割成每块100行
-            chunks = [lines[i : i + 50] for i in range(0, len(lines), 50)]
+        # 检查是否超过分块行数
+        if len(lines) > CHUNK_LINES:
+            # 按分块行数分割
+            chunks = [
+                lines[i : i + CHUNK_LINES] for i in range(0, len(lines), CHUNK_LINES)
+            ]
             all_results = []
 
             print(f"文本过长，已分割为{len(chunks)}个块进行处理")
@@ -258,7 +368,7 @@ def get_book_json_content(book_id: str):
         for attempt in range(max_retries):
             try:
                 response = client.chat.completions.create(
-                    model="gemini-2.0-flash",
+                    model=MODEL,
                     messages=[
                         {"role": "system", "content": prompt},
                         {"role": "user", "content": content},
@@ -311,7 +421,7 @@ def get_book_json_content(book_id: str):
 
 def check_json_conversion_status(book_id: str):
     """
-    检查指定book_id的小说章节是否都已转换为JSON文件。
+    检查指定book_id的小说章节是否都已完成对话分析。
 
     Args:
         book_id (str): 小说ID，对应data目录下的子目录名
@@ -319,26 +429,21 @@ def check_json_conversion_status(book_id: str):
     Returns:
         tuple: (总章节数, 已转换章节数, 缺失章节列表)
     """
-    # 获取章节路径列表
+    # 获取章节列表
     chapters = get_book_json(book_id)
     if not chapters:
         print(f"错误: 未找到书籍 {book_id} 的章节")
         return 0, 0, []
 
-    # 定义输出目录
-    output_dir = os.path.join("audio", book_id, "chapter")
-
-    # 检查每个章节对应的JSON文件
+    # 检查每个章节是否已有对话分析结果
     converted_chapters = 0
     missing_chapters = []
 
-    for i, chapter_path in enumerate(chapters, 1):  # 从1开始计数
-        output_path = os.path.join(output_dir, f"{i}.json")  # 使用简单的数字序号命名
-
-        if os.path.exists(output_path):
+    for i, chapter in enumerate(chapters, 1):  # 从1开始计数
+        if chapter["has_dialogues"]:
             converted_chapters += 1
         else:
-            missing_chapters.append((i, chapter_path))
+            missing_chapters.append((i, chapter["chapter_title"]))
 
     # 输出统计信息
     total_chapters = len(chapters)
@@ -353,14 +458,28 @@ def check_json_conversion_status(book_id: str):
 
     if missing_chapters:
         print("\n缺失的章节:")
-        for chapter_num, chapter_path in missing_chapters:
-            print(f"  章节 {chapter_num}: {chapter_path}")
+        for chapter_num, chapter_title in missing_chapters:
+            print(f"  章节 {chapter_num}: {chapter_title}")
 
     return total_chapters, converted_chapters, missing_chapters
 
 
+def export_dialogues_json(book_id: str, output_dir: str = None):
+    """
+    把书籍存储中的对话分析结果导出为便于阅读的JSON文件
+
+    默认导出到 audio/{book_id}/export/chapter/{序号}.json
+    """
+    if output_dir is None:
+        output_dir = os.path.join("audio", book_id, "export", "chapter")
+    count = get_book_store(book_id).export_dialogues_json(output_dir)
+    print(f"已导出 {count} 个章节的对话分析结果到: {output_dir}")
+    return count
+
+
 if __name__ == "__main__":
     # 可以在这里指定book_id
     book_id = "115690"
     get_book_json_content(book_id)
     # check_json_conversion_status(book_id)
+    # export_dialogues_json(book_id)
@@ -1,11 +1,12 @@
 import json
-import requests
 import os
-import time
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 import threading
+from file_utils import atomic_write_text, CrawlJournal
+from site_profiles import get_registry, profile_for
+from book_store import get_book_store
 
 
 def load_json(json_file):
@@ -18,42 +19,30 @@ def load_json(json_file):
         return []
 
 
-def fetch_html(url, timeout=10, retry=3):
-    """获取URL的HTML内容，带有重试机制"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    }
+def fetch_html(url, timeout=None, retry=None):
+    """获取URL的HTML内容，限速、重试和请求头由站点配置决定"""
+    response = profile_for(url).get(url, timeout=timeout, retries=retry)
+    response.raise_for_status()
+    return response.text
 
-    for i in range(retry):
-        try:
-            response = requests.get(url, headers=headers, timeout=timeout)
-            response.raise_for_status()
-            return response.text
-        except Exception as e:
-            if i == retry - 1:  # 最后一次重试
-                raise e
-            time.sleep(1)  # 重试前等待1秒
 
-
-def parse_html(html):
-    """解析HTML内容，提取<div class="content">下的所有<p>标签的文本"""
+def parse_html(html, url=""):
+    """解析HTML内容，提取站点配置中正文区域下所有段落的文本"""
     soup = BeautifulSoup(html, "html.parser")
-    content_div = soup.find("div", class_="content")
+    profile = profile_for(url)
+    content_div = profile.select_one("content", soup)
 
     if not content_div:
         return []
 
-    paragraphs = content_div.find_all("p")
+    paragraphs = profile.select("paragraph", content_div)
     return [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
 
 
 def save_content(content, save_path):
-    """保存内容到文件"""
+    """保存内容到文件（先写临时文件再重命名，避免留下半截章节）"""
     try:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(content))
+        atomic_write_text(save_path, "\n".join(content))
         return True
     except Exception as e:
         print(f"错误: 保存文件出错: {save_path}, {e}")
@@ -78,23 +67,27 @@ def get_file_path(chapter, save_dir, index):
         return os.path.join(save_dir, filename)
 
 
-def process_chapter(chapter, save_dir, index):
-    """处理单个章节"""
+def process_chapter(chapter, save_dir, index, journal=None, store=None):
+    """处理单个章节，指定书籍存储时同时写入正文（正文变化会使下游的对话分析结果过期）"""
     url = chapter["chapter_url"]
     title = chapter["chapter_title"]
 
     # 获取文件保存路径
     save_path = get_file_path(chapter, save_dir, index)
 
-    # 检查文件是否已存在，如果存在则跳过
-    if os.path.exists(save_path) and os.path.getsize(save_path) > 0:
+    # 检查文件是否已完整下载，如果是则跳过
+    if is_chapter_complete(url, save_path, journal):
         return True
 
     try:
         html = fetch_html(url)
-        content = parse_html(html)
+        content = parse_html(html, url)
         if content:
             if save_content(content, save_path):
+                if journal:
+                    journal.record(url, save_path, "\n".join(content))
+                if store:
+                    store.put_text(chapter, "\n".join(content))
                 return True
             else:
                 return False
@@ -104,12 +97,32 @@ def process_chapter(chapter, save_dir, index):
     except Exception as e:
         print(f"错误: 处理章节出错: {title}, {url}, {e}")
         return False
-    finally:
-        # 每次请求后等待0.2秒
-        time.sleep(0.2)
 
 
-def download_novel(json_file, save_dir, max_workers=10):
+def is_chapter_complete(url, save_path, journal=None):
+    """判断章节文件是否已完整下载，有抓取日志时以日志为准"""
+    if journal:
+        return journal.is_complete(url, save_path)
+    return os.path.exists(save_path) and os.path.getsize(save_path) > 0
+
+
+def import_legacy_files(journal, chapters, save_dir):
+    """补录旧版本下载、没有抓取日志记录的章节文件，返回补录的章节数"""
+    imported = 0
+    for index, chapter in enumerate(chapters):
+        save_path = get_file_path(chapter, save_dir, index)
+        if journal.import_legacy(chapter["chapter_url"], save_path):
+            imported += 1
+    return imported
+
+
+def download_novel(
+    json_file,
+    save_dir,
+    max_workers=10,
+    journal_mode=CrawlJournal.TRUST,
+    book_id=None,
+):
     """
     下载小说内容的主函数
 
@@ -117,16 +130,28 @@ def download_novel(json_file, save_dir, max_workers=10):
         json_file: JSON文件路径
         save_dir: 保存内容的目录
         max_workers: 最大线程数
+        journal_mode: 抓取日志校验模式，trust 只比对长度，verify 比对内容哈希
+        book_id: 书籍ID，指定时新下载的正文同时写入书籍存储，
+            重新下载后内容变化的章节在下次对话分析时会被重新分析
     """
     # 确保保存目录存在
     os.makedirs(save_dir, exist_ok=True)
 
+    # 抓取日志，记录已抓取URL的内容哈希和长度，用于断点续传
+    journal = CrawlJournal(os.path.join(save_dir, "crawl_journal.jsonl"), journal_mode)
+    store = get_book_store(book_id) if book_id else None
+
     # 加载JSON数据
     chapters = load_json(json_file)
     if not chapters:
         print(f"错误: 未加载到章节数据或章节为空: {json_file}")
         return
 
+    # 旧版本下载的文件先补录到抓取日志，之后只按日志判断是否完整
+    imported = import_legacy_files(journal, chapters, save_dir)
+    if imported:
+        print(f"补录旧版本下载的章节文件: {imported} 个")
+
     # 创建进度条
     pbar = tqdm(total=len(chapters), desc="下载进度")
 
@@ -142,7 +167,7 @@ def download_novel(json_file, save_dir, max_workers=10):
 
         # 检查文件是否已存在
         save_path = get_file_path(chapter, save_dir, index)
-        already_exists = os.path.exists(save_path) and os.path.getsize(save_path) > 0
+        already_exists = is_chapter_complete(chapter["chapter_url"], save_path, journal)
 
         if already_exists:
             with lock:
@@ -150,7 +175,7 @@ def download_novel(json_file, save_dir, max_workers=10):
                 pbar.update(1)
             return True
 
-        result = process_chapter(chapter, save_dir, index)
+        result = process_chapter(chapter, save_dir, index, journal, store)
         with lock:
             if result:
                 success_count += 1
@@ -177,6 +202,9 @@ def download_novel(json_file, save_dir, max_workers=10):
                     fail_count += 1
 
     pbar.close()
+    journal.compact()
+    # 保存本次下载中调优后的站点参数
+    get_registry().save()
 
     # 只在有错误时打印汇总信息
     if fail_count > 0:
@@ -189,7 +217,8 @@ def download_novel(json_file, save_dir, max_workers=10):
 
 # 如果直接运行脚本，支持命令行参数
 if __name__ == "__main__":
+    book_id = "115690"
     json_path = os.path.join(os.getcwd(), "data/xszj.json")
-    save_path = os.path.join(os.getcwd(), "data/115690/")
-    # 调用下载函数
-    download_novel(json_path, save_path, max_workers=5)
+    save_path = os.path.join(os.getcwd(), f"data/{book_id}/")
+    # 调用下载函数，正文同时写入书籍存储
+    download_novel(json_path, save_path, max_workers=5, book_id=book_id)
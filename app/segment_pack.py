@@ -0,0 +1,233 @@
+"""
+章节音频片段打包存储
+
+每个章节的片段不再各自保存为一个小文件，而是追加写入同一个数据文件 {base}.pack，
+并在索引文件 {base}.idx 中追加一行 JSON 记录：
+    {"index": 片段序号, "offset": 偏移, "length": 长度, "hash": 输入哈希, "duration": 时长(秒)}
+同一片段以最后一条记录为准，删除片段时追加 {"index": 片段序号, "deleted": true}。
+
+续传和拼接都只读取索引，不需要对大量小文件做 stat / open。
+数据先写入并落盘后再写索引，中断时残留的半行索引或越界记录在加载时丢弃并重写索引。
+被覆盖或删除的片段占用的空间在 compact() 时回收。
+"""
+
+import os
+import json
+import threading
+
+from chapter_assembler import frames_duration
+
+# 失效数据超过数据文件的该比例时压缩
+COMPACT_RATIO = 0.5
+
+
+class SegmentPack:
+    """单个章节的片段包，可以在多个线程中并发追加和读取"""
+
+    def __init__(self, base_path):
+        self.pack_path = f"{base_path}.pack"
+        self.index_path = f"{base_path}.idx"
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._data = None
+        self._index = None
+        self._reader = None
+        os.makedirs(os.path.dirname(self.pack_path) or ".", exist_ok=True)
+        self._recover()
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recover(self):
+        """处理压缩过程中断留下的临时文件"""
+        pack_tmp = f"{self.pack_path}.tmp"
+        index_tmp = f"{self.index_path}.tmp"
+        if os.path.exists(pack_tmp):
+            # 数据文件还没有替换，压缩未生效
+            os.remove(pack_tmp)
+            if os.path.exists(index_tmp):
+                os.remove(index_tmp)
+        elif os.path.exists(index_tmp):
+            # 数据文件已经替换，补完索引文件的替换
+            os.replace(index_tmp, self.index_path)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+
+        repaired = False
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    repaired = True
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    repaired = True
+                    continue
+                index = entry.get("index")
+                if index is None:
+                    continue
+                if entry.get("deleted"):
+                    self.entries.pop(index, None)
+                elif entry.get("offset", size) + entry.get("length", 0) <= size:
+                    self.entries[index] = entry
+                else:
+                    repaired = True
+
+        if repaired:
+            # 丢弃半行和越界的记录后重写索引：之后追加的记录不会接在半行后面，
+            # 数据文件增长后越界记录的偏移也不会重新变得“有效”
+            index_tmp = f"{self.index_path}.tmp"
+            self._write_index_file(index_tmp, self.entries.values())
+            os.replace(index_tmp, self.index_path)
+
+    def _open(self):
+        if self._data is None:
+            self._data = open(self.pack_path, "ab")
+            self._index = open(self.index_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _write_index_file(path, entries):
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_index(self, entries):
+        self._index.write(
+            "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        )
+        self._index.flush()
+
+    def get(self, index):
+        """片段的索引记录，不存在时返回None"""
+        return self.entries.get(index)
+
+    def is_current(self, index, digest):
+        """片段是否存在且按指定输入生成"""
+        entry = self.entries.get(index)
+        return entry is not None and entry.get("hash") == digest
+
+    def append(self, index, data, digest):
+        """追加一个片段（MP3帧数据），同序号的旧片段失效"""
+        with self.lock:
+            self._open()
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+            os.fsync(self._data.fileno())
+
+            entry = {
+                "index": index,
+                "offset": offset,
+                "length": len(data),
+                "hash": digest,
+                "duration": round(frames_duration(data), 3),
+            }
+            self._write_index([entry])
+            self.entries[index] = entry
+            return entry
+
+    def read(self, index):
+        """读取片段数据，不存在时返回None"""
+        entry = self.entries.get(index)
+        if entry is None:
+            return None
+        with self.lock:
+            if self._reader is None:
+                self._reader = open(self.pack_path, "rb")
+            self._reader.seek(entry["offset"])
+            return self._reader.read(entry["length"])
+
+    def discard(self, indices):
+        """删除片段，返回实际删除的片段数"""
+        with self.lock:
+            removed = [index for index in indices if index in self.entries]
+            if removed:
+                self._open()
+                self._write_index(
+                    [{"index": index, "deleted": True} for index in removed]
+                )
+                for index in removed:
+                    del self.entries[index]
+            return len(removed)
+
+    def live_bytes(self):
+        return sum(entry["length"] for entry in self.entries.values())
+
+    def total_bytes(self):
+        if not os.path.exists(self.pack_path):
+            return 0
+        return os.path.getsize(self.pack_path)
+
+    def duration(self):
+        """全部片段的总时长（秒）"""
+        return sum(entry.get("duration", 0) for entry in self.entries.values())
+
+    def compact(self, force=False):
+        """
+        回收被覆盖和删除的片段占用的空间
+
+        失效数据不超过 COMPACT_RATIO 时跳过（force 为True时总是压缩），返回是否执行了压缩
+        """
+        total = self.total_bytes()
+        if not total or (
+            not force and total - self.live_bytes() <= total * COMPACT_RATIO
+        ):
+            return False
+
+        with self.lock:
+            self._close_files()
+            pack_tmp = f"{self.pack_path}.tmp"
+            index_tmp = f"{self.index_path}.tmp"
+            entries = {}
+            with open(self.pack_path, "rb") as source, open(pack_tmp, "wb") as target:
+                for index in sorted(self.entries):
+                    entry = self.entries[index]
+                    source.seek(entry["offset"])
+                    data = source.read(entry["length"])
+                    entries[index] = dict(entry, offset=target.tell())
+                    target.write(data)
+                target.flush()
+                os.fsync(target.fileno())
+
+            self._write_index_file(index_tmp, entries.values())
+
+            # 先替换数据文件再替换索引，中断时由 _recover 补完
+            os.replace(pack_tmp, self.pack_path)
+            os.replace(index_tmp, self.index_path)
+            self.entries = entries
+            return True
+
+    def remove(self):
+        """删除片段包的全部文件"""
+        with self.lock:
+            self._close_files()
+            for path in (self.pack_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.entries = {}
+
+    def _close_files(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = None
+            self._index = None
+
+    def close(self):
+        with self.lock:
+            self._close_files()
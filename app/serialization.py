@@ -0,0 +1,223 @@
+"""
+数据序列化层
+
+章节对话分析结果默认以紧凑的二进制格式保存，需要给人查看时再导出为JSON。
+编码结果带格式头，读取时自动识别编码方式，旧的JSON数据可以直接读取。
+
+对话列表的二进制格式（列式，小端）：
+    MAGIC(4) 编码ID(1) 条数(u32) 角色数(u32) 性别数(u32)
+    角色名表、性别表：长度(u32) + 以 \\x1f 分隔的UTF-8文本
+    角色索引列(u32 × 条数)、性别索引列(u8 × 条数)
+    对话正文：长度(u32) + 以 \\x1f 分隔的UTF-8文本
+
+只统计角色时读到索引列为止，不需要解码对话正文。
+"""
+
+import sys
+import json
+import struct
+from array import array
+
+# 二进制格式头，JSON数据不会以 \x00 开头
+MAGIC = b"\x00AAB"
+
+# 字符串表的分隔符（ASCII 单元分隔符）
+SEPARATOR = "\x1f"
+
+# 4字节无符号整数的数组类型
+INDEX_TYPECODE = "I" if array("I").itemsize == 4 else "L"
+
+_COUNT = struct.Struct("<I")
+_HEADER = struct.Struct("<BIII")
+
+
+class JsonCodec:
+    """JSON编码，用于导出给人查看以及二进制格式不支持的数据"""
+
+    name = "json"
+    codec_id = None
+
+    def __init__(self, indent=None):
+        self.indent = indent
+
+    def supports(self, obj):
+        return True
+
+    def dumps(self, obj):
+        if self.indent:
+            text = json.dumps(obj, ensure_ascii=False, indent=self.indent)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        return text.encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class DialogueCodec:
+    """
+    对话列表的列式二进制编码
+
+    只支持由 type / sex / text 三个字符串字段组成的对话列表，
+    角色名和性别各自去重后以索引保存
+    """
+
+    name = "dialogue"
+    codec_id = 1
+    fields = ("type", "sex", "text")
+
+    def supports(self, obj):
+        if not isinstance(obj, list):
+            return False
+        for item in obj:
+            if not isinstance(item, dict) or len(item) != 3:
+                return False
+            for field in self.fields:
+                value = item.get(field)
+                if not isinstance(value, str) or SEPARATOR in value:
+                    return False
+        return True
+
+    def dumps(self, dialogues):
+        speakers = {}
+        sexes = {}
+        speaker_column = array(INDEX_TYPECODE)
+        sex_column = array("B")
+        texts = []
+        for item in dialogues:
+            speaker_column.append(speakers.setdefault(item["type"], len(speakers)))
+            sex_column.append(sexes.setdefault(item["sex"], len(sexes)))
+            texts.append(item["text"])
+
+        if len(sexes) > 255:
+            raise ValueError("性别取值过多，无法使用对话二进制编码")
+        if sys.byteorder != "little":
+            speaker_column.byteswap()
+
+        parts = [
+            MAGIC,
+            _HEADER.pack(self.codec_id, len(texts), len(speakers), len(sexes)),
+        ]
+        for strings in (list(speakers), list(sexes)):
+            parts.extend(_pack_strings(strings))
+        parts.append(speaker_column.tobytes())
+        parts.append(sex_column.tobytes())
+        parts.extend(_pack_strings(texts))
+        return b"".join(parts)
+
+    def read_columns(self, data):
+        """
+        读取角色名表、性别表和两个索引列
+
+        返回 (条数, 角色名列表, 性别列表, 角色索引列, 性别索引列, 正文所在偏移)
+        """
+        view = memoryview(data)
+        offset = len(MAGIC)
+        _, count, speaker_count, sex_count = _HEADER.unpack_from(view, offset)
+        offset += _HEADER.size
+
+        speakers, offset = _unpack_strings(view, offset, speaker_count)
+        sexes, offset = _unpack_strings(view, offset, sex_count)
+
+        speaker_column = array(INDEX_TYPECODE)
+        speaker_column.frombytes(view[offset : offset + count * 4])
+        if sys.byteorder != "little":
+            speaker_column.byteswap()
+        offset += count * 4
+
+        sex_column = array("B")
+        sex_column.frombytes(view[offset : offset + count])
+        offset += count
+
+        return count, speakers, sexes, speaker_column, sex_column, offset
+
+    def loads(self, data):
+        count, speakers, sexes, speaker_column, sex_column, offset = self.read_columns(
+            data
+        )
+        texts, _ = _unpack_strings(memoryview(data), offset, count)
+        return [
+            {"type": speakers[s], "sex": sexes[x], "text": text}
+            for s, x, text in zip(speaker_column, sex_column, texts)
+        ]
+
+    def speakers(self, data):
+        """只解码角色列，返回 [(角色名, 性别)]"""
+        _, speakers, sexes, speaker_column, sex_column, _ = self.read_columns(data)
+        return [(speakers[s], sexes[x]) for s, x in zip(speaker_column, sex_column)]
+
+
+def _pack_strings(strings):
+    blob = SEPARATOR.join(strings).encode("utf-8")
+    return [_COUNT.pack(len(blob)), blob]
+
+
+def _unpack_strings(view, offset, count):
+    (length,) = _COUNT.unpack_from(view, offset)
+    offset += _COUNT.size
+    if not count:
+        return [], offset + length
+    text = str(view[offset : offset + length], "utf-8")
+    return text.split(SEPARATOR), offset + length
+
+
+CODECS = {}
+CODECS_BY_ID = {}
+
+
+def register_codec(codec):
+    """注册编码方式，codec_id 用于在二进制数据的格式头中标识编码"""
+    CODECS[codec.name] = codec
+    if codec.codec_id is not None:
+        CODECS_BY_ID[codec.codec_id] = codec
+
+
+register_codec(JsonCodec())
+register_codec(DialogueCodec())
+
+# 对话分析结果默认使用的编码
+DEFAULT_CODEC = "dialogue"
+
+
+def dumps(obj, codec=DEFAULT_CODEC):
+    """编码数据，指定的编码不支持该数据时使用紧凑JSON"""
+    encoder = CODECS[codec]
+    if not encoder.supports(obj):
+        encoder = CODECS["json"]
+    return encoder.dumps(obj)
+
+
+def loads(data):
+    """解码数据，根据格式头自动识别编码方式（兼容JSON文本）"""
+    if isinstance(data, str):
+        return json.loads(data)
+    if bytes(data[: len(MAGIC)]) == MAGIC:
+        return CODECS_BY_ID[data[len(MAGIC)]].loads(data)
+    return json.loads(data)
+
+
+def speakers(data):
+    """
+    读取对话列表中每条对话的 (角色名, 性别)
+
+    二进制数据只解码角色列，JSON数据完整解析后提取。
+    非字典的条目返回 ("", "") 占位，保证结果下标与对话在列表中的下标（片段序号）一致
+    """
+    if not isinstance(data, str) and bytes(data[: len(MAGIC)]) == MAGIC:
+        codec = CODECS_BY_ID[data[len(MAGIC)]]
+        if hasattr(codec, "speakers"):
+            return codec.speakers(data)
+
+    return [
+        (
+            (item.get("type", ""), item.get("sex", ""))
+            if isinstance(item, dict)
+            else ("", "")
+        )
+        for item in loads(data)
+    ]
+
+
+def to_json(obj, indent=4):
+    """转换为便于阅读的JSON文本，用于导出"""
+    return json.dumps(obj, ensure_ascii=False, indent=indent)
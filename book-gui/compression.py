@@ -0,0 +1,106 @@
+"""
+压缩模块，使用按书训练的预置字典压缩章节正文和对话分析结果
+
+同一本书的章节之间人名、地名、常用句式和对话结果的JSON结构大量重复，
+单个章节单独压缩时这些重复无法利用。这里从书中抽样统计高频片段生成预置字典
+（zlib 的 zdict，最大32KB），压缩和解压时都使用同一份字典。
+"""
+
+import json
+import zlib
+from collections import Counter
+
+# zlib 滑动窗口大小，预置字典超过该长度的部分不会被使用
+DICTIONARY_SIZE = 32 * 1024
+
+# 统计高频片段使用的字符长度
+NGRAM_LENGTH = 8
+
+# 最多使用的候选片段数
+MAX_CANDIDATES = 4096
+
+CODEC = "zlib"
+
+# 段落列表的格式头，之后是JSON数组。旧格式是以换行连接的段落，不会以 \x00 开头
+PARAGRAPHS_PREFIX = "\x00"
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE, ngram=NGRAM_LENGTH):
+    """
+    从样本文本中训练预置字典
+
+    统计样本中出现两次以上的定长片段，按 出现次数 × 长度 排序后拼接，
+    最常用的片段放在字典末尾（距离待压缩数据最近，编码最短）。
+    样本太少没有重复片段时返回 None。
+    """
+    counter = Counter()
+    for sample in samples:
+        for i in range(len(sample) - ngram + 1):
+            counter[sample[i : i + ngram]] += 1
+
+    candidates = [
+        fragment for fragment, count in counter.most_common(MAX_CANDIDATES) if count > 1
+    ]
+    if not candidates:
+        return None
+
+    # 从最常用的开始挑选，跳过已包含在字典中的片段
+    pieces = []
+    total = 0
+    joined = ""
+    for fragment in candidates:
+        if fragment in joined:
+            continue
+        data_size = len(fragment.encode("utf-8"))
+        if total + data_size > size:
+            break
+        pieces.append(fragment)
+        total += data_size
+        joined += fragment
+
+    pieces.reverse()
+    return "".join(pieces).encode("utf-8")
+
+
+def compress(data, zdict=None, level=9):
+    """压缩字节数据"""
+    if zdict:
+        compressor = zlib.compressobj(level, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, zdict=None):
+    """解压字节数据，zdict 必须与压缩时相同"""
+    if zdict:
+        decompressor = zlib.decompressobj(zdict=zdict)
+    else:
+        decompressor = zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def encode_paragraphs(paragraphs):
+    """章节段落列表转换为字节数据（JSON数组，段落中包含换行也能原样还原）"""
+    text = json.dumps(paragraphs or [], ensure_ascii=False, separators=(",", ":"))
+    return (PARAGRAPHS_PREFIX + text).encode("utf-8")
+
+
+def decode_paragraphs(data):
+    """字节数据转换为章节段落列表，兼容以换行连接的旧格式"""
+    text = data.decode("utf-8")
+    if text.startswith(PARAGRAPHS_PREFIX):
+        return json.loads(text[len(PARAGRAPHS_PREFIX) :])
+    return text.split("\n") if text else []
+
+
+def encode_dialogues(dialogues):
+    """对话分析结果转换为紧凑的JSON字节数据"""
+    return json.dumps(
+        dialogues or [], ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def decode_dialogues(data):
+    """字节数据转换为对话分析结果"""
+    return json.loads(data.decode("utf-8")) if data else []
@@ -2,13 +2,13 @@
 爬虫核心模块，处理网络请求和数据解析
 """
 
-import time
 import threading
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from site_profiles import get_registry
 
 
 class NovelCrawler:
@@ -17,17 +17,14 @@ class NovelCrawler:
     def __init__(self):
         """初始化爬虫类"""
         self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-        )
+        # 站点配置注册表，提供选择器、请求头以及限速重试参数
+        self.registry = get_registry()
 
     def fetch_options_from_url(self, url, callback=None):
         """从URL获取选项列表"""
         try:
-            response = self.session.get(url)
-            response.encoding = "utf-8"
+            profile = self.registry.profile_for(url)
+            response = profile.get(url, session=self.session)
 
             if response.status_code != 200:
                 if callback:
@@ -35,16 +32,14 @@ class NovelCrawler:
                 return None
 
             soup = BeautifulSoup(response.text, "html.parser")
-            select_element = soup.find(
-                "select", attrs={"onchange": "location.href=this.value"}
-            )
+            select_element = profile.select_one("toc_select", soup)
 
             if not select_element:
                 if callback:
                     callback("错误: 未找到指定的select元素")
                 return None
 
-            options = select_element.find_all("option")
+            options = profile.select("toc_option", select_element)
             result = []
 
             for option in options:
@@ -84,8 +79,8 @@ class NovelCrawler:
             callback(f"正在处理: {text} - {url}")
 
         try:
-            response = self.session.get(url)
-            response.encoding = "utf-8"
+            profile = self.registry.profile_for(url)
+            response = profile.get(url, session=self.session)
 
             if response.status_code != 200:
                 if callback:
@@ -93,39 +88,36 @@ class NovelCrawler:
                 return []
 
             soup = BeautifulSoup(response.text, "html.parser")
-            ul_element = soup.find("ul", class_="read")
+            ul_element = profile.select_one("chapter_list", soup)
 
             if not ul_element:
                 if callback:
                     callback("错误: 未找到指定的ul元素")
                 return []
 
-            li_elements = ul_element.find_all("li")
             new_chapters = []
 
-            for li in li_elements:
-                a_tag = li.find("a")
-                if a_tag:
-                    href = a_tag.get("href")
-                    title = a_tag.text.strip()
+            for a_tag in profile.select("chapter_link", ul_element):
+                href = a_tag.get("href")
+                title = a_tag.text.strip()
 
-                    if href and not href.startswith(("http://", "https://")):
-                        href = urljoin(url, href)
+                if href and not href.startswith(("http://", "https://")):
+                    href = urljoin(url, href)
 
-                    chapter = {
-                        "chapter_url": href,
-                        "chapter_title": title,
-                        "group": text,
-                    }
+                chapter = {
+                    "chapter_url": href,
+                    "chapter_title": title,
+                    "group": text,
+                }
 
-                    # 检查章节是否已存在
-                    if not self.is_chapter_exists(chapter, existing_chapters):
-                        new_chapters.append(chapter)
-                        if callback:
-                            callback(f"新章节: {title}")
-                    else:
-                        if callback:
-                            callback(f"跳过已存在章节: {title}")
+                # 检查章节是否已存在
+                if not self.is_chapter_exists(chapter, existing_chapters):
+                    new_chapters.append(chapter)
+                    if callback:
+                        callback(f"新章节: {title}")
+                else:
+                    if callback:
+                        callback(f"跳过已存在章节: {title}")
 
             return new_chapters
 
@@ -144,34 +136,31 @@ class NovelCrawler:
                 return True
         return False
 
-    def fetch_chapter_content(self, chapter_url, timeout=10, retry=3):
-        """获取章节内容"""
-        for i in range(retry):
-            try:
-                response = self.session.get(chapter_url, timeout=timeout)
-                response.encoding = "utf-8"
-                response.raise_for_status()
+    def fetch_chapter_content(self, chapter_url, timeout=None, retry=None):
+        """获取章节内容，限速和重试由站点配置决定"""
+        profile = self.registry.profile_for(chapter_url)
+        try:
+            response = profile.get(
+                chapter_url, session=self.session, timeout=timeout, retries=retry
+            )
+            response.raise_for_status()
+        except Exception as e:
+            return None, f"获取内容失败: {str(e)}"
 
-                # 解析HTML内容
-                soup = BeautifulSoup(response.text, "html.parser")
-                content_div = soup.find("div", class_="content")
+        # 解析HTML内容
+        soup = BeautifulSoup(response.text, "html.parser")
+        content_div = profile.select_one("content", soup)
 
-                if not content_div:
-                    return None, "未找到内容区域"
+        if not content_div:
+            return None, "未找到内容区域"
 
-                paragraphs = content_div.find_all("p")
-                content = [
-                    p.get_text().strip() for p in paragraphs if p.get_text().strip()
-                ]
+        paragraphs = profile.select("paragraph", content_div)
+        content = [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
 
-                # 计算总字数
-                word_count = sum(len(p) for p in content)
+        # 计算总字数
+        word_count = sum(len(p) for p in content)
 
-                return content, word_count
-            except Exception as e:
-                if i == retry - 1:  # 最后一次重试
-                    return None, f"获取内容失败: {str(e)}"
-                time.sleep(1)  # 重试前等待1秒
+        return content, word_count
 
     def download_chapters_content(self, chapters, callback=None, max_workers=5):
         """下载章节内容并统计字数"""
@@ -228,9 +217,6 @@ class NovelCrawler:
                                 f"获取失败: {chapter['chapter_title']} ({completed}/{total})"
                             )
 
-                # 每次请求后等待一小段时间，避免请求过快
-                time.sleep(0.2)
-
                 return chapter
 
             except Exception as e:
@@ -258,6 +244,9 @@ class NovelCrawler:
                     if callback:
                         callback(f"任务执行出错: {str(e)}")
 
+        # 保存本次下载中调优后的站点参数
+        self.registry.save()
+
         if callback:
             callback(f"内容获取完成，成功: {success_count}, 失败: {fail_count}")
 
@@ -266,8 +255,7 @@ class NovelCrawler:
     def extract_novel_info(self, url, callback=None):
         """从小说页面提取小说基本信息"""
         try:
-            response = self.session.get(url)
-            response.encoding = "utf-8"
+            response = self.registry.profile_for(url).get(url, session=self.session)
 
             if response.status_code != 200:
                 if callback:
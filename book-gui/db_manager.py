@@ -3,9 +3,39 @@
 """
 
 import time
+import hashlib
 from datetime import datetime
-from pymongo import MongoClient, UpdateOne
-from bson import ObjectId
+from pymongo import MongoClient, UpdateOne, ReplaceOne, ASCENDING
+from pymongo.errors import OperationFailure
+from bson import ObjectId, Binary
+import gridfs
+
+import compression
+from models import BookDialogues
+
+# 章节列表只需要的字段
+CHAPTER_SUMMARY_FIELDS = {"title": 1, "url": 1, "volume": 1, "word_count": 1}
+
+# 压缩后超过该大小的正文或对话存入GridFS（单个文档上限16MB）
+GRIDFS_THRESHOLD = 4 * 1024 * 1024
+
+# 训练字典时最多使用的样本章节数
+DICTIONARY_SAMPLE_CHAPTERS = 20
+
+# 训练字典至少需要的样本字节数，样本不足时先不使用字典压缩，
+# 避免用开头一两个章节训练出的字典固定用于整本书
+DICTIONARY_MIN_SAMPLE_BYTES = 64 * 1024
+
+# 正文和对话分析结果分别保存的集合
+BLOB_COLLECTIONS = {
+    "content": "chapter_contents",
+    "dialogues": "chapter_dialogues",
+}
+
+BLOB_ENCODERS = {
+    "content": (compression.encode_paragraphs, compression.decode_paragraphs),
+    "dialogues": (compression.encode_dialogues, compression.decode_dialogues),
+}
 
 
 class MongoDBManager:
@@ -17,6 +47,9 @@ class MongoDBManager:
         self.db = None
         self.connected = False
         self.last_config = None  # 保存最后一次的连接配置
+        self.last_batch_timings = []  # 最近一次批量保存章节的每批耗时（秒）
+        self.fs = None  # 存放超大正文/对话的GridFS
+        self.dictionaries = {}  # 已加载的压缩字典 {字典ID: 字典数据}
 
     def connect(self, connection_string, db_name):
         """连接到MongoDB数据库"""
@@ -30,12 +63,54 @@ class MongoDBManager:
             # 检查连接是否成功
             self.client.server_info()
             self.db = self.client[db_name]
+            self.fs = gridfs.GridFS(self.db, collection="chapter_blobs")
+            self.dictionaries = {}
             self.connected = True
+            self.ensure_indexes()
             return True, "连接成功"
         except Exception as e:
             self.connected = False
             return False, f"连接失败: {str(e)}"
 
+    def ensure_indexes(self):
+        """创建章节集合需要的索引（已存在时不会重复创建）"""
+        chapters_collection = self.db.chapters
+        try:
+            chapters_collection.create_index(
+                [("novel_id", ASCENDING), ("url", ASCENDING)],
+                unique=True,
+                name="novel_id_url",
+            )
+        except OperationFailure as e:
+            # 旧数据中存在重复章节时无法建立唯一索引，退回普通索引
+            print(f"创建章节唯一索引失败，改用普通索引: {str(e)}")
+            chapters_collection.create_index(
+                [("novel_id", ASCENDING), ("url", ASCENDING)],
+                name="novel_id_url_nonunique",
+            )
+
+        # 旧版本按 dialogues 字段建立的部分索引，对话迁移到独立集合后不再使用
+        try:
+            chapters_collection.drop_index("novel_id_has_dialogues")
+        except OperationFailure:
+            pass
+
+        # 只索引已有对话分析结果的章节，用于查询分析状态
+        chapters_collection.create_index(
+            [("novel_id", ASCENDING)],
+            partialFilterExpression={"dialogue_count": {"$gt": 0}},
+            name="novel_id_dialogue_count",
+        )
+
+        # 正文和对话集合以章节ID为主键，按小说ID删除
+        for collection_name in BLOB_COLLECTIONS.values():
+            self.db[collection_name].create_index(
+                [("novel_id", ASCENDING)], name="novel_id"
+            )
+        self.db.compression_dicts.create_index(
+            [("novel_id", ASCENDING), ("kind", ASCENDING)], name="novel_id_kind"
+        )
+
     def reconnect(self):
         """使用上次的配置重新连接"""
         if not self.last_config:
@@ -51,6 +126,8 @@ class MongoDBManager:
             self.client.close()
             self.client = None
             self.db = None
+            self.fs = None
+            self.dictionaries = {}
             self.connected = False
 
     def is_connected(self):
@@ -93,8 +170,17 @@ class MongoDBManager:
         except Exception as e:
             return False, None, f"保存小说信息失败: {str(e)}"
 
-    def save_chapters(self, novel_id, chapters):
-        """保存章节信息"""
+    def save_chapters(
+        self, novel_id, chapters, batch_size=500, ordered=False, callback=None
+    ):
+        """
+        批量保存章节信息
+
+        每个章节生成一个按 (novel_id, url) 插入的 upsert 操作，已有字数统计的章节
+        再加一个仅在字数变化时生效的更新操作，按批次通过 bulk_write 提交。
+        章节正文压缩后单独保存到 chapter_contents 集合，内容未变化的章节不会重写。
+        每批耗时记录在 last_batch_timings 中，并通过 callback 输出。
+        """
         if not self.is_connected():
             return False, "未连接到数据库"
 
@@ -103,7 +189,9 @@ class MongoDBManager:
             now = datetime.now()
             new_count = 0
             update_count = 0
+            self.last_batch_timings = []
 
+            operations = []
             for chapter in chapters:
                 # 添加小说ID和时间戳
                 chapter_data = {
@@ -112,38 +200,90 @@ class MongoDBManager:
                     "title": chapter.get("chapter_title", ""),
                     "url": chapter.get("chapter_url", ""),
                     "word_count": chapter.get("word_count", 0),  # 添加字数字段
-                    "content": chapter.get("content", []),  # 添加内容字段
                     "created_at": now,
                     "updated_at": now,
                 }
+                chapter_filter = {"novel_id": novel_id, "url": chapter_data["url"]}
 
-                # 检查章节是否已存在
-                existing_chapter = chapters_collection.find_one(
-                    {"novel_id": novel_id, "url": chapter_data["url"]}
+                # 章节不存在时插入
+                operations.append(
+                    UpdateOne(
+                        chapter_filter, {"$setOnInsert": chapter_data}, upsert=True
+                    )
                 )
 
-                if not existing_chapter:
-                    # 新增章节
-                    chapters_collection.insert_one(chapter_data)
-                    new_count += 1
-                elif "word_count" in chapter and chapter["word_count"] > 0:
-                    # 如果已存在但有新的字数统计，则更新
-                    if existing_chapter.get("word_count", 0) != chapter["word_count"]:
-                        chapters_collection.update_one(
-                            {"_id": existing_chapter["_id"]},
+                # 如果已存在但有新的字数统计，则更新
+                if "word_count" in chapter and chapter["word_count"] > 0:
+                    operations.append(
+                        UpdateOne(
+                            dict(
+                                chapter_filter,
+                                word_count={"$ne": chapter["word_count"]},
+                            ),
                             {
                                 "$set": {
                                     "word_count": chapter["word_count"],
-                                    "content": chapter.get(
-                                        "content", []
-                                    ),  # 添加内容更新
                                     "updated_at": now,
                                 }
                             },
                         )
-                        update_count += 1
+                    )
 
-            return True, f"已保存 {new_count} 个新章节，更新 {update_count} 个章节"
+            total_batches = (len(operations) + batch_size - 1) // batch_size
+            for batch_index in range(total_batches):
+                batch = operations[
+                    batch_index * batch_size : (batch_index + 1) * batch_size
+                ]
+
+                start_time = time.perf_counter()
+                result = chapters_collection.bulk_write(batch, ordered=ordered)
+                elapsed = time.perf_counter() - start_time
+
+                new_count += result.upserted_count
+                update_count += result.modified_count
+                self.last_batch_timings.append(elapsed)
+
+                if callback:
+                    callback(
+                        f"章节批次 {batch_index + 1}/{total_batches}: "
+                        f"{len(batch)} 个操作，耗时 {elapsed * 1000:.0f} 毫秒"
+                    )
+
+            # 压缩保存章节正文
+            contents = [
+                (chapter.get("chapter_url", ""), chapter["content"])
+                for chapter in chapters
+                if chapter.get("content")
+            ]
+            written = raw_size = stored_size = 0
+            if contents:
+                url_to_id = self.get_chapter_ids(novel_id, [url for url, _ in contents])
+                items = [
+                    (url_to_id[url], content)
+                    for url, content in contents
+                    if url in url_to_id
+                ]
+                for start in range(0, len(items), batch_size):
+                    start_time = time.perf_counter()
+                    batch_written, batch_raw, batch_stored = self.write_blobs(
+                        "content", novel_id, items[start : start + batch_size]
+                    )
+                    self.last_batch_timings.append(time.perf_counter() - start_time)
+                    written += batch_written
+                    raw_size += batch_raw
+                    stored_size += batch_stored
+
+            total_time = sum(self.last_batch_timings)
+            message = (
+                f"已保存 {new_count} 个新章节，更新 {update_count} 个章节"
+                f"（{total_batches} 批，耗时 {total_time:.2f} 秒）"
+            )
+            if written:
+                message += (
+                    f"，写入 {written} 个章节正文"
+                    f"（{raw_size} 字节压缩为 {stored_size} 字节）"
+                )
+            return True, message
 
         except Exception as e:
             return False, f"保存章节失败: {str(e)}"
@@ -154,21 +294,24 @@ class MongoDBManager:
             return False, "未连接到数据库"
 
         try:
-            # 更新章节记录，添加对话分析结果
-            result = self.db.chapters.update_one(
+            chapter = self.db.chapters.find_one({"_id": chapter_id}, {"novel_id": 1})
+            if not chapter:
+                return False, "未找到章节或无需更新"
+
+            # 对话分析结果压缩后单独保存，章节记录只保留对话数量
+            self.write_blobs(
+                "dialogues", chapter["novel_id"], [(chapter_id, dialogues)]
+            )
+            self.db.chapters.update_one(
                 {"_id": chapter_id},
                 {
                     "$set": {
-                        "dialogues": dialogues,
+                        "dialogue_count": len(dialogues),
                         "dialogue_updated_at": datetime.now(),
                     }
                 },
             )
-
-            if result.modified_count > 0:
-                return True, "对话分析结果已保存"
-            else:
-                return False, "未找到章节或无需更新"
+            return True, "对话分析结果已保存"
         except Exception as e:
             return False, f"保存对话分析结果失败: {str(e)}"
 
@@ -182,12 +325,25 @@ class MongoDBManager:
             update_operations = []
             now = datetime.now()
 
+            # 按小说分组，每本书使用自己的压缩字典
+            novel_ids = {
+                chapter["_id"]: chapter["novel_id"]
+                for chapter in chapters_collection.find(
+                    {"_id": {"$in": list(chapter_dialogue_map)}}, {"novel_id": 1}
+                )
+            }
+            items_by_novel = {}
             for chapter_id, dialogues in chapter_dialogue_map.items():
+                if chapter_id not in novel_ids:
+                    continue
+                items_by_novel.setdefault(novel_ids[chapter_id], []).append(
+                    (chapter_id, dialogues)
+                )
                 operation = UpdateOne(
                     filter={"_id": chapter_id},
                     update={
                         "$set": {
-                            "dialogues": dialogues,
+                            "dialogue_count": len(dialogues),
                             "dialogue_updated_at": now,
                         }
                     },
@@ -195,8 +351,20 @@ class MongoDBManager:
                 update_operations.append(operation)
 
             if update_operations:
+                raw_size = stored_size = 0
+                for novel_id, items in items_by_novel.items():
+                    _, batch_raw, batch_stored = self.write_blobs(
+                        "dialogues", novel_id, items
+                    )
+                    raw_size += batch_raw
+                    stored_size += batch_stored
+
                 result = chapters_collection.bulk_write(update_operations)
-                return True, f"已更新 {result.modified_count} 个章节的对话分析结果"
+                return (
+                    True,
+                    f"已更新 {result.modified_count} 个章节的对话分析结果"
+                    f"（{raw_size} 字节压缩为 {stored_size} 字节）",
+                )
             else:
                 return False, "没有需要更新的章节"
 
@@ -228,17 +396,508 @@ class MongoDBManager:
             return None
 
     def get_chapters(self, novel_id):
-        """获取指定小说的所有章节"""
+        """获取指定小说的所有章节（包含解压后的正文和对话分析结果）"""
         if not self.is_connected():
             return []
 
         try:
-            chapters_collection = self.db.chapters
-            return list(chapters_collection.find({"novel_id": ObjectId(novel_id)}))
+            return list(self.iter_chapters(novel_id))
         except Exception as e:
             print(f"获取章节列表失败: {str(e)}")
             return []
 
+    def iter_chapters(self, novel_id, batch_size=200, kinds=("content", "dialogues")):
+        """按保存顺序逐批读取完整章节，每批的正文和对话各用一次查询读取并解压"""
+        if not self.is_connected():
+            return
+
+        cursor = self.db.chapters.find(
+            {"novel_id": ObjectId(novel_id)},
+            sort=[("_id", ASCENDING)],
+            batch_size=batch_size,
+        )
+        batch = []
+        for chapter in cursor:
+            batch.append(chapter)
+            if len(batch) >= batch_size:
+                yield from self.attach_blobs(batch, kinds)
+                batch = []
+        if batch:
+            yield from self.attach_blobs(batch, kinds)
+
+    def iter_chapter_summaries(self, novel_id, batch_size=500):
+        """
+        按保存顺序逐批读取章节概要（标题、URL、分卷、字数、是否已有对话分析），
+        不传输正文和对话数据
+        """
+        if not self.is_connected():
+            return
+
+        pipeline = [
+            {"$match": {"novel_id": ObjectId(novel_id)}},
+            {"$sort": {"_id": ASCENDING}},
+            {
+                "$project": {
+                    "title": 1,
+                    "url": 1,
+                    "volume": 1,
+                    "word_count": 1,
+                    # 兼容对话结果仍内嵌在章节文档中的旧数据
+                    "has_dialogues": {
+                        "$or": [
+                            {"$gt": ["$dialogue_count", 0]},
+                            {"$gt": [{"$size": {"$ifNull": ["$dialogues", []]}}, 0]},
+                        ]
+                    },
+                }
+            },
+        ]
+        cursor = self.db.chapters.aggregate(pipeline, batchSize=batch_size)
+        for chapter in cursor:
+            yield chapter
+
+    def get_chapter_summaries(self, novel_id, skip=0, limit=None):
+        """分页获取章节概要"""
+        if not self.is_connected():
+            return []
+
+        try:
+            cursor = self.db.chapters.find(
+                {"novel_id": ObjectId(novel_id)},
+                CHAPTER_SUMMARY_FIELDS,
+                sort=[("_id", ASCENDING)],
+                skip=skip,
+                limit=limit or 0,
+            )
+            return list(cursor)
+        except Exception as e:
+            print(f"获取章节概要失败: {str(e)}")
+            return []
+
+    def get_analyzed_urls(self, novel_id):
+        """获取已有对话分析结果的章节URL集合（只读取url字段）"""
+        if not self.is_connected():
+            return set()
+
+        cursor = self.db.chapters.find(
+            {
+                "novel_id": ObjectId(novel_id),
+                "$or": [
+                    {"dialogue_count": {"$gt": 0}},
+                    {"dialogues": {"$exists": True, "$ne": []}},
+                ],
+            },
+            {"url": 1, "_id": 0},
+        )
+        return {chapter.get("url", "") for chapter in cursor}
+
+    def get_chapter_ids(self, novel_id, urls):
+        """根据章节URL获取章节ID {url: _id}"""
+        if not self.is_connected():
+            return {}
+
+        cursor = self.db.chapters.find(
+            {"novel_id": ObjectId(novel_id), "url": {"$in": list(urls)}},
+            {"url": 1},
+        )
+        return {
+            chapter["url"]: chapter["_id"] for chapter in cursor if "url" in chapter
+        }
+
+    def get_chapter_content(self, novel_id, url):
+        """按需获取单个章节的正文段落列表"""
+        if not self.is_connected():
+            return []
+
+        chapter = self.db.chapters.find_one(
+            {"novel_id": ObjectId(novel_id), "url": url}, {"content": 1}
+        )
+        if not chapter:
+            return []
+        return self.attach_blobs([chapter], ("content",))[0].get("content", [])
+
+    def get_chapter_dialogues(self, novel_id, url):
+        """按需获取单个章节的对话分析结果"""
+        if not self.is_connected():
+            return []
+
+        chapter = self.db.chapters.find_one(
+            {"novel_id": ObjectId(novel_id), "url": url}, {"dialogues": 1}
+        )
+        if not chapter:
+            return []
+        return self.attach_blobs([chapter], ("dialogues",))[0].get("dialogues", [])
+
+    def load_book_dialogues(self, novel_id, batch_size=200):
+        """
+        按章节顺序读取整本书的对话分析结果，返回以章节URL为键的 BookDialogues
+
+        每批章节的对话一次查询读取，解压后立即转为列式存储，不保留字典列表
+        """
+        book = BookDialogues()
+        if not self.is_connected():
+            return book
+
+        cursor = self.db.chapters.find(
+            {
+                "novel_id": ObjectId(novel_id),
+                "$or": [
+                    {"dialogue_count": {"$gt": 0}},
+                    {"dialogues": {"$exists": True, "$ne": []}},
+                ],
+            },
+            {"url": 1, "dialogues": 1},
+            sort=[("_id", ASCENDING)],
+            batch_size=batch_size,
+        )
+        batch = []
+        for chapter in cursor:
+            batch.append(chapter)
+            if len(batch) >= batch_size:
+                for item in self.attach_blobs(batch, ("dialogues",)):
+                    book.add_chapter(item.get("url", ""), item["dialogues"])
+                batch = []
+        for item in self.attach_blobs(batch, ("dialogues",)):
+            book.add_chapter(item.get("url", ""), item["dialogues"])
+        return book
+
+    # 压缩存储相关方法
+    def get_dictionary(self, dict_id):
+        """读取压缩字典（进程内缓存）"""
+        if dict_id is None:
+            return None
+
+        if dict_id not in self.dictionaries:
+            doc = self.db.compression_dicts.find_one({"_id": dict_id})
+            self.dictionaries[dict_id] = bytes(doc["data"]) if doc else None
+        return self.dictionaries[dict_id]
+
+    def latest_dictionary(self, novel_id, kind):
+        """小说最新的压缩字典文档，没有时返回None"""
+        return self.db.compression_dicts.find_one(
+            {"novel_id": novel_id, "kind": kind}, sort=[("_id", -1)]
+        )
+
+    def ensure_dictionary(self, novel_id, kind, samples):
+        """
+        获取小说的压缩字典，没有时用样本训练并保存
+
+        样本为本次写入的数据加上已保存但没有使用字典压缩的章节，
+        合计不足 DICTIONARY_MIN_SAMPLE_BYTES 时不训练。
+        字典保存后不再修改（已压缩的数据依赖它），需要时用 retrain_dictionary 换用新字典。
+        返回 (字典ID, 字典数据)，样本不足以训练时返回 (None, None)
+        """
+        doc = self.latest_dictionary(novel_id, kind)
+        if doc:
+            self.dictionaries[doc["_id"]] = bytes(doc["data"])
+            return doc["_id"], self.dictionaries[doc["_id"]]
+
+        samples = samples[:DICTIONARY_SAMPLE_CHAPTERS]
+        if len(samples) < DICTIONARY_SAMPLE_CHAPTERS:
+            stored = self.db[BLOB_COLLECTIONS[kind]].find(
+                {"novel_id": novel_id, "dict_id": None},
+                limit=DICTIONARY_SAMPLE_CHAPTERS - len(samples),
+            )
+            samples += [self.read_raw_blob(doc).decode("utf-8") for doc in stored]
+        return self.save_dictionary(novel_id, kind, samples)
+
+    def save_dictionary(self, novel_id, kind, samples):
+        """用样本训练并保存新的压缩字典，样本不足时返回 (None, None)"""
+        sample_bytes = sum(len(sample.encode("utf-8")) for sample in samples)
+        if sample_bytes < DICTIONARY_MIN_SAMPLE_BYTES:
+            return None, None
+        zdict = compression.train_dictionary(samples)
+        if not zdict:
+            return None, None
+
+        result = self.db.compression_dicts.insert_one(
+            {
+                "novel_id": novel_id,
+                "kind": kind,
+                "codec": compression.CODEC,
+                "data": Binary(zdict),
+                "sample_count": len(samples),
+                "created_at": datetime.now(),
+            }
+        )
+        self.dictionaries[result.inserted_id] = zdict
+        return result.inserted_id, zdict
+
+    def write_blobs(self, kind, novel_id, items):
+        """
+        压缩并保存一批章节正文或对话分析结果
+
+        items 为 [(章节ID, 数据)]，内容哈希未变化的章节跳过，
+        压缩后过大的数据存入GridFS。同时移除章节文档中内嵌的旧字段。
+        返回 (写入数量, 原始字节数, 压缩后字节数)
+        """
+        if not items:
+            return 0, 0, 0
+
+        novel_id = ObjectId(novel_id)
+        collection = self.db[BLOB_COLLECTIONS[kind]]
+        encode = BLOB_ENCODERS[kind][0]
+        encoded = [(chapter_id, encode(value)) for chapter_id, value in items]
+        chapter_ids = [chapter_id for chapter_id, _ in encoded]
+
+        existing = {
+            doc["_id"]: doc
+            for doc in collection.find(
+                {"_id": {"$in": chapter_ids}}, {"hash": 1, "gridfs_id": 1}
+            )
+        }
+        dict_id, zdict = self.ensure_dictionary(
+            novel_id, kind, [raw.decode("utf-8") for _, raw in encoded]
+        )
+
+        now = datetime.now()
+        operations = []
+        stale_files = []
+        raw_size = stored_size = 0
+        for chapter_id, raw in encoded:
+            digest = hashlib.sha1(raw).hexdigest()
+            old = existing.get(chapter_id)
+            if old and old.get("hash") == digest:
+                continue
+
+            data = compression.compress(raw, zdict)
+            doc = {
+                "_id": chapter_id,
+                "novel_id": novel_id,
+                "codec": compression.CODEC,
+                "dict_id": dict_id,
+                "hash": digest,
+                "raw_size": len(raw),
+                "size": len(data),
+                "updated_at": now,
+            }
+            if len(data) > GRIDFS_THRESHOLD:
+                doc["gridfs_id"] = self.fs.put(
+                    data, novel_id=novel_id, chapter_id=chapter_id, kind=kind
+                )
+            else:
+                doc["data"] = Binary(data)
+            if old and old.get("gridfs_id"):
+                stale_files.append(old["gridfs_id"])
+
+            operations.append(ReplaceOne({"_id": chapter_id}, doc, upsert=True))
+            raw_size += len(raw)
+            stored_size += len(data)
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        for file_id in stale_files:
+            self.fs.delete(file_id)
+
+        self.db.chapters.update_many(
+            {"_id": {"$in": chapter_ids}, kind: {"$exists": True}},
+            {"$unset": {kind: ""}},
+        )
+        return len(operations), raw_size, stored_size
+
+    def read_raw_blob(self, doc):
+        """解压一个正文或对话文档，返回编码后的字节数据"""
+        if doc.get("gridfs_id"):
+            data = self.fs.get(doc["gridfs_id"]).read()
+        else:
+            data = bytes(doc["data"])
+        return compression.decompress(data, self.get_dictionary(doc.get("dict_id")))
+
+    def read_blob(self, kind, doc):
+        """解压一个正文或对话文档"""
+        return BLOB_ENCODERS[kind][1](self.read_raw_blob(doc))
+
+    def retrain_dictionary(self, novel_id, kind, force=False, batch_size=200):
+        """
+        用已保存的章节重新训练小说的压缩字典，并用新字典重新压缩该小说的全部数据
+
+        现有字典的样本章节数已达到 DICTIONARY_SAMPLE_CHAPTERS、
+        或已保存的章节不比训练现有字典时多时跳过（force 为True时总是重新训练）。
+        返回重新压缩的章节数
+        """
+        novel_id = ObjectId(novel_id)
+        collection = self.db[BLOB_COLLECTIONS[kind]]
+        current = self.latest_dictionary(novel_id, kind)
+        trained_on = current.get("sample_count", 0) if current else 0
+        if not force and trained_on >= DICTIONARY_SAMPLE_CHAPTERS:
+            return 0
+
+        samples = [
+            self.read_raw_blob(doc).decode("utf-8")
+            for doc in collection.find(
+                {"novel_id": novel_id}, limit=DICTIONARY_SAMPLE_CHAPTERS
+            )
+        ]
+        if not force and current and len(samples) <= trained_on:
+            return 0
+        dict_id, zdict = self.save_dictionary(novel_id, kind, samples)
+        if dict_id is None:
+            return 0
+
+        chapter_ids = [
+            doc["_id"]
+            for doc in collection.find(
+                {"novel_id": novel_id, "dict_id": {"$ne": dict_id}}, {"_id": 1}
+            )
+        ]
+        for start in range(0, len(chapter_ids), batch_size):
+            operations = []
+            stale_files = []
+            for doc in collection.find(
+                {"_id": {"$in": chapter_ids[start : start + batch_size]}}
+            ):
+                data = compression.compress(self.read_raw_blob(doc), zdict)
+                update = {"dict_id": dict_id, "size": len(data)}
+                if len(data) > GRIDFS_THRESHOLD:
+                    update["gridfs_id"] = self.fs.put(
+                        data, novel_id=novel_id, chapter_id=doc["_id"], kind=kind
+                    )
+                    unset = {"data": ""}
+                else:
+                    update["data"] = Binary(data)
+                    unset = {"gridfs_id": ""}
+                if doc.get("gridfs_id"):
+                    stale_files.append(doc["gridfs_id"])
+                operations.append(
+                    UpdateOne({"_id": doc["_id"]}, {"$set": update, "$unset": unset})
+                )
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+            for file_id in stale_files:
+                self.fs.delete(file_id)
+
+        # 旧字典已没有数据引用
+        self.db.compression_dicts.delete_many(
+            {"novel_id": novel_id, "kind": kind, "_id": {"$ne": dict_id}}
+        )
+        return len(chapter_ids)
+
+    def attach_blobs(self, chapters, kinds=("content", "dialogues")):
+        """
+        为章节文档补充解压后的正文和对话分析结果
+
+        仍内嵌在章节文档中的旧数据直接使用，其余每种数据一次查询批量读取
+        """
+        for kind in kinds:
+            missing = [chapter["_id"] for chapter in chapters if kind not in chapter]
+            if not missing:
+                continue
+
+            cursor = self.db[BLOB_COLLECTIONS[kind]].find(
+                {"_id": {"$in": missing}}, {"hash": 0}
+            )
+            values = {doc["_id"]: self.read_blob(kind, doc) for doc in cursor}
+            for chapter in chapters:
+                if kind not in chapter:
+                    chapter[kind] = values.get(chapter["_id"], [])
+        return chapters
+
+    def migrate_novel_storage(
+        self, novel_id, batch_size=200, callback=None, retrain=False
+    ):
+        """
+        将内嵌在章节文档中的正文和对话分析结果迁移到压缩集合
+
+        迁移后现有压缩字典的样本不足时（例如只用第一次保存的一个章节训练），
+        用已保存的章节重新训练字典并重新压缩；retrain 为True时总是重新训练。
+        返回 (是否成功, 消息)
+        """
+        if not self.is_connected():
+            return False, "未连接到数据库"
+
+        try:
+            novel_id = ObjectId(novel_id)
+            legacy_filter = {
+                "novel_id": novel_id,
+                "$or": [
+                    {"content": {"$exists": True}},
+                    {"dialogues": {"$exists": True}},
+                ],
+            }
+            moved = raw_size = stored_size = 0
+
+            while True:
+                batch = list(
+                    self.db.chapters.find(
+                        legacy_filter, {"content": 1, "dialogues": 1}, limit=batch_size
+                    )
+                )
+                if not batch:
+                    break
+
+                for kind in BLOB_COLLECTIONS:
+                    items = [(doc["_id"], doc[kind]) for doc in batch if doc.get(kind)]
+                    _, batch_raw, batch_stored = self.write_blobs(kind, novel_id, items)
+                    raw_size += batch_raw
+                    stored_size += batch_stored
+
+                operations = []
+                for doc in batch:
+                    update = {"$unset": {"content": "", "dialogues": ""}}
+                    # 只迁移正文的章节保留原有的对话数量
+                    if "dialogues" in doc:
+                        update["$set"] = {"dialogue_count": len(doc["dialogues"] or [])}
+                    operations.append(UpdateOne({"_id": doc["_id"]}, update))
+                self.db.chapters.bulk_write(operations, ordered=False)
+
+                moved += len(batch)
+                if callback:
+                    callback(f"已迁移 {moved} 个章节")
+
+            recompressed = 0
+            for kind in BLOB_COLLECTIONS:
+                recompressed += self.retrain_dictionary(
+                    novel_id, kind, force=retrain, batch_size=batch_size
+                )
+            retrained = f"，重新训练字典后重新压缩 {recompressed} 个章节"
+
+            if not moved:
+                if recompressed:
+                    return True, f"没有需要迁移的章节{retrained}"
+                return True, "没有需要迁移的章节"
+            message = f"已迁移 {moved} 个章节，{raw_size} 字节压缩为 {stored_size} 字节"
+            return True, message + (retrained if recompressed else "")
+        except Exception as e:
+            return False, f"迁移章节存储失败: {str(e)}"
+
+    def storage_report(self, novel_id):
+        """统计小说在各集合中的文档数和BSON字节数"""
+        if not self.is_connected():
+            return {}
+
+        novel_id = ObjectId(novel_id)
+        report = {}
+        for name in ["chapters", *BLOB_COLLECTIONS.values()]:
+            result = list(
+                self.db[name].aggregate(
+                    [
+                        {"$match": {"novel_id": novel_id}},
+                        {
+                            "$group": {
+                                "_id": None,
+                                "count": {"$sum": 1},
+                                "bytes": {"$sum": {"$bsonSize": "$$ROOT"}},
+                                "raw_bytes": {"$sum": {"$ifNull": ["$raw_size", 0]}},
+                            }
+                        },
+                    ]
+                )
+            )
+            report[name] = (
+                {key: result[0][key] for key in ("count", "bytes", "raw_bytes")}
+                if result
+                else {"count": 0, "bytes": 0, "raw_bytes": 0}
+            )
+
+        gridfs_bytes = sum(
+            doc.get("length", 0)
+            for doc in self.db["chapter_blobs.files"].find(
+                {"novel_id": novel_id}, {"length": 1}
+            )
+        )
+        report["chapter_blobs"] = {"bytes": gridfs_bytes}
+        return report
+
     def delete_novel(self, novel_id):
         """删除小说及其章节"""
         if not self.is_connected():
@@ -254,6 +913,13 @@ class MongoDBManager:
             # 删除相关章节
             result = self.db.chapters.delete_many({"novel_id": novel_id})
 
+            # 删除压缩保存的正文、对话和字典
+            for collection_name in BLOB_COLLECTIONS.values():
+                self.db[collection_name].delete_many({"novel_id": novel_id})
+            self.db.compression_dicts.delete_many({"novel_id": novel_id})
+            for grid_file in self.fs.find({"novel_id": novel_id}):
+                self.fs.delete(grid_file._id)
+
             return True, f"已删除小说及其 {result.deleted_count} 个章节"
         except Exception as e:
             return False, f"删除小说失败: {str(e)}"
@@ -199,8 +199,14 @@ class DialogueAnalyzer:
                 chapter_content, client, max_retries, retry_delay
             )
 
-    def batch_analyze_chapters(self, chapters, callback=None, max_workers=5):
-        """批量分析多个章节的对话"""
+    def batch_analyze_chapters(
+        self, chapters, callback=None, max_workers=5, content_loader=None
+    ):
+        """
+        批量分析多个章节的对话
+
+        content_loader: 章节字典中没有正文时用于按需读取正文段落列表的函数
+        """
         if not chapters:
             if callback:
                 callback("没有章节需要分析")
@@ -226,8 +232,11 @@ class DialogueAnalyzer:
         def process_chapter(chapter):
             nonlocal completed, success_count, fail_count
 
-            # 获取章节内容
-            chapter_content = "\n".join(chapter.get("content", []))
+            # 获取章节内容，没有时按需读取
+            paragraphs = chapter.get("content")
+            if not paragraphs and content_loader:
+                paragraphs = content_loader(chapter)
+            chapter_content = "\n".join(paragraphs or [])
             if not chapter_content:
                 with lock:
                     completed += 1
@@ -98,6 +98,9 @@ class NovelCrawlerGUI(tk.Tk):
         novel_menu.add_command(label="删除小说", command=self.delete_novel)
         novel_menu.add_separator()
         novel_menu.add_command(label="导出到JSON", command=self.export_book_to_json)
+        novel_menu.add_command(
+            label="迁移为压缩存储", command=self.migrate_novel_storage
+        )
         menubar.add_cascade(label="小说", menu=novel_menu)
 
         # 章节菜单
@@ -395,19 +398,10 @@ class NovelCrawlerGUI(tk.Tk):
         analyzed_chapters = set()
         if self.db_manager.is_connected() and self.current_novel_id:
             try:
-                # 查询有对话分析结果的章节
-                chapters_with_dialogues = list(
-                    self.db_manager.db.chapters.find(
-                        {
-                            "novel_id": self.current_novel_id,
-                            "dialogues": {"$exists": True, "$ne": []},
-                        }
-                    )
+                # 只查询有对话分析结果的章节URL，不加载对话内容
+                analyzed_chapters = self.db_manager.get_analyzed_urls(
+                    self.current_novel_id
                 )
-
-                # 将URL加入集合
-                for chapter in chapters_with_dialogues:
-                    analyzed_chapters.add(chapter.get("url", ""))
             except Exception as e:
                 self.log(f"获取对话分析状态出错: {str(e)}")
 
@@ -563,19 +557,15 @@ class NovelCrawlerGUI(tk.Tk):
                 self.log(f"未找到小说: {novel_id}")
                 return
 
-            # 加载章节信息
-            chapters_data = self.db_manager.get_chapters(novel_id)
-
-            # 转换为爬虫格式
+            # 加载章节概要（正文和对话在打开或处理章节时再按需读取）
             chapters = []
-            for chapter in chapters_data:
+            for chapter in self.db_manager.iter_chapter_summaries(novel_id):
                 chapters.append(
                     {
                         "chapter_title": chapter.get("title", ""),
                         "chapter_url": chapter.get("url", ""),
                         "group": chapter.get("volume", ""),
                         "word_count": chapter.get("word_count", 0),
-                        "content": chapter.get("content", []),  # Add this line
                     }
                 )
 
@@ -670,6 +660,39 @@ class NovelCrawlerGUI(tk.Tk):
         except Exception as e:
             self.log(f"删除小说出错: {str(e)}")
 
+    def migrate_novel_storage(self):
+        """将当前小说内嵌的正文和对话迁移到压缩存储，并输出迁移前后的存储大小"""
+        if not self.db_manager.is_connected():
+            messagebox.showwarning("警告", "未连接到数据库")
+            return
+
+        if not self.current_novel_id:
+            messagebox.showwarning("警告", "请先选择已保存的小说")
+            return
+
+        try:
+            before = self.db_manager.storage_report(self.current_novel_id)
+            success, message = self.db_manager.migrate_novel_storage(
+                self.current_novel_id, callback=self.log
+            )
+            if not success:
+                self.log(message)
+                messagebox.showerror("错误", message)
+                return
+
+            after = self.db_manager.storage_report(self.current_novel_id)
+            for name, stats in after.items():
+                self.log(
+                    f"{name}: {before.get(name, {}).get('bytes', 0)} 字节 -> "
+                    f"{stats['bytes']} 字节"
+                )
+            self.log(message)
+            messagebox.showinfo("成功", message)
+
+        except Exception as e:
+            self.log(f"迁移存储出错: {str(e)}")
+            messagebox.showerror("错误", f"迁移存储时出错: {str(e)}")
+
     def fetch_options(self):
         """获取选项列表"""
         url = self.url_var.get().strip()
@@ -934,11 +957,11 @@ class NovelCrawlerGUI(tk.Tk):
             # 分析所有章节
             chapters_to_analyze = self.chapters
 
-        # 过滤掉没有内容的章节
+        # 过滤掉没有内容的章节（已保存到数据库的正文在分析时按需读取）
         chapters_to_analyze = [
             ch
             for ch in chapters_to_analyze
-            if ch.get("content") and len(ch.get("content")) > 0
+            if ch.get("content") or ch.get("word_count", 0) > 0
         ]
 
         if not chapters_to_analyze:
@@ -960,6 +983,7 @@ class NovelCrawlerGUI(tk.Tk):
                         0, lambda: progress_dialog.add_message(msg)
                     ),
                     max_workers=3,
+                    content_loader=self.load_chapter_content,
                 )
                 self.after(0, lambda: self.log(f"对话分析完成，获取到 {len(results) if results else 0} 个结果"))
 
@@ -974,24 +998,12 @@ class NovelCrawlerGUI(tk.Tk):
                             chapter["chapter_url"] for chapter in chapters_to_analyze
                         }
 
-                        # 一次性查询所有章节信息
+                        # 一次性查询所有章节的URL到ID的映射
                         if self.db_manager.is_connected() and self.current_novel_id:
-                            db_chapters = list(
-                                self.db_manager.db.chapters.find(
-                                    {
-                                        "novel_id": self.current_novel_id,
-                                        "url": {"$in": list(chapter_urls)},
-                                    }
-                                )
+                            url_to_id = self.db_manager.get_chapter_ids(
+                                self.current_novel_id, chapter_urls
                             )
 
-                            # 创建URL到ID的映射
-                            url_to_id = {
-                                ch["url"]: ch["_id"]
-                                for ch in db_chapters
-                                if "url" in ch
-                            }
-
                             # 根据映射创建要保存的数据
                             for chapter_url, dialogue_result in results.items():
                                 if chapter_url in url_to_id:
@@ -1030,6 +1042,16 @@ class NovelCrawlerGUI(tk.Tk):
         self.analyze_task.daemon = True
         self.analyze_task.start()
 
+    def load_chapter_content(self, chapter):
+        """按需读取章节正文：内存中没有时从数据库读取"""
+        if chapter.get("content"):
+            return chapter["content"]
+        if not self.db_manager.is_connected() or not self.current_novel_id:
+            return []
+        return self.db_manager.get_chapter_content(
+            self.current_novel_id, chapter.get("chapter_url", "")
+        )
+
     def view_chapter_dialogue(self):
         """查看章节对话分析结果"""
         if not self.db_manager.is_connected():
@@ -1049,18 +1071,17 @@ class NovelCrawlerGUI(tk.Tk):
             chapter_url = chapter.get("chapter_url", "")
             chapter_title = chapter.get("chapter_title", "")
 
-            # 查询数据库获取对话分析结果
+            # 按需查询该章节的对话分析结果
             try:
-                chapter_doc = self.db_manager.db.chapters.find_one(
-                    {"novel_id": self.current_novel_id, "url": chapter_url}
+                dialogues = self.db_manager.get_chapter_dialogues(
+                    self.current_novel_id, chapter_url
                 )
 
-                if not chapter_doc or not chapter_doc.get("dialogues"):
+                if not dialogues:
                     messagebox.showinfo("提示", "该章节没有对话分析结果")
                     return
 
                 # 显示对话分析结果
-                dialogues = chapter_doc.get("dialogues", [])
                 dialog = DialogueViewDialog(self, chapter_title, dialogues)
 
             except Exception as e:
@@ -1142,10 +1163,14 @@ class NovelCrawlerGUI(tk.Tk):
         # 保存章节到数据库
         try:
             success, message = self.db_manager.save_chapters(
-                self.current_novel_id, self.chapters
+                self.current_novel_id, self.chapters, callback=self.log
             )
 
             if success:
+                # 正文已保存到数据库，释放内存，需要时再按需读取
+                for chapter in self.chapters:
+                    chapter.pop("content", None)
+
                 self.log(message)
                 messagebox.showinfo("成功", message)
             else:
@@ -1172,11 +1197,14 @@ class NovelCrawlerGUI(tk.Tk):
             messagebox.showerror("错误", "获取小说信息失败")
             return
 
-        # 获取所有章节
-        chapters = self.db_manager.get_chapters(self.current_novel_id)
+        # 获取所有章节正文，对话分析结果按列式存储整本读取
+        chapters = list(
+            self.db_manager.iter_chapters(self.current_novel_id, kinds=("content",))
+        )
         if not chapters:
             messagebox.showinfo("提示", "该小说没有章节")
             return
+        dialogues = self.db_manager.load_book_dialogues(self.current_novel_id)
 
         # 选择导出目录
         export_dir = filedialog.askdirectory(title="选择导出目录")
@@ -1185,7 +1213,7 @@ class NovelCrawlerGUI(tk.Tk):
 
         # 使用工具函数导出
         success, message = utils.export_book_to_json(
-            str(novel["_id"]), novel, chapters, export_dir
+            str(novel["_id"]), novel, chapters, export_dir, dialogues
         )
 
         if success:
@@ -1,13 +1,32 @@
 """
 数据模型模块，定义应用程序中使用的各种数据结构和模型类
+
+模型类都使用 __slots__，不为每个对象创建属性字典。
+长篇小说的对话分析结果使用列式的 DialogueTable / BookDialogues 保存：
+角色名在整本书范围内去重为整数ID，性别保存为枚举值，对话正文拼接为一个字符串加偏移数组，
+与原来的字典列表格式可以无损互相转换。
 """
 
+from array import array
+from collections import Counter
 from datetime import datetime
+from enum import IntEnum
 
 
 class Novel:
     """小说数据模型类"""
 
+    __slots__ = (
+        "id",
+        "name",
+        "author",
+        "description",
+        "source_url",
+        "volumes",
+        "created_at",
+        "updated_at",
+    )
+
     def __init__(self, name="", author="", description="", source_url=""):
         self.id = None  # MongoDB中的_id
         self.name = name
@@ -67,6 +86,20 @@ class Novel:
 class Chapter:
     """章节数据模型类"""
 
+    __slots__ = (
+        "id",
+        "novel_id",
+        "title",
+        "url",
+        "group",
+        "word_count",
+        "content",
+        "dialogues",
+        "created_at",
+        "updated_at",
+        "dialogue_updated_at",
+    )
+
     def __init__(self, title="", url="", group=""):
         self.id = None  # MongoDB中的_id
         self.novel_id = None  # 所属小说ID
@@ -75,7 +108,7 @@ class Chapter:
         self.group = group  # 卷/分组
         self.word_count = 0
         self.content = []  # 章节内容段落列表
-        self.dialogues = []  # 对话分析结果
+        self.dialogues = []  # 对话分析结果（字典列表或 DialogueTable）
         self.created_at = None
         self.updated_at = None
         self.dialogue_updated_at = None
@@ -93,7 +126,10 @@ class Chapter:
 
         # 如果有对话分析，则包含
         if self.dialogues:
-            data["dialogues"] = self.dialogues
+            if isinstance(self.dialogues, DialogueTable):
+                data["dialogues"] = self.dialogues.to_dicts()
+            else:
+                data["dialogues"] = self.dialogues
 
         # 如果有ID，则包含ID
         if self.id:
@@ -110,8 +146,12 @@ class Chapter:
         return data
 
     @classmethod
-    def from_dict(cls, data):
-        """从字典创建对象"""
+    def from_dict(cls, data, speakers=None):
+        """
+        从字典创建对象
+
+        指定 speakers（SpeakerTable）时对话分析结果转换为共享该角色表的 DialogueTable
+        """
         chapter = cls(
             title=data.get("title", ""),
             url=data.get("url", ""),
@@ -125,6 +165,8 @@ class Chapter:
         chapter.word_count = data.get("word_count", 0)
         chapter.content = data.get("content", [])
         chapter.dialogues = data.get("dialogues", [])
+        if speakers is not None:
+            chapter.dialogues = DialogueTable.from_dicts(chapter.dialogues, speakers)
         chapter.created_at = data.get("created_at")
         chapter.updated_at = data.get("updated_at")
         chapter.dialogue_updated_at = data.get("dialogue_updated_at")
@@ -160,6 +202,8 @@ class Chapter:
 class APIKey:
     """API密钥数据模型类"""
 
+    __slots__ = ("id", "api_key", "ai_name", "is_default", "created_at", "updated_at")
+
     def __init__(self, api_key="", ai_name="GeminiAI", is_default=False):
         self.id = None  # MongoDB中的_id
         self.api_key = api_key
@@ -212,6 +256,8 @@ class APIKey:
 class DialogueEntry:
     """对话条目模型"""
 
+    __slots__ = ("character_type", "character_sex", "text")
+
     def __init__(self, character_type="", character_sex="中", text=""):
         self.character_type = character_type  # 角色类型/名称
         self.character_sex = character_sex  # 角色性别
@@ -233,3 +279,270 @@ class DialogueEntry:
             character_sex=data.get("sex", "中"),
             text=data.get("text", ""),
         )
+
+
+class Sex(IntEnum):
+    """角色性别枚举，取值即在 DialogueTable 性别列中保存的编码"""
+
+    MALE = 0
+    FEMALE = 1
+    NEUTRAL = 2
+
+    @property
+    def label(self):
+        return SEX_LABELS[self]
+
+
+# 枚举值对应的中文性别（对话分析结果中使用的字符串）
+SEX_LABELS = ("男", "女", "中")
+
+
+class SpeakerTable:
+    """
+    角色名驻留表，把角色名映射为从0开始的整数ID
+
+    同一本书的所有 DialogueTable 共享一个角色表，角色ID在整本书范围内一致
+    """
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        """获取角色名的ID，新角色名分配新ID"""
+        speaker_id = self.ids.get(name)
+        if speaker_id is None:
+            speaker_id = len(self.names)
+            self.ids[name] = speaker_id
+            self.names.append(name)
+        return speaker_id
+
+    def name(self, speaker_id):
+        return self.names[speaker_id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+
+class DialogueTable:
+    """
+    列式的对话列表
+
+    每条对话占用：角色ID（4字节）、性别编码（1字节）、正文结束偏移（4字节），
+    所有正文拼接在一个字符串中。性别编码 0-2 对应 Sex 枚举，
+    其他性别字符串从 3 开始按出现顺序编码。
+    与标准格式 {"type", "sex", "text"} 不一致的条目（缺少字段、有额外字段、值不是字符串、
+    不是字典）按原样另存，转换回字典列表时原样返回，保证转换无损。
+    """
+
+    __slots__ = (
+        "speakers",
+        "speaker_ids",
+        "sex_codes",
+        "extra_sexes",
+        "text_ends",
+        "_text",
+        "_pending",
+        "irregular",
+    )
+
+    fields = ("type", "sex", "text")
+
+    def __init__(self, speakers=None):
+        self.speakers = speakers if speakers is not None else SpeakerTable()
+        self.speaker_ids = array("I")
+        self.sex_codes = array("B")
+        self.extra_sexes = []
+        self.text_ends = array("I")
+        self._text = ""
+        self._pending = []
+        self.irregular = {}
+
+    @classmethod
+    def from_dicts(cls, dialogues, speakers=None):
+        """从字典列表创建"""
+        table = cls(speakers)
+        table.extend(dialogues)
+        return table
+
+    def __len__(self):
+        return len(self.speaker_ids)
+
+    def _sex_code(self, sex):
+        if sex in SEX_LABELS:
+            return SEX_LABELS.index(sex)
+        if sex not in self.extra_sexes:
+            if len(SEX_LABELS) + len(self.extra_sexes) > 255:
+                raise ValueError("性别取值过多")
+            self.extra_sexes.append(sex)
+        return len(SEX_LABELS) + self.extra_sexes.index(sex)
+
+    def _sex_label(self, code):
+        if code < len(SEX_LABELS):
+            return SEX_LABELS[code]
+        return self.extra_sexes[code - len(SEX_LABELS)]
+
+    def _is_regular(self, item):
+        return (
+            isinstance(item, dict)
+            and len(item) == len(self.fields)
+            and all(isinstance(item.get(field), str) for field in self.fields)
+        )
+
+    def append(self, item):
+        """追加一条对话（字典或 DialogueEntry）"""
+        if isinstance(item, DialogueEntry):
+            item = item.to_dict()
+
+        if self._is_regular(item):
+            speaker, sex, text = item["type"], item["sex"], item["text"]
+        else:
+            # 非标准条目原样保存，列中只记录能识别的部分
+            self.irregular[len(self)] = item
+            data = item if isinstance(item, dict) else {}
+            speaker = str(data.get("type", ""))
+            sex = str(data.get("sex", ""))
+            text = ""
+
+        self.speaker_ids.append(self.speakers.intern(speaker))
+        self.sex_codes.append(self._sex_code(sex))
+        end = (self.text_ends[-1] if self.text_ends else 0) + len(text)
+        self.text_ends.append(end)
+        if text:
+            self._pending.append(text)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    @property
+    def text_buffer(self):
+        """所有对话正文拼接后的字符串（追加的正文在第一次读取时合并）"""
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+        return self._text
+
+    def speaker(self, index):
+        """第 index 条对话的角色名"""
+        return self.speakers.names[self.speaker_ids[index]]
+
+    def sex(self, index):
+        """第 index 条对话的性别字符串"""
+        return self._sex_label(self.sex_codes[index])
+
+    def text(self, index):
+        """第 index 条对话的正文"""
+        start = self.text_ends[index - 1] if index else 0
+        return self.text_buffer[start : self.text_ends[index]]
+
+    def to_dict(self, index):
+        """第 index 条对话转换为字典"""
+        if index in self.irregular:
+            return self.irregular[index]
+        return {
+            "type": self.speaker(index),
+            "sex": self.sex(index),
+            "text": self.text(index),
+        }
+
+    def to_dicts(self):
+        """转换为原来的字典列表格式"""
+        return [self.to_dict(index) for index in range(len(self))]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return DialogueEntry.from_dict(self.to_dict(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield DialogueEntry.from_dict(self.to_dict(index))
+
+    def speaker_counts(self):
+        """每个角色ID的对话条数"""
+        return Counter(self.speaker_ids)
+
+
+class BookDialogues:
+    """
+    整本书的对话分析结果
+
+    所有章节的对话保存在同一个 DialogueTable 中，章节按加入顺序记录起止行号，
+    用于角色统计、配音分配和界面展示时在内存中保存整本书的数据
+    """
+
+    __slots__ = ("table", "chapter_keys", "chapter_starts", "chapter_index")
+
+    def __init__(self):
+        self.table = DialogueTable()
+        self.chapter_keys = []
+        self.chapter_starts = array("I")
+        self.chapter_index = {}
+
+    @property
+    def speakers(self):
+        return self.table.speakers
+
+    def add_chapter(self, key, dialogues):
+        """加入一个章节的对话（字典列表），同一章节只能加入一次"""
+        if key in self.chapter_index:
+            raise ValueError(f"章节已存在: {key}")
+        self.chapter_index[key] = len(self.chapter_keys)
+        self.chapter_keys.append(key)
+        self.chapter_starts.append(len(self.table))
+        self.table.extend(dialogues)
+
+    def chapter_range(self, key):
+        """章节对话在整本书表中的行号范围"""
+        position = self.chapter_index[key]
+        start = self.chapter_starts[position]
+        if position + 1 < len(self.chapter_starts):
+            end = self.chapter_starts[position + 1]
+        else:
+            end = len(self.table)
+        return range(start, end)
+
+    def chapter_dicts(self, key):
+        """章节对话转换为字典列表"""
+        return [self.table.to_dict(index) for index in self.chapter_range(key)]
+
+    def to_dict(self):
+        """转换为 {章节键: 对话字典列表}"""
+        return {key: self.chapter_dicts(key) for key in self.chapter_keys}
+
+    def __len__(self):
+        return len(self.chapter_keys)
+
+    def character_stats(self):
+        """
+        角色统计：按对话条数降序的 [{"name", "gender", "lines_count"}]
+
+        性别取角色第一次出现时的性别，不解码对话正文
+        """
+        table = self.table
+        first_rows = {}
+        for index, speaker_id in enumerate(table.speaker_ids):
+            if speaker_id not in first_rows:
+                first_rows[speaker_id] = index
+
+        stats = [
+            {
+                "name": self.speakers.name(speaker_id),
+                "gender": table.sex(first_rows[speaker_id]),
+                "lines_count": count,
+            }
+            for speaker_id, count in table.speaker_counts().items()
+            if self.speakers.name(speaker_id)
+        ]
+        stats.sort(key=lambda x: x["lines_count"], reverse=True)
+        return stats
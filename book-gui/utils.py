@@ -313,6 +313,7 @@ def export_book_to_json(
     novel_data: Dict[str, Any],
     chapters_data: List[Dict[str, Any]],
     export_dir: str,
+    dialogues=None,
 ) -> Tuple[bool, str]:
     """
     导出小说和章节数据为JSON格式
@@ -322,6 +323,7 @@ def export_book_to_json(
         novel_data: 小说数据
         chapters_data: 章节数据列表
         export_dir: 导出目录
+        dialogues: 以章节URL为键的 BookDialogues，有对话分析结果时导出到 dialogues 目录
 
     Returns:
         (是否成功, 消息)
@@ -373,6 +375,16 @@ def export_book_to_json(
                 )
                 chapter_paths.append(rel_path)
 
+                # 写入章节对话分析结果
+                url = chapter.get("url", "")
+                if dialogues is not None and url in dialogues.chapter_index:
+                    dialogue_dir = os.path.join(book_dir, "dialogues", safe_volume_name)
+                    ensure_dir(dialogue_dir)
+                    save_json_file(
+                        os.path.join(dialogue_dir, f"{i:04d}_{safe_title}.json"),
+                        dialogues.chapter_dicts(url),
+                    )
+
                 chapter_index += 1
 
         # 保存章节路径列表到JSON文件
@@ -383,6 +395,11 @@ def export_book_to_json(
         novel_info_file = os.path.join(book_dir, "novel_info.json")
         save_json_file(novel_info_file, novel_data)
 
+        # 保存角色统计
+        if dialogues:
+            characters_file = os.path.join(book_dir, "characters.json")
+            save_json_file(characters_file, dialogues.character_stats())
+
         return True, f"已成功导出 {len(chapter_paths)} 个章节到 {book_dir}"
 
     except Exception as e:
@@ -0,0 +1,152 @@
+"""
+可续传的批量操作
+
+批量任务保存为追加写入的 jsonl 文件，第一行为任务头：
+    {"kind": 任务类型, "params": {...}, "items": [{"key": ..., ...}, ...], "created_at": 时间}
+之后每处理完一项追加一行 {"key": ..., "ok": 是否成功, "message": 说明}，同一项以最后一条为准。
+工具中途关闭后重新打开同一个任务文件，跳过已成功的项，未处理和失败的项继续执行。
+
+run_batch 在线程池中执行，同时提交的任务数有上限，取消时不再提交新任务，已提交的任务执行完毕后返回。
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from file_utils import atomic_write_text, read_jsonl
+
+
+class BatchJob:
+    """一个批量任务及其进度"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.header = {}
+        self.results = {}
+        self._load()
+
+    @classmethod
+    def create(cls, path, kind, items, params=None):
+        """创建新任务（覆盖同名的旧任务文件），items 中每项必须有唯一的 key"""
+        header = {
+            "kind": kind,
+            "params": params or {},
+            "items": [dict(item, key=str(item["key"])) for item in items],
+            "created_at": time.time(),
+        }
+        atomic_write_text(path, json.dumps(header, ensure_ascii=False) + "\n")
+        return cls(path)
+
+    @classmethod
+    def existing(cls, path):
+        """打开已有的任务文件，不存在或没有任务头时返回None"""
+        if not os.path.exists(path):
+            return None
+        job = cls(path)
+        return job if job.header else None
+
+    def _load(self):
+        """加载任务文件，截掉中断时可能残留的半行记录"""
+        for entry in read_jsonl(self.path):
+            if "items" in entry and not self.header:
+                self.header = entry
+            elif "key" in entry:
+                self.results[entry["key"]] = entry
+
+    @property
+    def kind(self):
+        return self.header.get("kind")
+
+    @property
+    def params(self):
+        return self.header.get("params", {})
+
+    @property
+    def items(self):
+        return self.header.get("items", [])
+
+    def pending(self):
+        """还没有成功的项（未处理和失败的项）"""
+        return [
+            item
+            for item in self.items
+            if not self.results.get(item["key"], {}).get("ok")
+        ]
+
+    def failed(self):
+        return [
+            item
+            for item in self.items
+            if item["key"] in self.results and not self.results[item["key"]]["ok"]
+        ]
+
+    def succeeded(self):
+        return [
+            item for item in self.items if self.results.get(item["key"], {}).get("ok")
+        ]
+
+    def record(self, key, ok, message=""):
+        """记录一项的结果，落盘后再返回"""
+        entry = {"key": str(key), "ok": bool(ok), "message": message, "at": time.time()}
+        with self.lock:
+            self.results[entry["key"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self):
+        """任务全部完成后删除任务文件"""
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def run_batch(job, operation, workers=4, progress=None, cancelled=None):
+    """
+    执行任务中所有未成功的项
+
+    operation(item) 返回 (是否成功, 说明)，抛出异常视为失败。
+    progress(item, 是否成功, 说明) 在调用线程中调用。
+    返回 (成功数, 失败数, 未处理数)，均只统计本次执行
+    """
+    pending = iter(job.pending())
+    remaining = len(job.pending())
+    max_in_flight = max(1, workers) * 2
+    succeeded = failed = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        in_flight = {}
+
+        def fill():
+            while len(in_flight) < max_in_flight:
+                if cancelled and cancelled():
+                    return
+                item = next(pending, None)
+                if item is None:
+                    return
+                in_flight[executor.submit(operation, item)] = item
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    ok, message = future.result()
+                except Exception as e:
+                    ok, message = False, str(e)
+                job.record(item["key"], ok, message)
+                remaining -= 1
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+                if progress:
+                    progress(item, ok, message)
+            fill()
+
+    return succeeded, failed, remaining
@@ -6,6 +6,9 @@ from tkinter import filedialog, messagebox, ttk
 import threading
 import time
 
+from file_utils import AUDIO_EXTENSIONS, CHINESE_NUMERALS, chinese_number
+from volume_packager import PACK_FORMATS, package_volumes
+
 
 class AudioFileSorter:
     def __init__(self, root):
@@ -19,25 +22,8 @@ class AudioFileSorter:
         self.group_size = tk.IntVar(value=50)  # 默认每组50个文件
         self.preview_mode = tk.BooleanVar(value=True)  # 默认启用预览模式
         self.folder_prefix = tk.StringVar(value="Group_")  # 文件夹前缀
-
-        # 中文数字映射
-        self.chinese_to_arabic = {
-            "零": 0,
-            "一": 1,
-            "二": 2,
-            "三": 3,
-            "四": 4,
-            "五": 5,
-            "六": 6,
-            "七": 7,
-            "八": 8,
-            "九": 9,
-            "十": 10,
-            "百": 100,
-            "千": 1000,
-            "万": 10000,
-            "亿": 100000000,
-        }
+        self.pack_format = tk.StringVar(value="mp3")  # 分卷格式
+        self.pack_workers = tk.IntVar(value=4)  # 并行打包的分卷数
 
         # 文件信息列表
         self.file_info = []
@@ -110,6 +96,20 @@ class AudioFileSorter:
             side=tk.LEFT, padx=20
         )
 
+        tk.Label(group_frame, text="分卷格式:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(
+            group_frame,
+            textvariable=self.pack_format,
+            values=list(PACK_FORMATS),
+            state="readonly",
+            width=6,
+        ).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(group_frame, text="并行数:").pack(side=tk.LEFT, padx=5)
+        tk.Entry(group_frame, textvariable=self.pack_workers, width=5).pack(
+            side=tk.LEFT, padx=5
+        )
+
         # 操作按钮 - 确保这部分正确显示
         btn_frame = tk.Frame(settings_frame)
         btn_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -137,6 +137,17 @@ class AudioFileSorter:
         )
         self.start_btn.pack(side=tk.LEFT, padx=10, pady=5)
 
+        self.pack_btn = tk.Button(
+            btn_frame,
+            text="打包分卷",
+            command=self.start_packaging,
+            width=15,
+            height=2,
+            bg="#c3e6cb",
+            font=("黑体", 10, "bold"),
+        )
+        self.pack_btn.pack(side=tk.LEFT, padx=10, pady=5)
+
         self.cancel_btn = tk.Button(
             btn_frame,
             text="取消",
@@ -290,7 +301,7 @@ class AudioFileSorter:
         messagebox.showinfo(
             "关于",
             "音频文件排序工具\n\n"
-            "功能：按章节顺序整理MP3文件并分组\n"
+            "功能：按章节顺序整理音频文件并分组，或打包为带章节标记的分卷\n"
             "作者：AI助手\n"
             "版本：1.0",
         )
@@ -302,7 +313,13 @@ class AudioFileSorter:
 2. 点击"扫描文件"按钮扫描文件
 3. 在预览中查看文件分组情况
 4. 调整分组设置（如有必要）
-5. 点击"开始分组"执行文件移动
+5. 点击"开始分组"执行文件移动，或点击"打包分卷"把每组合并为一个分卷文件
+
+打包分卷：
+每组章节按顺序合并为一个文件，保存在目录下的 volumes 文件夹中，原文件保留。
+不重新编码，按章节文件名写入章节标记：
+  mp3 - 合并MP3章节，写入 ID3 章节帧（CHAP）
+  m4b - 合并 AAC 编码的 m4a 章节（需要安装 ffmpeg）
 
 文件名格式：
 程序将识别"第xxx章"格式的文件名，提取章节号进行排序。
@@ -331,30 +348,6 @@ class AudioFileSorter:
         self.status_bar.config(text=message)
         self.root.update_idletasks()
 
-    def chinese_to_int(self, chinese_str):
-        """将中文数字转换为阿拉伯数字"""
-        if not chinese_str:
-            return None
-
-        result = 0
-        tmp = 0
-
-        for char in chinese_str:
-            if char in self.chinese_to_arabic:
-                num = self.chinese_to_arabic[char]
-                if num >= 10:  # 是单位
-                    if tmp == 0:
-                        tmp = 1
-                    result += tmp * num
-                    tmp = 0
-                else:  # 是数字
-                    tmp = tmp * 10 + num
-            else:
-                return None  # 包含非中文数字字符
-
-        result += tmp
-        return result
-
     def extract_chapter_number(self, filename):
         """从文件名中提取章节号"""
         # 尝试匹配阿拉伯数字章节号
@@ -368,13 +361,9 @@ class AudioFileSorter:
             return int(match.group(1))
 
         # 尝试匹配中文数字章节号
-        match = re.search(r"第([零一二三四五六七八九十百千万亿]+)章", filename)
+        match = re.search(f"第([{CHINESE_NUMERALS}]+)章", filename)
         if match:
-            chinese_num = match.group(1)
-            try:
-                return self.chinese_to_int(chinese_num)
-            except:
-                pass
+            return chinese_number(match.group(1))
 
         # 尝试从文件名开头提取数字
         match = re.search(r"^(\d+)", filename)
@@ -384,7 +373,7 @@ class AudioFileSorter:
         return float("inf")  # 无法提取章节号
 
     def scan_files(self):
-        """扫描目录中的MP3文件并解析章节号"""
+        """扫描目录中的音频文件并解析章节号"""
         directory = self.dir_entry.get()
         if not directory:
             messagebox.showerror("错误", "请选择一个目录")
@@ -402,16 +391,18 @@ class AudioFileSorter:
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
 
-        # 获取所有mp3文件
+        # 获取所有章节音频文件
         try:
-            mp3_files = [f for f in os.listdir(directory) if f.lower().endswith(".mp3")]
+            mp3_files = [
+                f for f in os.listdir(directory) if f.lower().endswith(AUDIO_EXTENSIONS)
+            ]
             if not mp3_files:
-                self.log("目录中没有找到MP3文件")
-                messagebox.showinfo("信息", "目录中没有找到MP3文件")
+                self.log("目录中没有找到音频文件")
+                messagebox.showinfo("信息", "目录中没有找到音频文件")
                 self.update_status("就绪")
                 return
 
-            self.log(f"找到 {len(mp3_files)} 个MP3文件")
+            self.log(f"找到 {len(mp3_files)} 个音频文件")
 
             # 解析文件名，提取章节数
             self.file_info = []
@@ -492,6 +483,7 @@ class AudioFileSorter:
         self.processing = True
         self.cancel_flag = False
         self.start_btn.config(state=tk.DISABLED)
+        self.pack_btn.config(state=tk.DISABLED)
         self.scan_btn.config(state=tk.DISABLED)
         self.cancel_btn.config(state=tk.NORMAL)
 
@@ -503,6 +495,121 @@ class AudioFileSorter:
             target=self.process_directory, args=(directory, group_size), daemon=True
         ).start()
 
+    def start_packaging(self):
+        """把每组章节打包为一个分卷文件"""
+        directory = self.dir_entry.get()
+        if not directory or not os.path.exists(directory):
+            messagebox.showerror("错误", "请选择一个存在的目录")
+            return
+
+        if not self.file_info:
+            self.scan_files()
+            if not self.file_info:
+                return
+
+        try:
+            group_size = self.group_size.get()
+            workers = self.pack_workers.get()
+            if group_size <= 0 or workers <= 0:
+                messagebox.showerror("错误", "每组文件数量和并行数必须大于0")
+                return
+        except:
+            messagebox.showerror("错误", "每组文件数量和并行数必须是有效的整数")
+            return
+
+        fmt = self.pack_format.get()
+        files = [
+            filename
+            for filename, _ in self.file_info
+            if filename.lower().endswith(PACK_FORMATS[fmt])
+        ]
+        if not files:
+            messagebox.showerror(
+                "错误",
+                f"没有可以打包为 {fmt} 的章节文件（{'、'.join(PACK_FORMATS[fmt])}）",
+            )
+            return
+        skipped = len(self.file_info) - len(files)
+        if skipped:
+            self.log(f"{skipped} 个文件的格式不能直接打包为 {fmt}，已跳过")
+
+        if self.preview_mode.get():
+            groups = (len(files) + group_size - 1) // group_size
+            if not messagebox.askyesno(
+                "确认", f"确定要把 {len(files)} 个章节打包为 {groups} 个 {fmt} 分卷吗？"
+            ):
+                return
+
+        self.processing = True
+        self.cancel_flag = False
+        self.start_btn.config(state=tk.DISABLED)
+        self.pack_btn.config(state=tk.DISABLED)
+        self.scan_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progress["value"] = 0
+
+        threading.Thread(
+            target=self.package_directory,
+            args=(directory, files, group_size, fmt, workers),
+            daemon=True,
+        ).start()
+
+    def package_directory(self, directory, files, group_size, fmt, workers):
+        try:
+            groups = [
+                [os.path.join(directory, f) for f in files[i : i + group_size]]
+                for i in range(0, len(files), group_size)
+            ]
+            output_dir = os.path.join(directory, "volumes")
+            album = os.path.basename(os.path.normpath(directory))
+            self.log(
+                f"开始打包 {len(groups)} 个 {fmt} 分卷到 {output_dir}，并行数 {workers}"
+            )
+
+            self.progress["maximum"] = len(groups)
+            self.progress["value"] = 0
+            start = time.time()
+            done = 0
+            failed = 0
+            for index, output_path, result in package_volumes(
+                groups,
+                output_dir,
+                fmt,
+                album,
+                prefix=self.folder_prefix.get(),
+                max_workers=workers,
+                cancelled=lambda: self.cancel_flag,
+            ):
+                done += 1
+                if isinstance(result, Exception):
+                    failed += 1
+                    self.log(f"错误: 分卷 {index + 1} 打包失败: {result}")
+                else:
+                    self.log(
+                        f"分卷 {os.path.basename(output_path)}: "
+                        f"{len(groups[index])} 章，时长 {result / 60:.1f} 分钟"
+                    )
+                self.progress["value"] = done
+                self.update_status(f"已打包: {done}/{len(groups)}")
+
+            if self.cancel_flag:
+                self.log("打包已取消")
+                return
+            elapsed = time.time() - start
+            self.log(f"打包完成，用时 {elapsed:.1f} 秒")
+            messagebox.showinfo(
+                "完成",
+                f"打包完成！\n\n共 {len(groups)} 个分卷，失败 {failed} 个。\n"
+                f"分卷保存在 {output_dir}",
+            )
+
+        except Exception as e:
+            self.log(f"发生错误: {str(e)}")
+            messagebox.showerror("错误", f"打包过程中发生错误: {str(e)}")
+
+        finally:
+            self.processing_completed()
+
     def cancel_processing(self):
         if messagebox.askyesno("确认", "确定要取消处理吗？"):
             self.cancel_flag = True
@@ -601,6 +708,7 @@ class AudioFileSorter:
         # 恢复界面状态
         self.processing = False
         self.start_btn.config(state=tk.NORMAL)
+        self.pack_btn.config(state=tk.NORMAL)
         self.scan_btn.config(state=tk.NORMAL)
         self.cancel_btn.config(state=tk.DISABLED)
         self.update_status("就绪")
@@ -11,6 +11,17 @@ import pyperclip
 import re
 import sys
 
+from batch_jobs import BatchJob, run_batch
+from publisher import Publisher
+from ximalaya_client import (
+    BASE_URL,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MIN_INTERVAL,
+    TrackCache,
+    XimalayaClient,
+    sync_tracks,
+)
+
 
 class XimalayaManager:
     def __init__(self, root):
@@ -25,10 +36,22 @@ class XimalayaManager:
         self.config = configparser.ConfigParser()
         self.album_id = "123456"  # 默认专辑ID
         self.cookie_file = "cookie.txt"  # 保存cookie的文件
+        self.sync_concurrency = DEFAULT_CONCURRENCY  # 获取作品列表的并发请求数
+        self.sync_interval = DEFAULT_MIN_INTERVAL  # 相邻请求的最小间隔（秒）
+        self.track_cache = None  # 当前专辑的作品缓存
+        self.base_url = BASE_URL  # 接口地址，测试时可以指向本地替身服务器
+        self.audio_dir = (
+            "audio"  # 合成程序的输出目录，章节音频在 {audio_dir}/{书籍ID}/audio
+        )
+        self.publish_book_id = ""  # 上次发布的书籍ID
+        self.publish_workers = 3  # 同时上传的章节数
+        self.publish_interval = 30  # 持续发布时扫描目录的间隔（秒）
+        self.publish_stop = None  # 发布进行中时为停止事件
 
         self.load_config()
         self.setup_ui()
         self.load_cookie()
+        self.check_unfinished_delete()
 
     def load_config(self):
         """加载配置文件"""
@@ -40,6 +63,24 @@ class XimalayaManager:
                         self.album_id = self.config["Settings"]["album_id"]
                     if "cookie_file" in self.config["Settings"]:
                         self.cookie_file = self.config["Settings"]["cookie_file"]
+                    settings = self.config["Settings"]
+                    self.base_url = settings.get("base_url", self.base_url)
+                    self.sync_concurrency = settings.getint(
+                        "sync_concurrency", self.sync_concurrency
+                    )
+                    self.sync_interval = settings.getfloat(
+                        "sync_interval", self.sync_interval
+                    )
+                    self.audio_dir = settings.get("audio_dir", self.audio_dir)
+                    self.publish_book_id = settings.get(
+                        "publish_book_id", self.publish_book_id
+                    )
+                    self.publish_workers = settings.getint(
+                        "publish_workers", self.publish_workers
+                    )
+                    self.publish_interval = settings.getfloat(
+                        "publish_interval", self.publish_interval
+                    )
         except Exception as e:
             print(f"加载配置文件失败: {str(e)}")
 
@@ -51,6 +92,13 @@ class XimalayaManager:
 
             self.config["Settings"]["album_id"] = self.album_id
             self.config["Settings"]["cookie_file"] = self.cookie_file
+            self.config["Settings"]["sync_concurrency"] = str(self.sync_concurrency)
+            self.config["Settings"]["sync_interval"] = str(self.sync_interval)
+            self.config["Settings"]["base_url"] = self.base_url
+            self.config["Settings"]["audio_dir"] = self.audio_dir
+            self.config["Settings"]["publish_book_id"] = self.publish_book_id
+            self.config["Settings"]["publish_workers"] = str(self.publish_workers)
+            self.config["Settings"]["publish_interval"] = str(self.publish_interval)
 
             with open(self.config_file, "w", encoding="utf-8") as f:
                 self.config.write(f)
@@ -80,9 +128,18 @@ class XimalayaManager:
         # 操作菜单
         action_menu = tk.Menu(menu_bar, tearoff=0)
         action_menu.add_command(label="获取作品列表", command=self.get_tracks)
+        action_menu.add_command(
+            label="完整刷新作品列表", command=lambda: self.get_tracks(full=True)
+        )
         action_menu.add_command(
             label="批量删除作品", command=lambda: self.show_delete_dialog()
         )
+        action_menu.add_command(
+            label="继续未完成的批量删除", command=self.resume_batch_delete
+        )
+        action_menu.add_separator()
+        action_menu.add_command(label="发布章节", command=self.start_publish)
+        action_menu.add_command(label="停止发布", command=self.stop_publish)
         menu_bar.add_cascade(label="操作", menu=action_menu)
 
         # 设置菜单
@@ -394,6 +451,7 @@ class XimalayaManager:
             )
             if new_album_id and new_album_id.strip():
                 self.album_id = new_album_id.strip()
+                self.track_cache = None
                 self.album_id_label.config(text=self.album_id)
 
                 # 更新配置
@@ -403,8 +461,8 @@ class XimalayaManager:
         except Exception as e:
             self.log(f"设置专辑ID失败: {str(e)}")
 
-    def get_tracks(self):
-        """获取作品列表"""
+    def get_tracks(self, full=False):
+        """获取作品列表，full 为True时忽略本地缓存重新获取全部页"""
         try:
             # 清空现有列表
             for item in self.track_tree.get_children():
@@ -427,7 +485,9 @@ class XimalayaManager:
             self.root.config(cursor="wait")
             self.status_bar.config(text="正在获取作品列表...")
 
-            thread = threading.Thread(target=self._get_tracks_thread, args=(cookie,))
+            thread = threading.Thread(
+                target=self._get_tracks_thread, args=(cookie, full)
+            )
             thread.daemon = True
             thread.start()
         except Exception as e:
@@ -435,52 +495,31 @@ class XimalayaManager:
             messagebox.showerror("错误", f"获取作品列表失败: {str(e)}")
             self.root.config(cursor="")
 
-    def _get_tracks_thread(self, cookie):
-        """在线程中获取作品列表"""
-        try:
-            total_pages = 1
-            current_page = 1
-            all_tracks = []
-
-            while current_page <= total_pages:
-                url = f"https://www.ximalaya.com/reform-upload/manage/album/tracks?albumId={self.album_id}&page={current_page}&pageSize=40&order=ASC&state=1"
-
-                headers = {
-                    "Cookie": cookie,
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-                }
-
-                response = requests.get(url, headers=headers)
-                data = response.json()
-                if data.get("ret") == 0 and data.get("msg") == "成功":
-                    # 获取作品列表成功
-                    page_data = data.get("data", {})
-                    tracks = page_data.get("infos", [])
-
-                    # 更新总页数
-                    if current_page == 1:
-                        total_size = page_data.get("totalSize", 0)
-                        page_size = page_data.get("pageSize", 40)
-                        total_pages = (total_size + page_size - 1) // page_size
-
-                        self.log(f"共找到 {total_size} 个作品，共 {total_pages} 页")
+    def _get_tracks_thread(self, cookie, full=False):
+        """
+        在线程中获取作品列表
 
-                    all_tracks.extend(tracks)
-
-                    self.log(
-                        f"已获取第 {current_page}/{total_pages} 页作品，{len(tracks)} 个"
-                    )
+        第一页得到作品总数后，其余页在速率预算内并发获取；
+        本地缓存有效时只获取新增作品所在的页，见 ximalaya_client.sync_tracks
+        """
+        client = self.create_client(cookie)
+        try:
+            start = time.time()
+            cache = TrackCache(self.album_id)
+            if cache.order and not full:
+                self.log(f"本地缓存中有 {len(cache.order)} 个作品，只获取有变化的页")
 
-                    current_page += 1
+            def progress(done, needed):
+                self.status_bar.config(text=f"正在获取作品列表: {done}/{needed} 页")
 
-                    # 防止请求过快
-                    time.sleep(0.5)
-                else:
-                    error_msg = data.get("msg", "未知错误")
-                    self.log(f"获取作品列表失败: {error_msg}")
-                    self.log(f"获取作品列表失败: {response.text}")
-                    messagebox.showerror("错误", f"获取作品列表失败: {error_msg}")
-                    break
+            all_tracks, fetched, total_pages = sync_tracks(
+                client, self.album_id, cache, full=full, progress=progress
+            )
+            self.track_cache = cache
+            self.log(
+                f"共找到 {len(all_tracks)} 个作品，共 {total_pages} 页，"
+                f"本次获取 {fetched} 页，用时 {time.time() - start:.1f} 秒"
+            )
 
             # 在主线程中更新UI
             self.root.after(0, lambda: self._update_track_list(all_tracks))
@@ -488,6 +527,14 @@ class XimalayaManager:
             self.log(f"获取作品列表失败: {str(e)}")
             messagebox.showerror("错误", f"获取作品列表失败: {str(e)}")
             self.root.config(cursor="")
+        finally:
+            client.close()
+
+    def create_client(self, cookie):
+        """按配置的速率预算和接口地址创建客户端"""
+        return XimalayaClient(
+            cookie, self.sync_concurrency, self.sync_interval, base_url=self.base_url
+        )
 
     def _update_track_list(self, tracks):
         """更新作品列表UI"""
@@ -806,9 +853,30 @@ class XimalayaManager:
             if not confirm:
                 return
 
+            job = BatchJob.existing(self.delete_job_path())
+            if job and job.pending():
+                if not messagebox.askyesno(
+                    "未完成的批量删除",
+                    f"上次的批量删除还有 {len(job.pending())} 个作品未完成，"
+                    "开始新的批量删除将放弃上次的进度，是否继续？",
+                ):
+                    return
+
+            # 任务先写入进度文件，中途关闭工具后可以继续
+            job = BatchJob.create(
+                self.delete_job_path(),
+                "delete",
+                [
+                    {"key": track.get("trackId"), "title": track.get("title", "")}
+                    for track in tracks_to_delete
+                    if track.get("trackId")
+                ],
+                {"album_id": self.album_id},
+            )
+
             # 启动线程批量删除
             thread = threading.Thread(
-                target=self._batch_delete_thread, args=(cookie, tracks_to_delete)
+                target=self._batch_delete_thread, args=(cookie, job)
             )
             thread.daemon = True
             thread.start()
@@ -890,90 +958,109 @@ class XimalayaManager:
             self.log(f"删除作品《{title}》(ID: {track_id})失败: {str(e)}")
             messagebox.showerror("错误", f"删除作品失败: {str(e)}")
 
-    def _batch_delete_thread(self, cookie, tracks):
-        """在线程中批量删除作品"""
+    def delete_job_path(self, album_id=None):
+        """批量删除的进度文件"""
+        return f"batch_delete_{album_id or self.album_id}.jsonl"
+
+    def check_unfinished_delete(self):
+        """启动时提示上次未完成的批量删除"""
+        job = BatchJob.existing(self.delete_job_path())
+        if job and job.pending():
+            self.log(
+                f"专辑 {self.album_id} 有未完成的批量删除（剩余 {len(job.pending())} 个），"
+                "可通过「操作 → 继续未完成的批量删除」继续"
+            )
+
+    def resume_batch_delete(self):
+        """继续上次中断或有失败项的批量删除"""
+        job = BatchJob.existing(self.delete_job_path())
+        if not job or not job.pending():
+            messagebox.showinfo("提示", "没有未完成的批量删除")
+            return
+
+        cookie = self.cookie_entry.get(1.0, tk.END).strip()
+        if not cookie:
+            messagebox.showwarning("警告", "请先填入Cookie!")
+            return
+
+        if not messagebox.askyesno(
+            "继续批量删除",
+            f"共 {len(job.items)} 个作品，已删除 {len(job.succeeded())} 个，"
+            f"剩余 {len(job.pending())} 个，是否继续？",
+        ):
+            return
+
+        thread = threading.Thread(target=self._batch_delete_thread, args=(cookie, job))
+        thread.daemon = True
+        thread.start()
+
+    def _batch_delete_thread(self, cookie, job):
+        """
+        在线程中批量删除作品
+
+        多个删除请求在速率预算内并发执行，出错时自动退避；
+        每个作品的结果写入进度文件，中断后可以从剩余的作品继续
+        """
+        client = self.create_client(cookie)
         try:
-            self.log(f"开始批量删除 {len(tracks)} 个作品...")
+            album_id = job.params.get("album_id", self.album_id)
+            pending = job.pending()
+            total = len(pending)
+            self.log(f"开始批量删除 {total} 个作品（共 {len(job.items)} 个）...")
             self.status_bar.config(text=f"正在批量删除作品...")
 
             # 禁用按钮
             self.root.config(cursor="wait")
 
-            success_count = 0
-            fail_count = 0
-
-            url = "https://www.ximalaya.com/reform-upload/manage/album/track/delete"
-
-            headers = {
-                "Accept": "application/json, text/plain, */*",
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Host": "www.ximalaya.com",
-                "Pragma": "no-cache",
-                "Referer": "https://www.ximalaya.com/reform-upload/page/sound/manage/123456",
-                "Sec-Fetch-Dest": "empty",
-                "Sec-Fetch-Mode": "cors",
-                "Sec-Fetch-Site": "same-origin",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-                "sec-ch-ua": '"Chromium";v="134", "Not:A-Brand";v="24", "Google Chrome";v="134"',
-                "sec-ch-ua-platform": "Windows",
-                "Content-Type": "application/json",
-                "Cookie": cookie,
-            }
-
-            total = len(tracks)
+            start = time.time()
+            finished = 0
             deleted_track_ids = []
 
-            for i, track in enumerate(tracks, 1):
-                track_id = track.get("trackId", "")
-                title = track.get("title", "")
-
-                if not track_id:
-                    continue
+            def delete(item):
+                return client.delete_track(item["key"], album_id)
 
-                payload = json.dumps({"trackId": int(track_id)})
-
-                # 更新状态栏
+            def progress(item, ok, message):
+                nonlocal finished
+                finished += 1
+                title = item.get("title", "")
+                if ok:
+                    deleted_track_ids.append(item["key"])
+                    self.log(
+                        f"[{finished}/{total}] 成功删除作品《{title}》(ID: {item['key']})"
+                    )
+                else:
+                    self.log(
+                        f"[{finished}/{total}] 删除作品《{title}》(ID: {item['key']})失败: {message}"
+                    )
                 self.root.after(
                     0,
-                    lambda msg=f"正在删除 ({i}/{total}): {title}": self.status_bar.config(
+                    lambda msg=f"正在删除 ({finished}/{total}): {title}": self.status_bar.config(
                         text=msg
                     ),
                 )
 
-                try:
-                    response = requests.post(url, headers=headers, data=payload)
-                    data = response.json()
-
-                    if data.get("ret") == 0 and data.get("msg") == "成功":
-                        # 删除成功
-                        success_count += 1
-                        deleted_track_ids.append(track_id)
-                        self.log(
-                            f"[{i}/{total}] 成功删除作品《{title}》(ID: {track_id})"
-                        )
-                    else:
-                        error_msg = data.get("msg", "未知错误")
-                        fail_count += 1
-                        self.log(
-                            f"[{i}/{total}] 删除作品《{title}》(ID: {track_id})失败: {error_msg}"
-                        )
-                except Exception as e:
-                    fail_count += 1
-                    self.log(
-                        f"[{i}/{total}] 删除作品《{title}》(ID: {track_id})失败: {str(e)}"
-                    )
+            success_count, fail_count, _ = run_batch(
+                job, delete, workers=client.concurrency, progress=progress
+            )
 
-                # 删除间隔，避免请求过快
-                time.sleep(0.5)
+            # 全部成功后删除进度文件，有失败时保留，可以继续重试
+            if not job.pending():
+                job.remove()
+            else:
+                self.log(
+                    f"{len(job.pending())} 个作品删除失败，"
+                    "可通过「操作 → 继续未完成的批量删除」重试"
+                )
 
             # 批量删除完成后，更新列表
             self.root.after(
                 0, lambda ids=deleted_track_ids: self._remove_tracks_from_list(ids)
             )
 
-            self.log(f"批量删除完成: 成功 {success_count} 个，失败 {fail_count} 个")
+            self.log(
+                f"批量删除完成: 成功 {success_count} 个，失败 {fail_count} 个，"
+                f"用时 {time.time() - start:.1f} 秒"
+            )
             self.root.after(
                 0,
                 lambda: self.status_bar.config(
@@ -996,6 +1083,8 @@ class XimalayaManager:
             self.log(f"批量删除过程中发生错误: {str(e)}")
             messagebox.showerror("错误", f"批量删除过程中发生错误: {str(e)}")
             self.root.config(cursor="")
+        finally:
+            client.close()
 
     def _remove_track_from_list(self, track_id):
         """从列表中移除已删除的作品"""
@@ -1012,6 +1101,8 @@ class XimalayaManager:
                 for track in self.tracks
                 if str(track.get("trackId", "")) != str(track_id)
             ]
+            if self.track_cache:
+                self.track_cache.remove([track_id])
 
             # 更新统计信息
             self.stats_label.config(text=f"总作品数: {len(self.tracks)}")
@@ -1021,23 +1112,133 @@ class XimalayaManager:
     def _remove_tracks_from_list(self, track_ids):
         """从列表中批量移除已删除的作品"""
         try:
+            removed = set(map(str, track_ids))
+
             # 从TreeView中移除
             for item in self.track_tree.get_children():
-                if self.track_tree.item(item, "values")[1] in map(str, track_ids):
+                if self.track_tree.item(item, "values")[1] in removed:
                     self.track_tree.delete(item)
 
             # 从缓存中移除
             self.tracks = [
                 track
                 for track in self.tracks
-                if str(track.get("trackId", "")) not in map(str, track_ids)
+                if str(track.get("trackId", "")) not in removed
             ]
+            if self.track_cache:
+                self.track_cache.remove(track_ids)
 
             # 更新统计信息
             self.stats_label.config(text=f"总作品数: {len(self.tracks)}")
         except Exception as e:
             self.log(f"从列表中批量移除作品失败: {str(e)}")
 
+    def start_publish(self):
+        """把合成完成的章节发布到当前专辑"""
+        if self.publish_stop is not None:
+            messagebox.showinfo("提示", "发布正在进行中")
+            return
+
+        cookie = self.cookie_entry.get(1.0, tk.END).strip()
+        if not cookie:
+            messagebox.showwarning("警告", "请先填入Cookie!")
+            return
+
+        book_id = simpledialog.askstring(
+            "发布章节", "请输入书籍ID:", initialvalue=self.publish_book_id
+        )
+        if not book_id or not book_id.strip():
+            return
+        book_id = book_id.strip()
+        directory = os.path.join(self.audio_dir, book_id, "audio")
+        if not os.path.isdir(directory):
+            messagebox.showerror("错误", f"章节音频目录不存在: {directory}")
+            return
+
+        watch = messagebox.askyesno(
+            "发布章节",
+            f"将把 {directory} 中的章节发布到专辑 {self.album_id}。\n\n"
+            "是否持续监视目录，合成出新章节后自动发布？\n"
+            "（选择「否」只发布目录中现有的章节）",
+        )
+
+        self.publish_book_id = book_id
+        self.save_config()
+
+        self.publish_stop = threading.Event()
+        thread = threading.Thread(
+            target=self._publish_thread, args=(cookie, directory, watch)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def stop_publish(self):
+        """停止发布，正在上传的分块完成后停止，下次发布时从中断处继续"""
+        if self.publish_stop is None:
+            messagebox.showinfo("提示", "没有正在进行的发布")
+            return
+        self.publish_stop.set()
+        self.log("正在停止发布...")
+
+    def _publish_thread(self, cookie, directory, watch):
+        """
+        在线程中发布章节
+
+        章节并发分块上传，按章节顺序创建作品，并在作品列表中确认，见 publisher.Publisher；
+        进度写入 publish_{专辑ID}.jsonl，中断后再次发布时继续
+        """
+        client = self.create_client(cookie)
+        stop = self.publish_stop
+        try:
+            publisher = Publisher(
+                client,
+                self.album_id,
+                directory,
+                workers=self.publish_workers,
+                log=self.log,
+            )
+            self.log(
+                f"开始发布 {directory} 到专辑 {self.album_id}"
+                + (f"，每 {self.publish_interval:g} 秒扫描一次" if watch else "")
+            )
+
+            def on_round(stats):
+                if stats["uploaded"] or stats["failed"]:
+                    self.log(
+                        f"本轮上传 {stats['uploaded']} 个章节"
+                        f"（{stats['bytes'] / 1024 / 1024:.1f} MB），"
+                        f"创建 {stats['created']} 个作品，失败 {stats['failed']} 个，"
+                        f"用时 {stats['seconds']:.1f} 秒"
+                    )
+                if stats["confirmed"]:
+                    self.log(f"已在作品列表中确认 {stats['confirmed']} 个新作品")
+                if stats["created"] or stats["confirmed"]:
+                    self.track_cache = publisher.cache
+                    self.root.after(
+                        0,
+                        lambda tracks=publisher.cache.all_tracks(): self._reload_track_list(
+                            tracks
+                        ),
+                    )
+
+            if watch:
+                publisher.watch(self.publish_interval, stop.is_set, on_round)
+            else:
+                on_round(publisher.run_once(stop.is_set))
+            self.log("发布已停止" if stop.is_set() else "发布完成")
+        except Exception as e:
+            self.log(f"发布过程中发生错误: {str(e)}")
+            messagebox.showerror("错误", f"发布过程中发生错误: {str(e)}")
+        finally:
+            client.close()
+            self.publish_stop = None
+
+    def _reload_track_list(self, tracks):
+        """用新的作品列表替换列表中的内容"""
+        for item in self.track_tree.get_children():
+            self.track_tree.delete(item)
+        self._update_track_list(tracks)
+
     def export_track_list(self):
         """导出作品列表到文件"""
         try:
@@ -1110,8 +1311,14 @@ class XimalayaManager:
 5. 批量删除：
    - 按序号删除：输入序号范围（如1-5）
    - 按名称删除：输入开始名称和结束名称
+   - 中途关闭后可通过「操作」→「继续未完成的批量删除」继续
+
+6. 发布章节：
+   - 「操作」→「发布章节」，输入书籍ID，把 audio/书籍ID/audio 中的章节发布到当前专辑
+   - 可以持续监视目录，合成出新章节后自动上传
+   - 中途停止或关闭后再次发布时从中断处继续，已发布的章节不会重复上传
 
-6. 日志和导出：
+7. 日志和导出：
    - 可导出操作日志
    - 可导出作品列表为CSV文件
 
@@ -1133,6 +1340,7 @@ class XimalayaManager:
 - 获取专辑作品列表
 - 支持批量删除作品
 - 按序号或名称范围删除
+- 发布合成完成的章节
 - 导出作品列表和日志
 
 本工具仅供学习和个人使用，请勿用于非法用途。
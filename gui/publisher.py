@@ -0,0 +1,341 @@
+"""
+章节发布
+
+把 audio/{book_id}/audio 中新完成的章节音频发布到专辑，每一轮：
+    1. 多个章节并发分块上传（共用 XimalayaClient 的速率预算），每块上传后核对 md5
+    2. 按章节顺序在专辑中创建作品（专辑按创建时间排序），有章节上传失败时之后的章节留到下一轮
+    3. 增量同步作品列表，确认新作品已出现在专辑中
+watch 按固定间隔重复执行，合成程序写出新章节后自动发布。
+
+每个章节的进度写入上传记录（追加写入的 jsonl，同一章节以最后一条为准）：
+    uploading  已创建上传任务，中断后查询服务端已收到的分块，只上传缺少的部分
+    uploaded   分块已合并，等待创建作品
+    creating   正在创建作品，中断后先在作品列表中按标题查找，避免重复创建
+    created    已创建作品，等待在作品列表中确认
+    confirmed  已在作品列表中确认
+章节文件由合成程序先写入 .part 临时文件再重命名；有片段缺失的章节写入 audio_incomplete 目录，
+补齐后才移入 audio 目录，因此目录中的音频文件都是完整的。
+已创建作品的章节文件被重新生成（修改文本、更换语音）后，文件版本与上传时记录的不同，
+每个版本提示一次：专辑按创建时间排序，不自动重新发布，需要在专辑中替换该作品的音频。
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from file_utils import AUDIO_EXTENSIONS, chapter_number, file_versions, read_jsonl
+from ximalaya_client import UPLOAD_CHUNK_SIZE, TrackCache, sync_tracks, track_key
+
+# 作品创建后连续多少轮没有出现在作品列表中时给出提示
+CONFIRM_WARN_CHECKS = 3
+
+
+class UploadLedger:
+    """上传记录，每个章节文件一条，键为文件名"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        """加载上传记录，截掉中断时可能残留的半行记录"""
+        for entry in read_jsonl(self.path):
+            if entry.get("key"):
+                self.entries[entry["key"]] = entry
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.entries.get(key, {}))
+
+    def state(self, key):
+        return self.get(key).get("state")
+
+    def update(self, key, **fields):
+        """合并字段并追加一条完整记录，落盘后再返回"""
+        with self.lock:
+            entry = dict(self.entries.get(key, {}), key=key, **fields)
+            entry["at"] = time.time()
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            return dict(entry)
+
+    def keys(self, *states):
+        with self.lock:
+            return [
+                key for key, entry in self.entries.items() if entry["state"] in states
+            ]
+
+
+def chapter_title(file_name):
+    return os.path.splitext(file_name)[0]
+
+
+class Publisher:
+    """
+    把一本书的章节音频发布到专辑
+
+    client 为 XimalayaClient，上传和作品列表请求共用它的速率预算；
+    workers 为同时上传的章节数，log(消息) 可以在任意线程中调用
+    """
+
+    def __init__(
+        self,
+        client,
+        album_id,
+        audio_dir,
+        ledger_path=None,
+        workers=3,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        log=print,
+    ):
+        self.client = client
+        self.album_id = str(album_id)
+        self.audio_dir = audio_dir
+        self.ledger = UploadLedger(ledger_path or f"publish_{self.album_id}.jsonl")
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.log = log
+        self.cache = TrackCache(self.album_id)
+        self.unconfirmed_checks = {}
+
+    def scan(self):
+        """目录中还没有创建作品的章节文件，按章节顺序排列"""
+        if not os.path.isdir(self.audio_dir):
+            return []
+
+        files = []
+        for file_name in os.listdir(self.audio_dir):
+            if not file_name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            if self.ledger.state(file_name) in ("creating", "created", "confirmed"):
+                continue
+            path = os.path.join(self.audio_dir, file_name)
+            number = chapter_number(file_name)
+            files.append(
+                (
+                    number is None,
+                    number or 0,
+                    os.path.getmtime(path),
+                    file_name,
+                )
+            )
+        return [item[-1] for item in sorted(files)]
+
+    def find_rebuilt(self):
+        """
+        已创建作品、上传之后又被重新生成的章节文件，每个新版本只提示一次
+
+        返回本次发现的文件名列表
+        """
+        rebuilt = []
+        for file_name in self.ledger.keys("creating", "created", "confirmed"):
+            entry = self.ledger.get(file_name)
+            path = os.path.join(self.audio_dir, file_name)
+            version = list(file_versions(path)[0] or ())
+            if not version or not entry.get("version"):
+                continue
+            if version in (entry["version"], entry.get("rebuilt")):
+                continue
+            self.ledger.update(file_name, rebuilt=version)
+            self.log(
+                f"《{chapter_title(file_name)}》已重新生成，"
+                f"专辑中的作品 (ID: {entry.get('track_id', '')}) 仍是旧版本，需要替换音频"
+            )
+            rebuilt.append(file_name)
+        return rebuilt
+
+    def upload(self, file_name, cancelled=None):
+        """
+        上传一个章节文件（在线程池中执行），返回本次实际上传的字节数
+
+        文件在上次上传之后有变化、上传任务不存在或已过期时重新创建上传任务
+        """
+        path = os.path.join(self.audio_dir, file_name)
+        version = list(file_versions(path)[0] or ())
+        entry = self.ledger.get(file_name)
+        if entry.get("version") == version and entry.get("state") == "uploaded":
+            return 0
+
+        upload_id = None
+        received = None
+        chunk_size = self.chunk_size
+        if entry.get("version") == version and entry.get("state") == "uploading":
+            upload_id = entry["upload_id"]
+            chunk_size = entry.get("chunk_size", chunk_size)
+            received = self.client.upload_status(upload_id)
+        if received is None:
+            size = os.path.getsize(path)
+            upload_id = self.client.create_upload(file_name, size, chunk_size)
+            received = set()
+            self.ledger.update(
+                file_name,
+                state="uploading",
+                upload_id=upload_id,
+                chunk_size=chunk_size,
+                version=version,
+                error="",
+            )
+        elif received:
+            self.log(f"《{chapter_title(file_name)}》继续上传，已有 {len(received)} 块")
+
+        sent = 0
+        chunks = max(1, (version[1] + chunk_size - 1) // chunk_size)
+        with open(path, "rb") as f:
+            for index in range(chunks):
+                if index in received:
+                    continue
+                if cancelled and cancelled():
+                    raise InterruptedError("发布已取消")
+                f.seek(index * chunk_size)
+                chunk = f.read(chunk_size)
+                self.client.upload_chunk(upload_id, index, chunk)
+                sent += len(chunk)
+
+        file_id = self.client.complete_upload(upload_id)
+        self.ledger.update(file_name, state="uploaded", file_id=file_id, error="")
+        return sent
+
+    def create(self, file_name):
+        """用已上传的文件创建作品"""
+        entry = self.ledger.update(file_name, state="creating")
+        track_id = self.client.create_track(
+            self.album_id, chapter_title(file_name), entry["file_id"]
+        )
+        self.ledger.update(file_name, state="created", track_id=str(track_id))
+        self.log(f"已创建作品《{chapter_title(file_name)}》(ID: {track_id})")
+
+    def confirm(self):
+        """
+        增量同步作品列表，确认已创建的作品
+
+        creating 状态（创建时中断）的章节在列表中按标题查找，找不到时退回 uploaded 重新创建。
+        返回本次确认的章节数
+        """
+        pending = self.ledger.keys("creating", "created")
+        if not pending:
+            return 0
+
+        tracks, _, _ = sync_tracks(self.client, self.album_id, self.cache)
+        by_id = {track_key(track): track for track in tracks}
+        by_title = {track.get("title", ""): track for track in tracks}
+
+        confirmed = 0
+        for file_name in pending:
+            entry = self.ledger.get(file_name)
+            title = chapter_title(file_name)
+            if entry["state"] == "creating":
+                track = by_title.get(title)
+                if track is None:
+                    self.ledger.update(file_name, state="uploaded")
+                    continue
+                entry = self.ledger.update(
+                    file_name, state="created", track_id=track_key(track)
+                )
+
+            if entry["track_id"] in by_id:
+                self.ledger.update(file_name, state="confirmed")
+                self.unconfirmed_checks.pop(file_name, None)
+                confirmed += 1
+                continue
+
+            checks = self.unconfirmed_checks.get(file_name, 0) + 1
+            self.unconfirmed_checks[file_name] = checks
+            if checks == CONFIRM_WARN_CHECKS:
+                self.log(
+                    f"作品《{title}》(ID: {entry['track_id']}) 创建后仍未出现在作品列表中，"
+                    "可能正在审核或转码"
+                )
+        return confirmed
+
+    def run_once(self, cancelled=None):
+        """
+        发布一轮：并发上传新章节，按章节顺序创建作品，然后确认
+
+        返回统计 {"uploaded", "created", "confirmed", "rebuilt", "failed", "bytes", "seconds"}
+        """
+        start = time.time()
+        stats = {"uploaded": 0, "created": 0, "failed": 0, "bytes": 0}
+
+        # 发布后又重新生成的章节只提示，不重复创建作品
+        stats["rebuilt"] = len(self.find_rebuilt())
+
+        # 上次在创建作品时中断的章节，先确认是否已经创建
+        if self.ledger.keys("creating"):
+            self.confirm()
+
+        files = self.scan()
+        if files:
+            self.log(f"发现 {len(files)} 个待发布的章节")
+
+        # 按章节顺序创建作品：前面的章节都上传完成后才创建，有章节失败时之后的章节留到下一轮
+        results = {}
+        next_index = 0
+        blocked = False
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.upload, file_name, cancelled): file_name
+                for file_name in files
+            }
+            for future in as_completed(futures):
+                file_name = futures[future]
+                try:
+                    stats["bytes"] += future.result()
+                    stats["uploaded"] += 1
+                    results[file_name] = True
+                except InterruptedError:
+                    results[file_name] = False
+                except Exception as e:
+                    stats["failed"] += 1
+                    results[file_name] = False
+                    self.ledger.update(file_name, error=str(e))
+                    self.log(f"上传《{chapter_title(file_name)}》失败: {e}")
+
+                while not blocked and next_index < len(files):
+                    file_name = files[next_index]
+                    if file_name not in results:
+                        break
+                    if not results[file_name] or (cancelled and cancelled()):
+                        blocked = True
+                        break
+                    try:
+                        self.create(file_name)
+                        stats["created"] += 1
+                    except Exception as e:
+                        # 保留 creating 状态，下一轮先在作品列表中确认是否已经创建
+                        blocked = True
+                        stats["failed"] += 1
+                        self.ledger.update(file_name, error=str(e))
+                        self.log(f"创建作品《{chapter_title(file_name)}》失败: {e}")
+                    next_index += 1
+
+        stats["confirmed"] = self.confirm()
+        stats["seconds"] = time.time() - start
+        return stats
+
+    def watch(self, interval=30, cancelled=None, on_round=None):
+        """
+        持续发布，每轮结束后等待 interval 秒再扫描目录，cancelled() 为True时返回
+
+        on_round(统计) 在每轮结束后调用，单轮出错时记录日志并在下一轮重试
+        """
+        while not (cancelled and cancelled()):
+            try:
+                stats = self.run_once(cancelled)
+                if on_round:
+                    on_round(stats)
+            except Exception as e:
+                self.log(f"发布出错，{interval} 秒后重试: {e}")
+
+            deadline = time.monotonic() + interval
+            while time.monotonic() < deadline:
+                if cancelled and cancelled():
+                    return
+                time.sleep(min(1.0, interval))
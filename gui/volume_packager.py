@@ -0,0 +1,283 @@
+"""
+章节音频打包为分卷
+
+把一组章节文件按顺序流式合并为一个分卷文件，并按章节标题写入章节标记，不重新编码：
+    mp3  MP3帧按字节拼接（去掉每个章节的标签和信息帧），开头写入带 CHAP/CTOC 帧的 ID3v2.3 标签
+    m4b  AAC 章节（m4a）由 ffmpeg 的 concat 分离器按流复制合并，章节标记写入 mp4 章节表
+
+章节标签的长度只取决于章节标题，mp3 分卷先写入同样长度的占位标签，
+拼接过程中累计每个章节的时长，完成后回写标签，每个章节文件只读取一次。
+多个分卷在线程池中并行打包，先写入 .part 临时文件，完成后重命名。
+"""
+
+import os
+import struct
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from chapter_assembler import audio_frames, frames_duration, parse_frame_header
+
+# ffmpeg 可执行文件（打包 m4b 时使用）
+FFMPEG = "ffmpeg"
+
+# 打包格式与输入章节文件的扩展名
+PACK_FORMATS = {
+    "mp3": (".mp3",),
+    "m4b": (".m4a", ".m4b", ".mp4"),
+}
+
+# ID3v2 的 CTOC 帧最多记录255个子元素
+MAX_CHAPTERS = 255
+
+
+def _text_frame(frame_id, text):
+    """ID3v2.3 文本帧，使用带BOM的UTF-16编码"""
+    body = b"\x01" + text.encode("utf-16") + b"\x00\x00"
+    return _frame(frame_id, body)
+
+
+def _frame(frame_id, body):
+    return frame_id.encode("ascii") + struct.pack(">IH", len(body), 0) + body
+
+
+def _syncsafe(size):
+    return bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def chapter_tag(album, volume_title, track, titles, starts_ms, ends_ms):
+    """
+    生成带章节标记的 ID3v2.3 标签
+
+    titles、starts_ms、ends_ms 为每个章节的标题、开始和结束时间（毫秒）。
+    标签长度只取决于标题，时间为0时可以作为占位标签
+    """
+    if len(titles) > MAX_CHAPTERS:
+        raise ValueError(f"每个分卷最多 {MAX_CHAPTERS} 个章节，当前 {len(titles)} 个")
+
+    element_ids = [f"ch{i}".encode("ascii") + b"\x00" for i in range(len(titles))]
+    frames = [
+        _text_frame("TIT2", volume_title),
+        _text_frame("TALB", album),
+        _text_frame("TRCK", track),
+        _frame(
+            "CTOC",
+            b"toc\x00"
+            + bytes([0x03, len(titles)])  # 顶层目录，子元素有序
+            + b"".join(element_ids),
+        ),
+    ]
+    for element_id, title, start, end in zip(element_ids, titles, starts_ms, ends_ms):
+        frames.append(
+            _frame(
+                "CHAP",
+                element_id
+                + struct.pack(">IIII", start, end, 0xFFFFFFFF, 0xFFFFFFFF)
+                + _text_frame("TIT2", title),
+            )
+        )
+    body = b"".join(frames)
+    return b"ID3\x03\x00\x00" + _syncsafe(len(body)) + body
+
+
+def _milliseconds(seconds):
+    return [int(round(value * 1000)) for value in seconds]
+
+
+def pack_mp3_volume(files, titles, output_path, album, track, cancelled=None):
+    """
+    把章节MP3按顺序拼接为一个分卷并写入章节标记
+
+    所有章节的采样率和声道数必须一致（同一编码配置生成），否则无法直接拼接，抛出 ValueError。
+    返回分卷时长（秒）
+    """
+    volume_title = os.path.splitext(os.path.basename(output_path))[0]
+    placeholder = chapter_tag(
+        album, volume_title, track, titles, [0] * len(titles), [0] * len(titles)
+    )
+    part_path = f"{output_path}.part"
+    boundaries = [0.0]
+    stream = None
+    try:
+        with open(part_path, "wb") as out:
+            out.write(placeholder)
+            for path in files:
+                if cancelled and cancelled():
+                    raise InterruptedError("打包已取消")
+                with open(path, "rb") as f:
+                    frames = audio_frames(f.read())
+                header = parse_frame_header(frames)
+                if header is None:
+                    raise ValueError(f"{os.path.basename(path)} 不是有效的MP3文件")
+                format_key = (header["sample_rate"], header["channels"])
+                if stream is None:
+                    stream = format_key
+                elif format_key != stream:
+                    raise ValueError(
+                        f"{os.path.basename(path)} 的采样率或声道数与分卷中的其他章节不一致，"
+                        "无法不重新编码直接拼接"
+                    )
+                out.write(frames)
+                boundaries.append(boundaries[-1] + frames_duration(frames))
+
+            # 回写包含实际章节时间的标签，长度与占位标签相同
+            out.seek(0)
+            out.write(
+                chapter_tag(
+                    album,
+                    volume_title,
+                    track,
+                    titles,
+                    _milliseconds(boundaries[:-1]),
+                    _milliseconds(boundaries[1:]),
+                )
+            )
+        os.replace(part_path, output_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return boundaries[-1]
+
+
+def mp4_duration(path):
+    """读取 mp4/m4a 文件 moov/mvhd 中的时长（秒），找不到时返回None"""
+    with open(path, "rb") as f:
+        data = _find_box(f, os.path.getsize(path), [b"moov", b"mvhd"])
+    if data is None:
+        return None
+    if data[0] == 1:
+        timescale, duration = struct.unpack(">IQ", data[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", data[12:20])
+    return duration / timescale if timescale else None
+
+
+def _find_box(f, end, path):
+    """按路径逐层查找 mp4 box，返回最后一层 box 的内容"""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return None
+        if box_type == path[0]:
+            if len(path) == 1:
+                return f.read(size - header)
+            return _find_box(f, start + size, path[1:])
+        f.seek(start + size)
+    return None
+
+
+def _escape_metadata(text):
+    for char in "\\=;#\n":
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def pack_m4b_volume(files, titles, output_path, album, track, cancelled=None):
+    """
+    把 AAC 章节（m4a）按流复制合并为 m4b 分卷并写入章节表
+
+    返回分卷时长（秒），ffmpeg 出错时抛出 RuntimeError
+    """
+    durations = []
+    for path in files:
+        duration = mp4_duration(path)
+        if duration is None:
+            raise ValueError(f"{os.path.basename(path)} 不是有效的 mp4/m4a 文件")
+        durations.append(duration)
+    if cancelled and cancelled():
+        raise InterruptedError("打包已取消")
+
+    volume_title = os.path.splitext(os.path.basename(output_path))[0]
+    metadata = [
+        ";FFMETADATA1",
+        f"title={_escape_metadata(volume_title)}",
+        f"album={_escape_metadata(album)}",
+        f"track={track}",
+    ]
+    start = 0.0
+    for title, duration in zip(titles, durations):
+        end = start + duration
+        metadata += [
+            "[CHAPTER]",
+            "TIMEBASE=1/1000",
+            f"START={int(round(start * 1000))}",
+            f"END={int(round(end * 1000))}",
+            f"title={_escape_metadata(title)}",
+        ]
+        start = end
+
+    part_path = f"{output_path}.part"
+    with tempfile.TemporaryDirectory() as work_dir:
+        list_path = os.path.join(work_dir, "files.txt")
+        metadata_path = os.path.join(work_dir, "metadata.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in files:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        with open(metadata_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(metadata) + "\n")
+
+        result = subprocess.run(
+            [FFMPEG, "-v", "error", "-y", "-f", "concat", "-safe", "0"]
+            + ["-i", list_path, "-i", metadata_path]
+            + ["-map", "0:a", "-map_metadata", "1", "-map_chapters", "1"]
+            + ["-c", "copy", "-f", "ipod", part_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+    if result.returncode:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        message = result.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"ffmpeg 合并失败（{result.returncode}）: {message}")
+    os.replace(part_path, output_path)
+    return start
+
+
+PACKERS = {"mp3": pack_mp3_volume, "m4b": pack_m4b_volume}
+
+
+def package_volumes(
+    groups, output_dir, fmt, album, prefix="", max_workers=4, cancelled=None
+):
+    """
+    并行打包多个分卷
+
+    groups 为每个分卷的章节文件路径列表（已按章节顺序排列），章节标题取文件名。
+    分卷保存为 {output_dir}/{prefix}{序号}.{fmt}。
+    逐个产出 (分卷序号, 分卷路径, 时长或异常)，顺序为完成顺序
+    """
+    if fmt not in PACKERS:
+        raise ValueError(f"不支持的打包格式: {fmt}")
+    os.makedirs(output_dir, exist_ok=True)
+    packer = PACKERS[fmt]
+    width = len(str(len(groups)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for i, files in enumerate(groups):
+            output_path = os.path.join(
+                output_dir, f"{prefix}{str(i + 1).zfill(width)}.{fmt}"
+            )
+            titles = [os.path.splitext(os.path.basename(path))[0] for path in files]
+            track = f"{i + 1}/{len(groups)}"
+            future = executor.submit(
+                packer, files, titles, output_path, album, track, cancelled
+            )
+            futures[future] = (i, output_path)
+
+        for future in as_completed(futures):
+            index, output_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            yield index, output_path, result
@@ -0,0 +1,432 @@
+"""
+喜马拉雅作品管理接口
+
+XimalayaClient 复用同一个 requests.Session（连接池），所有请求共用一个速率预算：
+同时进行的请求数不超过 concurrency，相邻两次请求的开始时间间隔不小于 min_interval。
+每个统计窗口按错误率（限流、服务端错误、网络错误）调整：错误率高时并发减半、间隔加倍，
+错误很少时逐步恢复到配置值（加性增、乘性减）。
+
+作品列表按 trackId 缓存在本地（TrackCache）。作品按创建时间升序分页，新作品总是追加在末尾，
+刷新时先获取第一页得到总数，再核对缓存中最后一页的位置是否偏移：
+没有偏移时只获取缓存最后一页及之后的新页，否则并发获取全部页。
+
+上传按分块进行：创建上传任务得到 uploadId，逐块上传（服务端返回每块的 md5 用于校验），
+全部分块到齐后合并得到 fileId，再用 fileId 在专辑中创建作品。
+中断后用 uploadId 查询服务端已收到的分块，只上传缺少的部分。接口地址集中在 UPLOAD_PATHS 中。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from file_utils import atomic_write_json
+
+BASE_URL = "https://www.ximalaya.com"
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+
+# 每页作品数
+PAGE_SIZE = 40
+
+# 默认速率预算：同时进行的请求数和相邻请求的最小间隔（秒）
+DEFAULT_CONCURRENCY = 6
+DEFAULT_MIN_INTERVAL = 0.1
+
+# 退避时请求间隔的下限和上限（秒）
+BACKOFF_MIN_INTERVAL = 0.1
+BACKOFF_MAX_INTERVAL = 5.0
+
+# 上传分块大小
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 分块上传和创建作品的接口
+UPLOAD_PATHS = {
+    "init": "/upload-server/upload/init",
+    "chunk": "/upload-server/upload/chunk",
+    "status": "/upload-server/upload/status",
+    "complete": "/upload-server/upload/complete",
+    "create": "/reform-upload/manage/album/track/create",
+}
+
+# 每统计多少次请求调整一次
+TUNING_WINDOW = 50
+# 窗口错误率不高于 SPEEDUP_ERROR_RATE 时恢复，达到 BACKOFF_ERROR_RATE 时退避
+SPEEDUP_ERROR_RATE = 0.05
+BACKOFF_ERROR_RATE = 0.15
+
+
+class XimalayaClient:
+    """带连接池和速率预算的接口客户端，可以在多个线程中共用"""
+
+    def __init__(
+        self,
+        cookie,
+        concurrency=DEFAULT_CONCURRENCY,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        base_url=BASE_URL,
+        retries=3,
+        retry_backoff=1.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = max(1, int(concurrency))
+        self.min_interval = float(min_interval)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Cookie": cookie, "User-Agent": USER_AGENT})
+
+        self.condition = threading.Condition()
+        self.active = 0
+        self.next_request_at = 0.0
+        # 当前生效的并发数和间隔，出错时退避，连续成功后恢复到配置值
+        self.limit = self.concurrency
+        self.interval = self.min_interval
+        self.window_requests = 0
+        self.window_errors = 0
+
+    def close(self):
+        self.session.close()
+
+    def acquire(self):
+        """等待并发名额和请求间隔"""
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+            now = time.monotonic()
+            wait = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + self.interval
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, error=False):
+        """归还并发名额，按请求结果调整并发和间隔"""
+        with self.condition:
+            self.active -= 1
+            self.window_requests += 1
+            if error:
+                self.window_errors += 1
+            if self.window_requests >= TUNING_WINDOW:
+                self._tune()
+            self.condition.notify_all()
+
+    def _tune(self):
+        """根据最近一个窗口的错误率调整并发和间隔（加性增、乘性减）"""
+        error_rate = self.window_errors / self.window_requests
+        if error_rate >= BACKOFF_ERROR_RATE:
+            self.limit = max(1, self.limit // 2)
+            self.interval = min(
+                max(self.interval * 2, BACKOFF_MIN_INTERVAL), BACKOFF_MAX_INTERVAL
+            )
+        elif error_rate <= SPEEDUP_ERROR_RATE:
+            self.limit = min(self.limit + 1, self.concurrency)
+            self.interval = max(self.interval * 0.5, self.min_interval)
+        self.window_requests = 0
+        self.window_errors = 0
+
+    def request(self, method, path, **kwargs):
+        """
+        按速率预算发起请求，网络错误、限流和服务端错误时退避重试
+
+        返回最后一次的响应对象；所有重试都抛出异常时抛出最后一个异常
+        """
+        kwargs.setdefault("timeout", 30)
+        for attempt in range(self.retries):
+            self.acquire()
+            error = True
+            retry_after = 0
+            try:
+                response = self.session.request(
+                    method, f"{self.base_url}{path}", **kwargs
+                )
+                error = response.status_code == 429 or response.status_code >= 500
+                if not error or attempt == self.retries - 1:
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                retry_after = int(retry_after) if retry_after.isdigit() else 0
+            except requests.RequestException:
+                if attempt == self.retries - 1:
+                    raise
+            finally:
+                self.release(error)
+
+            time.sleep(max(self.retry_backoff * (2**attempt), retry_after))
+
+    def get_tracks_page(self, album_id, page, page_size=PAGE_SIZE):
+        """
+        获取一页作品
+
+        返回接口的 data 字段（infos、totalSize、pageSize 等），接口返回错误时抛出 RuntimeError
+        """
+        response = self.request(
+            "GET",
+            "/reform-upload/manage/album/tracks",
+            params={
+                "albumId": album_id,
+                "page": page,
+                "pageSize": page_size,
+                "order": "ASC",
+                "state": 1,
+            },
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            raise RuntimeError(
+                f"第 {page} 页返回的不是JSON（{response.status_code}）: {response.text[:200]}"
+            )
+        if data.get("ret") != 0:
+            raise RuntimeError(f"获取第 {page} 页失败: {data.get('msg', '未知错误')}")
+        return data.get("data", {})
+
+    def delete_track(self, track_id, album_id=""):
+        """
+        删除一个作品
+
+        返回 (是否成功, 说明)
+        """
+        response = self.request(
+            "POST",
+            "/reform-upload/manage/album/track/delete",
+            json={"trackId": int(track_id)},
+            headers={
+                "Accept": "application/json, text/plain, */*",
+                "Referer": f"{self.base_url}/reform-upload/page/sound/manage/{album_id}",
+            },
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            return False, f"HTTP {response.status_code}: {response.text[:200]}"
+        # ret 为0且 msg 为“成功”时才算删除成功
+        if data.get("ret") == 0 and data.get("msg") == "成功":
+            return True, data["msg"]
+        return False, data.get("msg") or "未知错误"
+
+    def _api(self, response, action):
+        """解析接口响应，返回 data 字段，接口返回错误时抛出 RuntimeError"""
+        try:
+            data = response.json()
+        except ValueError:
+            raise RuntimeError(
+                f"{action}返回的不是JSON（{response.status_code}）: {response.text[:200]}"
+            )
+        if data.get("ret") != 0:
+            raise RuntimeError(f"{action}失败: {data.get('msg', '未知错误')}")
+        return data.get("data") or {}
+
+    def create_upload(self, file_name, file_size, chunk_size=UPLOAD_CHUNK_SIZE):
+        """创建分块上传任务，返回 uploadId"""
+        data = self._api(
+            self.request(
+                "POST",
+                UPLOAD_PATHS["init"],
+                json={
+                    "fileName": file_name,
+                    "fileSize": file_size,
+                    "chunkSize": chunk_size,
+                },
+            ),
+            "创建上传任务",
+        )
+        return data["uploadId"]
+
+    def upload_status(self, upload_id):
+        """
+        查询上传任务已收到的分块
+
+        返回已收到的分块序号集合；任务不存在或已过期时返回None
+        """
+        response = self.request(
+            "GET", UPLOAD_PATHS["status"], params={"uploadId": upload_id}
+        )
+        try:
+            data = self._api(response, "查询上传进度")
+        except RuntimeError:
+            return None
+        if data.get("expired"):
+            return None
+        return set(data.get("chunks", []))
+
+    def upload_chunk(self, upload_id, index, chunk):
+        """上传一个分块，服务端返回的 md5 与本地不一致时抛出 RuntimeError"""
+        data = self._api(
+            self.request(
+                "POST",
+                UPLOAD_PATHS["chunk"],
+                params={"uploadId": upload_id, "index": index},
+                data=chunk,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=120,
+            ),
+            f"上传第 {index + 1} 块",
+        )
+        if data.get("md5") != hashlib.md5(chunk).hexdigest():
+            raise RuntimeError(f"第 {index + 1} 块校验失败")
+
+    def complete_upload(self, upload_id):
+        """合并分块，返回 fileId"""
+        data = self._api(
+            self.request(
+                "POST", UPLOAD_PATHS["complete"], json={"uploadId": upload_id}
+            ),
+            "合并分块",
+        )
+        return data["fileId"]
+
+    def create_track(self, album_id, title, file_id):
+        """用已上传的文件在专辑中创建作品，返回 trackId"""
+        data = self._api(
+            self.request(
+                "POST",
+                UPLOAD_PATHS["create"],
+                json={"albumId": album_id, "title": title, "fileId": file_id},
+            ),
+            f"创建作品《{title}》",
+        )
+        return data["trackId"]
+
+
+class TrackCache:
+    """
+    专辑作品列表的本地缓存，保存在 track_cache_{album_id}.json
+
+    order 为按页面顺序排列的 trackId，tracks 为 trackId 到作品信息的映射
+    """
+
+    def __init__(self, album_id, directory="."):
+        self.album_id = str(album_id)
+        self.path = os.path.join(directory, f"track_cache_{self.album_id}.json")
+        self.order = []
+        self.tracks = {}
+        self.synced_at = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取作品缓存失败，将重新获取: {e}")
+            return
+        if data.get("album_id") != self.album_id:
+            return
+        self.tracks = data.get("tracks", {})
+        self.order = [tid for tid in data.get("order", []) if tid in self.tracks]
+        self.synced_at = data.get("synced_at")
+
+    def save(self):
+        atomic_write_json(
+            self.path,
+            {
+                "album_id": self.album_id,
+                "synced_at": self.synced_at,
+                "order": self.order,
+                "tracks": self.tracks,
+            },
+            indent=None,
+        )
+
+    def all_tracks(self):
+        return [self.tracks[tid] for tid in self.order]
+
+    def replace(self, tracks):
+        """用同步得到的完整作品列表替换缓存"""
+        self.tracks = {track_key(track): track for track in tracks}
+        self.order = list(self.tracks)
+        self.synced_at = time.time()
+        self.save()
+
+    def remove(self, track_ids):
+        """删除作品后同步移除缓存中的记录"""
+        removed = {str(tid) for tid in track_ids}
+        if not removed & set(self.tracks):
+            return
+        self.order = [tid for tid in self.order if tid not in removed]
+        for tid in removed:
+            self.tracks.pop(tid, None)
+        self.save()
+
+
+def track_key(track):
+    return str(track.get("trackId", ""))
+
+
+def sync_tracks(client, album_id, cache, full=False, progress=None):
+    """
+    同步专辑的作品列表
+
+    第一页得到作品总数；缓存有效时只获取缓存最后一页及之后的页，
+    full 为True或缓存的页面位置发生偏移（中间有作品被删除或插入）时获取全部页。
+    其余页在线程池中并发获取，受 client 的速率预算限制。
+    progress(已获取页数, 需要获取的页数) 在调用线程中调用。
+    返回 (作品列表, 实际获取的页数, 总页数)，任何一页失败时抛出异常且不修改缓存
+    """
+    first = client.get_tracks_page(album_id, 1)
+    total = first.get("totalSize", 0)
+    page_size = first.get("pageSize") or PAGE_SIZE
+    total_pages = max(1, (total + page_size - 1) // page_size)
+    pages = {1: first.get("infos", [])}
+
+    cached = [] if full else cache.order
+    keep = []
+    start_page = 2
+    first_ids = [track_key(track) for track in pages[1]]
+    if len(cached) > page_size and first_ids == cached[:page_size]:
+        # 缓存中最后一页仍在原来的位置时，之前的页没有变化；
+        # 发生偏移时这一页的结果同样有效，其余页重新获取
+        boundary = (len(cached) - 1) // page_size + 1
+        if boundary <= total_pages:
+            pages[boundary] = client.get_tracks_page(album_id, boundary).get(
+                "infos", []
+            )
+            expected = cached[(boundary - 1) * page_size : boundary * page_size]
+            actual = [track_key(track) for track in pages[boundary]]
+            if actual[: len(expected)] == expected:
+                keep = [
+                    cache.tracks[tid]
+                    for tid in cached[page_size : (boundary - 1) * page_size]
+                ]
+                start_page = boundary + 1
+
+    todo = [page for page in range(start_page, total_pages + 1) if page not in pages]
+    needed = len(pages) + len(todo)
+    if progress:
+        progress(len(pages), needed)
+    if todo:
+        with ThreadPoolExecutor(max_workers=client.concurrency) as executor:
+            futures = {
+                executor.submit(client.get_tracks_page, album_id, page): page
+                for page in todo
+            }
+            for future in as_completed(futures):
+                pages[futures[future]] = future.result().get("infos", [])
+                if progress:
+                    progress(len(pages), needed)
+
+    # 按页面顺序合并，获取期间有新作品时相邻页可能重复，按 trackId 去重
+    merged = {}
+    for track in pages[1] + keep:
+        merged.setdefault(track_key(track), track)
+    for page in sorted(pages):
+        if page > 1:
+            for track in pages[page]:
+                merged.setdefault(track_key(track), track)
+
+    tracks = list(merged.values())
+    cache.replace(tracks)
+    return tracks, needed, total_pages
@@ -7,8 +7,16 @@ import requests
 import threading
 from config_manager import ConfigManager
 from chapter_downloader import ChapterDownloader
+from book_manager import BookManager
+from file_utils import atomic_write_json
+from book_store import chapter_id, get_book_store
 from openai import OpenAI
 
+# 旧版本章节对话文件导入完成的标记（书籍存储的构建记录），每本书只导入一次
+LEGACY_DIALOGUES_ARTIFACT = "legacy:dialogue_files"
+
+# 本进程中已确认导入过旧版本对话文件的书籍
+_legacy_checked = set()
 
 # 初始化会话状态
 if "extraction_task_running" not in st.session_state:
@@ -52,25 +60,62 @@ def get_chapters(book_id):
     return []
 
 
-def get_chapter_dialogue(book_id, chapter_index, chapter_title):
+def get_chapter_dialogue(book_id, chapter_index, chapter):
     """获取章节对话数据"""
-    # 构建文件名
-    safe_title = "".join(c if c.isalnum() or c in "- " else "_" for c in chapter_title)
-    dialogue_file = os.path.join("audio", book_id, "chapter", f"{safe_title}.json")
+    store = get_book_store(book_id)
+    dialogues = store.get_dialogues(chapter)
+    if dialogues is None and not store.artifact_hashes(LEGACY_DIALOGUES_ARTIFACT):
+        dialogues = import_legacy_dialogue(book_id, chapter_index, chapter)
+    return dialogues
+
+
+def import_legacy_dialogue(book_id, chapter_index, chapter):
+    """把旧版本保存的章节对话文件导入书籍存储，没有时返回None"""
+    safe_title = "".join(
+        c if c.isalnum() or c in "- " else "_"
+        for c in chapter.get("chapter_title", "未知章节")
+    )
+    legacy_files = [
+        os.path.join("data", book_id, "users", f"{chapter_index+1}.json"),
+        os.path.join("audio", book_id, "chapter", f"{safe_title}.json"),
+    ]
 
-    if os.path.exists(dialogue_file):
+    for legacy_file in legacy_files:
+        if not os.path.exists(legacy_file) or os.path.getsize(legacy_file) == 0:
+            continue
         try:
-            with open(dialogue_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                dialogues = json.load(f)
         except Exception:
-            return None
+            continue
+        get_book_store(book_id).put_dialogues(chapter, dialogues)
+        return dialogues
+
     return None
 
 
+def import_legacy_dialogues(book_id, chapters):
+    """
+    导入所有尚未进入书籍存储的旧版本章节对话文件
+
+    每本书只执行一次：导入后在书籍存储中记录标记，页面重跑时不再逐章检查旧文件
+    """
+    if book_id in _legacy_checked or not chapters:
+        return
+    store = get_book_store(book_id)
+    if not store.artifact_hashes(LEGACY_DIALOGUES_ARTIFACT):
+        existing = store.dialogue_ids()
+        for i, chapter in enumerate(chapters):
+            if chapter_id(chapter) not in existing:
+                import_legacy_dialogue(book_id, i, chapter)
+        store.record_artifacts([(LEGACY_DIALOGUES_ARTIFACT, "done")])
+    _legacy_checked.add(book_id)
+
+
 def get_chapter_word_count(book_id, chapter):
-    """获取章节字数"""
-    downloader = ChapterDownloader(book_id)
-    return downloader.get_chapter_word_count(chapter)
+    """获取章节字数（来自章节状态索引）"""
+    stats = BookManager().get_chapter_status(book_id).get(chapter_id(chapter))
+    return stats["char_count"] if stats else 0
 
 
 def format_word_count(count):
@@ -92,10 +137,20 @@ def show_novel_content_tab(book_id):
         st.warning("未找到章节信息")
         return
 
+    # 对话分析结果以二进制格式保存，需要查看或编辑时导出为JSON
+    if st.button("导出对话分析结果为JSON"):
+        export_dir = os.path.join("data", book_id, "export", "dialogues")
+        count = get_book_store(book_id).export_dialogues_json(export_dir)
+        st.success(f"已导出 {count} 个章节的对话分析结果到 {export_dir}")
+
+    # 章节字数统一从章节状态索引读取
+    status = BookManager().get_chapter_status(book_id)
+
     # 遍历所有章节
     for i, chapter in enumerate(chapters):
         # 获取章节字数
-        word_count = get_chapter_word_count(book_id, chapter)
+        stats = status.get(chapter_id(chapter))
+        word_count = stats["char_count"] if stats else 0
 
         # 显示章节信息
         col1, col2 = st.columns([4, 1])
@@ -109,9 +164,7 @@ def show_novel_content_tab(book_id):
             # 添加显示对话信息按钮
             if st.button("显示对话信息", key=f"dialogue_{i}"):
                 # 获取对话数据
-                dialogue_data = get_chapter_dialogue(
-                    book_id, i, chapter["chapter_title"]
-                )
+                dialogue_data = get_chapter_dialogue(book_id, i, chapter)
 
                 if dialogue_data:
                     # 显示对话数据
@@ -147,13 +200,9 @@ def show_character_info_tab(book_id):
         except Exception as e:
             st.error(f"读取状态文件出错: {str(e)}")
 
-    # 角色信息目录路径和检查
-    users_dir = os.path.join("data", book_id, "users")
-    has_character_data = os.path.exists(users_dir) and any(
-        f.endswith(".json") and f != "extraction_status.json"
-        for f in os.listdir(users_dir)
-        if os.path.isfile(os.path.join(users_dir, f))
-    )
+    # 检查书籍存储中是否已有对话分析结果
+    import_legacy_dialogues(book_id, get_chapters(book_id))
+    has_character_data = bool(get_book_store(book_id).dialogue_ids())
 
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -177,11 +226,7 @@ def show_character_info_tab(book_id):
             }
             try:
                 os.makedirs(os.path.dirname(status_file), exist_ok=True)
-                with open(status_file, "w", encoding="utf-8") as f:
-                    json.dump(initial_status, f, ensure_ascii=False, indent=2)
-                    # 确保数据写入磁盘
-                    f.flush()
-                    os.fsync(f.fileno())
+                atomic_write_json(status_file, initial_status, indent=2)
 
                 # 创建并启动提取任务线程
                 extraction_thread = threading.Thread(
@@ -277,10 +322,6 @@ def process_chapters_in_thread(book_id):
     """在独立线程中处理章节提取任务"""
     try:
         # 准备目录
-        audio_dir = os.path.join("audio", book_id)
-        chapter_dir = os.path.join(audio_dir, "chapter")
-        os.makedirs(chapter_dir, exist_ok=True)
-
         users_dir = os.path.join("data", book_id, "users")
         os.makedirs(users_dir, exist_ok=True)
 
@@ -302,8 +343,7 @@ def process_chapters_in_thread(book_id):
                 "errors": ["未配置硅基流动API密钥或获取章节失败"],
                 "result": "提取失败：未配置API密钥或章节获取失败",
             }
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump(error_status, f, ensure_ascii=False, indent=2)
+            atomic_write_json(status_file, error_status, indent=2)
             return
 
         # 调用原始的处理函数
@@ -324,17 +364,12 @@ def process_chapters_in_thread(book_id):
                 "errors": [f"处理过程中发生错误: {str(e)}"],
                 "result": "提取失败：处理过程中发生错误",
             }
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump(error_status, f, ensure_ascii=False, indent=2)
+            atomic_write_json(status_file, error_status, indent=2)
 
 
 def start_extraction_task(book_id):
     """启动提取角色信息的任务 - 单线程版本"""
     # 准备目录
-    audio_dir = os.path.join("audio", book_id)
-    chapter_dir = os.path.join(audio_dir, "chapter")
-    os.makedirs(chapter_dir, exist_ok=True)
-
     users_dir = os.path.join("data", book_id, "users")
     os.makedirs(users_dir, exist_ok=True)
 
@@ -360,22 +395,20 @@ def start_extraction_task(book_id):
 def process_chapters_sequential(book_id, chapters, api_keys, api_url):
     """以单线程方式顺序处理所有章节"""
     # 准备目录
-    audio_dir = os.path.join("audio", book_id)
-    chapter_dir = os.path.join(audio_dir, "chapter")
-    os.makedirs(chapter_dir, exist_ok=True)
-
     users_dir = os.path.join("data", book_id, "users")
     os.makedirs(users_dir, exist_ok=True)
 
     # 创建状态文件
     status_file = os.path.join(users_dir, "extraction_status.json")
 
-    # 检查哪些章节需要处理
-    pending_chapters = []
-    for i, chapter in enumerate(chapters):
-        user_file = os.path.join(users_dir, f"{i+1}.json")
-        if not os.path.exists(user_file) or os.path.getsize(user_file) == 0:
-            pending_chapters.append((i, chapter))
+    # 检查哪些章节需要处理（书籍存储的索引查询）
+    import_legacy_dialogues(book_id, chapters)
+    existing = get_book_store(book_id).dialogue_ids()
+    pending_chapters = [
+        (i, chapter)
+        for i, chapter in enumerate(chapters)
+        if chapter_id(chapter) not in existing
+    ]
 
     # 统计信息
     total = len(chapters)
@@ -395,11 +428,7 @@ def process_chapters_sequential(book_id, chapters, api_keys, api_url):
             "failed": 0,
             "result": "所有章节已处理完成",
         }
-        with open(status_file, "w", encoding="utf-8") as f:
-            json.dump(status, f, ensure_ascii=False, indent=2)
-            # 确保数据写入磁盘
-            f.flush()
-            os.fsync(f.fileno())
+        atomic_write_json(status_file, status, indent=2)
         return
 
     # 写入初始状态
@@ -412,21 +441,13 @@ def process_chapters_sequential(book_id, chapters, api_keys, api_url):
         "failed": failed,
         "errors": [],
     }
-    with open(status_file, "w", encoding="utf-8") as f:
-        json.dump(status, f, ensure_ascii=False, indent=2)
-        # 确保数据写入磁盘
-        f.flush()
-        os.fsync(f.fileno())
+    atomic_write_json(status_file, status, indent=2)
 
     # 使用第一个可用的API密钥
     if not api_keys:
         status["status"] = "completed"
         status["result"] = "未配置API密钥，无法处理"
-        with open(status_file, "w", encoding="utf-8") as f:
-            json.dump(status, f, ensure_ascii=False, indent=2)
-            # 确保数据写入磁盘
-            f.flush()
-            os.fsync(f.fileno())
+        atomic_write_json(status_file, status, indent=2)
         return
 
     api_key = api_keys[0]  # 使用第一个API密钥
@@ -456,11 +477,7 @@ def process_chapters_sequential(book_id, chapters, api_keys, api_url):
                     "failed": failed,
                 }
             )
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump(status, f, ensure_ascii=False, indent=2)
-                # 确保数据写入磁盘
-                f.flush()
-                os.fsync(f.fileno())
+            atomic_write_json(status_file, status, indent=2)
 
             # 强制延迟，避免API频率限制
             time.sleep(2)
@@ -481,11 +498,7 @@ def process_chapters_sequential(book_id, chapters, api_keys, api_url):
                     "failed": failed,
                 }
             )
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump(status, f, ensure_ascii=False, indent=2)
-                # 确保数据写入磁盘
-                f.flush()
-                os.fsync(f.fileno())
+            atomic_write_json(status_file, status, indent=2)
 
             # 即使出错也要延迟，避免频率限制
             time.sleep(2)
@@ -503,45 +516,31 @@ def process_chapters_sequential(book_id, chapters, api_keys, api_url):
         "failed": failed,
         "result": f"角色信息提取完成，成功处理 {succeeded} 章，失败 {failed} 章",
     }
-    with open(status_file, "w", encoding="utf-8") as f:
-        json.dump(final_status, f, ensure_ascii=False, indent=2)
-        # 确保数据写入磁盘
-        f.flush()
-        os.fsync(f.fileno())
+    atomic_write_json(status_file, final_status, indent=2)
 
 
 def extract_chapter_dialogue(
     api_key, api_url, book_id, chapter, chapter_index, max_retries=3
 ):
     """提取单个章节的对话信息，带有重试机制"""
-    # 获取章节内容
-    downloader = ChapterDownloader(book_id)
-    file_path = downloader.get_chapter_file_path(chapter)
     chapter_title = chapter.get("chapter_title", "未知章节")
+    store = get_book_store(book_id)
 
-    # 检查目标文件是否已存在
-    users_dir = os.path.join("data", book_id, "users")
-    user_file = os.path.join(users_dir, f"{chapter_index+1}.json")
-
-    if os.path.exists(user_file) and os.path.getsize(user_file) > 0:
+    # 检查对话数据是否已存在
+    if store.has_dialogues(chapter):
         return True, f"章节 {chapter_index+1} 已存在，跳过处理"
 
-    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-        return False, f"章节 {chapter_index+1} ({chapter_title}) 文件不存在或为空"
-
-    # 读取章节内容
+    # 从书籍存储读取章节内容
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            chapter_content = f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, "r", encoding="gbk") as f:
-                chapter_content = f.read()
-        except Exception as e:
-            return (
-                False,
-                f"读取章节 {chapter_index+1} ({chapter_title}) 内容出错: {str(e)}",
-            )
+        chapter_content = ChapterDownloader(book_id).get_chapter_content(chapter)
+    except Exception as e:
+        return (
+            False,
+            f"读取章节 {chapter_index+1} ({chapter_title}) 内容出错: {str(e)}",
+        )
+
+    if not chapter_content:
+        return False, f"章节 {chapter_index+1} ({chapter_title}) 内容不存在或为空"
 
     # 限制章节内容长度
     if len(chapter_content) > 50000:
@@ -608,26 +607,12 @@ def extract_chapter_dialogue(
                             f"章节 {chapter_index+1}: 提取的数据不是有效的对话列表",
                         )
 
-                    # 保存对话数据到两个位置，并检查保存结果
-                    audio_save_result = save_chapter_dialogue_file(
-                        book_id, chapter, dialogue_data
-                    )
-                    user_save_result = save_chapter_user_info(
-                        book_id, chapter_index + 1, dialogue_data
-                    )
-
-                    if not audio_save_result or not user_save_result:
+                    # 保存对话数据到书籍存储
+                    if not save_chapter_dialogue(book_id, chapter, dialogue_data):
                         return (
                             False,
                             f"章节 {chapter_index+1}: 保存对话数据失败",
                         )
-
-                    # 最后确认文件确实存在
-                    if not os.path.exists(user_file) or os.path.getsize(user_file) == 0:
-                        return (
-                            False,
-                            f"章节 {chapter_index+1}: 文件保存后验证失败",
-                        )
                     return True, f"章节 {chapter_index+1}: 成功提取对话信息"
                 except json.JSONDecodeError:
                     return False, f"章节 {chapter_index+1}: JSON解析失败"
@@ -662,95 +647,24 @@ def extract_chapter_dialogue(
     return False, f"章节 {chapter_index+1} ({chapter_title}) 达到最大重试次数"
 
 
-def save_chapter_dialogue_file(book_id, chapter, dialogue_data):
-    """保存章节对话数据到audio目录"""
-    # 构建文件名
-    chapter_title = chapter.get("chapter_title", "未知章节")
-    safe_title = "".join(c if c.isalnum() or c in "- " else "_" for c in chapter_title)
-    dialogue_file = os.path.join("audio", book_id, "chapter", f"{safe_title}.json")
-
-    # 确保目录存在
-    os.makedirs(os.path.dirname(dialogue_file), exist_ok=True)
-
-    # 保存对话数据
+def save_chapter_dialogue(book_id, chapter, dialogue_data):
+    """保存章节对话数据到书籍存储"""
     try:
-        with open(dialogue_file, "w", encoding="utf-8") as f:
-            json.dump(dialogue_data, f, ensure_ascii=False, indent=4)
+        get_book_store(book_id).put_dialogues(chapter, dialogue_data)
         return True
     except Exception as e:
         print(f"保存对话数据出错: {str(e)}")
         return False
 
 
-def save_chapter_user_info(book_id, chapter_number, dialogue_data):
-    """保存章节角色信息到users目录"""
-    # 确保目录存在
-    users_dir = os.path.join("data", book_id, "users")
-    os.makedirs(users_dir, exist_ok=True)
-
-    # 构建文件名
-    user_file = os.path.join(users_dir, f"{chapter_number}.json")
-
-    # 保存对话数据
-    try:
-        with open(user_file, "w", encoding="utf-8") as f:
-            json.dump(dialogue_data, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        print(f"保存角色信息出错: {str(e)}")
-        return False
-
-
 def compile_character_statistics(book_id):
-    """从所有章节文件中汇总角色统计信息"""
-    # 角色统计信息
-    characters_info = {}
-
-    # 章节文件目录路径
-    users_dir = os.path.join("data", book_id, "users")
-
-    # 确保目录存在
-    if not os.path.exists(users_dir):
-        return []
-
-    # 遍历所有JSON文件
-    for filename in os.listdir(users_dir):
-        if not filename.endswith(".json") or filename == "extraction_status.json":
-            continue
-
-        file_path = os.path.join(users_dir, filename)
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                dialogues = json.load(f)
-
-            # 处理每个对话
-            for dialogue in dialogues:
-                if not isinstance(dialogue, dict):
-                    continue
-
-                character = dialogue.get("type", "")
-                gender = dialogue.get("sex", "")
-
-                if character:
-                    if character not in characters_info:
-                        characters_info[character] = {
-                            "name": character,
-                            "gender": gender,
-                            "lines_count": 0,
-                        }
-
-                    characters_info[character]["lines_count"] += 1
-
-        except Exception as e:
-            print(f"处理文件 {filename} 时出错: {str(e)}")
-
-    # 转换为列表
-    characters_list = list(characters_info.values())
-
-    # 按台词数量降序排序
-    characters_list.sort(key=lambda x: x["lines_count"], reverse=True)
+    """
+    获取角色统计信息（按台词数量降序）
 
-    return characters_list
+    统计由书籍存储在每个章节的对话结果写入或替换时增量维护，
+    这里只读取角色表，不再遍历章节对话；性别取角色第一次出现时的性别
+    """
+    return get_book_store(book_id).character_stats(gender="first")
 
 
 def compile_character_info(book_id):
@@ -763,8 +677,7 @@ def compile_character_info(book_id):
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "user_info.json")
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(characters_list, f, ensure_ascii=False, indent=2)
+    atomic_write_json(output_file, characters_list, indent=2)
 
 
 def show_character_list(book_id, characters):
@@ -1270,8 +1183,7 @@ def save_character_voice(book_id, character_name, voice_config):
 
     # 保存配置
     try:
-        with open(voices_file, "w", encoding="utf-8") as f:
-            json.dump(voices_config, f, ensure_ascii=False, indent=4)
+        atomic_write_json(voices_file, voices_config)
 
         # 同时保存一份角色与模型的映射关系，更人性化的格式
         mapping_file = os.path.join("data", book_id, "voice_mapping.json")
@@ -1286,8 +1198,7 @@ def save_character_voice(book_id, character_name, voice_config):
                 "语音ID": config.get("voice_id", ""),
             }
 
-        with open(mapping_file, "w", encoding="utf-8") as f:
-            json.dump(mapping, f, ensure_ascii=False, indent=4)
+        atomic_write_json(mapping_file, mapping)
 
         return True
     except Exception as e:
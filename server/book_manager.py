@@ -2,7 +2,20 @@ import os
 import json
 import streamlit as st
 from chapter_parser import fetch_chapter_pages_from_url, fetch_all_detailed_chapters
-from chapter_downloader import ChapterDownloader
+from chapter_downloader import ChapterDownloader, legacy_imported
+from file_utils import AUDIO_EXTENSIONS, atomic_write_json, file_versions
+from book_store import chapter_id, get_book_store, store_version
+
+# 章节状态缓存 {book_id: (存储版本, 章节状态表)}
+# 放在模块级别，Streamlit 每次重跑页面都能复用
+_chapter_status_cache = {}
+
+# 本进程中已确认导入过旧版本章节文件的书籍
+_legacy_checked = set()
+
+# 书库目录索引，首次使用时从文件加载
+LIBRARY_CATALOG_FILE = os.path.join("data", "library_catalog.json")
+_library_catalog = None
 
 
 class BookManager:
@@ -11,41 +24,138 @@ class BookManager:
         os.makedirs(self.data_dir, exist_ok=True)
 
     def get_books_list(self):
-        """获取本地书库中的所有书籍"""
-        books = []
+        """获取本地书库中的所有书籍（来自书库目录索引）"""
+        return [entry["info"] for entry in self.get_library_catalog().values()]
+
+    def get_library_catalog(self):
+        """
+        获取书库目录索引 {book_id: {"version": 文件版本, "info": 书籍信息和统计}}
+
+        索引保存在 data/library_catalog.json，只有书籍目录、info.json、chapters.json、
+        书籍存储或音频目录的修改时间变化时才重新统计对应书籍
+        """
+        global _library_catalog
+        if _library_catalog is None:
+            _library_catalog = self._load_library_catalog()
 
         if not os.path.exists(self.data_dir):
-            return books
-
-        for book_id in os.listdir(self.data_dir):
-            book_path = os.path.join(self.data_dir, book_id)
-            if os.path.isdir(book_path) and book_id != "config":  # 排除配置目录
-                info_file = os.path.join(book_path, "info.json")
-                if os.path.exists(info_file):
-                    try:
-                        with open(info_file, "r", encoding="utf-8") as f:
-                            book_info = json.load(f)
-                            books.append(book_info)
-                    except Exception as e:
-                        st.error(f"读取书籍信息出错: {str(e)}")
-                else:
-                    # 如果没有info.json，尝试从chapters.json获取信息
-                    chapters_file = os.path.join(book_path, "chapters.json")
-                    if os.path.exists(chapters_file):
-                        try:
-                            with open(chapters_file, "r", encoding="utf-8") as f:
-                                chapters = json.load(f)
-                                books.append(
-                                    {
-                                        "id": book_id,
-                                        "name": book_id,  # 使用ID作为书名
-                                        "chapters_count": len(chapters),
-                                    }
-                                )
-                        except Exception as e:
-                            st.error(f"读取章节信息出错: {str(e)}")
-
-        return books
+            return {}
+
+        book_ids = [
+            book_id
+            for book_id in os.listdir(self.data_dir)
+            if book_id != "config"  # 排除配置目录
+            and os.path.isdir(os.path.join(self.data_dir, book_id))
+        ]
+
+        catalog = {}
+        changed = set(_library_catalog) != set(book_ids)
+        for book_id in book_ids:
+            entry = _library_catalog.get(book_id)
+            version = self._book_version(book_id)
+            if entry is None or entry["version"] != version:
+                info = self._summarize_book(book_id)
+                # 统计过程中可能创建了书籍存储，重新获取版本
+                entry = {"version": self._book_version(book_id), "info": info}
+                changed = True
+            catalog[book_id] = entry
+
+        if changed:
+            _library_catalog = catalog
+            try:
+                atomic_write_json(LIBRARY_CATALOG_FILE, catalog)
+            except Exception as e:
+                print(f"保存书库索引出错: {str(e)}")
+
+        return {book_id: entry for book_id, entry in catalog.items() if entry["info"]}
+
+    def _load_library_catalog(self):
+        """读取上次保存的书库目录索引"""
+        if not os.path.exists(LIBRARY_CATALOG_FILE):
+            return {}
+        try:
+            with open(LIBRARY_CATALOG_FILE, "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+        except Exception as e:
+            print(f"读取书库索引出错: {str(e)}")
+            return {}
+
+        # JSON 中的元组被读成列表，转换回来以便比较版本
+        for entry in catalog.values():
+            entry["version"] = [
+                tuple(part) if isinstance(part, list) else part
+                for part in entry["version"]
+            ]
+        return catalog
+
+    def _book_version(self, book_id):
+        """书籍相关文件的版本，用于判断书库索引是否过期"""
+        book_path = os.path.join(self.data_dir, book_id)
+        versions = file_versions(
+            book_path,
+            os.path.join(book_path, "info.json"),
+            os.path.join(book_path, "chapters.json"),
+            os.path.join("audio", book_id, "audio"),
+        )
+        return list(versions + store_version(book_id, self.data_dir))
+
+    def _summarize_book(self, book_id):
+        """
+        统计单本书的信息
+
+        返回书籍信息字典，附带章节数、已下载章节数、总字数、
+        已完成对话分析的章节数和已合成音频的章节数；不是书籍目录时返回None
+        """
+        book_path = os.path.join(self.data_dir, book_id)
+        info_file = os.path.join(book_path, "info.json")
+        chapters_file = os.path.join(book_path, "chapters.json")
+
+        book_info = None
+        if os.path.exists(info_file):
+            try:
+                with open(info_file, "r", encoding="utf-8") as f:
+                    book_info = json.load(f)
+            except Exception as e:
+                st.error(f"读取书籍信息出错: {str(e)}")
+                return None
+
+        chapters = []
+        if os.path.exists(chapters_file):
+            try:
+                with open(chapters_file, "r", encoding="utf-8") as f:
+                    chapters = json.load(f)
+            except Exception as e:
+                st.error(f"读取章节信息出错: {str(e)}")
+
+        if book_info is None:
+            # 如果没有info.json，使用chapters.json中的信息
+            if not os.path.exists(chapters_file):
+                return None
+            book_info = {
+                "id": book_id,
+                "name": book_id,  # 使用ID作为书名
+                "chapters_count": len(chapters),
+            }
+
+        status = self.get_chapter_status(book_id)
+        attributed = get_book_store(book_id).dialogue_ids()
+        ids = [chapter_id(chapter) for chapter in chapters]
+
+        audio_dir = os.path.join("audio", book_id, "audio")
+        synthesized = 0
+        if os.path.isdir(audio_dir):
+            synthesized = sum(
+                1 for f in os.listdir(audio_dir) if f.lower().endswith(AUDIO_EXTENSIONS)
+            )
+
+        book_info["stats"] = {
+            "chapters": len(chapters),
+            "downloaded": sum(1 for cid in ids if cid in status),
+            "words": sum(status[cid]["char_count"] for cid in ids if cid in status),
+            "attributed": sum(1 for cid in ids if cid in attributed),
+            "synthesized": synthesized,
+        }
+        return book_info
 
     def get_book_chapters(self, book_id):
         """获取指定书籍的章节列表"""
@@ -87,13 +197,14 @@ class BookManager:
 
             # 保存分页选项信息
             options_file = os.path.join(dir_path, "options.json")
-            with open(options_file, "w", encoding="utf-8") as f:
-                json.dump(chapter_pages, f, ensure_ascii=False, indent=4)
+            atomic_write_json(options_file, chapter_pages)
 
             # 保存详细章节信息
             chapters_file = os.path.join(dir_path, "chapters.json")
-            with open(chapters_file, "w", encoding="utf-8") as f:
-                json.dump(detailed_chapters, f, ensure_ascii=False, indent=4)
+            atomic_write_json(chapters_file, detailed_chapters)
+
+            # 章节顺序同步到书籍存储
+            get_book_store(book_id).sync_chapters(detailed_chapters)
 
             # 保存书籍信息
             info_file = os.path.join(dir_path, "info.json")
@@ -104,8 +215,7 @@ class BookManager:
                 "chapters_count": len(detailed_chapters),
             }
 
-            with open(info_file, "w", encoding="utf-8") as f:
-                json.dump(info_data, f, ensure_ascii=False, indent=4)
+            atomic_write_json(info_file, info_data)
 
             return (
                 True,
@@ -130,10 +240,41 @@ class BookManager:
 
         return True, status_message, result
 
+    def get_chapter_status(self, book_id):
+        """
+        获取书籍已下载章节的状态表 {章节ID: {"downloaded", "char_count", "size", "mtime"}}
+
+        状态在章节写入书籍存储时一并更新，这里只在存储文件的修改时间变化后重新查询，
+        页面重跑时不再逐章读取正文。除每本书第一次调用时导入旧版本章节文件外，
+        这里只做只读查询，下载过程中频繁轮询也不会与下载争用存储的写入
+        """
+        self.import_legacy_content(book_id)
+        store = get_book_store(book_id)
+        cached = _chapter_status_cache.get(book_id)
+        if cached and cached[0] == store.version():
+            return cached[1]
+
+        version = store.version()
+        status = store.chapter_stats()
+        _chapter_status_cache[book_id] = (version, status)
+        return status
+
+    def import_legacy_content(self, book_id):
+        """旧版本下载的章节文件导入书籍存储，每本书只执行一次（见 ChapterDownloader）"""
+        if book_id in _legacy_checked:
+            return
+        chapters_file = os.path.join(self.data_dir, book_id, "chapters.json")
+        if os.path.exists(chapters_file) and not legacy_imported(
+            get_book_store(book_id)
+        ):
+            ChapterDownloader(book_id).import_legacy_chapters(
+                self.get_book_chapters(book_id)
+            )
+        _legacy_checked.add(book_id)
+
     def is_chapter_downloaded(self, book_id, chapter):
         """检查章节是否已下载"""
-        downloader = ChapterDownloader(book_id)
-        return downloader.is_chapter_downloaded(chapter)
+        return chapter_id(chapter) in self.get_chapter_status(book_id)
 
     def are_all_chapters_downloaded(self, book_id):
         """检查是否所有章节都已下载"""
@@ -141,19 +282,27 @@ class BookManager:
         if not chapters:
             return False
 
-        downloader = ChapterDownloader(book_id)
-        return downloader.are_all_chapters_downloaded(chapters)
+        status = self.get_chapter_status(book_id)
+        return all(chapter_id(chapter) in status for chapter in chapters)
 
     def get_chapter_word_count(self, book_id, chapter):
         """获取章节的字数"""
-        downloader = ChapterDownloader(book_id)
-        return downloader.get_chapter_word_count(chapter)
+        stats = self.get_chapter_status(book_id).get(chapter_id(chapter))
+        return stats["char_count"] if stats else 0
 
     def get_book_total_words(self, book_id):
-        """获取书籍总字数"""
+        """获取书籍总字数和已下载章节数"""
         chapters = self.get_book_chapters(book_id)
         if not chapters:
             return 0, 0
 
-        downloader = ChapterDownloader(book_id)
-        return downloader.get_total_word_count(chapters)
+        status = self.get_chapter_status(book_id)
+        total_count = 0
+        downloaded_count = 0
+        for chapter in chapters:
+            stats = status.get(chapter_id(chapter))
+            if stats and stats["char_count"] > 0:
+                total_count += stats["char_count"]
+                downloaded_count += 1
+
+        return total_count, downloaded_count
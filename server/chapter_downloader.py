@@ -4,24 +4,40 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 from chapter_parser import fetch_html_content, parse_chapter_content
+from file_utils import CrawlJournal
+from site_profiles import get_registry
+from book_store import chapter_id, get_book_store
+
+# 旧版本章节文件导入完成的标记（书籍存储的构建记录），每本书只导入一次
+LEGACY_IMPORT_ARTIFACT = "legacy:chapter_files"
+
+
+def legacy_imported(store):
+    """旧版本章节文件是否已导入书籍存储"""
+    return bool(store.artifact_hashes(LEGACY_IMPORT_ARTIFACT))
 
 
 class ChapterDownloader:
-    def __init__(self, book_id, max_workers=5):
+    def __init__(self, book_id, max_workers=5, journal_mode=CrawlJournal.TRUST):
         self.book_id = book_id
         self.max_workers = max_workers
         self.base_dir = os.path.join("data", book_id)
         self.content_dir = os.path.join(self.base_dir, "content")
+        # 章节正文保存在书籍存储中
+        self.store = get_book_store(book_id)
+        # 抓取日志，用于判断旧版本下载的章节文件是否完整
+        self.journal = CrawlJournal(
+            os.path.join(self.base_dir, "crawl_journal.jsonl"), journal_mode
+        )
         self.lock = threading.Lock()
         self.total_chapters = 0
         self.success_count = 0
         self.fail_count = 0
         self.skip_count = 0
         self.chapter_statuses = {}
-        os.makedirs(self.content_dir, exist_ok=True)
 
     def get_chapter_file_path(self, chapter):
-        """根据章节信息生成保存文件的路径"""
+        """旧版本按章节标题保存的正文文件路径"""
         title = chapter["chapter_title"]
         group = chapter.get("group", "")
 
@@ -37,50 +53,70 @@ class ChapterDownloader:
         else:
             return os.path.join(self.content_dir, filename)
 
-    def is_chapter_downloaded(self, chapter):
-        """检查章节内容是否已下载"""
-        file_path = self.get_chapter_file_path(chapter)
-        return os.path.exists(file_path) and os.path.getsize(file_path) > 0
-
-    def get_chapter_word_count(self, chapter):
-        """获取章节的字数"""
+    def import_legacy_chapter(self, chapter):
+        """把旧版本下载的完整章节文件导入书籍存储，成功返回True"""
+        url = chapter.get("chapter_url")
         file_path = self.get_chapter_file_path(chapter)
-        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-            return 0
+        if not (
+            self.journal.is_complete(url, file_path)
+            or self.journal.import_legacy(url, file_path)
+        ):
+            return False
 
         try:
             with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                # 统计中文字符数（移除空格、换行符等）
-                text = (
-                    content.replace(" ", "")
-                    .replace("\n", "")
-                    .replace("\r", "")
-                    .replace("\t", "")
-                )
-                return len(text)
+                self.store.put_text(chapter, f.read())
+            return True
         except Exception as e:
-            print(f"读取章节内容出错: {str(e)}")
+            print(f"导入章节文件出错: {str(e)}")
+            return False
+
+    def is_chapter_downloaded(self, chapter):
+        """检查章节内容是否已下载"""
+        if self.store.has_text(chapter):
+            return True
+        if legacy_imported(self.store):
+            return False
+        return self.import_legacy_chapter(chapter)
+
+    def get_chapter_word_count(self, chapter):
+        """获取章节的字数"""
+        if not self.is_chapter_downloaded(chapter):
             return 0
+        return self.store.get_char_count(chapter)
+
+    def get_chapter_content(self, chapter):
+        """获取章节正文，未下载时返回None"""
+        if not self.is_chapter_downloaded(chapter):
+            return None
+        return self.store.get_text(chapter)
+
+    def import_legacy_chapters(self, chapters):
+        """
+        导入所有尚未进入书籍存储的旧版本章节文件
+
+        每本书只导入一次，完成后在书籍存储中记录标记，之后直接返回
+        """
+        if legacy_imported(self.store):
+            return
+        status = self.store.text_status()
+        for chapter in chapters:
+            if chapter_id(chapter) not in status:
+                self.import_legacy_chapter(chapter)
+        self.store.record_artifacts([(LEGACY_IMPORT_ARTIFACT, "done")])
 
     def are_all_chapters_downloaded(self, chapters):
         """检查是否所有章节都已下载"""
-        for chapter in chapters:
-            if not self.is_chapter_downloaded(chapter):
-                return False
-        return True
+        self.import_legacy_chapters(chapters)
+        status = self.store.text_status()
+        return all(chapter_id(chapter) in status for chapter in chapters)
 
     def download_chapter(self, index, chapter):
         """下载单个章节内容"""
         url = chapter.get("chapter_url")
-        title = chapter.get("chapter_title")
-        file_path = self.get_chapter_file_path(chapter)
 
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # 检查文件是否已存在
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        # 检查章节是否已下载（书籍存储的索引查询）
+        if self.is_chapter_downloaded(chapter):
             with self.lock:
                 self.skip_count += 1
                 self.chapter_statuses[index] = "已存在"
@@ -94,16 +130,15 @@ class ChapterDownloader:
                     self.chapter_statuses[index] = "获取内容失败"
                 return False
 
-            content_paragraphs = parse_chapter_content(html_content)
+            content_paragraphs = parse_chapter_content(html_content, url)
             if not content_paragraphs:
                 with self.lock:
                     self.fail_count += 1
                     self.chapter_statuses[index] = "解析内容失败"
                 return False
 
-            # 保存内容
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write("\n".join(content_paragraphs))
+            # 保存内容到书籍存储（单个事务写入，不会留下半截章节）
+            self.store.put_text(chapter, "\n".join(content_paragraphs))
 
             with self.lock:
                 self.success_count += 1
@@ -124,15 +159,17 @@ class ChapterDownloader:
         self.skip_count = 0
         self.chapter_statuses = {i: "等待中" for i in range(len(chapters))}
 
+        # 同步章节顺序到书籍存储
+        self.store.sync_chapters(chapters)
+
         # 使用线程池处理下载
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             futures = []
             for i, chapter in enumerate(chapters):
                 # 直接提交任务，不在子线程中使用streamlit组件
+                # 请求频率由站点配置统一控制，这里不再逐个等待
                 future = executor.submit(self.download_chapter, i, chapter)
                 futures.append(future)
-                # 短暂等待避免同时提交太多任务
-                time.sleep(0.1)
 
             # 创建一个进度条 - 在主线程中创建
             progress_bar = st.progress(0.0)
@@ -160,6 +197,12 @@ class ChapterDownloader:
                 except Exception as e:
                     print(f"任务执行出错: {e}")
 
+        # 压缩抓取日志，避免旧文件反复补录
+        if self.journal.entries:
+            self.journal.compact()
+        # 保存本次下载中调优后的站点参数
+        get_registry().save()
+
         final_status = {
             "total": self.total_chapters,
             "success": self.success_count,
@@ -175,10 +218,13 @@ class ChapterDownloader:
         total_count = 0
         downloaded_count = 0
 
+        # 一次查询取出所有已下载章节的字数
+        self.import_legacy_chapters(chapters)
+        status = self.store.text_status()
         for chapter in chapters:
-            word_count = self.get_chapter_word_count(chapter)
-            if word_count > 0:
-                total_count += word_count
+            cid = chapter_id(chapter)
+            if status.get(cid, 0) > 0:
+                total_count += status[cid]
                 downloaded_count += 1
 
         return total_count, downloaded_count
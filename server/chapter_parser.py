@@ -1,30 +1,21 @@
-import requests
 from bs4 import BeautifulSoup
 import streamlit as st
 from urllib.parse import urljoin
-import time
+from site_profiles import get_registry, profile_for
 
 
 # 获取HTML内容
-def fetch_html_content(url, timeout=10, retry=3):
-    """获取URL的HTML内容，带有重试机制"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    }
-
-    for i in range(retry):
-        try:
-            time.sleep(0.1)
-            response = requests.get(url, headers=headers, timeout=timeout)
-            response.encoding = "utf-8"  # 确保中文编码正确
-            response.raise_for_status()
-            return response.text
-        except Exception as e:
-            if i == retry - 1:  # 最后一次重试
-                st.error(f"获取页面失败: {url}, 错误: {e}")
-                return None
-            continue
-    return None
+def fetch_html_content(url, timeout=None, retry=None):
+    """获取URL的HTML内容，限速、重试和请求头由站点配置决定"""
+    profile = profile_for(url)
+
+    try:
+        response = profile.get(url, timeout=timeout, retries=retry)
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        st.error(f"获取页面失败: {url}, 错误: {e}")
+        return None
 
 
 # 获取章节分页列表
@@ -37,16 +28,15 @@ def fetch_chapter_pages_from_url(url):
         # 解析HTML
         soup = BeautifulSoup(html_content, "html.parser")
 
-        # 查找指定的select元素
-        select_element = soup.find(
-            "select", attrs={"onchange": "location.href=this.value"}
-        )
+        # 查找站点配置中的分页select元素
+        profile = profile_for(url)
+        select_element = profile.select_one("toc_select", soup)
 
         if not select_element:
             return "错误: 未找到指定的select元素"
 
         # 提取所有option元素
-        options = select_element.find_all("option")
+        options = profile.select("toc_option", select_element)
 
         # 创建结果列表
         result = []
@@ -74,29 +64,25 @@ def extract_detailed_chapters(html_content, base_url):
         return []
 
     soup = BeautifulSoup(html_content, "html.parser")
+    profile = profile_for(base_url)
 
-    # 查找指定的ul元素
-    ul_element = soup.find("ul", class_="read")
+    # 查找站点配置中的章节列表元素
+    ul_element = profile.select_one("chapter_list", soup)
 
     if not ul_element:
         return []  # 错误: 未找到指定的ul元素
 
-    # 提取所有li元素
-    li_elements = ul_element.find_all("li")
-
     chapters = []
 
-    for li in li_elements:
-        a_tag = li.find("a")
-        if a_tag:
-            href = a_tag.get("href")
-            title = a_tag.text.strip()
+    for a_tag in profile.select("chapter_link", ul_element):
+        href = a_tag.get("href")
+        title = a_tag.text.strip()
 
-            # 处理相对URL
-            if href and not href.startswith(("http://", "https://")):
-                href = urljoin(base_url, href)
+        # 处理相对URL
+        if href and not href.startswith(("http://", "https://")):
+            href = urljoin(base_url, href)
 
-            chapters.append({"chapter_url": href, "chapter_title": title})
+        chapters.append({"chapter_url": href, "chapter_title": title})
 
     return chapters
 
@@ -134,20 +120,24 @@ def fetch_all_detailed_chapters(chapter_pages):
             ):
                 all_chapters.append(chapter)
 
+    # 保存本次抓取中调优后的站点参数
+    get_registry().save()
+
     return all_chapters
 
 
 # 解析章节内容
-def parse_chapter_content(html_content):
+def parse_chapter_content(html_content, url=""):
     """解析章节内容，返回段落文本列表"""
     if not html_content:
         return []
 
     soup = BeautifulSoup(html_content, "html.parser")
-    content_div = soup.find("div", class_="content")
+    profile = profile_for(url)
+    content_div = profile.select_one("content", soup)
 
     if not content_div:
         return []
 
-    paragraphs = content_div.find_all("p")
+    paragraphs = profile.select("paragraph", content_div)
     return [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
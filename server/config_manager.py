@@ -3,6 +3,7 @@ import json
 import streamlit as st
 import requests
 from openai import OpenAI
+from file_utils import atomic_write_json, atomic_write_bytes
 
 
 class ConfigManager:
@@ -27,8 +28,7 @@ class ConfigManager:
     def save_config(self):
         """保存配置文件"""
         try:
-            with open(self.config_file, "w", encoding="utf-8") as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=4)
+            atomic_write_json(self.config_file, self.config)
             return True
         except Exception as e:
             st.error(f"保存配置文件出错: {str(e)}")
@@ -399,8 +399,7 @@ class ConfigManager:
 
             if response.status_code == 200:
                 # 将响应内容保存为音频文件
-                with open(sample_path, "wb") as f:
-                    f.write(response.content)
+                atomic_write_bytes(sample_path, response.content)
 
                 # 不再尝试更新配置文件
                 return True, sample_path
@@ -435,10 +434,12 @@ class ConfigManager:
         if os.path.exists(sample_path) and os.path.getsize(sample_path) > 0:
             return True, sample_path
 
-        # 构建和运行异步函数
+        # 构建和运行异步函数（先保存到临时文件，完成后再重命名）
         async def generate_speech():
             communicate = Communicate(text, voice_id)
-            await communicate.save(sample_path)
+            temp_path = f"{sample_path}.part"
+            await communicate.save(temp_path)
+            os.replace(temp_path, sample_path)
 
         try:
             asyncio.run(generate_speech())
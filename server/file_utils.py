@@ -0,0 +1,259 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+# 章节音频的扩展名，对应各编码配置的输出格式（见 encoding_profiles），
+# 发布、整理和统计章节音频时共用
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".opus")
+
+# 中文数字：数字、单位（十百千）和节单位（万亿）
+CHINESE_DIGITS = {
+    "零": 0,
+    "〇": 0,
+    "一": 1,
+    "二": 2,
+    "两": 2,
+    "三": 3,
+    "四": 4,
+    "五": 5,
+    "六": 6,
+    "七": 7,
+    "八": 8,
+    "九": 9,
+}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+CHINESE_SECTIONS = {"万": 10**4, "亿": 10**8}
+CHINESE_NUMERALS = "".join([*CHINESE_DIGITS, *CHINESE_UNITS, *CHINESE_SECTIONS])
+
+
+def atomic_write_bytes(file_path, data):
+    """原子写入二进制内容：先写同目录临时文件，fsync 后再重命名覆盖目标文件"""
+    directory = os.path.dirname(file_path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    # 临时文件放在同一目录，保证 os.replace 是同一文件系统内的原子重命名
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(file_path, text, encoding="utf-8"):
+    """原子写入文本内容"""
+    atomic_write_bytes(file_path, text.encode(encoding))
+
+
+def atomic_write_json(file_path, data, indent=4):
+    """原子写入JSON文件"""
+    atomic_write_text(file_path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+def read_jsonl(path):
+    """
+    读取追加写入的 jsonl 文件，返回各行的记录，无法解析的行被跳过
+
+    末尾没有换行的半行是写入中断留下的，从文件中截掉，之后追加的记录从新的一行开始
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+
+    complete = data.rfind(b"\n") + 1
+    entries = []
+    for line in data[:complete].splitlines():
+        try:
+            entry = json.loads(line) if line.strip() else None
+        except ValueError:
+            continue
+        if isinstance(entry, dict):
+            entries.append(entry)
+
+    if complete < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(complete)
+    return entries
+
+
+def file_versions(*paths):
+    """文件的版本（修改时间和大小），文件不存在时为None，用于判断缓存是否过期"""
+    versions = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            versions.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def content_hash(data):
+    """计算内容的sha1哈希"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+
+def chinese_number(text):
+    """
+    中文数字转换为整数，如 "一百零五"、"十二"、"两千"、"一二三"，不是中文数字时返回None
+    """
+    if not text:
+        return None
+
+    total = section = digit = 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            # 没有单位的连续数字按位读，如 "一二三"
+            digit = digit * 10 + CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            section += (digit or 1) * CHINESE_UNITS[char]
+            digit = 0
+        elif char in CHINESE_SECTIONS:
+            unit = CHINESE_SECTIONS[char]
+            # 节单位大于之前累计的值时（如 "一万亿"）整体相乘
+            if unit > max(total, 1):
+                total = (total + section + digit) * unit
+            else:
+                total += (section + digit) * unit
+            section = digit = 0
+        else:
+            return None
+    return total + section + digit
+
+
+def chapter_number(file_name):
+    """
+    从文件名中提取章节号，支持 "第12章"、"第一百零五章" 和以数字开头的文件名，
+    提取不到时返回None
+    """
+    match = re.search(r"第(\d+)章", file_name)
+    if match:
+        return int(match.group(1))
+    match = re.search(f"第([{CHINESE_NUMERALS}]+)章", file_name)
+    if match:
+        return chinese_number(match.group(1))
+    match = re.match(r"(\d+)", file_name)
+    return int(match.group(1)) if match else None
+
+
+def is_valid_text(data):
+    """检查文本文件内容是否完整：严格 UTF-8 解码（截断在多字节字符中间时失败）、没有 NUL 字节、不是空白"""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return "\x00" not in text and bool(text.strip())
+
+
+class CrawlJournal:
+    """
+    抓取日志，记录每个已抓取URL对应的内容哈希和长度
+
+    日志是追加写入的 jsonl 文件，同一URL以最后一条记录为准。
+    断点续传时根据日志判断本地文件是否可信，不可信的章节重新抓取。
+    旧版本下载的文件没有日志记录，需要先用 import_legacy 补录。
+
+    校验模式:
+        trust  - 文件存在且长度与日志一致即视为完成
+        verify - 额外重新计算哈希并与日志比对
+    """
+
+    TRUST = "trust"
+    VERIFY = "verify"
+
+    def __init__(self, journal_path, mode=TRUST):
+        self.journal_path = journal_path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        """加载日志，截掉崩溃时可能残留的半行记录"""
+        for entry in read_jsonl(self.journal_path):
+            if entry.get("url"):
+                self.entries[entry["url"]] = entry
+
+    def record(self, url, file_path, data, sync=True):
+        """记录一次成功的抓取（应在目标文件原子写入完成之后调用）"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        entry = {
+            "url": url,
+            "path": file_path,
+            "sha1": content_hash(data),
+            "length": len(data),
+            "fetched_at": time.time(),
+        }
+
+        with self.lock:
+            self.entries[url] = entry
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def is_complete(self, url, file_path):
+        """判断URL对应的本地文件是否为完整的已抓取内容（只读，不修改日志）"""
+        entry = self.entries.get(url)
+        if entry is None or not os.path.exists(file_path):
+            return False
+
+        if entry.get("length") != os.path.getsize(file_path):
+            return False
+
+        if self.mode == self.VERIFY:
+            with open(file_path, "rb") as f:
+                return content_hash(f.read()) == entry.get("sha1")
+
+        return True
+
+    def import_legacy(self, url, file_path):
+        """
+        补录旧版本下载、没有日志记录的文件，补录成功返回True
+
+        trust 模式下非空文件直接补录；verify 模式下文件没有可比对的哈希，
+        先检查内容（严格 UTF-8 解码、没有 NUL 字节、不是空白），截断或损坏的文件不补录，应重新抓取
+        """
+        if url in self.entries or not os.path.exists(file_path):
+            return False
+
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if not data:
+            return False
+
+        if self.mode == self.VERIFY and not is_valid_text(data):
+            return False
+
+        self.record(url, file_path, data, sync=False)
+        return True
+
+    def compact(self):
+        """压缩日志，每个URL只保留最后一条记录"""
+        with self.lock:
+            lines = [
+                json.dumps(entry, ensure_ascii=False) for entry in self.entries.values()
+            ]
+            atomic_write_text(
+                self.journal_path, "\n".join(lines) + "\n" if lines else ""
+            )
@@ -1,5 +1,6 @@
 import streamlit as st
 from book_manager import BookManager
+from book_store import chapter_id
 from config_page import show_config_page
 from audiobook_creator import show_audiobook_creation_page
 
@@ -58,11 +59,18 @@ def show_book_chapters(book_id):
     if not chapters:
         return
 
+    # 章节下载状态和字数（来自章节状态索引，不读取正文）
+    status = book_manager.get_chapter_status(book_id)
+
+    def chapter_words(chapter):
+        stats = status.get(chapter_id(chapter))
+        return stats["char_count"] if stats else 0
+
     # 获取书籍总字数
     total_words, downloaded_chapters = book_manager.get_book_total_words(book_id)
 
     # 检查是否所有章节都已下载
-    all_downloaded = book_manager.are_all_chapters_downloaded(book_id)
+    all_downloaded = all(chapter_id(chapter) in status for chapter in chapters)
 
     # 显示统计信息
     st.subheader("书籍统计")
@@ -119,14 +127,9 @@ def show_book_chapters(book_id):
     # 遍历分组显示
     for group, group_chapters in sorted(groups.items()):
         # 计算当前分组的总字数
-        group_word_count = sum(
-            book_manager.get_chapter_word_count(book_id, chapter)
-            for chapter in group_chapters
-        )
+        group_word_count = sum(chapter_words(chapter) for chapter in group_chapters)
         group_downloaded = sum(
-            1
-            for chapter in group_chapters
-            if book_manager.is_chapter_downloaded(book_id, chapter)
+            1 for chapter in group_chapters if chapter_id(chapter) in status
         )
 
         with st.expander(
@@ -135,12 +138,11 @@ def show_book_chapters(book_id):
         ):
             for i, chapter in enumerate(group_chapters, 1):
                 # 检查章节是否已下载
-                is_downloaded = book_manager.is_chapter_downloaded(book_id, chapter)
+                is_downloaded = chapter_id(chapter) in status
 
                 if is_downloaded:
                     # 获取字数
-                    word_count = book_manager.get_chapter_word_count(book_id, chapter)
-                    download_status = f"✅ {format_word_count(word_count)}"
+                    download_status = f"✅ {format_word_count(chapter_words(chapter))}"
                 else:
                     download_status = "❌ 未下载"
 
@@ -269,24 +271,29 @@ def main():
             total_chapters = 0
             total_downloaded = 0
             total_words = 0
+            total_attributed = 0
+            total_synthesized = 0
 
+            # 各书的统计来自书库目录索引，不再逐本读取章节
             for book in books:
-                book_id = book.get("id")
-                chapters_count = book.get("chapters_count", 0)
-                total_chapters += chapters_count
-
-                if book_id:
-                    words, downloaded = book_manager.get_book_total_words(book_id)
-                    total_words += words
-                    total_downloaded += downloaded
-
-            col1, col2, col3 = st.columns(3)
+                stats = book.get("stats", {})
+                total_chapters += book.get("chapters_count", 0)
+                total_words += stats.get("words", 0)
+                total_downloaded += stats.get("downloaded", 0)
+                total_attributed += stats.get("attributed", 0)
+                total_synthesized += stats.get("synthesized", 0)
+
+            col1, col2, col3, col4, col5 = st.columns(5)
             with col1:
                 st.metric("书籍总数", len(books))
             with col2:
                 st.metric("章节总数", f"{total_downloaded}/{total_chapters}")
             with col3:
                 st.metric("总字数", format_word_count(total_words))
+            with col4:
+                st.metric("已分析对话", total_attributed)
+            with col5:
+                st.metric("已合成音频", total_synthesized)
 
 
 # 返回书籍列表的辅助函数
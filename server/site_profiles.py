@@ -0,0 +1,349 @@
+import os
+import json
+import time
+import statistics
+import threading
+from urllib.parse import urlparse
+
+import requests
+import soupsieve
+
+from file_utils import atomic_write_json
+
+# 站点配置文件路径
+PROFILES_FILE = os.path.join("data", "site_profiles.json")
+
+# 内置的站点模板（默认对应参考站点 m.ilwxs.com 的页面结构）
+DEFAULT_SELECTORS = {
+    # 章节分页下拉框
+    "toc_select": 'select[onchange="location.href=this.value"]',
+    # 分页下拉框中的选项
+    "toc_option": "option",
+    # 章节列表
+    "chapter_list": "ul.read",
+    # 章节列表中的链接
+    "chapter_link": "li a",
+    # 正文区域
+    "content": "div.content",
+    # 正文段落
+    "paragraph": "p",
+}
+
+DEFAULT_SETTINGS = {
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "encoding": "utf-8",
+    "timeout": 10,
+    # 同一站点同时进行的请求数（与原来下载线程池的线程数相当）
+    "concurrency": 10,
+    # 同一站点两次请求之间的最小间隔（秒）
+    "min_interval": 0.02,
+    "retries": 3,
+    "retry_backoff": 1.0,
+}
+
+# 自动调优的边界
+TUNING_LIMITS = {
+    "max_concurrency": 32,
+    "min_concurrency": 1,
+    "floor_interval": 0.0,
+    "max_interval": 5.0,
+}
+
+# 每统计多少次请求调整一次
+TUNING_WINDOW = 50
+# 错误率低于该值时加速，高于 BACKOFF_ERROR_RATE 时减速
+SPEEDUP_ERROR_RATE = 0.01
+BACKOFF_ERROR_RATE = 0.05
+
+
+class SiteProfile:
+    """单个站点的配置：选择器、请求参数以及自动调优状态"""
+
+    def __init__(self, name, hosts, selectors=None, settings=None, stats=None):
+        self.name = name
+        self.hosts = list(hosts)
+        self.selectors = dict(DEFAULT_SELECTORS)
+        self.selectors.update(selectors or {})
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        # safe_concurrency / safe_interval 记录错误率达标时的最快设置
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "safe_concurrency": None,
+            "safe_interval": None,
+        }
+        self.stats.update(stats or {})
+
+        # 选择器只编译一次
+        self.compiled = {
+            key: soupsieve.compile(selector) for key, selector in self.selectors.items()
+        }
+
+        # 所属注册表，调优后用于写回配置文件
+        self.registry = None
+        self.condition = threading.Condition()
+        self.active = 0
+        self.next_request_at = 0.0
+        self.window_requests = 0
+        self.window_errors = 0
+        self.dirty = False
+
+    def select(self, key, soup):
+        """使用编译后的选择器查找所有匹配元素"""
+        return self.compiled[key].select(soup)
+
+    def select_one(self, key, soup):
+        """使用编译后的选择器查找第一个匹配元素"""
+        return self.compiled[key].select_one(soup)
+
+    def headers(self):
+        """请求头"""
+        return {"User-Agent": self.settings["user_agent"]}
+
+    def acquire(self):
+        """等待并发名额和请求间隔"""
+        with self.condition:
+            while self.active >= self.settings["concurrency"]:
+                self.condition.wait()
+            self.active += 1
+
+            now = time.monotonic()
+            wait = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + float(
+                self.settings["min_interval"]
+            )
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, error):
+        """归还并发名额并记录结果，按窗口错误率调整参数"""
+        tuned = False
+        with self.condition:
+            self.active -= 1
+            self.stats["requests"] += 1
+            self.window_requests += 1
+            if error:
+                self.stats["errors"] += 1
+                self.window_errors += 1
+
+            if self.window_requests >= TUNING_WINDOW:
+                self._tune()
+                tuned = True
+
+            self.condition.notify_all()
+
+        if tuned and self.registry:
+            self.registry.save_if_dirty()
+
+    def _tune(self):
+        """根据最近一个窗口的错误率调整并发和间隔（加性增、乘性减）"""
+        error_rate = self.window_errors / self.window_requests
+        concurrency = self.settings["concurrency"]
+        interval = float(self.settings["min_interval"])
+
+        if error_rate <= SPEEDUP_ERROR_RATE:
+            self.stats["safe_concurrency"] = max(
+                concurrency, self.stats["safe_concurrency"] or 0
+            )
+            if self.stats["safe_interval"] is None:
+                self.stats["safe_interval"] = interval
+            else:
+                self.stats["safe_interval"] = min(interval, self.stats["safe_interval"])
+            concurrency = min(concurrency + 1, TUNING_LIMITS["max_concurrency"])
+            interval = max(interval * 0.8, TUNING_LIMITS["floor_interval"])
+            if interval < 0.01:
+                interval = TUNING_LIMITS["floor_interval"]
+        elif error_rate >= BACKOFF_ERROR_RATE:
+            concurrency = max(concurrency // 2, TUNING_LIMITS["min_concurrency"])
+            interval = min(max(interval * 2, 0.1), TUNING_LIMITS["max_interval"])
+            # 之前记录的安全值已不再安全，回退到当前值
+            if (self.stats["safe_concurrency"] or 0) > concurrency:
+                self.stats["safe_concurrency"] = concurrency
+            if (self.stats["safe_interval"] or 0) < interval:
+                self.stats["safe_interval"] = interval
+
+        self.settings["concurrency"] = concurrency
+        self.settings["min_interval"] = round(interval, 3)
+        self.window_requests = 0
+        self.window_errors = 0
+        self.dirty = True
+
+    def get(self, url, session=None, timeout=None, retries=None):
+        """
+        按站点配置发起GET请求，带限速、重试和结果统计
+
+        返回最后一次的响应对象；所有重试都抛出异常时抛出最后一个异常
+        """
+        client = session or requests
+        timeout = timeout or self.settings["timeout"]
+        retries = retries or self.settings["retries"]
+
+        for attempt in range(retries):
+            self.acquire()
+            error = True
+            try:
+                response = client.get(url, headers=self.headers(), timeout=timeout)
+                response.encoding = self.settings["encoding"]
+                # 限流和服务端错误计入错误率，其他状态码视为站点正常响应
+                error = response.status_code == 429 or response.status_code >= 500
+                if not error or attempt == retries - 1:
+                    return response
+            except requests.RequestException:
+                if attempt == retries - 1:
+                    raise
+            finally:
+                self.release(error)
+
+            time.sleep(self.settings["retry_backoff"] * (2**attempt))
+
+    def to_dict(self):
+        """转换为字典，用于保存"""
+        return {
+            "name": self.name,
+            "hosts": self.hosts,
+            "selectors": self.selectors,
+            "settings": self.settings,
+            "stats": self.stats,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从字典创建对象"""
+        return cls(
+            name=data.get("name", ""),
+            hosts=data.get("hosts", []),
+            selectors=data.get("selectors"),
+            settings=data.get("settings"),
+            stats=data.get("stats"),
+        )
+
+
+class SiteRegistry:
+    """站点配置注册表，按域名查找站点配置，并把调优结果写回配置文件"""
+
+    def __init__(self, profiles_file=PROFILES_FILE, save_interval=30):
+        self.profiles_file = profiles_file
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.last_saved_at = time.monotonic()
+        self.load()
+
+    def load(self):
+        """加载配置文件"""
+        if not os.path.exists(self.profiles_file):
+            return
+
+        try:
+            with open(self.profiles_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取站点配置出错: {str(e)}")
+            return
+
+        for item in data:
+            profile = SiteProfile.from_dict(item)
+            profile.registry = self
+            self.profiles[profile.name] = profile
+
+    def save(self):
+        """保存配置文件（先写临时文件再重命名）"""
+        with self.lock:
+            data = [profile.to_dict() for profile in self.profiles.values()]
+            for profile in self.profiles.values():
+                profile.dirty = False
+            self.last_saved_at = time.monotonic()
+
+        atomic_write_json(self.profiles_file, data)
+
+    def save_if_dirty(self):
+        """有调优变化且距上次保存超过间隔时保存"""
+        # profile_for 可能在其他线程中同时添加配置，检查在锁内进行
+        with self.lock:
+            due = time.monotonic() - self.last_saved_at >= self.save_interval
+            dirty = due and any(profile.dirty for profile in self.profiles.values())
+        if dirty:
+            self.save()
+
+    def profile_for(self, url):
+        """获取URL所属站点的配置，未知站点以已学习到的安全设置创建新配置"""
+        host = urlparse(url).hostname or ""
+
+        with self.lock:
+            for profile in self.profiles.values():
+                if host in profile.hosts:
+                    return profile
+
+            profile = SiteProfile(
+                name=host, hosts=[host], settings=self.learned_defaults(host)
+            )
+            profile.registry = self
+            self.profiles[host] = profile
+            profile.dirty = True
+
+        return profile
+
+    def learned_defaults(self, host=""):
+        """
+        新站点的初始设置
+
+        同一主域名（如 m.example.com 与 www.example.com）已有调优记录时沿用其安全值，
+        否则取所有已调优站点安全值的中位数，个别慢站点不会拖慢新站点；
+        没有任何调优记录时使用内置默认值
+        """
+        tuned = [
+            p
+            for p in self.profiles.values()
+            if p.stats.get("safe_concurrency")
+            or p.stats.get("safe_interval") is not None
+        ]
+        family = [
+            p
+            for p in tuned
+            if any(host_family(h) == host_family(host) for h in p.hosts)
+        ]
+
+        safe_concurrency = [
+            p.stats["safe_concurrency"]
+            for p in family or tuned
+            if p.stats.get("safe_concurrency")
+        ]
+        safe_interval = [
+            p.stats["safe_interval"]
+            for p in family or tuned
+            if p.stats.get("safe_interval") is not None
+        ]
+
+        settings = dict(DEFAULT_SETTINGS)
+        if safe_concurrency:
+            settings["concurrency"] = statistics.median_low(safe_concurrency)
+        if safe_interval:
+            settings["min_interval"] = statistics.median(safe_interval)
+        return settings
+
+
+def host_family(host):
+    """主域名（域名的最后两段），用于把同一站点的不同子域名归为一类"""
+    if not host or host.replace(".", "").isdigit():
+        return host
+    return ".".join(host.split(".")[-2:])
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """获取全局站点配置注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SiteRegistry()
+        return _registry
+
+
+def profile_for(url):
+    """获取URL所属站点的配置"""
+    return get_registry().profile_for(url)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TEST_DIR)
+
+# key_test.py 是批量测试 API Key 的脚本，导入时就会读取密钥文件并发起请求
+collect_ignore = ["key_test.py"]
@@ -0,0 +1,340 @@
+"""
+爬虫吞吐量压测
+
+启动本地替身站点（site_standin.py），依次用各个爬虫入口完成“目录 → 章节列表 → 正文下载”，
+报告每秒章节数、单章延迟 p50/p99 以及注入错误后的完成情况。
+
+每个入口在独立子进程和临时工作目录中运行：
+    app       getBookList + getZjList + saveBooks.download_novel
+    server    chapter_parser + ChapterDownloader（需要安装 streamlit）
+    book-gui  NovelCrawler
+
+用法:
+    python test/crawler_bench.py --chapters 300 --latency 30 --error-rate 0.02 --rate-limit 80
+    python test/crawler_bench.py --output bench.json
+    python test/crawler_bench.py --baseline bench.json --tolerance 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from urllib.request import urlopen
+
+from site_standin import StandinServer, add_config_arguments, config_from_args
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口名称与代码目录
+TARGETS = {
+    "app": "app",
+    "server": "server",
+    "book-gui": "book-gui",
+}
+
+
+def timed(func, is_ok, records, lock):
+    """包装章节处理函数，记录每章耗时和结果"""
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        with lock:
+            records.append((elapsed, is_ok(result)))
+        return result
+
+    return wrapper
+
+
+def run_app(url, max_workers, records, lock):
+    """app 目录下的命令行爬虫"""
+    import getBookList
+    import getZjList
+    import saveBooks
+    from file_utils import atomic_write_json
+
+    start = time.perf_counter()
+    options = getBookList.fetch_options_from_url(url)
+    if isinstance(options, str):
+        raise RuntimeError(options)
+
+    chapters = []
+    for option in options:
+        html_content = getZjList.fetch_html_content(option["list_url"])
+        for chapter in getZjList.extract_chapters(html_content, option["list_url"]):
+            chapter["group"] = option["text"]
+            chapters.append(chapter)
+    toc_seconds = time.perf_counter() - start
+
+    json_file = os.path.join("data", "xszj.json")
+    atomic_write_json(json_file, chapters)
+
+    saveBooks.process_chapter = timed(saveBooks.process_chapter, bool, records, lock)
+    start = time.perf_counter()
+    saveBooks.download_novel(
+        json_file, os.path.join("data", "bench"), max_workers=max_workers
+    )
+    return len(chapters), toc_seconds, time.perf_counter() - start
+
+
+def run_server(url, max_workers, records, lock):
+    """server 目录下的 streamlit 爬虫（脱离 streamlit 运行时 UI 调用不生效）"""
+    import chapter_parser
+    from chapter_downloader import ChapterDownloader
+
+    start = time.perf_counter()
+    pages = chapter_parser.fetch_chapter_pages_from_url(url)
+    if isinstance(pages, str):
+        raise RuntimeError(pages)
+    chapters = chapter_parser.fetch_all_detailed_chapters(pages)
+    toc_seconds = time.perf_counter() - start
+
+    ChapterDownloader.download_chapter = timed(
+        ChapterDownloader.download_chapter, bool, records, lock
+    )
+    downloader = ChapterDownloader("bench", max_workers=max_workers)
+    start = time.perf_counter()
+    downloader.download_all_chapters(chapters)
+    return len(chapters), toc_seconds, time.perf_counter() - start
+
+
+def run_book_gui(url, max_workers, records, lock):
+    """book-gui 的 NovelCrawler"""
+    from crawler import NovelCrawler
+
+    NovelCrawler.fetch_chapter_content = timed(
+        NovelCrawler.fetch_chapter_content,
+        lambda result: result[0] is not None,
+        records,
+        lock,
+    )
+    crawler = NovelCrawler()
+
+    start = time.perf_counter()
+    options = crawler.fetch_options_from_url(url)
+    if not options:
+        raise RuntimeError("未获取到章节分页")
+    chapters = []
+    for option in options:
+        chapters.extend(crawler.fetch_chapters(option, chapters))
+    toc_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    crawler.download_chapters_content(chapters, max_workers=max_workers)
+    return len(chapters), toc_seconds, time.perf_counter() - start
+
+
+RUNNERS = {
+    "app": run_app,
+    "server": run_server,
+    "book-gui": run_book_gui,
+}
+
+
+def run_worker(args):
+    """子进程：在临时工作目录中运行单个入口，结果写入 --result 文件"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, TARGETS[args.worker]))
+
+    records = []
+    lock = threading.Lock()
+    result = {"target": args.worker}
+    try:
+        total, toc_seconds, download_seconds = RUNNERS[args.worker](
+            args.url, args.max_workers, records, lock
+        )
+        result.update(
+            {
+                "chapters": total,
+                "toc_seconds": toc_seconds,
+                "download_seconds": download_seconds,
+            }
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["latencies"] = [elapsed for elapsed, _ in records]
+    result["ok"] = sum(1 for _, ok in records if ok)
+    result["failed"] = sum(1 for _, ok in records if not ok)
+
+    # 压测结束时站点配置调优到的参数
+    profiles_file = os.path.join("data", "site_profiles.json")
+    if os.path.exists(profiles_file):
+        with open(profiles_file, "r", encoding="utf-8") as f:
+            for profile in json.load(f):
+                if "127.0.0.1" in profile.get("hosts", []):
+                    result["tuned"] = {
+                        "concurrency": profile["settings"]["concurrency"],
+                        "min_interval": profile["settings"]["min_interval"],
+                    }
+
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+def fetch_stats(server, reset=False):
+    """读取或清空替身服务器的统计"""
+    path = "/__reset" if reset else "/__stats"
+    with urlopen(server.base_url + path) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def bench_target(server, target, max_workers, timeout):
+    """运行单个入口并汇总结果"""
+    fetch_stats(server, reset=True)
+
+    with tempfile.TemporaryDirectory(prefix=f"bench-{target}-") as workdir:
+        result_file = os.path.join(workdir, "result.json")
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--worker",
+            target,
+            "--url",
+            server.toc_url,
+            "--max-workers",
+            str(max_workers),
+            "--result",
+            result_file,
+        ]
+        try:
+            subprocess.run(
+                command,
+                cwd=workdir,
+                timeout=timeout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except subprocess.TimeoutExpired:
+            return {"target": target, "error": f"超时（{timeout}秒）"}
+
+        if not os.path.exists(result_file):
+            return {"target": target, "error": "子进程未返回结果"}
+        with open(result_file, "r", encoding="utf-8") as f:
+            result = json.load(f)
+
+    latencies = result.pop("latencies", [])
+    download_seconds = result.get("download_seconds") or 0
+    result["chapters_per_sec"] = (
+        result["ok"] / download_seconds if download_seconds else 0.0
+    )
+    result["p50_ms"] = percentile(latencies, 50) * 1000
+    result["p99_ms"] = percentile(latencies, 99) * 1000
+    result["completion"] = (
+        result["ok"] / result["chapters"] if result.get("chapters") else 0.0
+    )
+    result["server"] = fetch_stats(server)
+    return result
+
+
+def print_report(results):
+    """打印压测结果"""
+    header = f"{'入口':<10}{'章节':>6}{'成功':>6}{'失败':>6}{'章/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'注入错误':>8}{'限流':>6}{'完成率':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if "chapters" not in result:
+            print(f"{result['target']:<10}出错: {result.get('error')}")
+            continue
+        server = result["server"]
+        print(
+            f"{result['target']:<10}{result['chapters']:>6}{result['ok']:>6}{result['failed']:>6}"
+            f"{result['chapters_per_sec']:>10.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{server['errors_injected']:>8}{server['throttled']:>6}{result['completion']:>8.1%}"
+        )
+        if result.get("error"):
+            print(f"  出错: {result['error']}")
+        if result.get("tuned"):
+            print(
+                f"  站点配置调优结果: 并发 {result['tuned']['concurrency']}, 间隔 {result['tuned']['min_interval']}秒"
+            )
+
+
+def check_baseline(results, baseline_file, tolerance):
+    """与基线比较，吞吐量下降或完成率降低视为回归"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {item["target"]: item for item in json.load(f)}
+
+    regressions = []
+    for result in results:
+        base = baseline.get(result["target"])
+        if not base or "chapters" not in base:
+            continue
+        if "chapters" not in result:
+            regressions.append(f"{result['target']}: 运行出错 {result.get('error')}")
+            continue
+        if result["chapters_per_sec"] < base["chapters_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{result['target']}: 吞吐量 {result['chapters_per_sec']:.1f} 低于基线 {base['chapters_per_sec']:.1f}"
+            )
+        if result["completion"] < base["completion"]:
+            regressions.append(
+                f"{result['target']}: 完成率 {result['completion']:.1%} 低于基线 {base['completion']:.1%}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫吞吐量压测")
+    add_config_arguments(parser)
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=list(TARGETS),
+        default=list(TARGETS),
+        help="要压测的爬虫入口",
+    )
+    parser.add_argument("--max-workers", type=int, default=10, help="爬虫线程数")
+    parser.add_argument("--timeout", type=int, default=600, help="单个入口超时（秒）")
+    parser.add_argument("--output", help="保存结果的JSON文件")
+    parser.add_argument("--baseline", help="用于回归比较的基线JSON文件")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="允许的吞吐量下降比例"
+    )
+    # 子进程参数
+    parser.add_argument("--worker", choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = []
+    with StandinServer(config_from_args(args)) as server:
+        print(f"替身站点: {server.toc_url}")
+        for target in args.targets:
+            print(f"正在压测: {target}")
+            results.append(bench_target(server, target, args.max_workers, args.timeout))
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for message in regressions:
+            print(f"回归: {message}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+编码配置对比
+
+用一个样本章节按每个编码配置（app/encoding_profiles.py）并行编码，
+报告每个配置的文件大小、相对默认输出的比例、编码耗时和实时倍数。
+
+样本章节可以是已合成书籍的某一章（从片段包拼接，不调用语音合成接口），也可以直接指定MP3文件。
+片段按默认参数（44.1kHz）合成，按配置中的合成参数重新合成对最终大小没有影响，报告中不包含这部分。
+
+用法:
+    python test/encoding_bench.py --book-id 115690 --chapter 0
+    python test/encoding_bench.py --input sample.mp3 --profiles speech_mp3 speech_opus
+    python test/encoding_bench.py --input sample.mp3 --output encoding.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from chapter_assembler import ChapterAssembler  # noqa: E402
+from chapter_assembler import audio_frames, frames_duration  # noqa: E402
+from encoding_profiles import ENCODING_PROFILES, transcode  # noqa: E402
+from encoding_profiles import output_extension  # noqa: E402
+from segment_pack import SegmentPack  # noqa: E402
+
+
+def sample_from_book(book_id, chapter_index, output_path):
+    """从书籍的片段包拼接样本章节"""
+    pack_base = os.path.join("audio", book_id, "audio_temp", str(chapter_index))
+    if not os.path.exists(f"{pack_base}.idx"):
+        raise SystemExit(f"章节 {chapter_index} 没有片段包: {pack_base}.idx")
+
+    with SegmentPack(pack_base) as pack:
+        total = max(pack.entries) + 1 if pack.entries else 0
+        assembler = ChapterAssembler(output_path, total)
+        for index in range(total):
+            assembler.add(
+                index, (lambda i=index: pack.read(i)) if pack.get(index) else None
+            )
+        if not assembler.finish():
+            raise SystemExit(f"章节 {chapter_index} 没有可用的音频片段")
+    return output_path
+
+
+def encode_profile(name, source_path, work_dir):
+    """进程池任务：按一个配置编码样本，返回 (配置名, 大小, 耗时)"""
+    export = ENCODING_PROFILES[name]["export"]
+    if not export:
+        return name, os.path.getsize(source_path), 0.0
+
+    output_path = os.path.join(work_dir, f"{name}.{output_extension(export)}")
+    start = time.perf_counter()
+    transcode(source_path, output_path, export)
+    return name, os.path.getsize(output_path), time.perf_counter() - start
+
+
+def run(source_path, profiles, workers):
+    with open(source_path, "rb") as f:
+        duration = frames_duration(audio_frames(f.read()))
+    source_size = os.path.getsize(source_path)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(encode_profile, name, source_path, work_dir)
+                for name in profiles
+            ]
+            results = [future.result() for future in futures]
+
+    rows = []
+    for name, size, seconds in results:
+        export = ENCODING_PROFILES[name]["export"] or {}
+        rows.append(
+            {
+                "profile": name,
+                "format": output_extension(export),
+                "bytes": size,
+                "ratio": size / source_size,
+                "kbps": size * 8 / 1000 / duration if duration else 0,
+                "encode_seconds": seconds,
+                "realtime": duration / seconds if seconds else None,
+            }
+        )
+    return {"duration": duration, "source_bytes": source_size, "profiles": rows}
+
+
+def print_report(report):
+    print(
+        f"样本时长 {report['duration']:.1f} 秒，"
+        f"默认输出 {report['source_bytes'] / 1024:.0f} KB"
+    )
+    print(
+        f"{'配置':<14}{'格式':<6}{'大小(KB)':>10}{'比例':>8}"
+        f"{'kbps':>8}{'耗时(秒)':>10}{'实时倍数':>10}"
+    )
+    for row in report["profiles"]:
+        realtime = f"{row['realtime']:.0f}x" if row["realtime"] else "-"
+        print(
+            f"{row['profile']:<14}{row['format']:<6}{row['bytes'] / 1024:>10.0f}"
+            f"{row['ratio']:>8.0%}{row['kbps']:>8.1f}"
+            f"{row['encode_seconds']:>10.2f}{realtime:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="章节音频编码配置对比")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--book-id", help="从该书的片段包拼接样本章节")
+    source.add_argument("--input", help="样本MP3文件")
+    parser.add_argument("--chapter", type=int, default=0, help="样本章节序号")
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(ENCODING_PROFILES),
+        choices=list(ENCODING_PROFILES),
+        help="参与对比的配置，默认全部",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="并行编码的进程数")
+    parser.add_argument("--output", help="把报告保存为JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sample_dir:
+        if args.input:
+            source_path = args.input
+        else:
+            source_path = sample_from_book(
+                args.book_id, args.chapter, os.path.join(sample_dir, "sample.mp3")
+            )
+        report = run(source_path, args.profiles, args.workers)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+book-gui MongoDB 章节存储压测
+
+在临时数据库中生成一本样本小说，先按旧格式把正文和对话分析结果内嵌在章节文档中，
+测量存储大小和常用查询延迟；再迁移到压缩集合后重新测量，输出前后对比。
+
+需要可访问的 MongoDB，测试结束后删除临时数据库（指定 --keep 时保留）。
+
+用法:
+    python test/mongo_storage_bench.py --uri mongodb://localhost:27017 --chapters 1000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+from site_standin import SAMPLE_SENTENCES
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "book-gui"))
+
+from db_manager import MongoDBManager  # noqa: E402
+
+SPEAKERS = [("林尘", "男"), ("苏婉儿", "女"), ("王长老", "男"), ("小师妹", "女")]
+
+
+def make_chapter(number, paragraphs):
+    """生成样本章节（正文和对话分析结果），内容按章节号确定"""
+    rng = random.Random(number)
+    content = [rng.choice(SAMPLE_SENTENCES) for _ in range(paragraphs)]
+    dialogues = []
+    for text in content:
+        if "“" in text:
+            name, sex = rng.choice(SPEAKERS)
+            dialogues.append({"type": name, "sex": sex, "text": text})
+        else:
+            dialogues.append({"type": "旁白", "sex": "中", "text": text})
+    return content, dialogues
+
+
+def insert_legacy_novel(db, chapters, paragraphs):
+    """按旧格式插入样本小说，返回小说ID"""
+    novel_id = db.novels.insert_one({"name": "存储压测样本"}).inserted_id
+    batch = []
+    for number in range(1, chapters + 1):
+        content, dialogues = make_chapter(number, paragraphs)
+        batch.append(
+            {
+                "novel_id": novel_id,
+                "volume": f"第{(number - 1) // 100 + 1}卷",
+                "title": f"第{number}章",
+                "url": f"http://standin/book/1/{number}.html",
+                "word_count": sum(len(p) for p in content),
+                "content": content,
+                "dialogues": dialogues,
+            }
+        )
+        if len(batch) >= 500:
+            db.chapters.insert_many(batch)
+            batch = []
+    if batch:
+        db.chapters.insert_many(batch)
+    return novel_id
+
+
+def timed(func, repeat):
+    """多次运行取平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(manager, novel_id, urls, repeat):
+    """测量存储大小和查询延迟"""
+    sample_urls = urls[:: max(1, len(urls) // 20)]
+    report = manager.storage_report(novel_id)
+    return {
+        "bytes": sum(stats["bytes"] for stats in report.values()),
+        "collections": report,
+        "list_ms": timed(
+            lambda: list(manager.iter_chapter_summaries(novel_id)), repeat
+        ),
+        "analyzed_ms": timed(lambda: manager.get_analyzed_urls(novel_id), repeat),
+        "content_ms": timed(
+            lambda: [manager.get_chapter_content(novel_id, url) for url in sample_urls],
+            repeat,
+        )
+        / len(sample_urls),
+        "dialogues_ms": timed(
+            lambda: [
+                manager.get_chapter_dialogues(novel_id, url) for url in sample_urls
+            ],
+            repeat,
+        )
+        / len(sample_urls),
+        "export_ms": timed(lambda: manager.get_chapters(novel_id), 1),
+    }
+
+
+def print_report(before, after):
+    """打印迁移前后对比"""
+    rows = [
+        ("存储大小(字节)", "bytes", "{:>14,}"),
+        ("章节列表(ms)", "list_ms", "{:>14.1f}"),
+        ("分析状态(ms)", "analyzed_ms", "{:>14.1f}"),
+        ("单章正文(ms)", "content_ms", "{:>14.2f}"),
+        ("单章对话(ms)", "dialogues_ms", "{:>14.2f}"),
+        ("全书导出(ms)", "export_ms", "{:>14.1f}"),
+    ]
+    print(f"{'指标':<14}{'内嵌存储':>14}{'压缩存储':>14}")
+    for label, key, fmt in rows:
+        print(f"{label:<14}{fmt.format(before[key])}{fmt.format(after[key])}")
+
+    print("\n压缩存储各集合:")
+    for name, stats in after["collections"].items():
+        line = f"  {name:<18}{stats['bytes']:>14,} 字节"
+        if stats.get("raw_bytes"):
+            line += f"（原始 {stats['raw_bytes']:,} 字节）"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="book-gui MongoDB 章节存储压测")
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="连接字符串")
+    parser.add_argument("--chapters", type=int, default=1000, help="章节数")
+    parser.add_argument("--paragraphs", type=int, default=60, help="每章段落数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询重复次数")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据库")
+    args = parser.parse_args()
+
+    db_name = f"storage_bench_{int(time.time())}"
+    manager = MongoDBManager()
+    success, message = manager.connect(args.uri, db_name)
+    if not success:
+        print(message)
+        sys.exit(1)
+
+    try:
+        print(f"临时数据库: {db_name}，生成 {args.chapters} 个章节")
+        novel_id = insert_legacy_novel(manager.db, args.chapters, args.paragraphs)
+        urls = [
+            f"http://standin/book/1/{number}.html"
+            for number in range(1, args.chapters + 1)
+        ]
+
+        before = measure(manager, novel_id, urls, args.repeat)
+
+        start = time.perf_counter()
+        success, message = manager.migrate_novel_storage(novel_id)
+        print(f"{message}，耗时 {time.perf_counter() - start:.2f} 秒\n")
+        if not success:
+            sys.exit(1)
+
+        after = measure(manager, novel_id, urls, args.repeat)
+        print_report(before, after)
+    finally:
+        if not args.keep:
+            manager.client.drop_database(db_name)
+        manager.disconnect()
+
+
+if __name__ == "__main__":
+    main()
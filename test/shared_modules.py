@@ -0,0 +1,70 @@
+"""
+共享模块一致性检查
+
+app/、server/、gui/、book-gui/ 各自作为脚本目录运行（PyInstaller 打包 gui/），
+公共模块以相同的副本放在各目录中。以第一个目录中的文件为准，副本必须与它完全一致，
+修改公共模块时只改第一个目录中的文件，再用 --sync 同步到其他目录。
+
+用法:
+    python test/shared_modules.py          检查副本是否一致，不一致时返回非零状态
+    python test/shared_modules.py --sync   用第一个目录中的文件覆盖其他副本
+"""
+
+import os
+import sys
+import shutil
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 公共模块 -> 所在目录（第一个为源文件）
+SHARED_MODULES = {
+    "site_profiles.py": ("app", "server", "book-gui"),
+    "book_store.py": ("app", "server"),
+    "serialization.py": ("app", "server"),
+    "chapter_assembler.py": ("app", "gui"),
+    "file_utils.py": ("app", "server", "gui", "book-gui"),
+}
+
+
+def differing_copies():
+    """与源文件不一致或缺失的副本，返回 [(源文件, 副本)]"""
+    result = []
+    for name, directories in SHARED_MODULES.items():
+        source = os.path.join(ROOT_DIR, directories[0], name)
+        with open(source, "rb") as f:
+            expected = f.read()
+        for directory in directories[1:]:
+            copy = os.path.join(ROOT_DIR, directory, name)
+            if not os.path.exists(copy):
+                result.append((source, copy))
+                continue
+            with open(copy, "rb") as f:
+                if f.read() != expected:
+                    result.append((source, copy))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享模块一致性检查")
+    parser.add_argument("--sync", action="store_true", help="用源文件覆盖其他副本")
+    args = parser.parse_args()
+
+    differing = differing_copies()
+    for source, copy in differing:
+        relative_source = os.path.relpath(source, ROOT_DIR)
+        relative_copy = os.path.relpath(copy, ROOT_DIR)
+        if args.sync:
+            shutil.copyfile(source, copy)
+            print(f"已同步: {relative_source} -> {relative_copy}")
+        else:
+            print(f"副本不一致: {relative_copy}（源文件 {relative_source}）")
+
+    if differing and not args.sync:
+        sys.exit(1)
+    if not differing:
+        print("所有共享模块的副本一致")
+
+
+if __name__ == "__main__":
+    main()
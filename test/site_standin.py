@@ -0,0 +1,375 @@
+"""
+本地小说站点替身服务器
+
+按 chapter_parser / NovelCrawler / saveBooks 期望的页面结构提供目录页、分页章节列表和章节正文，
+可配置响应延迟、错误注入和限流，用于离线测试和压测爬虫。
+
+页面地址:
+    /book/<book_id>/               目录首页（分页下拉框 + 第一页章节列表）
+    /book/<book_id>/list_<n>.html  第 n 页章节列表
+    /book/<book_id>/<n>.html       第 n 章正文
+    /__stats                       服务器统计（JSON）
+    /__reset                       清空统计
+
+指定 --record-dir 时优先返回录制的页面，文件路径与URL路径对应，
+例如 /book/1/3.html 对应 <record-dir>/book/1/3.html，目录页对应 <record-dir>/book/1/index.html。
+
+用法:
+    python test/site_standin.py --port 8765 --chapters 300 --latency 50 --error-rate 0.02 --rate-limit 40
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 正文生成用的语料
+SAMPLE_SENTENCES = [
+    "夜色渐深，山门前的石阶上落满了枯叶。",
+    "“师兄，你真的要下山吗？”少女拉住他的衣袖，声音有些发颤。",
+    "他没有回头，只是轻轻点了点头。",
+    "远处传来几声钟鸣，惊起了林中栖息的飞鸟。",
+    "“此去凶险，你多保重。”老者叹了口气，将一枚玉佩塞到他手里。",
+    "风从谷底吹上来，带着潮湿的泥土气息。",
+    "“放心吧，我一定会回来的。”",
+    "城门口的守卫打着哈欠，懒洋洋地看着来往的行人。",
+]
+
+
+class StandinConfig:
+    """替身服务器配置"""
+
+    def __init__(
+        self,
+        book_id="1",
+        chapters=200,
+        page_size=50,
+        paragraphs=30,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=0.0,
+        burst=10,
+        record_dir=None,
+        seed=None,
+    ):
+        self.book_id = str(book_id)
+        self.chapters = chapters
+        self.page_size = page_size
+        self.paragraphs = paragraphs
+        # 延迟和抖动，单位秒
+        self.latency = latency
+        self.jitter = jitter
+        # 返回500的概率
+        self.error_rate = error_rate
+        # 每秒允许的请求数，0表示不限流；超出后返回429
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.record_dir = record_dir
+        self.random = random.Random(seed)
+
+    @property
+    def pages(self):
+        """章节列表分页数"""
+        return max(1, (self.chapters + self.page_size - 1) // self.page_size)
+
+
+class StandinState:
+    """限流令牌桶和统计数据"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.tokens = float(config.burst)
+        self.last_refill = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {
+                "requests": 0,
+                "served": 0,
+                "errors_injected": 0,
+                "throttled": 0,
+                "not_found": 0,
+            }
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def take_token(self):
+        """从令牌桶取一个令牌，取不到说明超出限流"""
+        if not self.config.rate_limit:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                float(self.config.burst),
+                self.tokens + (now - self.last_refill) * self.config.rate_limit,
+            )
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def should_fail(self):
+        with self.lock:
+            return self.config.random.random() < self.config.error_rate
+
+    def delay(self):
+        with self.lock:
+            jitter = self.config.random.uniform(-self.config.jitter, self.config.jitter)
+        return max(0.0, self.config.latency + jitter)
+
+
+def render_toc(config, page):
+    """渲染目录页（分页下拉框 + 当前页章节列表）"""
+    base = f"/book/{config.book_id}/"
+    options = []
+    for i in range(1, config.pages + 1):
+        start = (i - 1) * config.page_size + 1
+        end = min(i * config.page_size, config.chapters)
+        value = f"{base}list_{i}.html"
+        selected = " selected" if i == page else ""
+        options.append(f'<option value="{value}"{selected}>第{start}-{end}章</option>')
+
+    start = (page - 1) * config.page_size + 1
+    end = min(page * config.page_size, config.chapters)
+    items = [
+        f'<li><a href="{base}{n}.html">第{n}章 测试章节{n}</a></li>'
+        for n in range(start, end + 1)
+    ]
+
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>测试小说{config.book_id}</title></head>
+<body>
+<h1>测试小说{config.book_id}</h1>
+<div class="info"><span>作者：</span>替身作者</div>
+<div class="intro">本地替身站点生成的测试小说。</div>
+<select onchange="location.href=this.value">{"".join(options)}</select>
+<ul class="read">{"".join(items)}</ul>
+</body></html>"""
+
+
+def render_chapter(config, number):
+    """渲染章节正文，内容按章节号确定，便于校验"""
+    rng = random.Random(number)
+    paragraphs = [
+        f"<p>{escape(rng.choice(SAMPLE_SENTENCES))}</p>"
+        for _ in range(config.paragraphs)
+    ]
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>第{number}章 测试章节{number}</title></head>
+<body>
+<h1>第{number}章 测试章节{number}</h1>
+<div class="content">{"".join(paragraphs)}</div>
+</body></html>"""
+
+
+def make_handler(config, state):
+    """创建请求处理类"""
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # 压测时不输出访问日志
+            pass
+
+        def send_body(self, status, body, content_type="text/html; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+
+            if path == "/__stats":
+                self.send_body(
+                    200, json.dumps(state.snapshot()), "application/json; charset=utf-8"
+                )
+                return
+            if path == "/__reset":
+                state.reset()
+                self.send_body(200, "{}", "application/json; charset=utf-8")
+                return
+
+            state.count("requests")
+
+            if not state.take_token():
+                state.count("throttled")
+                self.send_body(429, "Too Many Requests")
+                return
+
+            delay = state.delay()
+            if delay:
+                time.sleep(delay)
+
+            if state.should_fail():
+                state.count("errors_injected")
+                self.send_body(500, "Internal Server Error")
+                return
+
+            body = self.resolve(path)
+            if body is None:
+                state.count("not_found")
+                self.send_body(404, "Not Found")
+                return
+
+            state.count("served")
+            self.send_body(200, body)
+
+        def resolve(self, path):
+            """根据路径返回页面内容，优先使用录制的页面"""
+            recorded = self.recorded(path)
+            if recorded is not None:
+                return recorded
+
+            prefix = f"/book/{config.book_id}/"
+            if not path.startswith(prefix):
+                return None
+
+            name = path[len(prefix) :]
+            if name in ("", "index.html"):
+                return render_toc(config, 1)
+
+            stem = name[:-5] if name.endswith(".html") else None
+            if not stem:
+                return None
+
+            if stem.startswith("list_") and stem[5:].isdigit():
+                page = int(stem[5:])
+                if 1 <= page <= config.pages:
+                    return render_toc(config, page)
+                return None
+
+            if stem.isdigit() and 1 <= int(stem) <= config.chapters:
+                return render_chapter(config, int(stem))
+
+            return None
+
+        def recorded(self, path):
+            """读取录制的页面"""
+            if not config.record_dir:
+                return None
+
+            relative = path.lstrip("/")
+            if not relative or relative.endswith("/"):
+                relative += "index.html"
+
+            root = os.path.abspath(config.record_dir)
+            file_path = os.path.abspath(os.path.join(root, relative))
+            # 防止路径穿越到录制目录之外
+            if not file_path.startswith(root + os.sep) or not os.path.isfile(file_path):
+                return None
+
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
+
+    return StandinHandler
+
+
+class StandinServer:
+    """在后台线程运行的替身服务器"""
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        self.config = config
+        self.state = StandinState(config)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(config, self.state))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def toc_url(self):
+        return f"{self.base_url}/book/{self.config.book_id}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_config_arguments(parser):
+    """添加服务器配置参数（压测脚本复用）"""
+    parser.add_argument("--book-id", default="1", help="书籍ID")
+    parser.add_argument("--chapters", type=int, default=200, help="章节数")
+    parser.add_argument("--page-size", type=int, default=50, help="每页章节数")
+    parser.add_argument("--paragraphs", type=int, default=30, help="每章段落数")
+    parser.add_argument("--latency", type=float, default=0, help="响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回500的概率")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="每秒允许的请求数，0为不限流"
+    )
+    parser.add_argument("--burst", type=int, default=10, help="限流令牌桶容量")
+    parser.add_argument("--record-dir", default=None, help="录制页面目录")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+
+
+def config_from_args(args):
+    """根据命令行参数创建配置"""
+    return StandinConfig(
+        book_id=args.book_id,
+        chapters=args.chapters,
+        page_size=args.page_size,
+        paragraphs=args.paragraphs,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        record_dir=args.record_dir,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地小说站点替身服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandinServer(config_from_args(args), args.host, args.port)
+    print(f"替身站点已启动: {server.toc_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from audio_postprocess import (
+    FULL_SCALE,
+    postprocess_settings,
+    process_segment,
+    window_energy,
+)
+
+SAMPLE_RATE = 24000
+
+
+def tone(seconds, amplitude, channels=1):
+    """正弦波，amplitude 为相对满刻度的幅度"""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    wave = amplitude * FULL_SCALE * np.sin(2 * np.pi * 440 * t)
+    return np.repeat(wave.astype(np.int16)[:, None], channels, axis=1)
+
+
+def quiet(seconds, channels=1):
+    return np.zeros((int(SAMPLE_RATE * seconds), channels), np.int16)
+
+
+def dbfs(samples):
+    data = samples.astype(np.float64) / FULL_SCALE
+    return 10 * np.log10((data * data).mean())
+
+
+def test_window_energy_keeps_tail_window():
+    samples = np.ones((25, 2), np.float32)
+    assert np.allclose(window_energy(samples, 10), [1.0, 1.0, 1.0])
+    assert window_energy(samples[:0], 10).size == 0
+
+
+def test_trims_silence_and_keeps_margin():
+    settings = postprocess_settings()
+    samples = np.concatenate([quiet(0.5), tone(1.0, 0.1), quiet(0.5)])
+    processed = process_segment(samples, SAMPLE_RATE, settings)
+
+    margin = 2 * settings["keep_silence_ms"] / 1000 + 2 * settings["window_ms"] / 1000
+    assert 1.0 <= len(processed) / SAMPLE_RATE <= 1.0 + margin
+    assert processed.dtype == np.int16
+    assert processed.shape[1] == 1
+
+
+def test_normalizes_loudness_of_quiet_and_loud_segments():
+    settings = postprocess_settings({"keep_silence_ms": 0})
+    for amplitude in (0.02, 0.5):
+        processed = process_segment(
+            tone(1.0, amplitude, channels=2), SAMPLE_RATE, settings
+        )
+        assert abs(dbfs(processed) - settings["target_dbfs"]) < 0.5
+
+
+def test_gain_is_limited_by_peak():
+    settings = postprocess_settings({"target_dbfs": -1.0, "keep_silence_ms": 0})
+    processed = process_segment(tone(1.0, 0.1), SAMPLE_RATE, settings)
+    peak = np.abs(processed.astype(np.float64)).max() / FULL_SCALE
+    assert peak <= settings["peak_limit"] + 1e-3
+
+
+def test_silent_segment_is_dropped():
+    processed = process_segment(quiet(1.0, 2), SAMPLE_RATE, postprocess_settings())
+    assert processed.shape == (0, 2)
@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from audio_validation import (
+    SILENT_GRANULE_BITS,
+    expected_duration,
+    scan_frames,
+    validate_segment,
+)
+from chapter_assembler import parse_frame_header
+
+# 帧头：MPEG-1 立体声 / 单声道（128kbps，44100Hz），MPEG-2 立体声 / 单声道（80kbps，22050Hz）
+MPEG1_STEREO = b"\xff\xfb\x90\x64"
+MPEG1_MONO = b"\xff\xfb\x90\xc4"
+MPEG2_STEREO = b"\xff\xf3\x90\x64"
+MPEG2_MONO = b"\xff\xf3\x90\xc4"
+# 保护位为0，帧头之后有2字节CRC
+MPEG1_CRC = b"\xff\xfa\x90\x64"
+
+# 第一个颗粒的 part2_3_length 在边信息中的比特偏移
+SIDE_INFO_SHIFT = {
+    MPEG1_STEREO: 20,
+    MPEG1_MONO: 18,
+    MPEG2_STEREO: 10,
+    MPEG2_MONO: 9,
+    MPEG1_CRC: 20,
+}
+
+
+def frame(header, voiced=True):
+    """
+    生成一帧，边信息中第一个颗粒的 part2_3_length 按是否有声取静音阈值两侧的值，
+    边信息偏移算错1比特时 part2_3_length 加倍或减半，有声和静音的判断随之颠倒
+    """
+    shift = SIDE_INFO_SHIFT[header]
+    part2_3_length = SILENT_GRANULE_BITS + (8 if voiced else 0)
+    big_values = 200
+    side_info = (part2_3_length << (64 - shift - 12)) | (
+        big_values << (64 - shift - 21)
+    )
+    crc = b"" if header[1] & 0x01 else b"\x00\x00"
+    data = header + crc + side_info.to_bytes(8, "big")
+    length = parse_frame_header(header)["length"]
+    return data + b"\x00" * (length - len(data))
+
+
+def frames(header, count, voiced=True):
+    return b"".join(frame(header, voiced) for _ in range(count))
+
+
+@pytest.mark.parametrize("header", list(SIDE_INFO_SHIFT))
+def test_voiced_and_silent_frames_are_told_apart(header):
+    info = parse_frame_header(header)
+    result = scan_frames(frames(header, 10))
+    assert result["frames"] == 10
+    assert not result["truncated"]
+    assert result["voiced_ratio"] == 1.0
+    assert result["duration"] == pytest.approx(
+        10 * info["samples"] / info["sample_rate"]
+    )
+
+    assert scan_frames(frames(header, 10, voiced=False))["voiced_ratio"] == 0.0
+    mixed = frames(header, 3) + frames(header, 1, voiced=False)
+    assert scan_frames(mixed)["voiced_ratio"] == 0.75
+
+
+def test_valid_segment_passes():
+    data = frames(MPEG1_STEREO, 100)  # 约2.6秒
+    assert validate_segment(data) == (True, "")
+    assert validate_segment(data, "林风看着远处的山，说道我们走吧") == (True, "")
+
+
+def test_truncated_segment_is_rejected():
+    data = frames(MPEG1_STEREO, 20)
+    result = scan_frames(data[:-100])
+    assert result["truncated"]
+    assert result["frames"] == 19
+
+    ok, reason = validate_segment(data[:-100])
+    assert not ok and "截断" in reason
+
+    # 帧序列中途断开
+    broken = frames(MPEG1_STEREO, 5) + b"\x00" * 50 + frames(MPEG1_STEREO, 5)
+    assert scan_frames(broken)["truncated"]
+
+
+def test_silent_segment_is_rejected():
+    ok, reason = validate_segment(frames(MPEG1_STEREO, 100, voiced=False))
+    assert not ok and "静音" in reason
+
+
+def test_duration_is_checked_against_text():
+    data = frames(MPEG1_STEREO, 100)
+    ok, reason = validate_segment(data, "很长的一段文字" * 20)
+    assert not ok and "过短" in reason
+    ok, reason = validate_segment(frames(MPEG1_STEREO, 1000), "好。")
+    assert not ok and "过长" in reason
+
+
+def test_expected_duration_ignores_punctuation():
+    assert expected_duration("你好，世界！") == expected_duration("你好世界")
+    assert expected_duration("你好世界", speed=2) == expected_duration("你好")
+
+
+def test_empty_or_garbage_data():
+    assert validate_segment(b"") == (False, "音频为空")
+    ok, reason = validate_segment(b"\x00" * 1000)
+    assert not ok and "没有有效" in reason
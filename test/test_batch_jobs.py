@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "gui"))
+
+from batch_jobs import BatchJob, run_batch
+
+ITEMS = [{"key": track_id, "title": f"第{track_id}章"} for track_id in range(1, 7)]
+
+
+def keys(items):
+    return [item["key"] for item in items]
+
+
+def test_progress_survives_reopen(tmp_path):
+    path = str(tmp_path / "delete.jsonl")
+    job = BatchJob.create(path, "delete", ITEMS, {"album_id": "42"})
+    job.record("1", True)
+    job.record("2", False, "网络错误")
+    job.record("3", True)
+    job.record("2", True)
+
+    job = BatchJob.existing(path)
+    assert job.kind == "delete"
+    assert job.params == {"album_id": "42"}
+    assert keys(job.succeeded()) == ["1", "2", "3"]
+    assert keys(job.failed()) == []
+    assert keys(job.pending()) == ["4", "5", "6"]
+
+
+def test_existing_requires_header(tmp_path):
+    path = str(tmp_path / "delete.jsonl")
+    assert BatchJob.existing(path) is None
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"kind": "delete", "ite')
+    assert BatchJob.existing(path) is None
+
+
+def test_torn_tail_does_not_swallow_next_record(tmp_path):
+    path = str(tmp_path / "delete.jsonl")
+    BatchJob.create(path, "delete", ITEMS).record("1", True)
+    with open(path, "ab") as f:
+        f.write('{"key": "2", "ok": true, "message": "删除'.encode("utf-8")[:-2])
+
+    job = BatchJob(path)
+    assert keys(job.succeeded()) == ["1"]
+    job.record("3", True)
+    assert keys(BatchJob(path).succeeded()) == ["1", "3"]
+
+
+def test_run_batch_resumes_after_cancel(tmp_path):
+    path = str(tmp_path / "delete.jsonl")
+    job = BatchJob.create(path, "delete", ITEMS)
+    calls = []
+    lock = threading.Lock()
+
+    def operation(item):
+        with lock:
+            calls.append(item["key"])
+        if item["key"] == "4":
+            raise RuntimeError("删除失败")
+        return True, "成功"
+
+    # 第一次执行在处理两项后取消
+    progressed = []
+    succeeded, failed, remaining = run_batch(
+        job,
+        operation,
+        workers=1,
+        progress=lambda item, ok, message: progressed.append(item["key"]),
+        cancelled=lambda: len(progressed) >= 2,
+    )
+    assert failed == 0
+    assert succeeded + remaining == len(ITEMS)
+    first_run = set(calls)
+
+    job = BatchJob.existing(path)
+    succeeded, failed, remaining = run_batch(job, operation, workers=3)
+    assert (failed, remaining) == (1, 0)
+    assert not first_run & set(calls[len(first_run) :])
+
+    job = BatchJob.existing(path)
+    assert keys(job.pending()) == ["4"]
+    assert job.results["4"]["message"] == "删除失败"
@@ -0,0 +1,150 @@
+import os
+import sys
+import random
+import sqlite3
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from book_store import BookStore, chapter_id, dialogues_artifact, file_artifact
+
+CHAPTERS = [
+    {"chapter_title": f"第{n}章", "chapter_url": f"http://x/{n}"} for n in range(1, 4)
+]
+
+
+def line(speaker, sex="男", text="……"):
+    return {"type": speaker, "sex": sex, "text": text}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BookStore("b1", str(tmp_path))
+    store.sync_chapters(CHAPTERS)
+    yield store
+    store.close()
+
+
+def counts(store):
+    return {item["name"]: item["lines_count"] for item in store.character_stats()}
+
+
+def test_replacing_dialogues_subtracts_old_contribution(store):
+    store.put_dialogues(CHAPTERS[0], [line("林风"), line("苏晴", "女"), line("林风")])
+    store.put_dialogues(CHAPTERS[1], [line("林风")])
+    assert counts(store) == {"林风": 3, "苏晴": 1}
+
+    store.put_dialogues(CHAPTERS[0], [line("苏晴", "女"), line("旁白", "中")])
+    assert counts(store) == {"林风": 1, "苏晴": 1, "旁白": 1}
+
+    # 台词数减到0的角色从统计中删除
+    store.put_dialogues(CHAPTERS[1], [])
+    assert counts(store) == {"苏晴": 1, "旁白": 1}
+    assert sorted(store.speaker_names()) == ["旁白", "苏晴"]
+
+
+def test_reordering_chapters_updates_first_and_last_gender(store):
+    store.put_dialogues(CHAPTERS[0], [line("阿青", "女")])
+    store.put_dialogues(CHAPTERS[2], [line("阿青", "男")])
+    assert store.character_stats("first")[0]["gender"] == "女"
+    assert store.character_stats("last")[0]["gender"] == "男"
+
+    store.sync_chapters([CHAPTERS[2], CHAPTERS[1], CHAPTERS[0]])
+    assert store.character_stats("first")[0]["gender"] == "男"
+    assert store.character_stats("last")[0]["gender"] == "女"
+    assert [c["chapter_title"] for c in store.list_chapters()] == [
+        "第3章",
+        "第2章",
+        "第1章",
+    ]
+
+
+def test_speaker_segments(store):
+    store.put_dialogues(
+        CHAPTERS[0],
+        [line("旁白", "中"), line("林风"), line("苏晴", "女"), line("林风")],
+    )
+    store.put_dialogues(CHAPTERS[2], [line("林风"), line("旁白", "中")])
+
+    assert store.speaker_segments(["林风"]) == {
+        chapter_id(CHAPTERS[0]): [1, 3],
+        chapter_id(CHAPTERS[2]): [0],
+    }
+    assert store.speaker_segments(["苏晴", "旁白", "苏晴"]) == {
+        chapter_id(CHAPTERS[0]): [0, 2],
+        chapter_id(CHAPTERS[2]): [1],
+    }
+    assert store.speaker_segments(["无名"]) == {}
+
+    # 替换章节后倒排索引随之更新
+    store.put_dialogues(CHAPTERS[0], [line("苏晴", "女")])
+    assert store.speaker_segments(["林风"]) == {chapter_id(CHAPTERS[2]): [0]}
+
+
+def test_parallel_rebuild_matches_incremental_stats(tmp_path):
+    chapters = [
+        {"chapter_title": f"第{n}章", "chapter_url": f"http://y/{n}"} for n in range(40)
+    ]
+    rng = random.Random(7)
+    store = BookStore("b2", str(tmp_path))
+    store.sync_chapters(chapters)
+    speakers = ["旁白", "林风", "苏晴", "阿青", ""]
+    for chapter in rng.sample(chapters, len(chapters)):
+        store.put_dialogues(
+            chapter,
+            [
+                line(rng.choice(speakers), rng.choice("男女中"))
+                for _ in range(rng.randint(0, 30))
+            ],
+        )
+    # 替换一部分章节，增量统计需要扣除旧的贡献
+    for chapter in chapters[::5]:
+        store.put_dialogues(chapter, [line("林风", "女")])
+
+    def snapshot():
+        # 台词数相同的角色之间的顺序取决于插入顺序，按角色名比较
+        return (
+            sorted(store.character_stats("first"), key=lambda x: x["name"]),
+            sorted(store.character_stats("last"), key=lambda x: x["name"]),
+            store.speaker_segments(speakers),
+        )
+
+    incremental = snapshot()
+    result = store.rebuild_character_stats(workers=2, shards_per_worker=3)
+    assert result["chapters"] == len(chapters)
+    assert snapshot() == incremental
+    store.close()
+
+
+def test_old_store_is_backfilled(tmp_path):
+    store = BookStore("b3", str(tmp_path))
+    store.put_dialogues(CHAPTERS[0], [line("林风"), line("林风")])
+    store.close()
+
+    conn = sqlite3.connect(store.path)
+    conn.executescript("DELETE FROM characters; PRAGMA user_version = 0;")
+    conn.close()
+
+    store = BookStore("b3", str(tmp_path))
+    assert counts(store) == {"林风": 2}
+    store.close()
+
+
+def test_artifact_records(store):
+    audio = file_artifact("audio/b1/audio/第1章.mp3")
+    temp = file_artifact("audio/b1/audio_temp/0/1.mp3")
+    store.record_artifacts([(audio, "h1"), (temp, "h2")])
+    store.record_artifacts([(audio, "h3")])
+    assert store.artifact_hashes(file_artifact("audio/b1/audio/")) == {audio: "h3"}
+    assert store.artifact_hashes("file:") == {audio: "h3", temp: "h2"}
+
+    store.forget_artifacts([audio])
+    assert store.artifact_hashes(file_artifact("audio/b1/audio/")) == {}
+
+    # 对话结果和输入哈希在同一事务中记录
+    store.put_dialogues(CHAPTERS[0], [line("林风")], inputs="d1")
+    assert store.artifact_hashes("dialogues:") == {
+        dialogues_artifact(CHAPTERS[0]): "d1"
+    }
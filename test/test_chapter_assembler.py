@@ -0,0 +1,77 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from chapter_assembler import ChapterAssembler, audio_frames, frames_duration
+
+# MPEG-1 Layer III，128kbps，44100Hz，每帧417字节
+FRAME_HEADER = b"\xff\xfb\x90\x64"
+FRAME_SECONDS = 1152 / 44100
+
+
+def mp3_segment(marker, frames=3, tagged=True):
+    """生成由静音帧组成的片段，帧数据用 marker 填充以便检查拼接顺序"""
+    data = b"".join(FRAME_HEADER + bytes([marker]) * 413 for _ in range(frames))
+    if tagged:
+        data = b"ID3\x03\x00\x00\x00\x00\x00\x05" + b"\x00" * 5 + data
+    return data
+
+
+def test_audio_frames_strips_tags():
+    frames = audio_frames(mp3_segment(1))
+    assert bytes(frames) == mp3_segment(1, tagged=False)
+    assert abs(frames_duration(frames) - 3 * FRAME_SECONDS) < 1e-9
+
+
+def test_segments_added_out_of_order_are_written_in_order(tmp_path):
+    output_path = str(tmp_path / "chapter.mp3")
+    assembler = ChapterAssembler(output_path, 4)
+    segments = {index: mp3_segment(index + 1) for index in range(4)}
+
+    assembler.add(2, lambda: segments[2])
+    assembler.add(1, None)
+    assert assembler.buffered == 2
+    assert assembler.written == 0
+    assembler.add(0, lambda: segments[0])
+    assert assembler.buffered == 0
+    assert assembler.written == 2
+    assembler.add(3, lambda: segments[3])
+
+    assert assembler.finish() == output_path
+    assert not os.path.exists(f"{output_path}.part")
+    with open(output_path, "rb") as f:
+        data = f.read()
+    expected = b"".join(mp3_segment(i, tagged=False) for i in (1, 3, 4))
+    assert data == expected
+
+
+def test_incomplete_chapter_leaves_no_file(tmp_path):
+    output_path = str(tmp_path / "chapter.mp3")
+    assembler = ChapterAssembler(output_path, 3)
+    assembler.add(0, lambda: mp3_segment(1))
+    assembler.add(2, lambda: mp3_segment(3))
+
+    assert assembler.finish() is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_abort_removes_partial_output(tmp_path):
+    output_path = str(tmp_path / "chapter.mp3")
+    assembler = ChapterAssembler(output_path, 2)
+    assembler.add(0, lambda: mp3_segment(1))
+    assert os.path.exists(f"{output_path}.part")
+
+    assembler.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_invalid_segment_is_skipped(tmp_path):
+    output_path = str(tmp_path / "chapter.mp3")
+    assembler = ChapterAssembler(output_path, 2)
+    assembler.add(0, lambda: b"not audio")
+    assembler.add(1, lambda: mp3_segment(2))
+
+    assert assembler.finish() == output_path
+    assert assembler.written == 1
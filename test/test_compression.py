@@ -0,0 +1,35 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "book-gui"))
+
+import compression
+
+
+def test_paragraphs_round_trip_with_newlines():
+    for paragraphs in ([], [""], ["第一段"], ["第一段\n含换行", "", "[系统提示]"]):
+        data = compression.encode_paragraphs(paragraphs)
+        assert compression.decode_paragraphs(data) == paragraphs
+
+
+def test_legacy_newline_joined_paragraphs_are_readable():
+    assert compression.decode_paragraphs("甲\n乙".encode("utf-8")) == ["甲", "乙"]
+    assert compression.decode_paragraphs(b"") == []
+
+
+def test_dictionary_compression_round_trip():
+    chapters = [
+        f"第{n}章\n林风看着苏晴，说道：“我们明天出发去青云山。”" * 20 for n in range(10)
+    ]
+    zdict = compression.train_dictionary(chapters)
+    assert zdict and len(zdict) <= compression.DICTIONARY_SIZE
+
+    raw = chapters[3].encode("utf-8")
+    data = compression.compress(raw, zdict)
+    assert compression.decompress(data, zdict) == raw
+    assert len(data) <= len(compression.compress(raw))
+
+
+def test_dictionary_needs_repeated_fragments():
+    assert compression.train_dictionary(["短"]) is None
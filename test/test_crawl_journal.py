@@ -0,0 +1,74 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from file_utils import CrawlJournal, read_jsonl
+
+TEXT = "第一章\n夜色渐深。"
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+
+def test_record_and_reload(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    chapter = str(tmp_path / "0001.txt")
+    write(chapter, TEXT)
+
+    CrawlJournal(journal_path).record("u1", chapter, TEXT)
+    for mode in (CrawlJournal.TRUST, CrawlJournal.VERIFY):
+        assert CrawlJournal(journal_path, mode).is_complete("u1", chapter)
+
+    # 长度不变、内容被改动的文件只在 verify 模式下被发现
+    write(chapter, TEXT.replace("夜", "昼"))
+    assert CrawlJournal(journal_path).is_complete("u1", chapter)
+    assert not CrawlJournal(journal_path, CrawlJournal.VERIFY).is_complete(
+        "u1", chapter
+    )
+
+
+def test_is_complete_does_not_import_legacy_files(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    chapter = str(tmp_path / "0001.txt")
+    write(chapter, TEXT)
+
+    journal = CrawlJournal(journal_path)
+    assert not journal.is_complete("u1", chapter)
+    assert not os.path.exists(journal_path)
+
+    assert journal.import_legacy("u1", chapter)
+    assert not journal.import_legacy("u1", chapter)
+    assert CrawlJournal(journal_path).is_complete("u1", chapter)
+
+
+def test_verify_mode_rejects_truncated_legacy_file(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    chapter = str(tmp_path / "0001.txt")
+    write(chapter, TEXT.encode("utf-8")[:-1])
+
+    assert not CrawlJournal(journal_path, CrawlJournal.VERIFY).import_legacy(
+        "u1", chapter
+    )
+    assert CrawlJournal(journal_path).import_legacy("u1", chapter)
+
+
+def test_torn_tail_is_truncated_before_appending(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    chapter = str(tmp_path / "0001.txt")
+    write(chapter, TEXT)
+    CrawlJournal(journal_path).record("u1", chapter, TEXT)
+
+    # 写入中断，半行记录截断在多字节字符中间
+    with open(journal_path, "ab") as f:
+        f.write('{"url": "u2", "path": "章'.encode("utf-8")[:-1])
+
+    journal = CrawlJournal(journal_path)
+    assert list(journal.entries) == ["u1"]
+    journal.record("u3", chapter, TEXT)
+
+    assert [entry["url"] for entry in read_jsonl(journal_path)] == ["u1", "u3"]
+    assert list(CrawlJournal(journal_path).entries) == ["u1", "u3"]
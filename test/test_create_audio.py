@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+import book_store
+import createAudio
+from book_store import file_artifact, get_book_store
+
+from test_chapter_assembler import mp3_segment
+
+CHAPTER = {"chapter_title": "第1章 开端", "chapter_url": "http://x/1"}
+DIALOGUES = [
+    {"type": "旁白", "sex": "中", "text": "夜色渐深。"},
+    {"type": "林风", "sex": "男", "text": "出发。"},
+    {"type": "苏晴", "sex": "女", "text": "等等。"},
+]
+VOICES = {"旁白": "narrator", "林风": "male", "苏晴": "female"}
+
+
+@pytest.fixture
+def synth(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(book_store, "_stores", {})
+    get_book_store("b1").put_dialogues(CHAPTER, DIALOGUES)
+
+    calls = []
+    failing = set()
+
+    def create_audio_from_api(text, module, max_retries=3, settings=None):
+        calls.append(text)
+        return None if text in failing else mp3_segment(len(calls) % 250 + 1)
+
+    monkeypatch.setattr(createAudio, "create_audio_from_api", create_audio_from_api)
+    monkeypatch.setattr(
+        createAudio, "validate_audio_content", lambda *args, **kwargs: (True, "")
+    )
+    return calls, failing
+
+
+def build(voices=VOICES):
+    return createAudio.process_chapter(CHAPTER, voices, "b1", 0, max_workers=2)
+
+
+def test_incomplete_chapter_is_kept_out_of_audio_dir(synth):
+    calls, failing = synth
+    failing.add("出发。")
+
+    path = build()
+    assert path == "audio/b1/audio_incomplete/第1章 开端.mp3"
+    assert os.path.exists(path)
+    assert not os.path.exists("audio/b1/audio/第1章 开端.mp3")
+    assert calls.count("出发。") == createAudio.MAX_SEGMENT_ATTEMPTS
+
+    # 补齐缺失的片段后移入 audio 目录，只重新合成缺失的片段
+    failing.clear()
+    calls.clear()
+    path = build()
+    assert path == "audio/b1/audio/第1章 开端.mp3"
+    assert calls == ["出发。"]
+    assert os.listdir("audio/b1/audio_incomplete") == []
+
+    # 构建记录与输入一致时不再处理
+    calls.clear()
+    assert build() == path
+    assert calls == []
+
+
+def test_incomplete_build_counts_as_build_record(synth):
+    _, failing = synth
+    failing.add("等等。")
+    store = get_book_store("b1")
+    assert not createAudio.has_build_records(store, "b1")
+
+    build()
+    # 片段包和不完整章节的构建记录都说明书籍由记录构建输入的版本合成
+    os.remove("audio/b1/audio_temp/0.idx")
+    assert createAudio.has_build_records(store, "b1")
+
+
+def test_changed_voice_rebuilds_only_affected_segments(synth):
+    calls, _ = synth
+    path = build()
+    assert len(calls) == 3
+
+    calls.clear()
+    assert build(dict(VOICES, 林风="other")) == path
+    assert calls == ["出发。"]
+    built = get_book_store("b1").artifact_hashes(file_artifact(path))
+    assert built[file_artifact(path)] != createAudio.INCOMPLETE_BUILD
+
+
+def test_unrecorded_chapter_audio(synth):
+    calls, _ = synth
+    path = "audio/b1/audio/第1章 开端.mp3"
+    os.makedirs("audio/b1/audio")
+    with open(path, "wb") as f:
+        f.write(mp3_segment(1))
+
+    # 书籍没有任何构建记录时，旧版本生成的章节音频视为最新并补录
+    assert build() == path
+    assert calls == []
+    store = get_book_store("b1")
+    assert file_artifact(path) in store.artifact_hashes(file_artifact(path))
+
+    # 书籍已有构建记录时，没有记录的章节音频来源不明，重新生成
+    store.forget_artifacts([file_artifact(path)])
+    store.record_artifacts([(file_artifact("audio/b1/audio/第2章.mp3"), "h")])
+    assert build() == path
+    assert len(calls) == 3
+
+
+def test_plain_mp3_builds_stream_without_finalizer(synth, monkeypatch):
+    def no_finalizer(*args, **kwargs):
+        raise AssertionError("不需要收尾进程池")
+
+    monkeypatch.setattr(createAudio, "ChapterFinalizer", no_finalizer)
+    os.makedirs("audio/b1", exist_ok=True)
+    for name, data in (("xszj.json", [CHAPTER]), ("user.json", VOICES)):
+        with open(f"audio/b1/{name}", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    createAudio.create_audio("b1", max_workers=2, profile="default")
+    assert os.path.exists("audio/b1/audio/第1章 开端.mp3")
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from encoding_profiles import (
+    DEFAULT_PROFILE,
+    ENCODING_PROFILES,
+    encoder_args,
+    is_mp3,
+    load_profile,
+    output_extension,
+    output_extensions,
+)
+
+
+def test_default_profile_outputs_concatenated_mp3():
+    for profile in (None, {}, {"profile": None}):
+        assert load_profile(profile) == {
+            "name": DEFAULT_PROFILE,
+            "synth": {},
+            "export": None,
+        }
+    assert output_extension(None) == "mp3"
+    assert is_mp3(None)
+
+
+def test_named_profiles():
+    profile = load_profile("speech_opus")
+    assert profile["synth"] == {"sample_rate": 32000}
+    assert output_extension(profile["export"]) == "opus"
+    assert not is_mp3(profile["export"])
+    assert output_extension(load_profile("speech_aac")["export"]) == "m4a"
+    assert output_extensions() == ["m4a", "mp3", "opus"]
+
+
+def test_overrides_do_not_change_base_profile():
+    profile = load_profile(
+        {
+            "profile": "speech_mp3",
+            "synth": {"speed": 1.2},
+            "export": {"bitrate": "40k"},
+        }
+    )
+    assert profile["synth"] == {"sample_rate": 32000, "speed": 1.2}
+    assert profile["export"]["bitrate"] == "40k"
+    assert profile["export"]["codec"] == "libmp3lame"
+    assert ENCODING_PROFILES["speech_mp3"]["export"]["bitrate"] == "48k"
+    assert ENCODING_PROFILES["speech_mp3"]["synth"] == {"sample_rate": 32000}
+
+    # 默认配置也可以通过 export 覆盖为重新编码
+    profile = load_profile({"export": {"format": "mp3", "codec": "libmp3lame"}})
+    assert profile["name"] == DEFAULT_PROFILE
+    assert output_extension(profile["export"]) == "mp3"
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="未知的编码配置"):
+        load_profile("lossless")
+    with pytest.raises(ValueError):
+        load_profile({"profile": "lossless"})
+
+
+def test_encoder_args():
+    export = load_profile("speech_opus")["export"]
+    assert encoder_args(export) == [
+        "-vn",
+        "-c:a",
+        "libopus",
+        "-ar",
+        "24000",
+        "-ac",
+        "1",
+        "-b:a",
+        "24k",
+        "-application",
+        "voip",
+        "-f",
+        "opus",
+    ]
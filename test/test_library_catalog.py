@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import shutil
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+
+import book_store
+import book_manager
+from book_manager import BookManager, LIBRARY_CATALOG_FILE
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def add_book(book_id, name, chapters):
+    write_json(
+        os.path.join("data", book_id, "info.json"),
+        {"id": book_id, "name": name, "chapters_count": chapters},
+    )
+    write_json(
+        os.path.join("data", book_id, "chapters.json"),
+        [
+            {"chapter_title": f"第{n}章", "chapter_url": f"http://x/{book_id}/{n}"}
+            for n in range(1, chapters + 1)
+        ],
+    )
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 模块级缓存按相对路径保存，每个测试使用独立的工作目录
+    monkeypatch.setattr(book_store, "_stores", {})
+    monkeypatch.setattr(book_manager, "_library_catalog", None)
+    monkeypatch.setattr(book_manager, "_chapter_status_cache", {})
+    monkeypatch.setattr(book_manager, "_legacy_checked", set())
+
+    summarized = []
+    summarize = BookManager._summarize_book
+
+    def counting(self, book_id):
+        summarized.append(book_id)
+        return summarize(self, book_id)
+
+    monkeypatch.setattr(BookManager, "_summarize_book", counting)
+    add_book("b1", "第一本", 3)
+    add_book("b2", "第二本", 2)
+    os.makedirs(os.path.join("audio", "b1", "audio"))
+    for name in ("第1章.opus", "第2章.mp3", "第2章.mp3.part"):
+        open(os.path.join("audio", "b1", "audio", name), "wb").close()
+    return BookManager(), summarized
+
+
+def test_catalog_summarizes_each_book_once(manager):
+    manager, summarized = manager
+    books = {book["id"]: book for book in manager.get_books_list()}
+    assert sorted(books) == ["b1", "b2"]
+    assert books["b1"]["stats"]["chapters"] == 3
+    assert books["b1"]["stats"]["synthesized"] == 2
+    assert sorted(summarized) == ["b1", "b2"]
+    assert os.path.exists(LIBRARY_CATALOG_FILE)
+
+    summarized.clear()
+    manager.get_books_list()
+    assert summarized == []
+
+    # 新进程从索引文件加载，不重新统计
+    book_manager._library_catalog = None
+    assert len(manager.get_books_list()) == 2
+    assert summarized == []
+
+
+def test_only_changed_books_are_summarized(manager):
+    manager, summarized = manager
+    manager.get_books_list()
+    summarized.clear()
+
+    add_book("b2", "第二本", 5)
+    books = {book["id"]: book for book in manager.get_books_list()}
+    assert summarized == ["b2"]
+    assert books["b2"]["stats"]["chapters"] == 5
+
+    summarized.clear()
+    add_book("b3", "第三本", 1)
+    assert len(manager.get_books_list()) == 3
+    assert summarized == ["b3"]
+
+
+def test_removed_book_leaves_catalog(manager):
+    manager, summarized = manager
+    manager.get_books_list()
+
+    shutil.rmtree(os.path.join("data", "b2"))
+
+    assert [book["id"] for book in manager.get_books_list()] == ["b1"]
+    with open(LIBRARY_CATALOG_FILE, "r", encoding="utf-8") as f:
+        assert list(json.load(f)) == ["b1"]
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "book-gui"))
+
+import utils
+from models import BookDialogues, DialogueTable, SpeakerTable
+
+REGULAR = [
+    {"type": "旁白", "sex": "中", "text": "夜色渐深。"},
+    {"type": "林风", "sex": "男", "text": "我们明天出发。"},
+    {"type": "苏晴", "sex": "女", "text": ""},
+    {"type": "林风", "sex": "男", "text": "第一句\n第二句"},
+    {"type": "系统", "sex": "未知", "text": "[提示]"},
+]
+
+IRREGULAR = [
+    {"type": "林风", "sex": "男", "text": "正常"},
+    {"type": "苏晴", "text": "缺少性别"},
+    {"type": "苏晴", "sex": "女", "text": "额外字段", "emotion": "怒"},
+    {"type": "旁白", "sex": "中", "text": 42},
+    "不是字典",
+    None,
+    {"type": "林风", "sex": "男", "text": "之后的正文"},
+]
+
+
+def test_regular_dialogues_round_trip():
+    table = DialogueTable.from_dicts(REGULAR)
+    assert len(table) == len(REGULAR)
+    assert table.to_dicts() == REGULAR
+    assert table.irregular == {}
+    assert table.extra_sexes == ["未知"]
+    assert [entry.to_dict() for entry in table] == REGULAR
+    assert table[-1].to_dict() == REGULAR[-1]
+    with pytest.raises(IndexError):
+        table[len(REGULAR)]
+
+
+def test_irregular_dialogues_round_trip():
+    table = DialogueTable.from_dicts(IRREGULAR)
+    assert table.to_dicts() == IRREGULAR
+    assert sorted(table.irregular) == [1, 2, 3, 4, 5]
+    # 非标准条目不占用正文，前后的正文偏移不受影响
+    assert table.text(0) == "正常"
+    assert table.text(6) == "之后的正文"
+    # 能识别的角色名仍参与统计
+    assert table.speaker(2) == "苏晴"
+    assert json.loads(json.dumps(table.to_dicts())) == IRREGULAR
+
+
+def test_tables_share_speaker_ids():
+    speakers = SpeakerTable(["旁白"])
+    first = DialogueTable.from_dicts(REGULAR[:2], speakers)
+    second = DialogueTable.from_dicts(REGULAR[3:4], speakers)
+    assert first.speaker_ids[1] == second.speaker_ids[0] == speakers.intern("林风")
+    assert len(speakers) == 2
+
+
+def test_book_dialogues_round_trip_and_stats():
+    book = BookDialogues()
+    book.add_chapter("u1", REGULAR)
+    book.add_chapter("u2", [])
+    book.add_chapter("u3", IRREGULAR)
+    with pytest.raises(ValueError):
+        book.add_chapter("u1", REGULAR)
+
+    assert len(book) == 3
+    assert book.to_dict() == {"u1": REGULAR, "u2": [], "u3": IRREGULAR}
+    assert book.chapter_range("u2") == range(5, 5)
+
+    stats = book.character_stats()
+    assert stats[0] == {"name": "林风", "gender": "男", "lines_count": 4}
+    assert {item["name"]: item["lines_count"] for item in stats} == {
+        "林风": 4,
+        "苏晴": 3,
+        "旁白": 2,
+        "系统": 1,
+    }
+
+
+def test_export_writes_chapter_dialogues(tmp_path):
+    book = BookDialogues()
+    book.add_chapter("u2", IRREGULAR)
+    chapters = [
+        {"title": "第1章", "url": "u1", "volume": "卷一", "content": ["甲"]},
+        {"title": "第2章", "url": "u2", "volume": "卷一", "content": ["乙"]},
+    ]
+
+    success, _ = utils.export_book_to_json("b1", {}, chapters, str(tmp_path), book)
+    assert success
+    dialogue_dir = tmp_path / "b1" / "dialogues" / "卷一"
+    assert sorted(os.listdir(dialogue_dir)) == ["0002_第2章.json"]
+    data = json.loads((dialogue_dir / "0002_第2章.json").read_text(encoding="utf-8"))
+    assert data == IRREGULAR
+    characters = json.loads(
+        (tmp_path / "b1" / "characters.json").read_text(encoding="utf-8")
+    )
+    assert characters[0]["name"] == "林风"
@@ -0,0 +1,187 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "gui"))
+
+from file_utils import chapter_number, chinese_number
+from publisher import Publisher, UploadLedger
+from ximalaya_client import XimalayaClient
+from ximalaya_standin import StandinConfig, StandinServer
+
+CHUNK_SIZE = 1024
+
+
+@pytest.fixture
+def server():
+    with StandinServer(StandinConfig(album_id="7", tracks=3)) as server:
+        yield server
+
+
+@pytest.fixture
+def audio_dir(tmp_path, monkeypatch):
+    # 作品列表缓存写在当前目录
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "audio"
+    directory.mkdir()
+    for name, size in [
+        ("第2章 重逢.mp3", 3000),
+        ("第1章 开端.opus", 5000),
+        ("第10章 尾声.m4a", 100),
+        ("第3章 未完成.mp3.part", 100),
+        ("说明.txt", 100),
+    ]:
+        (directory / name).write_bytes(os.urandom(size))
+    return str(directory)
+
+
+def make_publisher(server, audio_dir, **kwargs):
+    client = XimalayaClient("cookie", min_interval=0, base_url=server.base_url)
+    return Publisher(
+        client,
+        "7",
+        audio_dir,
+        ledger_path=os.path.join(os.path.dirname(audio_dir), "ledger.jsonl"),
+        chunk_size=CHUNK_SIZE,
+        log=lambda message: None,
+        **kwargs,
+    )
+
+
+def titles(server):
+    return [track["title"] for track in server.state.tracks[3:]]
+
+
+def test_ledger_merges_fields_and_reloads(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = UploadLedger(path)
+    ledger.update("a.mp3", state="uploading", upload_id="u1")
+    ledger.update("b.mp3", state="uploading", upload_id="u2")
+    ledger.update("a.mp3", state="uploaded", file_id="f1")
+
+    ledger = UploadLedger(path)
+    assert ledger.get("a.mp3")["upload_id"] == "u1"
+    assert ledger.get("a.mp3")["file_id"] == "f1"
+    assert ledger.keys("uploaded") == ["a.mp3"]
+    assert ledger.keys("uploading", "uploaded") == ["a.mp3", "b.mp3"]
+    assert ledger.state("c.mp3") is None
+
+
+def test_ledger_torn_tail_does_not_swallow_next_update(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    UploadLedger(path).update("a.mp3", state="uploaded", file_id="f1")
+    with open(path, "ab") as f:
+        f.write('{"key": "a.mp3", "state": "创建'.encode("utf-8")[:-1])
+
+    ledger = UploadLedger(path)
+    assert ledger.state("a.mp3") == "uploaded"
+    ledger.update("a.mp3", state="creating")
+    assert UploadLedger(path).state("a.mp3") == "creating"
+
+
+def test_publishes_in_chapter_order(server, audio_dir):
+    publisher = make_publisher(server, audio_dir)
+    assert publisher.scan() == ["第1章 开端.opus", "第2章 重逢.mp3", "第10章 尾声.m4a"]
+
+    stats = publisher.run_once()
+    assert (stats["uploaded"], stats["created"], stats["confirmed"]) == (3, 3, 3)
+    assert stats["bytes"] == 8100
+    assert titles(server) == ["第1章 开端", "第2章 重逢", "第10章 尾声"]
+
+    # 已发布的章节不会重复上传或创建
+    stats = make_publisher(server, audio_dir).run_once()
+    assert (stats["uploaded"], stats["created"]) == (0, 0)
+    assert server.state.snapshot()["created"] == 3
+
+
+def test_interrupted_upload_sends_only_missing_chunks(server, audio_dir):
+    publisher = make_publisher(server, audio_dir, workers=1)
+    sent = []
+
+    def cancelled():
+        sent.append(None)
+        return len(sent) > 2
+
+    with pytest.raises(InterruptedError):
+        publisher.upload("第1章 开端.opus", cancelled)
+    assert publisher.ledger.state("第1章 开端.opus") == "uploading"
+    assert server.state.snapshot()["chunks"] == 2
+
+    publisher = make_publisher(server, audio_dir, workers=1)
+    assert publisher.upload("第1章 开端.opus") == 5000 - 2 * CHUNK_SIZE
+    assert server.state.snapshot()["chunks"] == 5
+    assert publisher.ledger.state("第1章 开端.opus") == "uploaded"
+
+
+def test_interrupted_create_is_confirmed_without_duplicate(server, audio_dir):
+    publisher = make_publisher(server, audio_dir)
+    file_name = "第1章 开端.opus"
+    publisher.upload(file_name)
+    publisher.create(file_name)
+    # 创建请求已发出、记录 created 之前中断
+    publisher.ledger.update(file_name, state="creating")
+
+    stats = make_publisher(server, audio_dir).run_once()
+    assert stats["created"] == 2
+    assert UploadLedger(publisher.ledger.path).state(file_name) == "confirmed"
+    assert titles(server).count("第1章 开端") == 1
+
+
+def test_interrupted_create_is_retried_when_missing(server, audio_dir):
+    publisher = make_publisher(server, audio_dir)
+    file_name = "第1章 开端.opus"
+    publisher.upload(file_name)
+    # 创建请求没有到达服务器
+    publisher.ledger.update(file_name, state="creating")
+
+    stats = make_publisher(server, audio_dir).run_once()
+    assert stats["created"] == 3
+    assert titles(server) == ["第1章 开端", "第2章 重逢", "第10章 尾声"]
+
+
+def test_rebuilt_chapter_is_reported_once(server, audio_dir):
+    make_publisher(server, audio_dir).run_once()
+
+    # 合成程序重新生成了已发布的章节
+    with open(os.path.join(audio_dir, "第2章 重逢.mp3"), "wb") as f:
+        f.write(os.urandom(4000))
+
+    publisher = make_publisher(server, audio_dir)
+    stats = publisher.run_once()
+    assert (stats["rebuilt"], stats["uploaded"], stats["created"]) == (1, 0, 0)
+    assert publisher.ledger.get("第2章 重逢.mp3")["rebuilt"][1] == 4000
+    assert make_publisher(server, audio_dir).run_once()["rebuilt"] == 0
+    assert server.state.snapshot()["created"] == 3
+
+
+def test_chapter_number_reads_chinese_numerals():
+    for text, number in [
+        ("十", 10),
+        ("十二", 12),
+        ("一百零五", 105),
+        ("两千零一十", 2010),
+        ("一二三", 123),
+        ("十二万", 120000),
+        ("一亿二千万", 120000000),
+    ]:
+        assert chinese_number(text) == number
+    assert chinese_number("十a") is None
+    assert chapter_number("第一百章 决战.mp3") == 100
+    assert chapter_number("第99章 前夜.mp3") == 99
+    assert chapter_number("说明.mp3") is None
+
+
+def test_chinese_numbered_chapters_publish_in_order(server, tmp_path):
+    directory = tmp_path / "chinese"
+    directory.mkdir()
+    for name in ("第一百章 决战.mp3", "第九十九章 前夜.mp3", "第二十章 相遇.mp3"):
+        (directory / name).write_bytes(os.urandom(100))
+
+    publisher = make_publisher(server, str(directory))
+    assert publisher.scan() == [
+        "第二十章 相遇.mp3",
+        "第九十九章 前夜.mp3",
+        "第一百章 决战.mp3",
+    ]
@@ -0,0 +1,121 @@
+import os
+import sys
+import shutil
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from segment_pack import SegmentPack
+
+# MPEG-1 Layer III，128kbps，44100Hz，每帧417字节
+FRAME_HEADER = b"\xff\xfb\x90\x64"
+
+
+def frames(marker, count=2):
+    return b"".join(FRAME_HEADER + bytes([marker]) * 413 for _ in range(count))
+
+
+def test_segments_survive_reopen(tmp_path):
+    base = str(tmp_path / "0")
+    with SegmentPack(base) as pack:
+        pack.append(0, frames(1), "h0")
+        pack.append(1, frames(2, 3), "h1")
+        pack.append(0, frames(3), "h0b")
+
+    with SegmentPack(base) as pack:
+        assert pack.read(0) == frames(3)
+        assert pack.read(1) == frames(2, 3)
+        assert pack.is_current(0, "h0b")
+        assert not pack.is_current(0, "h0")
+        assert pack.get(1)["duration"] > pack.get(0)["duration"] > 0
+
+
+def test_torn_index_and_missing_data_are_ignored(tmp_path):
+    base = str(tmp_path / "0")
+    with SegmentPack(base) as pack:
+        pack.append(0, frames(1), "h0")
+        entry = pack.append(1, frames(2), "h1")
+
+    # 中断时数据只写入了一部分、索引只写了半行
+    with open(f"{base}.pack", "r+b") as f:
+        f.truncate(entry["offset"] + 10)
+    with open(f"{base}.idx", "a", encoding="utf-8") as f:
+        f.write('{"index": 2, "offs')
+
+    with SegmentPack(base) as pack:
+        assert pack.read(0) == frames(1)
+        assert pack.get(1) is None
+        assert pack.get(2) is None
+        pack.append(1, frames(4), "h1")
+        assert pack.read(1) == frames(4)
+
+    with SegmentPack(base) as pack:
+        assert pack.read(0) == frames(1)
+        assert pack.read(1) == frames(4)
+
+
+def test_discard_and_compact(tmp_path):
+    base = str(tmp_path / "0")
+    with SegmentPack(base) as pack:
+        for index in range(4):
+            pack.append(index, frames(index + 1), f"h{index}")
+        pack.append(0, frames(9), "h0b")
+        assert pack.discard([2, 5]) == 1
+        assert not pack.compact()
+
+        assert pack.compact(force=True)
+        assert pack.total_bytes() == pack.live_bytes()
+        assert pack.read(0) == frames(9)
+
+    with SegmentPack(base) as pack:
+        assert sorted(pack.entries) == [0, 1, 3]
+        assert pack.read(0) == frames(9)
+        assert pack.read(3) == frames(4)
+
+
+def test_recover_before_data_file_replaced(tmp_path):
+    base = str(tmp_path / "0")
+    with SegmentPack(base) as pack:
+        pack.append(0, frames(1), "h0")
+        pack.append(0, frames(2), "h0b")
+
+    # 压缩写完临时文件后、替换数据文件前中断
+    with open(f"{base}.pack.tmp", "wb") as f:
+        f.write(b"partial")
+    with open(f"{base}.idx.tmp", "w", encoding="utf-8") as f:
+        f.write('{"index": 0, "offset": 0, "length": 7}\n')
+
+    with SegmentPack(base) as pack:
+        assert pack.read(0) == frames(2)
+    assert not os.path.exists(f"{base}.pack.tmp")
+    assert not os.path.exists(f"{base}.idx.tmp")
+
+
+def test_recover_after_data_file_replaced(tmp_path):
+    base = str(tmp_path / "0")
+    with SegmentPack(base) as pack:
+        pack.append(0, frames(1), "h0")
+        pack.append(1, frames(2), "h1")
+        pack.append(0, frames(3), "h0b")
+    shutil.copy(f"{base}.idx", f"{base}.idx.old")
+
+    with SegmentPack(base) as pack:
+        assert pack.compact(force=True)
+
+    # 数据文件已经替换、索引文件还没有替换时中断
+    os.replace(f"{base}.idx", f"{base}.idx.tmp")
+    os.replace(f"{base}.idx.old", f"{base}.idx")
+
+    with SegmentPack(base) as pack:
+        assert pack.read(0) == frames(3)
+        assert pack.read(1) == frames(2)
+    assert not os.path.exists(f"{base}.idx.tmp")
+
+
+def test_remove_deletes_files(tmp_path):
+    base = str(tmp_path / "0")
+    pack = SegmentPack(base)
+    pack.append(0, frames(1), "h0")
+    pack.remove()
+    assert os.listdir(tmp_path) == []
+    assert pack.get(0) is None
@@ -0,0 +1,53 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+import serialization
+from serialization import MAGIC
+
+DIALOGUES = [
+    {"type": "旁白", "sex": "中", "text": "夜色渐深。"},
+    {"type": "林风", "sex": "男", "text": "走吧。"},
+    {"type": "旁白", "sex": "中", "text": ""},
+    {"type": "苏晴", "sex": "女", "text": "等等，\n还有一件事。"},
+]
+
+
+def test_dialogues_round_trip_in_binary_format():
+    data = serialization.dumps(DIALOGUES)
+    assert data.startswith(MAGIC)
+    assert serialization.loads(data) == DIALOGUES
+    assert serialization.loads(memoryview(data)) == DIALOGUES
+
+
+def test_speakers_match_full_decode():
+    expected = [(item["type"], item["sex"]) for item in DIALOGUES]
+    assert serialization.speakers(serialization.dumps(DIALOGUES)) == expected
+    assert serialization.speakers(serialization.to_json(DIALOGUES)) == expected
+
+
+def test_empty_list_round_trip():
+    data = serialization.dumps([])
+    assert data.startswith(MAGIC)
+    assert serialization.loads(data) == []
+    assert serialization.speakers(data) == []
+
+
+def test_unsupported_data_falls_back_to_json():
+    irregular = [
+        {"type": "旁白", "sex": "中", "text": "含有\x1f分隔符"},
+        {"type": "林风", "sex": "男", "text": "多一个字段", "emotion": "平静"},
+        "不是字典",
+    ]
+    data = serialization.dumps(irregular)
+    assert not data.startswith(MAGIC)
+    assert serialization.loads(data) == irregular
+    assert serialization.speakers(data) == [("旁白", "中"), ("林风", "男"), ("", "")]
+
+
+def test_legacy_json_text_is_readable():
+    text = serialization.to_json(DIALOGUES)
+    assert serialization.loads(text) == DIALOGUES
+    assert serialization.loads(text.encode("utf-8")) == DIALOGUES
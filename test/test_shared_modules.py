@@ -0,0 +1,6 @@
+from shared_modules import SHARED_MODULES, differing_copies
+
+
+def test_shared_module_copies_match():
+    assert SHARED_MODULES
+    assert differing_copies() == []
@@ -0,0 +1,135 @@
+import os
+import sys
+import struct
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "gui"))
+
+from chapter_assembler import audio_frames, frames_duration
+from volume_packager import (
+    chapter_tag,
+    mp4_duration,
+    package_volumes,
+    pack_mp3_volume,
+)
+
+from test_chapter_assembler import mp3_segment
+
+TITLES = ["第1章 开端", "第2章 重逢", "第3章 尾声"]
+
+
+def write_chapters(directory, frame_counts):
+    paths = []
+    for index, frames in enumerate(frame_counts):
+        path = os.path.join(directory, f"{TITLES[index]}.mp3")
+        with open(path, "wb") as f:
+            f.write(mp3_segment(index + 1, frames))
+        paths.append(path)
+    return paths
+
+
+def read_tag(data):
+    """解析 ID3v2.3 标签，返回 (标签长度, [(章节ID, 开始毫秒, 结束毫秒)])"""
+    assert data[:3] == b"ID3"
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | byte
+    chapters = []
+    position = 10
+    while position < 10 + size:
+        frame_id = data[position : position + 4]
+        (length,) = struct.unpack(">I", data[position + 4 : position + 8])
+        body = data[position + 10 : position + 10 + length]
+        if frame_id == b"CHAP":
+            element_id, rest = body.split(b"\x00", 1)
+            start, end = struct.unpack(">II", rest[:8])
+            chapters.append((element_id.decode("ascii"), start, end))
+        position += 10 + length
+    return 10 + size, chapters
+
+
+def test_mp3_volume_frames_and_chapter_marks(tmp_path):
+    frame_counts = [3, 5, 2]
+    files = write_chapters(str(tmp_path), frame_counts)
+    output_path = str(tmp_path / "卷1.mp3")
+
+    duration = pack_mp3_volume(files, TITLES, output_path, "书名", "1/1")
+    assert not os.path.exists(f"{output_path}.part")
+    with open(output_path, "rb") as f:
+        data = f.read()
+
+    tag_length, chapters = read_tag(data)
+    # 拼接的帧就是去掉标签后的各章节帧
+    expected = b"".join(
+        mp3_segment(i + 1, n, tagged=False) for i, n in enumerate(frame_counts)
+    )
+    assert data[tag_length:] == expected
+
+    # 章节时间按帧时长累计
+    boundaries = [0.0]
+    for index, frames in enumerate(frame_counts):
+        chapter = audio_frames(mp3_segment(index + 1, frames))
+        boundaries.append(boundaries[-1] + frames_duration(chapter))
+    assert chapters == [
+        (f"ch{i}", round(boundaries[i] * 1000), round(boundaries[i + 1] * 1000))
+        for i in range(len(TITLES))
+    ]
+    assert abs(duration - boundaries[-1]) < 1e-9
+
+    # 回写的标签与占位标签长度相同
+    placeholder = chapter_tag("书名", "卷1", "1/1", TITLES, [0] * 3, [0] * 3)
+    assert tag_length == len(placeholder)
+
+
+def test_sample_rate_mismatch_is_rejected(tmp_path):
+    files = write_chapters(str(tmp_path), [3, 3])
+    # MPEG-1 Layer III，128kbps，48000Hz，每帧384字节
+    with open(files[1], "wb") as f:
+        f.write(b"".join(b"\xff\xfb\x94\x64" + b"\x02" * 380 for _ in range(3)))
+
+    output_path = str(tmp_path / "卷1.mp3")
+    with pytest.raises(ValueError, match="采样率"):
+        pack_mp3_volume(files, TITLES[:2], output_path, "书名", "1/1")
+    assert not os.path.exists(output_path)
+    assert not os.path.exists(f"{output_path}.part")
+
+
+def test_package_volumes_names_and_results(tmp_path):
+    files = write_chapters(str(tmp_path), [1, 2, 3])
+    output_dir = str(tmp_path / "volumes")
+
+    results = sorted(
+        package_volumes([files[:2], files[2:]], output_dir, "mp3", "书名", "卷")
+    )
+    assert [os.path.basename(path) for _, path, _ in results] == ["卷1.mp3", "卷2.mp3"]
+    assert all(isinstance(duration, float) for _, _, duration in results)
+
+
+def box(box_type, body, large=False):
+    if large:
+        return struct.pack(">I4sQ", 1, box_type, len(body) + 16) + body
+    return struct.pack(">I4s", len(body) + 8, box_type) + body
+
+
+def write_mp4(path, mvhd):
+    with open(path, "wb") as f:
+        f.write(box(b"ftyp", b"M4A \x00\x00\x00\x00"))
+        f.write(box(b"moov", box(b"trak", b"") + box(b"mvhd", mvhd), large=True))
+
+
+def test_mp4_duration_reads_mvhd_versions(tmp_path):
+    path = str(tmp_path / "chapter.m4a")
+
+    write_mp4(path, b"\x00\x00\x00\x00" + struct.pack(">IIII", 0, 0, 1000, 90500))
+    assert mp4_duration(path) == 90.5
+
+    write_mp4(
+        path, b"\x01\x00\x00\x00" + struct.pack(">QQIQ", 0, 0, 44100, 44100 * 3600 * 2)
+    )
+    assert mp4_duration(path) == 7200
+
+    with open(path, "wb") as f:
+        f.write(box(b"ftyp", b"M4A \x00\x00\x00\x00"))
+    assert mp4_duration(path) is None
@@ -0,0 +1,460 @@
+"""
+本地喜马拉雅作品管理接口替身服务器
+
+按 gui/ximalaya_client.py 使用的接口返回专辑作品列表、删除作品、分块上传和创建作品，
+可配置响应延迟、错误注入和限流，用于离线测试作品列表同步、批量删除和章节发布。
+
+接口地址:
+    GET  /reform-upload/manage/album/tracks        分页作品列表（albumId、page、pageSize）
+    POST /reform-upload/manage/album/track/delete  删除作品（JSON: {"trackId": ...}）
+    POST /upload-server/upload/init                创建上传任务（JSON: fileName、fileSize、chunkSize）
+    POST /upload-server/upload/chunk               上传分块（uploadId、index，请求体为分块内容）
+    GET  /upload-server/upload/status              已收到的分块（uploadId）
+    POST /upload-server/upload/complete            合并分块（JSON: {"uploadId": ...}）
+    POST /reform-upload/manage/album/track/create  创建作品（JSON: albumId、title、fileId）
+    GET  /__stats                                  服务器统计（JSON）
+    GET  /__reset                                  清空统计
+
+用法:
+    python test/ximalaya_standin.py --port 8766 --tracks 2000 --latency 80 --error-rate 0.02 --rate-limit 30
+然后在 gui2 的 config.ini 的 [Settings] 中设置 base_url = http://127.0.0.1:8766
+"""
+
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandinConfig:
+    """替身服务器配置"""
+
+    def __init__(
+        self,
+        album_id="1",
+        tracks=200,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=0.0,
+        burst=10,
+        listing_delay=0.0,
+        seed=None,
+    ):
+        self.album_id = str(album_id)
+        self.tracks = tracks
+        # 延迟和抖动，单位秒
+        self.latency = latency
+        self.jitter = jitter
+        # 返回500的概率
+        self.error_rate = error_rate
+        # 每秒允许的请求数，0表示不限流；超出后返回429
+        self.rate_limit = rate_limit
+        self.burst = burst
+        # 新创建的作品经过多少秒后才出现在作品列表中（模拟审核和转码）
+        self.listing_delay = listing_delay
+        self.random = random.Random(seed)
+
+
+class StandinState:
+    """专辑作品、上传任务、限流令牌桶和统计数据"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.tokens = float(config.burst)
+        self.last_refill = time.monotonic()
+        # 按创建时间升序排列的作品
+        now_ms = int(time.time() * 1000)
+        self.tracks = [
+            {
+                "trackId": 100000 + n,
+                "title": f"第{n}章 测试作品{n}",
+                "createAt": now_ms - (config.tracks - n) * 60000,
+                "duration": 600 + n % 300,
+                "trackStatInfo": {"playCount": n * 3},
+            }
+            for n in range(1, config.tracks + 1)
+        ]
+        self.next_track_id = 100000 + config.tracks + 1
+        # uploadId -> 上传任务，fileId -> 合并后的文件
+        self.uploads = {}
+        self.files = {}
+        self.next_upload = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {
+                "requests": 0,
+                "served": 0,
+                "errors_injected": 0,
+                "throttled": 0,
+                "not_found": 0,
+                "deleted": 0,
+                "chunks": 0,
+                "uploaded_bytes": 0,
+                "created": 0,
+                "max_in_flight": 0,
+            }
+            self.in_flight = 0
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, tracks=len(self.tracks))
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(
+                self.stats["max_in_flight"], self.in_flight
+            )
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def take_token(self):
+        """从令牌桶取一个令牌，取不到说明超出限流"""
+        if not self.config.rate_limit:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                float(self.config.burst),
+                self.tokens + (now - self.last_refill) * self.config.rate_limit,
+            )
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def should_fail(self):
+        with self.lock:
+            return self.config.random.random() < self.config.error_rate
+
+    def delay(self):
+        with self.lock:
+            jitter = self.config.random.uniform(-self.config.jitter, self.config.jitter)
+        return max(0.0, self.config.latency + jitter)
+
+    def tracks_page(self, page, page_size):
+        with self.lock:
+            visible_before = (time.time() - self.config.listing_delay) * 1000
+            tracks = [
+                track for track in self.tracks if track["createAt"] <= visible_before
+            ]
+            start = (page - 1) * page_size
+            return {
+                "infos": tracks[start : start + page_size],
+                "totalSize": len(tracks),
+                "pageSize": page_size,
+                "pageNum": page,
+            }
+
+    def delete_track(self, track_id):
+        """删除作品，作品不存在时返回False"""
+        with self.lock:
+            for i, track in enumerate(self.tracks):
+                if track["trackId"] == track_id:
+                    del self.tracks[i]
+                    self.stats["deleted"] += 1
+                    return True
+            return False
+
+    def create_upload(self, payload):
+        with self.lock:
+            self.next_upload += 1
+            upload_id = f"u{self.next_upload}"
+            self.uploads[upload_id] = {
+                "name": payload["fileName"],
+                "size": int(payload["fileSize"]),
+                "chunk_size": int(payload["chunkSize"]),
+                "chunks": {},
+            }
+            return upload_id
+
+    def add_chunk(self, upload_id, index, data):
+        """保存分块，返回分块的 md5；上传任务不存在时返回None"""
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is None:
+                return None
+            upload["chunks"][index] = len(data)
+            self.stats["chunks"] += 1
+            self.stats["uploaded_bytes"] += len(data)
+        return hashlib.md5(data).hexdigest()
+
+    def upload_chunks(self, upload_id):
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            return None if upload is None else sorted(upload["chunks"])
+
+    def complete_upload(self, upload_id):
+        """分块齐全时返回 fileId，否则返回None"""
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is None or sum(upload["chunks"].values()) != upload["size"]:
+                return None
+            file_id = f"f{upload_id}"
+            self.files[file_id] = upload["name"]
+            del self.uploads[upload_id]
+            return file_id
+
+    def create_track(self, title, file_id):
+        """创建作品，返回 trackId；文件不存在或已使用时返回None"""
+        with self.lock:
+            if self.files.pop(file_id, None) is None:
+                return None
+            track_id = self.next_track_id
+            self.next_track_id += 1
+            self.tracks.append(
+                {
+                    "trackId": track_id,
+                    "title": title,
+                    "createAt": int(time.time() * 1000),
+                    "duration": 0,
+                    "trackStatInfo": {"playCount": 0},
+                }
+            )
+            self.stats["created"] += 1
+            return track_id
+
+
+def make_handler(config, state):
+    """创建请求处理类"""
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # 压测时不输出访问日志
+            pass
+
+        def send_body(self, status, body, content_type="text/plain; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_json(self, data):
+            self.send_body(
+                200,
+                json.dumps(data, ensure_ascii=False),
+                "application/json; charset=utf-8",
+            )
+
+        def read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length)
+
+        def read_json(self, body):
+            try:
+                return json.loads(body or b"{}")
+            except ValueError:
+                return None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/__stats":
+                self.send_json(state.snapshot())
+                return
+            if url.path == "/__reset":
+                state.reset()
+                self.send_json({})
+                return
+            self.handle_api(url, None)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            self.handle_api(url, self.read_body())
+
+        def handle_api(self, url, body):
+            state.count("requests")
+            if not state.take_token():
+                state.count("throttled")
+                self.send_body(429, "Too Many Requests")
+                return
+
+            state.enter()
+            try:
+                delay = state.delay()
+                if delay:
+                    time.sleep(delay)
+
+                if state.should_fail():
+                    state.count("errors_injected")
+                    self.send_body(500, "Internal Server Error")
+                    return
+
+                result = self.resolve(url, body)
+            finally:
+                state.leave()
+
+            if result is None:
+                state.count("not_found")
+                self.send_body(404, "Not Found")
+                return
+
+            state.count("served")
+            self.send_json(result)
+
+        def resolve(self, url, body):
+            """根据接口地址返回响应数据"""
+            query = parse_qs(url.query)
+            if url.path == "/upload-server/upload/chunk":
+                upload_id = query.get("uploadId", [""])[0]
+                index = int(query.get("index", ["0"])[0])
+                md5 = state.add_chunk(upload_id, index, body or b"")
+                if md5 is None:
+                    return {"ret": 1, "msg": "上传任务不存在"}
+                return {"ret": 0, "msg": "成功", "data": {"index": index, "md5": md5}}
+
+            if url.path == "/upload-server/upload/status":
+                chunks = state.upload_chunks(query.get("uploadId", [""])[0])
+                if chunks is None:
+                    return {"ret": 0, "msg": "成功", "data": {"expired": True}}
+                return {"ret": 0, "msg": "成功", "data": {"chunks": chunks}}
+
+            payload = self.read_json(body)
+            if url.path == "/reform-upload/manage/album/tracks":
+                if query.get("albumId", [""])[0] != config.album_id:
+                    return {"ret": 1, "msg": "专辑不存在"}
+                page = int(query.get("page", ["1"])[0])
+                page_size = int(query.get("pageSize", ["40"])[0])
+                return {
+                    "ret": 0,
+                    "msg": "成功",
+                    "data": state.tracks_page(page, page_size),
+                }
+
+            if url.path == "/reform-upload/manage/album/track/delete":
+                if not payload or "trackId" not in payload:
+                    return {"ret": 1, "msg": "参数错误"}
+                if state.delete_track(payload["trackId"]):
+                    return {"ret": 0, "msg": "成功"}
+                return {"ret": 1, "msg": "作品不存在"}
+
+            if url.path == "/upload-server/upload/init":
+                if not payload or "fileSize" not in payload:
+                    return {"ret": 1, "msg": "参数错误"}
+                upload_id = state.create_upload(payload)
+                return {"ret": 0, "msg": "成功", "data": {"uploadId": upload_id}}
+
+            if url.path == "/upload-server/upload/complete":
+                file_id = state.complete_upload((payload or {}).get("uploadId"))
+                if file_id is None:
+                    return {"ret": 1, "msg": "分块不完整"}
+                return {"ret": 0, "msg": "成功", "data": {"fileId": file_id}}
+
+            if url.path == "/reform-upload/manage/album/track/create":
+                if not payload or str(payload.get("albumId")) != config.album_id:
+                    return {"ret": 1, "msg": "专辑不存在"}
+                track_id = state.create_track(
+                    payload.get("title", ""), payload.get("fileId")
+                )
+                if track_id is None:
+                    return {"ret": 1, "msg": "文件不存在"}
+                return {"ret": 0, "msg": "成功", "data": {"trackId": track_id}}
+
+            return None
+
+    return StandinHandler
+
+
+class StandinServer:
+    """在后台线程运行的替身服务器"""
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        self.config = config
+        self.state = StandinState(config)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(config, self.state))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_config_arguments(parser):
+    """添加服务器配置参数（压测脚本复用）"""
+    parser.add_argument("--album-id", default="1", help="专辑ID")
+    parser.add_argument("--tracks", type=int, default=200, help="专辑中的作品数")
+    parser.add_argument("--latency", type=float, default=0, help="响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回500的概率")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="每秒允许的请求数，0为不限流"
+    )
+    parser.add_argument("--burst", type=int, default=10, help="限流令牌桶容量")
+    parser.add_argument(
+        "--listing-delay", type=float, default=0, help="新作品出现在列表中的延迟（秒）"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+
+
+def config_from_args(args):
+    """根据命令行参数创建配置"""
+    return StandinConfig(
+        album_id=args.album_id,
+        tracks=args.tracks,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        listing_delay=args.listing_delay,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地喜马拉雅作品管理接口替身服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8766, help="监听端口")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandinServer(config_from_args(args), args.host, args.port)
+    print(f"替身接口已启动: {server.base_url}（专辑 {args.album_id}）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()